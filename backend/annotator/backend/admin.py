@@ -1,8 +1,46 @@
+from typing import Any, Optional
+
 from django.contrib import admin
+from django.db.models import Count, QuerySet
+from django.http import HttpRequest
+from django.template.response import TemplateResponse
+
+from . import blobs
 from . import models
 
 
+# Lists the content-addressed blobs with their reference counts and reports the
+# bytes saved by deduplication above the list.
+class BlobAdmin(admin.ModelAdmin):  # type: ignore
+    list_display = ["sha256", "size", "references", "created"]
+    readonly_fields = ["sha256", "size", "file", "created"]
+
+    def get_queryset(self, request: HttpRequest) -> QuerySet[models.Blob]:
+        return super().get_queryset(request).annotate(references=Count("files"))
+
+    @admin.display(ordering="references")
+    def references(self, obj: Any) -> int:
+        return int(obj.references)
+
+    def changelist_view(
+        self, request: HttpRequest, extra_context: Optional[dict[str, Any]] = None
+    ) -> TemplateResponse:
+        extra_context = extra_context or {}
+        extra_context["deduplication"] = blobs.get_deduplication_report()
+        return super().changelist_view(request, extra_context)
+
+    def has_add_permission(self, request: HttpRequest) -> bool:
+        return False
+
+
 admin.site.register(models.Project)
 admin.site.register(models.ModelData)
 admin.site.register(models.Label)
 admin.site.register(models.File)
+admin.site.register(models.UploadSession)
+admin.site.register(models.Blob, BlobAdmin)
+admin.site.register(models.TranscodedBlob)
+admin.site.register(models.AnnotationVersion)
+admin.site.register(models.Job)
+admin.site.register(models.AnnotationAgreement)
+admin.site.register(models.PreviewRender)
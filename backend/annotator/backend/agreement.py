@@ -0,0 +1,91 @@
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+from . import constants
+from . import models
+from .anno3d import Labels, count_classes
+
+# Inter-annotator agreement of two annotations of the same model. The unlabeled
+# faces or points are treated like an annotation class of their own, so labeling
+# something the other annotator left out counts as a disagreement. The metrics are
+# cached per pair of annotationFile contents.
+
+Metrics = dict[str, Any]
+
+
+# Returns the confusion matrix, the per class IoU, the observed agreement and Cohen's
+# kappa of the labels. The rows of the confusion matrix are the classes of `labels`,
+# the columns those of `against`, both in the order of `classes`. The neutral class is
+# part of `classes` if it is used, but has no IoU.
+def compare_labels(labels: Labels, against: Labels) -> Metrics:
+    if len(labels) != len(against):
+        raise ValueError("The annotations do not have the same count.")
+    neutral = constants.ANNO3D_NEUTRAL_CLASS
+    classes = np.flatnonzero(count_classes(labels) + count_classes(against))
+    size = len(classes)
+    # maps the annotation classes to the rows and columns of the confusion matrix
+    lookup = np.zeros(neutral + 1, dtype=np.int64)
+    lookup[classes] = np.arange(size)
+    confusion = np.zeros(size * size, dtype=np.int64)
+    for start in range(0, len(labels), constants.ANNO3D_BLOCK_SIZE):
+        end = start + constants.ANNO3D_BLOCK_SIZE
+        pairs = lookup[labels[start:end]] * size + lookup[against[start:end]]
+        confusion += np.bincount(pairs, minlength=size * size)
+    matrix = confusion.reshape(size, size)
+
+    total = len(labels)
+    agreed = np.diagonal(matrix)
+    rows, columns = matrix.sum(axis=1), matrix.sum(axis=0)
+    union = rows + columns - agreed
+    iou: list[Optional[float]] = [
+        None if annotationClass == neutral else float(agreed[i] / union[i])
+        for i, annotationClass in enumerate(classes)
+    ]
+    labeledIou = [value for value in iou if value is not None]
+    observed = expected = kappa = None
+    if total:
+        observed = float(agreed.sum() / total)
+        expected = float((rows / total) @ (columns / total))
+        # both annotations are a single identical class
+        kappa = 1.0 if expected == 1.0 else (observed - expected) / (1.0 - expected)
+    return {
+        "count": total,
+        "classes": classes.tolist(),
+        "confusion": matrix.tolist(),
+        "iou": iou,
+        "meanIou": sum(labeledIou) / len(labeledIou) if labeledIou else None,
+        "observedAgreement": observed,
+        "kappa": kappa,
+    }
+
+
+# Returns the metrics of two annotationFiles, from the cache if they were computed
+# before. read_labels reads the labels of a File. Files without a sha256, which were
+# uploaded before it was stored, are never cached.
+def get_metrics(
+    fileObj: models.File,
+    againstFile: models.File,
+    read_labels: Callable[[models.File], Labels],
+) -> Metrics:
+    cacheable = bool(fileObj.sha256 and againstFile.sha256)
+    if cacheable:
+        cached = models.AnnotationAgreement.objects.filter(
+            sha256=fileObj.sha256, againstSha256=againstFile.sha256
+        ).first()
+        if cached is not None:
+            return cached.result
+    metrics = compare_labels(read_labels(fileObj), read_labels(againstFile))
+    if cacheable:
+        # concurrent requests for the same pair compute it once each
+        models.AnnotationAgreement.objects.bulk_create(
+            [
+                models.AnnotationAgreement(
+                    sha256=fileObj.sha256,
+                    againstSha256=againstFile.sha256,
+                    result=metrics,
+                )
+            ],
+            ignore_conflicts=True,
+        )
+    return metrics
@@ -0,0 +1,17 @@
+# Server side implementation of the anno3d annotation file formats.
+
+from .common import (
+    AnnotationFileError,
+    Labels,
+    count_classes,
+    create_labels,
+    get_classes,
+)
+
+__all__ = [
+    "AnnotationFileError",
+    "Labels",
+    "count_classes",
+    "create_labels",
+    "get_classes",
+]
@@ -0,0 +1,198 @@
+import io
+from typing import IO, Iterator
+
+import numpy as np
+
+from .. import constants
+from .common import (
+    FORMAT_BINARY,
+    VERSION_TWO,
+    AnnotationFileError,
+    Labels,
+    create_labels,
+    is_number,
+    read_header_line,
+)
+
+
+# Parser and serializer for the binary anno3d format BIN version 2.0. The header
+# consists of text lines like UTF8v1, so both formats are told apart by the same
+# `format`/`version` lines:
+#
+#   format BIN
+#   version 2.0
+#   count <number of faces or points>
+#   encoding dense|rle
+#   runs <number of runs>               (rle only)
+#   <payload>
+#
+# The payload of the dense encoding is the label array itself, count little-endian
+# uint16 values. The payload of the run-length encoding is a sequence of runs, each
+# a little-endian uint16 annotation class followed by a uint32 length. The
+# serializer uses whichever encoding is smaller: dense labels of point clouds take
+# 2 bytes per point instead of up to 11 in UTF8v1, while large unlabeled or
+# uniformly labeled areas of meshes collapse to a few runs.
+
+ENCODING_DENSE = "dense"
+ENCODING_RLE = "rle"
+
+DENSE = np.dtype("<u2")
+RUN = np.dtype([("annotationClass", "<u2"), ("length", "<u4")])
+
+
+# Returns the number of runs of equal annotation classes.
+def count_runs(labels: Labels) -> int:
+    if len(labels) == 0:
+        return 0
+    runs = 1
+    for start in range(0, len(labels) - 1, constants.ANNO3D_BLOCK_SIZE):
+        block = labels[start : start + constants.ANNO3D_BLOCK_SIZE + 1]
+        runs += int(np.count_nonzero(block[1:] != block[:-1]))
+    return runs
+
+
+def iter_runs(labels: Labels) -> Iterator[bytes]:
+    # the last run of a block may continue in the next one
+    pendingClass = -1
+    pendingLength = 0
+    for start in range(0, len(labels), constants.ANNO3D_BLOCK_SIZE):
+        block = labels[start : start + constants.ANNO3D_BLOCK_SIZE]
+        starts = np.flatnonzero(block[1:] != block[:-1]) + 1
+        starts = np.concatenate(([0], starts))
+        lengths = np.diff(np.append(starts, len(block)))
+        if block[0] == pendingClass:
+            lengths[0] += pendingLength
+        elif pendingLength > 0:
+            yield np.array([(pendingClass, pendingLength)], dtype=RUN).tobytes()
+
+        runs = np.empty(len(starts) - 1, dtype=RUN)
+        runs["annotationClass"] = block[starts[:-1]]
+        runs["length"] = lengths[:-1]
+        if len(runs) > 0:
+            yield runs.tobytes()
+        pendingClass = int(block[starts[-1]])
+        pendingLength = int(lengths[-1])
+    if pendingLength > 0:
+        yield np.array([(pendingClass, pendingLength)], dtype=RUN).tobytes()
+
+
+def iter_serialize(labels: Labels) -> Iterator[bytes]:
+    runs = count_runs(labels)
+    header = f"format {FORMAT_BINARY}\nversion {VERSION_TWO}\ncount {len(labels)}\n"
+    if runs * RUN.itemsize < len(labels) * DENSE.itemsize:
+        yield (header + f"encoding {ENCODING_RLE}\nruns {runs}\n").encode("utf-8")
+        yield from iter_runs(labels)
+    else:
+        yield (header + f"encoding {ENCODING_DENSE}\n").encode("utf-8")
+        for start in range(0, len(labels), constants.ANNO3D_BLOCK_SIZE):
+            block = labels[start : start + constants.ANNO3D_BLOCK_SIZE]
+            yield block.astype(DENSE, copy=False).tobytes()
+
+
+def serialize(labels: Labels, fileobj: IO[bytes]) -> None:
+    for block in iter_serialize(labels):
+        fileobj.write(block)
+
+
+def serialize_bytes(labels: Labels) -> bytes:
+    return b"".join(iter_serialize(labels))
+
+
+def read_exactly(fileobj: IO[bytes], size: int) -> bytes:
+    data = fileobj.read(size)
+    # streams like zip members may return less than requested
+    while len(data) < size:
+        more = fileobj.read(size - len(data))
+        if not more:
+            raise AnnotationFileError("The file is truncated.", "parsing_error")
+        data += more
+    return data
+
+
+def read_number(fileobj: IO[bytes], name: str, lineNumber: int) -> int:
+    parts = read_header_line(fileobj, lineNumber).split(" ")
+    if len(parts) != 2 or parts[0] != name or not is_number(parts[1]):
+        raise AnnotationFileError(
+            f"Expected the {name} but got: '{' '.join(parts)}'.",
+            "parsing_error",
+            lineNumber,
+        )
+    return int(parts[1])
+
+
+def parse_dense(fileobj: IO[bytes], labels: Labels) -> None:
+    for start in range(0, len(labels), constants.ANNO3D_BLOCK_SIZE):
+        block = labels[start : start + constants.ANNO3D_BLOCK_SIZE]
+        data = read_exactly(fileobj, len(block) * DENSE.itemsize)
+        block[:] = np.frombuffer(data, dtype=DENSE)
+
+
+def parse_rle(fileobj: IO[bytes], labels: Labels, runCount: int) -> None:
+    blockSize = max(1, constants.ANNO3D_BLOCK_SIZE // RUN.itemsize)
+    position = 0
+    for first in range(0, runCount, blockSize):
+        size = min(blockSize, runCount - first)
+        runs = np.frombuffer(read_exactly(fileobj, size * RUN.itemsize), dtype=RUN)
+        lengths = runs["length"].astype(np.int64)
+        end = position + int(lengths.sum())
+        if (lengths == 0).any() or end > len(labels):
+            raise AnnotationFileError(
+                "The runs do not match the count.", "parsing_error"
+            )
+        if end - position <= constants.ANNO3D_BLOCK_SIZE:
+            labels[position:end] = np.repeat(runs["annotationClass"], lengths)
+        else:
+            # long runs are filled one by one instead of repeating them in memory
+            for annotationClass, length in zip(runs["annotationClass"], lengths):
+                labels[position : position + length] = annotationClass
+                position += length
+        position = end
+    if position != len(labels):
+        raise AnnotationFileError("The runs do not match the count.", "parsing_error")
+
+
+# Parses a file object. Only the labels are held in memory, the payload is read in
+# blocks of ANNO3D_BLOCK_SIZE.
+def parse(fileobj: IO[bytes], maxCount: int = constants.ANNO3D_MAX_COUNT) -> Labels:
+    formatLine = read_header_line(fileobj, 1)
+    if formatLine != f"format {FORMAT_BINARY}":
+        raise AnnotationFileError(
+            f"The file format '{formatLine}' is not supported.", "unsupported_format", 1
+        )
+    versionLine = read_header_line(fileobj, 2)
+    if versionLine != f"version {VERSION_TWO}":
+        raise AnnotationFileError(
+            f"The file version '{versionLine}' is not supported.",
+            "unsupported_format",
+            2,
+        )
+    try:
+        labels = create_labels(read_number(fileobj, "count", 3), maxCount)
+    except AnnotationFileError as error:
+        error.lineNumber = 3
+        raise
+
+    encoding = read_header_line(fileobj, 4)
+    if encoding == f"encoding {ENCODING_DENSE}":
+        parse_dense(fileobj, labels)
+    elif encoding == f"encoding {ENCODING_RLE}":
+        runCount = read_number(fileobj, "runs", 5)
+        if runCount > len(labels):
+            raise AnnotationFileError(
+                "There are more runs than indices.", "parsing_error", 5
+            )
+        parse_rle(fileobj, labels, runCount)
+    else:
+        raise AnnotationFileError(
+            f"The encoding '{encoding}' is not supported.", "unsupported_format", 4
+        )
+
+    if fileobj.read(1):
+        raise AnnotationFileError(
+            "The file contains data after the labels.", "parsing_error"
+        )
+    return labels
+
+
+def parse_bytes(data: bytes, maxCount: int = constants.ANNO3D_MAX_COUNT) -> Labels:
+    return parse(io.BytesIO(data), maxCount)
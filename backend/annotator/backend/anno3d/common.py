@@ -0,0 +1,69 @@
+from typing import IO, Optional
+
+import numpy as np
+import numpy.typing as npt
+
+from .. import constants
+
+
+# Shared definitions of the anno3d annotation file formats. The parsed data of an
+# annotation file is a uint16 array with one annotation class per face (meshes) or
+# point (point clouds), equivalent to the Uint16Array used by the frontend.
+
+Labels = npt.NDArray[np.uint16]
+
+FORMAT_UTF8 = "UTF8"
+VERSION_ONE = "1.0"
+FORMAT_BINARY = "BIN"
+VERSION_TWO = "2.0"
+
+# every valid header line is far shorter, longer lines are never buffered
+MAX_LINE_LENGTH = 64
+
+
+class AnnotationFileError(Exception):
+    def __init__(
+        self, message: str, code: str, lineNumber: Optional[int] = None
+    ) -> None:
+        super().__init__(message)
+        self.message = message
+        self.code = code
+        self.lineNumber = lineNumber
+
+
+def create_labels(count: int, maxCount: int = constants.ANNO3D_MAX_COUNT) -> Labels:
+    if count < 0 or count > maxCount:
+        raise AnnotationFileError(
+            f"The count {count} exceeds the maximum of {maxCount}.", "count_too_large"
+        )
+    return np.full(count, constants.ANNO3D_NEUTRAL_CLASS, dtype=np.uint16)
+
+
+# Returns the number of faces or points of every annotation class. bincount converts
+# its input to intp, so the labels are counted block by block.
+def count_classes(labels: Labels) -> npt.NDArray[np.int64]:
+    counts = np.zeros(constants.ANNO3D_NEUTRAL_CLASS + 1, dtype=np.int64)
+    for start in range(0, len(labels), constants.ANNO3D_BLOCK_SIZE):
+        block = labels[start : start + constants.ANNO3D_BLOCK_SIZE]
+        counts += np.bincount(block, minlength=len(counts))
+    return counts
+
+
+# Returns the annotation classes used in the labels, without the neutral class.
+def get_classes(labels: Labels) -> list[int]:
+    used = np.flatnonzero(count_classes(labels)[: constants.ANNO3D_NEUTRAL_CLASS])
+    return [int(c) for c in used]
+
+
+def is_number(text: str) -> bool:
+    return text.isascii() and text.isdigit()
+
+
+# Reads a single line of the text header without the newline character.
+def read_header_line(fileobj: IO[bytes], lineNumber: int) -> str:
+    line = fileobj.readline(MAX_LINE_LENGTH + 1)
+    if not line.endswith(b"\n"):
+        raise AnnotationFileError(
+            "The header is incomplete.", "parsing_error", lineNumber
+        )
+    return line[:-1].decode("utf-8", "replace")
@@ -0,0 +1,62 @@
+import io
+from typing import IO, Iterable, Iterator, Optional
+
+from .. import constants
+from . import binaryv2, utf8v1
+from .common import MAX_LINE_LENGTH, AnnotationFileError, Labels
+
+
+# Selects the parser of a file by its `format` and `version` header, like
+# frontend/src/annotator/anno3d/GenericAnnotationFileParser.ts, and the serializer by
+# the name of the format.
+
+FORMAT_UTF8V1 = "utf8v1"
+FORMAT_BINARYV2 = "binv2"
+FORMATS = (FORMAT_UTF8V1, FORMAT_BINARYV2)
+
+HEADERS = {
+    b"format UTF8\nversion 1.0\n": FORMAT_UTF8V1,
+    b"format BIN\nversion 2.0\n": FORMAT_BINARYV2,
+}
+
+
+# Returns the name of the format of the file without consuming any of its bytes.
+def detect_format(fileobj: io.BufferedIOBase) -> str:
+    head = fileobj.peek(2 * MAX_LINE_LENGTH)  # type: ignore[attr-defined]
+    for header, name in HEADERS.items():
+        # a truncated header is reported by the parser of the format
+        if head.startswith(header) or (head and header.startswith(head)):
+            return name
+    line = head.split(b"\n", 1)[0][:MAX_LINE_LENGTH].decode("utf-8", "replace")
+    if not line.startswith("format ") or not line.isprintable():
+        raise AnnotationFileError(
+            "The file is no anno3d file.", "unsupported_format", 1
+        )
+    raise AnnotationFileError(
+        f"The file format '{line}' is not supported.", "unsupported_format", 1
+    )
+
+
+# Parses a file of any supported format and returns the name of the format and the
+# labels.
+def parse(
+    fileobj: IO[bytes], maxCount: int = constants.ANNO3D_MAX_COUNT
+) -> tuple[str, Labels]:
+    reader = fileobj if hasattr(fileobj, "peek") else io.BufferedReader(fileobj)
+    name = detect_format(reader)  # type: ignore[arg-type]
+    if name == FORMAT_UTF8V1:
+        return name, utf8v1.parse(reader, maxCount=maxCount)
+    return name, binaryv2.parse(reader, maxCount)
+
+
+# Serializes the labels in the given format. UTF8 1.0 writes the labels of the
+# annotation classes in the given order, see utf8v1.iter_serialize, BIN 2.0 has no
+# label sections.
+def iter_serialize(
+    labels: Labels, name: str, classes: Optional[Iterable[int]] = None
+) -> Iterator[bytes]:
+    if name == FORMAT_UTF8V1:
+        return utf8v1.iter_serialize(labels, classes)
+    if name == FORMAT_BINARYV2:
+        return binaryv2.iter_serialize(labels)
+    raise ValueError(f"Unknown anno3d format '{name}'.")
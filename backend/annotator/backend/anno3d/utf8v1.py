@@ -0,0 +1,320 @@
+import io
+from typing import IO, Iterable, Iterator, Optional
+
+import numpy as np
+import numpy.typing as npt
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .. import constants
+from .common import (
+    FORMAT_UTF8,
+    MAX_LINE_LENGTH,
+    VERSION_ONE,
+    AnnotationFileError,
+    Labels,
+    count_classes,
+    create_labels,
+    is_number,
+)
+
+
+# Parser and serializer for the anno3d format UTF8 version 1.0, the counterpart of
+# frontend/src/annotator/anno3d/UTF8v1. A file looks like this:
+#
+#   format UTF8
+#   version 1.0
+#   count <number of faces or points>
+#   label <annotation class> <number of indices>
+#   <index>
+#   ...
+#
+# The index lines make up almost the whole file. They are never split in Python,
+# instead every block of index lines is converted at once with NumPy. Both the
+# parser and the serializer work on blocks of ANNO3D_BLOCK_SIZE bytes, so apart from
+# the label array the memory usage does not depend on the size of the file.
+
+NEWLINE = ord("\n")
+ZERO = ord("0")
+# ANNO3D_MAX_COUNT has 9 digits, one more allows a proper out of range error
+MAX_INDEX_DIGITS = 10
+POWERS_OF_TEN = 10 ** np.arange(MAX_INDEX_DIGITS, dtype=np.int64)
+
+HEADER_FORMAT, HEADER_VERSION, HEADER_COUNT, HEADER_DONE = range(4)
+
+
+# Converts a block of index lines to integers. `ends` contains the position of the
+# newline character of every line in the block. Every line is read as a row of a
+# matrix that is right-aligned at the newline character, so the digits of all lines
+# can be accumulated column by column.
+def parse_index_lines(
+    block: memoryview, ends: npt.NDArray[np.int64], firstLineNumber: int
+) -> npt.NDArray[np.int64]:
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    lengths = ends - starts
+    invalid = (lengths == 0) | (lengths > MAX_INDEX_DIGITS)
+
+    width = min(int(lengths.max()), MAX_INDEX_DIGITS)
+    # the padding keeps the window of the first line inside the buffer
+    chars = np.empty(len(block) + width, dtype=np.uint8)
+    chars[:width] = ZERO
+    chars[width:] = np.frombuffer(block, dtype=np.uint8)
+    digits = sliding_window_view(chars, width)[ends] - ZERO
+    # characters of the previous lines are no digits of the current one
+    digits[np.arange(width) < (width - lengths)[:, None]] = 0
+    invalid |= (digits > 9).any(axis=1)
+    if invalid.any():
+        line = int(np.argmax(invalid))
+        text = bytes(block[starts[line] : ends[line]]).decode("utf-8", "replace")
+        raise AnnotationFileError(
+            f"Expected an index but got: '{text}'.",
+            "parsing_error",
+            firstLineNumber + line,
+        )
+
+    values = np.zeros(len(ends), dtype=np.int64)
+    for column in range(width):
+        values *= 10
+        values += digits[:, column]
+    return values
+
+
+# Streaming parser. Data is passed in arbitrary pieces with feed(), close() checks
+# that the file is complete and returns the labels. With `classes`, only these
+# annotation classes are accepted.
+class ParserUTF8v1:
+    def __init__(
+        self,
+        classes: Optional[Iterable[int]] = None,
+        maxCount: int = constants.ANNO3D_MAX_COUNT,
+    ) -> None:
+        self.classes = None if classes is None else set(classes)
+        self.maxCount = maxCount
+        self.labels: Optional[Labels] = None
+        self.usedClasses: set[int] = set()
+        self.header = HEADER_FORMAT
+        self.annotationClass = constants.ANNO3D_NEUTRAL_CLASS
+        self.remaining = 0
+        self.lineNumber = 0
+        self.overflow = b""
+
+    def feed(self, data: bytes) -> None:
+        data = self.overflow + data
+        end = data.rfind(b"\n") + 1
+        self.overflow = data[end:]
+        if len(self.overflow) > MAX_LINE_LENGTH:
+            raise AnnotationFileError(
+                "The line is too long.", "parsing_error", self.lineNumber + 1
+            )
+        if end > 0:
+            self.parse_lines(memoryview(data)[:end])
+
+    def close(self) -> Labels:
+        if self.overflow:
+            # the last line is not terminated by a newline character
+            self.feed(b"\n")
+        if self.header != HEADER_DONE or self.labels is None:
+            raise AnnotationFileError(
+                "The header is incomplete.", "parsing_error", self.lineNumber
+            )
+        if self.remaining > 0:
+            raise AnnotationFileError(
+                f"Expected {self.remaining} more indices for the label with the "
+                + f"annotation class {self.annotationClass}.",
+                "parsing_error",
+                self.lineNumber,
+            )
+        return self.labels
+
+    def parse_lines(self, lines: memoryview) -> None:
+        ends = np.flatnonzero(np.frombuffer(lines, dtype=np.uint8) == NEWLINE)
+        line = 0
+        position = 0
+        while line < len(ends):
+            if self.remaining > 0:
+                count = min(self.remaining, len(ends) - line)
+                end = int(ends[line + count - 1]) + 1
+                self.parse_indices(
+                    lines[position:end], ends[line : line + count] - position
+                )
+                line += count
+            else:
+                end = int(ends[line]) + 1
+                text = bytes(lines[position : end - 1]).decode("utf-8", "replace")
+                self.lineNumber += 1
+                self.parse_header_line(text)
+                line += 1
+            position = end
+
+    def parse_indices(self, block: memoryview, ends: npt.NDArray[np.int64]) -> None:
+        assert self.labels is not None
+        indices = parse_index_lines(block, ends, self.lineNumber + 1)
+        outOfRange = indices >= len(self.labels)
+        if outOfRange.any():
+            line = int(np.argmax(outOfRange))
+            raise AnnotationFileError(
+                f"The index {indices[line]} exceeds the count {len(self.labels)}.",
+                "index_out_of_range",
+                self.lineNumber + 1 + line,
+            )
+        self.labels[indices] = self.annotationClass
+        self.remaining -= len(ends)
+        self.lineNumber += len(ends)
+
+    def parse_header_line(self, line: str) -> None:
+        parts = line.split(" ")
+        if self.header == HEADER_FORMAT:
+            if len(parts) != 2 or parts[0] != "format" or parts[1] != FORMAT_UTF8:
+                raise AnnotationFileError(
+                    f"The file format '{line}' is not supported.",
+                    "unsupported_format",
+                    self.lineNumber,
+                )
+            self.header = HEADER_VERSION
+        elif self.header == HEADER_VERSION:
+            if len(parts) != 2 or parts[0] != "version" or parts[1] != VERSION_ONE:
+                raise AnnotationFileError(
+                    f"The file version '{line}' is not supported.",
+                    "unsupported_format",
+                    self.lineNumber,
+                )
+            self.header = HEADER_COUNT
+        elif self.header == HEADER_COUNT:
+            if len(parts) != 2 or parts[0] != "count" or not is_number(parts[1]):
+                raise AnnotationFileError(
+                    f"Expected the count but got: '{line}'.",
+                    "parsing_error",
+                    self.lineNumber,
+                )
+            try:
+                self.labels = create_labels(int(parts[1]), self.maxCount)
+            except AnnotationFileError as error:
+                error.lineNumber = self.lineNumber
+                raise
+            self.header = HEADER_DONE
+        else:
+            self.parse_label_header(parts, line)
+
+    def parse_label_header(self, parts: list[str], line: str) -> None:
+        if (
+            len(parts) != 3
+            or parts[0] != "label"
+            or not is_number(parts[1])
+            or not is_number(parts[2])
+            or int(parts[1]) >= constants.ANNO3D_NEUTRAL_CLASS
+        ):
+            raise AnnotationFileError(
+                f"Expected a label header but got: '{line}'.",
+                "parsing_error",
+                self.lineNumber,
+            )
+        annotationClass = int(parts[1])
+        if self.classes is not None and annotationClass not in self.classes:
+            raise AnnotationFileError(
+                f"There is no label with the annotation class {annotationClass}.",
+                "unknown_label",
+                self.lineNumber,
+            )
+        if annotationClass in self.usedClasses:
+            raise AnnotationFileError(
+                f"The label with the annotation class {annotationClass} was already "
+                + "parsed.",
+                "duplicate_label",
+                self.lineNumber,
+            )
+        self.usedClasses.add(annotationClass)
+        self.annotationClass = annotationClass
+        self.remaining = int(parts[2])
+
+
+# Parses a file object block by block, the text is never held in memory as a whole.
+def parse(
+    fileobj: IO[bytes],
+    classes: Optional[Iterable[int]] = None,
+    maxCount: int = constants.ANNO3D_MAX_COUNT,
+) -> Labels:
+    parser = ParserUTF8v1(classes, maxCount)
+    while block := fileobj.read(constants.ANNO3D_BLOCK_SIZE):
+        parser.feed(block)
+    return parser.close()
+
+
+def parse_bytes(
+    data: bytes,
+    classes: Optional[Iterable[int]] = None,
+    maxCount: int = constants.ANNO3D_MAX_COUNT,
+) -> Labels:
+    return parse(io.BytesIO(data), classes, maxCount)
+
+
+# Converts sorted indices to newline terminated decimal lines. Indices with the same
+# number of digits are adjacent and are written as the rows of one matrix.
+def format_indices(indices: npt.NDArray[np.int64]) -> bytes:
+    parts = []
+    start = 0
+    for width, end in enumerate(np.searchsorted(indices, POWERS_OF_TEN[1:]), 1):
+        if end > start:
+            values = indices[start:end].copy()
+            chars = np.empty((end - start, width + 1), dtype=np.uint8)
+            for column in range(width - 1, -1, -1):
+                chars[:, column] = values % 10 + ZERO
+                values //= 10
+            chars[:, width] = NEWLINE
+            parts.append(chars.tobytes())
+        start = end
+    if start < len(indices):
+        raise AnnotationFileError(
+            f"The index {indices[start]} is too large.", "index_out_of_range"
+        )
+    return b"".join(parts)
+
+
+# Serializes the labels block by block. The labels are written in the order of
+# `classes`, including labels without indices. Given the annotation classes of the
+# project labels in their order, the file is written like the frontend writes it.
+# Without `classes`, only the annotation classes used in the labels are written, in
+# ascending order.
+def iter_serialize(
+    labels: Labels, classes: Optional[Iterable[int]] = None
+) -> Iterator[bytes]:
+    counts = count_classes(labels)
+    used = [int(c) for c in np.flatnonzero(counts[: constants.ANNO3D_NEUTRAL_CLASS])]
+    if classes is None:
+        classes = used
+    else:
+        classes = list(classes)
+        unknown = set(used) - set(classes)
+        if unknown:
+            raise AnnotationFileError(
+                f"There is no label with the annotation class {min(unknown)}.",
+                "unknown_label",
+            )
+
+    yield (
+        f"format {FORMAT_UTF8}\nversion {VERSION_ONE}\ncount {len(labels)}\n"
+    ).encode("utf-8")
+
+    # the index lines of a block have at most MAX_INDEX_DIGITS + 1 bytes
+    blockSize = max(1, constants.ANNO3D_BLOCK_SIZE // (MAX_INDEX_DIGITS + 1))
+    for annotationClass in classes:
+        yield f"label {annotationClass} {counts[annotationClass]}\n".encode("utf-8")
+        if counts[annotationClass] == 0:
+            continue
+        for start in range(0, len(labels), blockSize):
+            indices = np.flatnonzero(
+                labels[start : start + blockSize] == annotationClass
+            )
+            if len(indices) > 0:
+                yield format_indices(indices + start)
+
+
+def serialize(
+    labels: Labels, fileobj: IO[bytes], classes: Optional[Iterable[int]] = None
+) -> None:
+    for block in iter_serialize(labels, classes):
+        fileobj.write(block)
+
+
+def serialize_bytes(labels: Labels, classes: Optional[Iterable[int]] = None) -> bytes:
+    return b"".join(iter_serialize(labels, classes))
@@ -0,0 +1,249 @@
+import hashlib
+import zipfile
+import zlib
+from contextlib import contextmanager
+from typing import IO, Iterator, Optional
+
+import numpy as np
+import numpy.typing as npt
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.http import HttpRequest
+from django.http.response import HttpResponseBase
+
+from . import archives
+from . import blobs
+from . import constants
+from . import downloads
+from . import models
+from .utils import get_modeldata_file_path
+from .anno3d import AnnotationFileError, Labels, generic
+from .anno3d.common import MAX_LINE_LENGTH, get_classes
+from .anno3d.utf8v1 import MAX_INDEX_DIGITS
+
+
+# Canonical storage and transcoding of annotationFiles. Whatever anno3d format an
+# annotation is uploaded in, it is stored in the binary format BIN 2.0. Downloads are
+# transcoded to the format requested with the anno3d_format parameter, which defaults
+# to UTF8 1.0, the only format clients without the parameter can read. Files stored
+# before, or in the requested format, are sent as they are. Transcoded archives are
+# stored in the blob store the first time they are requested, so that they are sent
+# like stored files, with byte ranges and a strong entity tag.
+#
+# Like the frontend, UTF8 1.0 files get a label section for every label of the
+# project, in the order of the labels and also for labels without indices, so that a
+# file uploaded by the frontend is downloaded with the same content. Since the
+# content depends on the labels of the project, transcoded archives are identified by
+# the format and a key of the annotation classes.
+
+CANONICAL_FORMAT = generic.FORMAT_BINARYV2
+DEFAULT_FORMAT = generic.FORMAT_UTF8V1
+FORMAT_PARAMETER = "anno3d_format"
+
+# names used by the frontend, see frontend/src/api/v1/endpoints/Files.ts
+FILENAME = "annotationFile.zip"
+MEMBER_NAME = "annotation.anno3d"
+# canonical archives do not depend on the time of the upload, so equal annotations
+# are deduplicated by the blob store
+CANONICAL_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+
+# Opens the single member of an (already validated) annotationFile archive.
+@contextmanager
+def open_member(fileobj: IO[bytes]) -> Iterator[IO[bytes]]:
+    with zipfile.ZipFile(fileobj) as archive:
+        members = [info for info in archive.infolist() if not info.is_dir()]
+        with archive.open(members[0]) as member:
+            yield member
+
+
+# Parses an annotationFile archive and returns the name of its format and the labels.
+def read_archive(fileobj: IO[bytes]) -> tuple[str, Labels]:
+    try:
+        with open_member(fileobj) as member:
+            return generic.parse(member)
+    except (zipfile.BadZipFile, zlib.error, EOFError):
+        raise AnnotationFileError(
+            "The annotation cannot be extracted.", "invalid_archive"
+        )
+    finally:
+        fileobj.seek(0)
+
+
+# Returns the name of the format of a stored annotationFile or None, if it is no
+# anno3d file.
+def get_stored_format(fileObj: models.File) -> Optional[str]:
+    with fileObj.file.open("rb") as handle:
+        try:
+            with open_member(handle) as member:
+                return generic.detect_format(member)  # type: ignore[arg-type]
+        except (AnnotationFileError, zipfile.BadZipFile, zlib.error, IndexError):
+            return None
+
+
+# Returns the annotation classes of the labels of the project in the order the
+# frontend writes them to UTF8 1.0 files. Classes an anno3d file cannot hold are left
+# out.
+def get_label_classes(project: models.Project) -> list[int]:
+    queryset = project.labels.filter(
+        annotationClass__gte=0, annotationClass__lt=constants.ANNO3D_NEUTRAL_CLASS
+    ).order_by("pk")
+    return list(dict.fromkeys(queryset.values_list("annotationClass", flat=True)))
+
+
+# Identifies the annotation classes a file in the given format is written with, the
+# empty string if the format does not depend on them.
+def get_classes_key(name: str, classes: Optional[list[int]]) -> str:
+    if name != generic.FORMAT_UTF8V1 or classes is None:
+        return ""
+    return hashlib.sha256(",".join(map(str, classes)).encode("ascii")).hexdigest()
+
+
+# Identifies content transcoded to the given format, see downloads.get_etag.
+def get_variant(name: str, classes: Optional[list[int]]) -> str:
+    key = get_classes_key(name, classes)
+    return f"{name}-{key[:16]}" if key else name
+
+
+# Streams an annotationFile archive of the labels in the given format. UTF8 1.0
+# files are written with the given annotation classes, followed by the classes of
+# the labels without a label in the project, e.g. of deleted labels.
+def iter_archive(
+    labels: Labels,
+    name: str,
+    date_time: Optional[tuple[int, int, int, int, int, int]] = None,
+    classes: Optional[list[int]] = None,
+) -> Iterator[bytes]:
+    # UTF8 1.0 is the larger format, an index line takes at most 11 bytes
+    maxSize = len(labels) * (MAX_INDEX_DIGITS + 1) + MAX_LINE_LENGTH * (
+        constants.ANNO3D_NEUTRAL_CLASS + 4
+    )
+    if classes is not None:
+        known = set(classes)
+        classes = classes + [c for c in get_classes(labels) if c not in known]
+    return archives.iter_zip(
+        [(MEMBER_NAME, generic.iter_serialize(labels, name, classes), maxSize)],
+        date_time=date_time,
+    )
+
+
+# Stores the labels as annotationFile archive, by default in the canonical format,
+# and returns its Blob.
+def store_labels(
+    labels: Labels,
+    name: str = CANONICAL_FORMAT,
+    classes: Optional[list[int]] = None,
+) -> models.Blob:
+    path = blobs.get_temp_path()
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "wb") as temp:
+        for block in iter_archive(labels, name, CANONICAL_DATE_TIME, classes):
+            temp.write(block)
+            digest.update(block)
+            size += len(block)
+    return blobs.store_path(path, digest.hexdigest(), size)
+
+
+# Stores the labels as annotationFile of the ModelData, which has to be locked with
+# select_for_update in the current transaction. The previous content is released once
+# the transaction is committed.
+def save_labels(
+    modeldata: models.ModelData, labels: Labels, user: Optional[User]
+) -> models.File:
+    blob = store_labels(labels)
+    fileObj = modeldata.annotationFile
+    if fileObj is None:
+        fileObj = models.File(
+            filePath=get_modeldata_file_path(modeldata, modeldata.project),
+            fileFormat="application/zip",
+            uploaded_by=user,
+        )
+        blobs.assign_blob(fileObj, blob)
+        fileObj.save()
+    else:
+        fileObj.uploaded_by = user
+        blobs.replace_content(fileObj, blob)
+    modeldata.annotationFile = fileObj
+    modeldata.save()
+    return fileObj
+
+
+# Applies the changes of an annotation patch, an array of (start, end, annotation
+# class) rows, to the labels. The ranges exclude their end and later changes
+# overwrite earlier ones.
+def apply_changes(labels: Labels, changes: npt.NDArray[np.int64]) -> None:
+    starts, ends, classes = changes.T
+    invalid = (starts >= ends) | (ends > len(labels))
+    if invalid.any():
+        start, end, _ = changes[int(np.argmax(invalid))]
+        raise AnnotationFileError(
+            f"The range [{start}, {end}) is empty or exceeds the count {len(labels)}.",
+            "index_out_of_range",
+        )
+    for start, end, annotationClass in changes.tolist():
+        labels[start:end] = annotationClass
+
+
+# Returns the Blob of the annotationFile, which has to be stored in the blob store,
+# transcoded to the given format with the given annotation classes. It is transcoded
+# and stored the first time. Raises FileNotFoundError if the file does not exist on
+# the disk.
+def get_transcoded_blob(
+    fileObj: models.File, name: str, classes: Optional[list[int]] = None
+) -> models.Blob:
+    key = get_classes_key(name, classes)
+    cached = (
+        models.TranscodedBlob.objects.select_related("blob")
+        .filter(source_id=fileObj.blob_id, anno3dFormat=name, classesKey=key)
+        .first()
+    )
+    if cached is not None and default_storage.exists(cached.blob.file.name):
+        return cached.blob
+
+    with fileObj.file.open("rb") as handle:
+        _, labels = read_archive(handle)
+    with transaction.atomic():
+        blob = store_labels(labels, name, classes)
+        # the annotationFile may have been replaced and its Blob released meanwhile
+        source = models.Blob.objects.select_for_update().filter(pk=fileObj.blob_id)
+        if not source.exists():
+            raise FileNotFoundError(fileObj.file.name)
+        models.TranscodedBlob.objects.update_or_create(
+            source_id=fileObj.blob_id,
+            anno3dFormat=name,
+            classesKey=key,
+            defaults={"blob": blob},
+        )
+    return blob
+
+
+# Returns a response for downloading the annotationFile in the given format, UTF8 1.0
+# is written with the given annotation classes. Raises FileNotFoundError if the file
+# does not exist on the disk.
+def download_response(
+    request: HttpRequest,
+    fileObj: models.File,
+    name: str,
+    classes: Optional[list[int]] = None,
+) -> HttpResponseBase:
+    if get_stored_format(fileObj) in (None, name):
+        return downloads.file_response(request, fileObj, FILENAME)
+    variant = get_variant(name, classes)
+    if fileObj.blob_id is not None:
+        return downloads.file_response(
+            request,
+            fileObj,
+            FILENAME,
+            variant,
+            lambda: get_transcoded_blob(fileObj, name, classes),
+        )
+
+    # files stored before the blob store are transcoded while they are sent
+    def generate() -> Iterator[bytes]:
+        with fileObj.file.open("rb") as handle:
+            _, labels = read_archive(handle)
+        return iter_archive(labels, name, classes=classes)
+
+    return downloads.generated_response(request, fileObj, FILENAME, variant, generate)
@@ -7,3 +7,4 @@ class AnnotatorConfig(AppConfig):
 
     def ready(self) -> None:
         import annotator.backend.signals  # noqa: F401
+        import annotator.backend.tasks  # noqa: F401
@@ -0,0 +1,617 @@
+import os
+import posixpath
+import struct
+import time
+import zipfile
+import zlib
+from dataclasses import dataclass
+from typing import IO, Iterable, Iterator, Optional
+
+from . import constants
+
+
+# Validation of uploaded zip archives without extracting them. Only the end of
+# central directory record, the central directory and the local file headers are
+# read, one record at a time, so the memory usage does not depend on the size of
+# the archive. The rules follow frontend/src/file_pipelines.txt.
+# Archives generated by the server are written as a stream with iter_zip().
+
+
+class ArchiveError(Exception):
+    def __init__(self, message: str, code: str) -> None:
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+
+@dataclass
+class ArchiveMember:
+    name: str
+    flags: int
+    method: int
+    crc: int
+    compressedSize: int
+    fileSize: int
+    headerOffset: int
+    # offset of the (compressed) data, known after the local header was read
+    dataOffset: int = 0
+
+    def is_dir(self) -> bool:
+        return self.name.endswith("/")
+
+    def get_extension(self) -> str:
+        return posixpath.splitext(self.name)[1].lower()
+
+
+EOCD_SIGNATURE = b"PK\x05\x06"
+ZIP64_EOCD_LOCATOR_SIGNATURE = b"PK\x06\x07"
+ZIP64_EOCD_SIGNATURE = b"PK\x06\x06"
+CENTRAL_HEADER_SIGNATURE = b"PK\x01\x02"
+LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+
+EOCD = struct.Struct("<4s4H2LH")
+ZIP64_EOCD_LOCATOR = struct.Struct("<4sLQL")
+ZIP64_EOCD = struct.Struct("<4sQ2H2L4Q")
+CENTRAL_HEADER = struct.Struct("<4s6H3L5H2L")
+LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+
+ZIP64_MARKER = 0xFFFFFFFF
+ZIP64_EXTRA_ID = 0x0001
+
+FLAG_ENCRYPTED = 0x1
+
+# stored and deflated, the methods the frontend is able to unzip
+SUPPORTED_METHODS = (0, 8)
+
+
+def read_exactly(fileobj: IO[bytes], offset: int, size: int) -> bytes:
+    fileobj.seek(offset)
+    data = fileobj.read(size)
+    if len(data) != size:
+        raise ArchiveError("The archive is truncated.", "invalid_archive")
+    return data
+
+
+# Returns the number of entries and the offset and size of the central directory.
+def read_end_record(fileobj: IO[bytes], archiveSize: int) -> tuple[int, int, int]:
+    # the record is followed by a comment of at most 65535 bytes
+    tailSize = min(archiveSize, EOCD.size + 0xFFFF)
+    tail = read_exactly(fileobj, archiveSize - tailSize, tailSize)
+    position = tail.rfind(EOCD_SIGNATURE)
+    if position < 0 or position + EOCD.size > len(tail):
+        raise ArchiveError("The file is not a zip archive.", "invalid_archive")
+    (_, disk, _, _, entries, cdSize, cdOffset, _) = EOCD.unpack_from(tail, position)
+    if disk != 0:
+        raise ArchiveError(
+            "Archives spanning multiple disks are not supported.", "invalid_archive"
+        )
+
+    recordOffset = archiveSize - tailSize + position
+    if ZIP64_MARKER in (cdSize, cdOffset) or entries == 0xFFFF:
+        locatorOffset = recordOffset - ZIP64_EOCD_LOCATOR.size
+        if locatorOffset < 0:
+            raise ArchiveError("The zip64 locator is missing.", "invalid_archive")
+        locator = ZIP64_EOCD_LOCATOR.unpack(
+            read_exactly(fileobj, locatorOffset, ZIP64_EOCD_LOCATOR.size)
+        )
+        if locator[0] != ZIP64_EOCD_LOCATOR_SIGNATURE:
+            raise ArchiveError("The zip64 locator is missing.", "invalid_archive")
+        record = ZIP64_EOCD.unpack(read_exactly(fileobj, locator[2], ZIP64_EOCD.size))
+        if record[0] != ZIP64_EOCD_SIGNATURE:
+            raise ArchiveError("The zip64 record is invalid.", "invalid_archive")
+        entries, cdSize, cdOffset = record[7], record[8], record[9]
+        recordOffset = locator[2]
+
+    if cdOffset + cdSize > recordOffset:
+        raise ArchiveError("The central directory is invalid.", "invalid_archive")
+    return entries, cdOffset, cdSize
+
+
+def apply_zip64_extra(member: ArchiveMember, extra: bytes) -> None:
+    position = 0
+    while position + 4 <= len(extra):
+        headerId, size = struct.unpack_from("<2H", extra, position)
+        data = extra[position + 4 : position + 4 + size]
+        position += 4 + size
+        if headerId != ZIP64_EXTRA_ID:
+            continue
+        values = iter(struct.unpack_from(f"<{len(data) // 8}Q", data))
+        # only the fields set to the marker in the header are present
+        if member.fileSize == ZIP64_MARKER:
+            member.fileSize = next(values, member.fileSize)
+        if member.compressedSize == ZIP64_MARKER:
+            member.compressedSize = next(values, member.compressedSize)
+        if member.headerOffset == ZIP64_MARKER:
+            member.headerOffset = next(values, member.headerOffset)
+
+
+# Streams the central directory and yields one member at a time.
+def iter_central_directory(
+    fileobj: IO[bytes], entries: int, cdOffset: int, cdSize: int
+) -> Iterator[ArchiveMember]:
+    position = cdOffset
+    end = cdOffset + cdSize
+    for _ in range(entries):
+        if position + CENTRAL_HEADER.size > end:
+            raise ArchiveError("The central directory is truncated.", "invalid_archive")
+        header = CENTRAL_HEADER.unpack(
+            read_exactly(fileobj, position, CENTRAL_HEADER.size)
+        )
+        if header[0] != CENTRAL_HEADER_SIGNATURE:
+            raise ArchiveError("The central directory is invalid.", "invalid_archive")
+        (flags, method) = header[3], header[4]
+        nameLength, extraLength, commentLength = header[10], header[11], header[12]
+        variable = read_exactly(
+            fileobj, position + CENTRAL_HEADER.size, nameLength + extraLength
+        )
+        member = ArchiveMember(
+            name=variable[:nameLength].decode("utf-8", errors="replace"),
+            flags=flags,
+            method=method,
+            crc=header[7],
+            compressedSize=header[8],
+            fileSize=header[9],
+            headerOffset=header[16],
+        )
+        apply_zip64_extra(member, variable[nameLength:])
+        position += CENTRAL_HEADER.size + nameLength + extraLength + commentLength
+        yield member
+
+
+# Reads the local header of the member and checks it against the central directory.
+def read_local_header(fileobj: IO[bytes], member: ArchiveMember) -> None:
+    header = LOCAL_HEADER.unpack(
+        read_exactly(fileobj, member.headerOffset, LOCAL_HEADER.size)
+    )
+    if header[0] != LOCAL_HEADER_SIGNATURE:
+        raise ArchiveError(
+            f"The local header of '{member.name}' is invalid.", "invalid_archive"
+        )
+    nameLength, extraLength = header[9], header[10]
+    name = read_exactly(fileobj, member.headerOffset + LOCAL_HEADER.size, nameLength)
+    method = header[3]
+    if name.decode("utf-8", errors="replace") != member.name or method != member.method:
+        raise ArchiveError(
+            f"The local header of '{member.name}' does not match the central "
+            + "directory.",
+            "invalid_archive",
+        )
+    member.dataOffset = (
+        member.headerOffset + LOCAL_HEADER.size + nameLength + extraLength
+    )
+
+
+def check_member(member: ArchiveMember, trusted: bool = False) -> None:
+    normalized = posixpath.normpath(member.name)
+    if member.name.startswith("/") or normalized.startswith(".."):
+        raise ArchiveError(
+            f"The member '{member.name}' has an unsafe path.", "unsafe_path"
+        )
+    if member.flags & FLAG_ENCRYPTED:
+        raise ArchiveError(
+            f"The member '{member.name}' is encrypted.", "unsupported_archive"
+        )
+    if member.method not in SUPPORTED_METHODS:
+        raise ArchiveError(
+            f"The member '{member.name}' uses an unsupported compression method.",
+            "unsupported_archive",
+        )
+    if not trusted and (
+        member.fileSize
+        > max(member.compressedSize, 1) * constants.ARCHIVE_MAX_COMPRESSION_RATIO
+    ):
+        raise ArchiveError(
+            f"The compression ratio of '{member.name}' is too high.",
+            "compression_ratio_too_high",
+        )
+
+
+# Validates the structure of a zip archive and returns its file members (without
+# directories). The position of fileobj is reset to the start afterwards. Archives
+# stored by the server are trusted and may be compressed arbitrarily well.
+def read_archive(fileobj: IO[bytes], trusted: bool = False) -> list[ArchiveMember]:
+    archiveSize = fileobj.seek(0, os.SEEK_END)
+    entries, cdOffset, cdSize = read_end_record(fileobj, archiveSize)
+    if entries > constants.ARCHIVE_MAX_ENTRIES:
+        raise ArchiveError("The archive contains too many entries.", "too_many_files")
+
+    members: list[ArchiveMember] = []
+    totalSize = 0
+    for member in iter_central_directory(fileobj, entries, cdOffset, cdSize):
+        check_member(member, trusted)
+        read_local_header(fileobj, member)
+        if member.dataOffset + member.compressedSize > cdOffset:
+            raise ArchiveError(
+                f"The data of '{member.name}' exceeds the archive.", "invalid_archive"
+            )
+        totalSize += member.fileSize
+        if totalSize > constants.ARCHIVE_MAX_UNCOMPRESSED_SIZE:
+            raise ArchiveError(
+                "The uncompressed archive is too large.", "uncompressed_too_large"
+            )
+        if not member.is_dir():
+            members.append(member)
+
+    # overlapping members are a common way to build zip bombs
+    members.sort(key=lambda m: m.headerOffset)
+    for previous, current in zip(members, members[1:]):
+        if previous.dataOffset + previous.compressedSize > current.headerOffset:
+            raise ArchiveError("The archive members overlap.", "invalid_archive")
+
+    fileobj.seek(0)
+    return members
+
+
+# A baseFile archive contains exactly one .obj/.ply file and an optional .jpg/.png
+# texture.
+def validate_basefile_archive(fileobj: IO[bytes]) -> list[ArchiveMember]:
+    members = read_archive(fileobj)
+    models = [m for m in members if m.get_extension() in constants.MODEL_EXTENSIONS]
+    textures = [m for m in members if m.get_extension() in constants.TEXTURE_EXTENSIONS]
+    if len(models) != 1:
+        raise ArchiveError(
+            "The baseFile has to contain exactly one .obj or .ply file.",
+            "wrong_archive_content",
+        )
+    if len(textures) > 1 or len(members) != len(models) + len(textures):
+        raise ArchiveError(
+            "Besides the model, the baseFile may only contain one .jpg or .png file.",
+            "wrong_archive_content",
+        )
+    return members
+
+
+# An annotationFile archive contains exactly one file.
+def validate_annotationfile_archive(
+    fileobj: IO[bytes], trusted: bool = False
+) -> list[ArchiveMember]:
+    members = read_archive(fileobj, trusted)
+    if len(members) != 1:
+        raise ArchiveError(
+            "The annotationFile has to contain exactly one file.",
+            "wrong_archive_content",
+        )
+    return members
+
+
+FLAG_DATA_DESCRIPTOR = 0x8
+
+
+# Follows the local headers of a zip archive while it is streamed, e.g. uploaded, and
+# collects its members without seeking or buffering their data. Members written with
+# a data descriptor do not declare their size in the local header, so the scan gives
+# up on them, as well as on archives with data in front of the first member.
+class LocalHeaderScanner:
+    def __init__(self) -> None:
+        self.buffer = bytearray()
+        # offset of the first byte of the buffer in the archive
+        self.position = 0
+        # number of bytes of member data that are still to be skipped
+        self.skip = 0
+        self.members: list[ArchiveMember] = []
+        self.complete = False
+        self.failed = False
+
+    def feed(self, data: bytes) -> None:
+        if self.complete or self.failed:
+            return
+        if self.skip >= len(data):
+            self.skip -= len(data)
+            self.position += len(data)
+            return
+        self.buffer += memoryview(data)[self.skip :]
+        self.position += self.skip
+        self.skip = 0
+        while self.read_header():
+            pass
+
+    # Reads the local header at the start of the buffer. Returns whether the next one
+    # is in the buffer as well.
+    def read_header(self) -> bool:
+        if len(self.buffer) < 4:
+            return False
+        signature = bytes(self.buffer[:4])
+        if signature in (CENTRAL_HEADER_SIGNATURE, EOCD_SIGNATURE):
+            self.complete = True
+            self.buffer.clear()
+            return False
+        if signature != LOCAL_HEADER_SIGNATURE:
+            return self.fail()
+        if len(self.buffer) < LOCAL_HEADER.size:
+            return False
+        header = LOCAL_HEADER.unpack_from(self.buffer)
+        nameLength, extraLength = header[9], header[10]
+        headerSize = LOCAL_HEADER.size + nameLength + extraLength
+        if len(self.buffer) < headerSize:
+            return False
+        if header[2] & FLAG_DATA_DESCRIPTOR:
+            return self.fail()
+        nameEnd = LOCAL_HEADER.size + nameLength
+        member = ArchiveMember(
+            name=bytes(self.buffer[LOCAL_HEADER.size : nameEnd]).decode(
+                "utf-8", errors="replace"
+            ),
+            flags=header[2],
+            method=header[3],
+            crc=header[6],
+            compressedSize=header[7],
+            fileSize=header[8],
+            headerOffset=self.position,
+            dataOffset=self.position + headerSize,
+        )
+        apply_zip64_extra(member, bytes(self.buffer[nameEnd:headerSize]))
+        if not member.is_dir():
+            if len(self.members) >= constants.ARCHIVE_MAX_ENTRIES:
+                return self.fail()
+            self.members.append(member)
+
+        consumed = headerSize + member.compressedSize
+        if consumed <= len(self.buffer):
+            del self.buffer[:consumed]
+            self.position += consumed
+            return True
+        self.skip = consumed - len(self.buffer)
+        self.position += len(self.buffer)
+        self.buffer.clear()
+        return False
+
+    def fail(self) -> bool:
+        self.failed = True
+        self.buffer.clear()
+        return False
+
+    # Returns the file members, or None if the scan did not reach the central
+    # directory.
+    def get_members(self) -> Optional[list[ArchiveMember]]:
+        if self.complete and not self.failed:
+            return self.members
+        return None
+
+
+# Checks the members found by a LocalHeaderScanner against those of the central
+# directory. Archives whose local headers describe other members than the central
+# directory are read differently by different tools.
+def check_scanned_members(
+    scanned: list[ArchiveMember], members: list[ArchiveMember]
+) -> None:
+    def describe(member: ArchiveMember) -> tuple[str, int, int, int, int]:
+        return (
+            member.name,
+            member.headerOffset,
+            member.method,
+            member.compressedSize,
+            member.fileSize,
+        )
+
+    ordered = sorted(members, key=lambda m: m.headerOffset)
+    if [describe(m) for m in scanned] != [describe(m) for m in ordered]:
+        raise ArchiveError(
+            "The local headers do not match the central directory.",
+            "invalid_archive",
+        )
+
+
+# Collects the output of a ZipFile until it is yielded. Without seek(), zipfile
+# writes data descriptors after the members instead of going back to their headers.
+class ZipStreamBuffer:
+    def __init__(self) -> None:
+        self.chunks: list[bytes] = []
+        self.position = 0
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self) -> None:
+        pass
+
+    def pop(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+# Streams a zip archive of the given members, each a name, an iterable of its content
+# and an upper bound of its size. Zip64 records are only written if the bound
+# requires them, since not every client can read them. With a fixed date_time, the
+# same content always results in the same archive.
+def iter_zip(
+    members: Iterable[tuple[str, Iterable[bytes], int]],
+    compression: int = zipfile.ZIP_DEFLATED,
+    date_time: Optional[tuple[int, int, int, int, int, int]] = None,
+) -> Iterator[bytes]:
+    buffer = ZipStreamBuffer()
+    with zipfile.ZipFile(buffer, "w", compression=compression) as archive:
+        for name, content, maxSize in members:
+            info = zipfile.ZipInfo(name, date_time or time.localtime()[:6])
+            info.compress_type = compression
+            force_zip64 = maxSize >= zipfile.ZIP64_LIMIT
+            with archive.open(info, "w", force_zip64=force_zip64) as member:
+                for block in content:
+                    member.write(block)
+                    if buffer.chunks:
+                        yield buffer.pop()
+    yield buffer.pop()
+
+
+# A member of a zip archive written by iter_raw_zip(). Its content is already
+# compressed with the given method, e.g. the data of a member of another archive.
+@dataclass
+class RawMember:
+    name: str
+    method: int
+    crc: int
+    compressedSize: int
+    fileSize: int
+    date_time: tuple[int, int, int, int, int, int]
+    content: Iterable[bytes]
+
+
+# Returns a stored member of the given bytes.
+def create_stored_member(
+    name: str, data: bytes, date_time: tuple[int, int, int, int, int, int]
+) -> RawMember:
+    return RawMember(
+        name,
+        zipfile.ZIP_STORED,
+        zlib.crc32(data),
+        len(data),
+        len(data),
+        date_time,
+        [data],
+    )
+
+
+# Returns a member copying the compressed data of a member of a validated archive.
+def copy_member(
+    fileobj: IO[bytes],
+    member: ArchiveMember,
+    name: str,
+    date_time: tuple[int, int, int, int, int, int],
+) -> RawMember:
+    def iter_data() -> Iterator[bytes]:
+        fileobj.seek(member.dataOffset)
+        remaining = member.compressedSize
+        while remaining > 0:
+            block = fileobj.read(min(constants.DOWNLOAD_BLOCK_SIZE, remaining))
+            if not block:
+                raise ArchiveError("The archive is truncated.", "invalid_archive")
+            remaining -= len(block)
+            yield block
+
+    return RawMember(
+        name,
+        member.method,
+        member.crc,
+        member.compressedSize,
+        member.fileSize,
+        date_time,
+        iter_data(),
+    )
+
+
+def get_dos_date_time(
+    date_time: tuple[int, int, int, int, int, int]
+) -> tuple[int, int]:
+    year, month, day, hour, minute, second = date_time
+    date = (max(year, 1980) - 1980) << 9 | month << 5 | day
+    return date, hour << 11 | minute << 5 | second // 2
+
+
+# Streams a zip archive of members whose data is copied as it is, without being
+# decompressed or recompressed. Only the headers are generated, so the memory usage
+# does not depend on the size or number of the members apart from the central
+# directory. Zip64 records are only written where sizes or offsets require them.
+def iter_raw_zip(members: Iterable[RawMember]) -> Iterator[bytes]:
+    centralDirectory: list[bytes] = []
+    offset = 0
+    for member in members:
+        name = member.name.encode("utf-8")
+        # language encoding flag, the names are UTF-8
+        flags = 0x800
+        date, dosTime = get_dos_date_time(member.date_time)
+        zip64 = max(member.compressedSize, member.fileSize) >= ZIP64_MARKER
+        version = 45 if zip64 else 20
+        extra = b""
+        sizes = (member.compressedSize, member.fileSize)
+        if zip64:
+            extra = struct.pack(
+                "<2H2Q", ZIP64_EXTRA_ID, 16, member.fileSize, member.compressedSize
+            )
+            sizes = (ZIP64_MARKER, ZIP64_MARKER)
+        header = LOCAL_HEADER.pack(
+            LOCAL_HEADER_SIGNATURE,
+            version,
+            flags,
+            member.method,
+            dosTime,
+            date,
+            member.crc,
+            *sizes,
+            len(name),
+            len(extra),
+        )
+        yield header + name + extra
+        written = 0
+        for block in member.content:
+            written += len(block)
+            yield block
+        if written != member.compressedSize:
+            raise ArchiveError(
+                f"The data of '{member.name}' does not match its size.",
+                "invalid_archive",
+            )
+
+        # the central directory repeats the sizes and adds the offset of the header
+        centralExtra = b""
+        centralSizes = [member.compressedSize, member.fileSize]
+        headerOffset = offset
+        values = []
+        if member.fileSize >= ZIP64_MARKER:
+            values.append(member.fileSize)
+            centralSizes[1] = ZIP64_MARKER
+        if member.compressedSize >= ZIP64_MARKER:
+            values.append(member.compressedSize)
+            centralSizes[0] = ZIP64_MARKER
+        if offset >= ZIP64_MARKER:
+            values.append(offset)
+            headerOffset = ZIP64_MARKER
+        if values:
+            centralExtra = struct.pack(
+                f"<2H{len(values)}Q", ZIP64_EXTRA_ID, 8 * len(values), *values
+            )
+            version = 45
+        centralDirectory.append(
+            CENTRAL_HEADER.pack(
+                CENTRAL_HEADER_SIGNATURE,
+                version,
+                version,
+                flags,
+                member.method,
+                dosTime,
+                date,
+                member.crc,
+                *centralSizes,
+                len(name),
+                len(centralExtra),
+                0,
+                0,
+                0,
+                0,
+                headerOffset,
+            )
+            + name
+            + centralExtra
+        )
+        offset += len(header) + len(name) + len(extra) + written
+
+    cdSize = sum(len(entry) for entry in centralDirectory)
+    for start in range(0, len(centralDirectory), 1024):
+        yield b"".join(centralDirectory[start : start + 1024])
+
+    entries = len(centralDirectory)
+    if entries >= 0xFFFF or cdSize >= ZIP64_MARKER or offset >= ZIP64_MARKER:
+        yield ZIP64_EOCD.pack(
+            ZIP64_EOCD_SIGNATURE,
+            ZIP64_EOCD.size - 12,
+            45,
+            45,
+            0,
+            0,
+            entries,
+            entries,
+            cdSize,
+            offset,
+        )
+        yield ZIP64_EOCD_LOCATOR.pack(
+            ZIP64_EOCD_LOCATOR_SIGNATURE, 0, offset + cdSize, 1
+        )
+        yield EOCD.pack(
+            EOCD_SIGNATURE, 0, 0, 0xFFFF, 0xFFFF, ZIP64_MARKER, ZIP64_MARKER, 0
+        )
+    else:
+        yield EOCD.pack(EOCD_SIGNATURE, 0, 0, entries, entries, cdSize, offset, 0)
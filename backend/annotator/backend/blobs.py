@@ -0,0 +1,206 @@
+import dataclasses
+import os
+import uuid
+from typing import Iterator, Optional
+
+from django.conf import settings
+from django.core.files import File as DjangoFile
+from django.core.files.move import file_move_safe
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from . import archives
+from . import constants
+from . import models
+from annotator.backend.utils import hash_file
+
+
+# Content-addressed storage for the bytes of File objects. Every distinct content is
+# stored once below MEDIA_ROOT/BLOB_DIR, named by its SHA-256. File objects reference
+# a Blob and the Blob is only removed from the disk when its last File is deleted.
+# Storing content that is already stored locks its Blob row until the end of the
+# transaction, so callers store and reference a Blob in one transaction; otherwise
+# the last File of the Blob could be deleted in between and take the content along.
+# Files are only removed from the disk once the deleting transaction committed.
+
+
+def get_blob_name(sha256: str) -> str:
+    return os.path.join(constants.BLOB_DIR, sha256[:2], sha256[2:4], sha256)
+
+
+def get_temp_path() -> str:
+    path = default_storage.path(os.path.join(constants.BLOB_DIR, "tmp"))
+    os.makedirs(path, exist_ok=True)
+    return os.path.join(path, uuid.uuid4().hex)
+
+
+# Returns the Blob of the content, if it is stored, and locks its row, see above.
+def get_stored_blob(sha256: str) -> Optional[models.Blob]:
+    blob = models.Blob.objects.select_for_update().filter(sha256=sha256).first()
+    if blob is None or not default_storage.exists(blob.file.name):
+        return None
+    return blob
+
+
+# Moves the file at the given path into the blob store and returns its Blob. The
+# path is consumed: if the content is already stored, the file is simply removed.
+@transaction.atomic
+def store_path(path: str, sha256: str, size: int) -> models.Blob:
+    name = get_blob_name(sha256)
+    target = default_storage.path(name)
+    existing = get_stored_blob(sha256)
+    if existing is not None:
+        os.remove(path)
+        return existing
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    # temporary upload files are only readable by their owner, but blobs may be
+    # served by nginx directly (X-Accel-Redirect)
+    os.chmod(path, settings.FILE_UPLOAD_PERMISSIONS or 0o644)
+    # renaming within the blob directory is atomic, readers never see a partial blob
+    os.replace(path, target)
+    blob, _ = models.Blob.objects.get_or_create(
+        sha256=sha256, defaults={"size": size, "file": name}
+    )
+    return blob
+
+
+# Stores the content of a (possibly uploaded) file and returns its Blob. Files
+# streamed through the HashingFileUploadHandler are moved instead of copied and are
+# not read again.
+@transaction.atomic
+def store_file(content: DjangoFile, sha256: Optional[str] = None) -> models.Blob:
+    sha256 = sha256 or getattr(content, "sha256", None) or hash_file(content)
+    size = content.size or 0
+
+    existing = get_stored_blob(sha256)
+    if existing is not None:
+        return existing
+
+    temp_path = get_temp_path()
+    if hasattr(content, "temporary_file_path"):
+        file_move_safe(content.temporary_file_path(), temp_path)
+    else:
+        with open(temp_path, "wb") as temp:
+            for chunk in content.chunks():
+                temp.write(chunk)
+    return store_path(temp_path, sha256, size)
+
+
+# Sets the blob as content of the File object, the object is not saved. The archive
+# members are those of the blob's content, if they are known.
+def assign_blob(
+    fileObj: models.File,
+    blob: models.Blob,
+    archiveMembers: Optional[list[archives.ArchiveMember]] = None,
+) -> None:
+    fileObj.blob = blob
+    fileObj.sha256 = blob.sha256
+    fileObj.fileSize = blob.size
+    fileObj.fileModified = blob.created
+    fileObj.file.name = blob.file.name
+    fileObj.archiveMembers = (
+        None
+        if archiveMembers is None
+        else [dataclasses.asdict(member) for member in archiveMembers]
+    )
+
+
+# Replaces the content of a saved File with the blob and saves it. The row is locked
+# while it is swapped, so the former content is taken from the database instead of
+# a possibly stale instance, and it is only released once the transaction committed.
+# Readers therefore find either the former or the new content, never a missing file,
+# and handles opened to the former content stay valid after it was removed.
+def replace_content(
+    fileObj: models.File,
+    blob: models.Blob,
+    archiveMembers: Optional[list[archives.ArchiveMember]] = None,
+) -> None:
+    with transaction.atomic():
+        current = models.File.objects.select_for_update().get(pk=fileObj.pk)
+        oldBlob_id, oldName = current.blob_id, current.file.name
+        assign_blob(fileObj, blob, archiveMembers)
+        fileObj.save()
+        transaction.on_commit(lambda: release_content(oldBlob_id, oldName))
+
+
+# Deletes the Blob and its file, if neither a File nor a TranscodedBlob references
+# it anymore. The Blobs transcoded from it are released as well.
+def release_blob(blob_id: int) -> None:
+    with transaction.atomic():
+        blob = models.Blob.objects.select_for_update().filter(pk=blob_id).first()
+        if blob is None or blob.files.exists() or blob.transcodedFrom.exists():
+            return
+        name = blob.file.name
+        transcoded = list(blob.transcodings.values_list("blob_id", flat=True))
+        blob.delete()
+        transaction.on_commit(lambda: delete_blob_file(name))
+        for pk in transcoded:
+            release_blob(pk)
+
+
+# Removes the file of a deleted Blob, unless the content was stored again meanwhile.
+def delete_blob_file(name: str) -> None:
+    if not models.Blob.objects.filter(file=name).exists():
+        default_storage.delete(name)
+
+
+# Releases the former content of a File, which is either a Blob or, for files uploaded
+# before the blob store existed, an unshared file with the given name. Either is only
+# removed from the disk once the current transaction committed.
+def release_content(blob_id: Optional[int], name: str) -> None:
+    if blob_id is not None:
+        release_blob(blob_id)
+    elif name:
+        transaction.on_commit(lambda: default_storage.delete(name))
+
+
+# Stores the SHA-256 of Files uploaded before hashes were stored, which migration
+# 0011 leaves empty since reading every file would block the migration. Every hash is
+# saved on its own, so an interrupted run continues with the files that still lack a
+# hash. Files missing on the disk are skipped and Files replaced meanwhile are left
+# alone. Yields the number of hashed files and bytes of every batch.
+def hash_legacy_files(
+    batchSize: int = constants.HASH_FILES_BATCH_SIZE,
+) -> Iterator[tuple[int, int]]:
+    queryset = models.File.objects.filter(blob__isnull=True, sha256="").exclude(file="")
+    last = 0
+    while True:
+        batch = list(
+            queryset.filter(pk__gt=last)
+            .order_by("pk")
+            .values_list("pk", "file")[:batchSize]
+        )
+        if not batch:
+            return
+        hashed, size = 0, 0
+        for pk, name in batch:
+            try:
+                with default_storage.open(name, "rb") as handle:
+                    sha256 = hash_file(handle)
+                    fileSize = handle.size
+            except FileNotFoundError:
+                continue
+            if queryset.filter(pk=pk, file=name).update(sha256=sha256):
+                hashed += 1
+                size += fileSize
+        last = batch[-1][0]
+        yield hashed, size
+
+
+# Returns the amount of stored and referenced bytes of the blob store.
+def get_deduplication_report() -> dict[str, int]:
+    stored = models.Blob.objects.aggregate(count=Count("pk"), bytes=Sum("size"))
+    referenced = models.File.objects.filter(blob__isnull=False).aggregate(
+        count=Count("pk"), bytes=Sum("blob__size")
+    )
+    storedBytes = stored["bytes"] or 0
+    referencedBytes = referenced["bytes"] or 0
+    return {
+        "blobs": stored["count"] or 0,
+        "references": referenced["count"] or 0,
+        "storedBytes": storedBytes,
+        "referencedBytes": referencedBytes,
+        "savedBytes": referencedBytes - storedBytes,
+    }
@@ -0,0 +1,116 @@
+import math
+from typing import Any, Callable, Optional
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from . import annotations
+from . import constants
+from . import models
+from . import versions
+from .anno3d import Labels
+
+# Consensus of several annotations of the same model. Every annotator works on their
+# own ModelData, the ModelData of one model share a baseFile. The merged label of a
+# face or point is the class most annotators assigned to it, unlabeled faces and
+# points are no votes. Labels with too few votes stay unlabeled, ties are resolved
+# with one of the TIE_BREAKS.
+
+# ties stay unlabeled
+TIE_BREAK_NEUTRAL = "neutral"
+# the lowest of the tied classes wins
+TIE_BREAK_LOWEST = "lowest"
+# the tied class of the annotation given first wins
+TIE_BREAK_FIRST = "first"
+TIE_BREAKS = (TIE_BREAK_NEUTRAL, TIE_BREAK_LOWEST, TIE_BREAK_FIRST)
+
+
+# Returns the number of votes a label needs, at least one.
+def get_required_votes(sources: int, minAgreement: float) -> int:
+    # the epsilon keeps e.g. 0.6 * 5 from needing 4 votes
+    return max(1, math.ceil(minAgreement * sources - 1e-9))
+
+
+# Merges the labels of the same model. Works on blocks of ANNO3D_BLOCK_SIZE labels,
+# which keeps the vote counts small. Every label of a block is compared with the
+# labels of the other annotations at the same index, which is fast for the few
+# annotations of a model no matter how many classes they use. Returns the merged
+# labels and the number of ties and of labels without enough votes.
+def merge_labels(
+    labelList: list[Labels],
+    tieBreak: str = TIE_BREAK_NEUTRAL,
+    minAgreement: float = 0.0,
+) -> tuple[Labels, dict[str, int]]:
+    if not labelList or len({len(labels) for labels in labelList}) != 1:
+        raise ValueError("The annotations do not have the same count.")
+    if tieBreak not in TIE_BREAKS:
+        raise ValueError(f"There is no tie break '{tieBreak}'.")
+    neutral = constants.ANNO3D_NEUTRAL_CLASS
+    required = get_required_votes(len(labelList), minAgreement)
+    count = len(labelList[0])
+    merged = np.empty(count, dtype=np.uint16)
+    stats = {"ties": 0, "belowAgreement": 0}
+    votes = np.empty((len(labelList), constants.ANNO3D_BLOCK_SIZE), dtype=np.uint8)
+    for start in range(0, count, constants.ANNO3D_BLOCK_SIZE):
+        end = min(start + constants.ANNO3D_BLOCK_SIZE, count)
+        block = np.stack([labels[start:end] for labels in labelList])
+        blockVotes = votes[:, : end - start]
+        # the votes of the class of every annotation at every index
+        for i, labels in enumerate(block):
+            np.sum(block == labels, axis=0, out=blockVotes[i])
+        blockVotes[block == neutral] = 0
+
+        # argmax picks the first of the tied annotations
+        winner = np.argmax(blockVotes, axis=0)
+        columns = np.arange(end - start)
+        best = blockVotes[winner, columns]
+        result = block[winner, columns]
+        tied = ((blockVotes == best) & (block != result)).any(axis=0) & (best > 0)
+        if tieBreak == TIE_BREAK_NEUTRAL:
+            result[tied] = neutral
+        elif tieBreak == TIE_BREAK_LOWEST:
+            # the neutral class is the largest one
+            candidates = np.where(blockVotes == best, block, neutral)
+            result = candidates.min(axis=0)
+        weak = (best < required) & (best > 0)
+        result[weak] = neutral
+        merged[start:end] = result
+        stats["ties"] += int(np.count_nonzero(tied & ~weak))
+        stats["belowAgreement"] += int(np.count_nonzero(weak))
+    return merged, stats
+
+
+# Replaces the annotationFile of the target with the consensus of the annotationFiles
+# of the sources. progress is called after every source that was read.
+def merge_annotations(
+    target: models.ModelData,
+    sources: list[models.ModelData],
+    user: Optional[User],
+    tieBreak: str = TIE_BREAK_NEUTRAL,
+    minAgreement: float = 0.0,
+    progress: Optional[Callable[[int], Any]] = None,
+) -> dict[str, Any]:
+    labelList = []
+    for i, source in enumerate(sources):
+        if source.annotationFile is None:
+            raise ValueError(f"ModelData {source.pk} has no annotationFile.")
+        with source.annotationFile.file.open("rb") as handle:
+            labelList.append(annotations.read_archive(handle)[1])
+        if progress is not None:
+            progress(i + 1)
+    merged, stats = merge_labels(labelList, tieBreak, minAgreement)
+    del labelList
+
+    with transaction.atomic():
+        target = models.ModelData.objects.select_for_update().get(pk=target.pk)
+        if target.locked is not None and target.locked != user:
+            raise ValueError(f"ModelData {target.pk} is locked by another user.")
+        fileObj = annotations.save_labels(target, merged, user)
+        versions.record_version(target, user, merged)
+    return {
+        "count": len(merged),
+        "labeled": int(np.count_nonzero(merged != constants.ANNO3D_NEUTRAL_CLASS)),
+        **stats,
+        "sha256": fileObj.sha256,
+    }
@@ -15,6 +15,12 @@ MODELDATA_MODELTYPE_MAX_LENGTH = 30
 FILE_FILEPATH_MAX_LENGTH = 255
 FILE_FILEFORMAT_MAX_LENGTH = 30
 FILE_MAX_FILESIZE = 1000 * pow(2, 20)
+# allowance for the boundaries, headers and other fields of a multipart upload, whose
+# Content-Length is checked against the maximum size of its file
+FILE_MAX_FORM_OVERHEAD = 64 * pow(2, 10)
+FILE_CHECKSUM_MAX_LENGTH = 64
+
+UPLOADSESSION_FILETYPE_MAX_LENGTH = 30
 
 LABEL_NAME_MAX_LENGTH = 100
 
@@ -25,3 +31,122 @@ INTEGER_MIN = -INTEGER_MAX - 1
 
 # time a model is locked for a user in seconds
 LOCKING_TIME = 3600
+
+# chunk sizes of resumable upload sessions in bytes
+UPLOAD_DEFAULT_CHUNK_SIZE = 8 * pow(2, 20)
+UPLOAD_MIN_CHUNK_SIZE = 64 * pow(2, 10)
+UPLOAD_MAX_CHUNK_SIZE = 64 * pow(2, 20)
+
+# size of the blocks that are read from a request body and written to disk
+UPLOAD_STREAM_BLOCK_SIZE = 64 * pow(2, 10)
+
+# directory in MEDIA_ROOT for unfinished upload sessions
+UPLOAD_SESSION_DIR = "uploads"
+
+# directory in MEDIA_ROOT for the content-addressed file blobs
+BLOB_DIR = "blobs"
+
+# size of the blocks that are sent for file downloads
+DOWNLOAD_BLOCK_SIZE = 256 * pow(2, 10)
+# requests with more byte ranges than this are answered with the whole file
+DOWNLOAD_MAX_RANGES = 16
+
+# rules for uploaded zip archives, see archives.py
+MODEL_EXTENSIONS = (".obj", ".ply")
+TEXTURE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+ARCHIVE_MAX_ENTRIES = 16
+ARCHIVE_MAX_UNCOMPRESSED_SIZE = 8 * pow(2, 30)
+ARCHIVE_MAX_COMPRESSION_RATIO = 100
+
+# model types of ModelData, as sent by the frontend
+MODEL_TYPE_MESH = "mesh"
+MODEL_TYPE_POINT_CLOUD = "point_cloud"
+
+# reading .obj and .ply models, see geometry.py
+PLY_MAX_HEADER_LINES = 1000
+PLY_MAX_LINE_LENGTH = 1024
+# number of lines or rows that are parsed at once
+GEOMETRY_BLOCK_SIZE = pow(2, 16)
+
+# anno3d annotation files, see anno3d/
+# annotation class of unlabeled faces and points
+ANNO3D_NEUTRAL_CLASS = 0xFFFF
+# largest number of faces or points (the labels take 2 bytes each)
+ANNO3D_MAX_COUNT = pow(2, 28)
+# size of the blocks that are read and written while (de)serializing
+ANNO3D_BLOCK_SIZE = pow(2, 20)
+# largest number of (start, end, annotation class) changes of an annotation patch
+ANNO3D_MAX_PATCH_CHANGES = pow(2, 20)
+# the length of the names of anno3d formats
+ANNO3D_FORMAT_MAX_LENGTH = 10
+
+# annotation version history, see versions.py
+# directory in MEDIA_ROOT for the chunks of annotation versions
+ANNOTATION_CHUNK_DIR = "chunks"
+# number of labels per chunk (128 KiB before compression)
+ANNOTATION_CHUNK_SIZE = pow(2, 16)
+# the retention policy keeps at least this many of the newest versions per ModelData
+ANNOTATION_VERSIONS_KEEP = 20
+# and all versions younger than this number of days
+ANNOTATION_VERSIONS_KEEP_DAYS = 30
+
+# background jobs, see jobs.py
+JOB_KIND_MAX_LENGTH = 100
+JOB_STATUS_MAX_LENGTH = 20
+JOB_MESSAGE_MAX_LENGTH = 255
+JOB_WORKER_MAX_LENGTH = 100
+# number of times a failing job is run
+JOB_MAX_ATTEMPTS = 3
+# delay of the first retry in seconds, doubled with every further attempt
+JOB_RETRY_DELAY = 10
+# seconds an idle worker waits before it looks for new jobs again
+JOB_POLL_INTERVAL = 1.0
+# running jobs without a heartbeat for this many seconds are considered crashed
+JOB_STALE_TIMEOUT = 600
+# seconds between the heartbeats of a running job, independent of its progress
+JOB_HEARTBEAT_INTERVAL = 30
+
+# maximum number of annotations merged by a consensus job
+CONSENSUS_MAX_SOURCES = 32
+
+# media garbage collection, see mediagc.py
+# files and rows younger than this number of seconds may belong to running requests
+MEDIA_GC_GRACE_PERIOD = 24 * 60 * 60
+# number of paths that are checked with one query or by one thread at once
+MEDIA_GC_BATCH_SIZE = 500
+MEDIA_GC_THREADS = 8
+# number of files `manage.py hash_files` looks up at once
+HASH_FILES_BATCH_SIZE = 100
+
+# preview renders of baseFiles, see previews.py
+PREVIEW_VIEW_MAX_LENGTH = 10
+# width and height of the renders in pixels
+PREVIEW_SIZE = 256
+# the renders are drawn this many times larger and scaled down for antialiasing
+PREVIEW_SUPERSAMPLING = 2
+PREVIEW_WEBP_QUALITY = 80
+# larger point clouds are thinned out evenly before they are drawn
+PREVIEW_MAX_POINTS = 4 * pow(2, 20)
+# number of points or triangles that are projected at once
+PREVIEW_BLOCK_SIZE = pow(2, 18)
+# samples drawn for the triangles of one render at most, meshes of many large
+# triangles are sampled more sparsely
+PREVIEW_MAX_SAMPLES = 16 * pow(2, 20)
+# renders are requested with their key in the URL and never change
+PREVIEW_CACHE_MAX_AGE = 365 * 24 * 60 * 60
+
+# octree tiles of point clouds, see tiles.py
+TILE_DIR = "tiles"
+# points of one node at most, the points of larger nodes are passed to its children
+TILE_MAX_POINTS = pow(2, 16)
+# a node keeps at most one point of each cell of a grid with this many cells per axis
+TILE_GRID_SIZE = 64
+# the nodes of the deepest level keep all of their points
+TILE_MAX_DEPTH = 16
+
+# seconds a worker process may reuse the answer of a project membership check, see
+# permissions.is_project_member. 0 disables the cache, so that removed members lose
+# their access immediately
+PROJECT_MEMBERSHIP_CACHE_TTL = 0
+# answers the cache of a worker holds at most
+PROJECT_MEMBERSHIP_CACHE_SIZE = 10000
@@ -0,0 +1,292 @@
+import re
+import secrets
+from typing import IO, Callable, Iterator, Optional
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import (
+    FileResponse,
+    HttpRequest,
+    HttpResponse,
+    StreamingHttpResponse,
+)
+from django.db.models.fields.files import FieldFile
+from django.http.response import HttpResponseBase
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, parse_etags
+
+from . import constants
+from . import models
+
+
+# Responses for downloading File objects. Supports conditional requests
+# (If-None-Match, If-Modified-Since, If-Match, If-Unmodified-Since), single and
+# multiple byte ranges (Range, If-Range) and falls back to a plain FileResponse.
+# With USE_X_ACCEL_REDIRECT set, the bytes are sent by nginx instead. Requests
+# with an If-Range header are still streamed by Django, because nginx would
+# compare it against its own validators instead of the ones sent by Django.
+
+
+RANGE_SPEC_PATTERN = re.compile(r"^\s*(\d*)\s*-\s*(\d*)\s*$")
+
+
+# Returns the entity tag of the File. Content generated from the File, such as a
+# transcoded version, is identified by a variant. Unless it is stored, it only gets a
+# weak validator, because it is not guaranteed to be byte-identical each time.
+def get_etag(fileObj: models.File, variant: str = "", stored: bool = False) -> str:
+    # the upload date changes with every upload, the hash changes with the content
+    version = format(int(fileObj.uploadDate.timestamp() * 1_000_000), "x")
+    if variant:
+        content = fileObj.sha256 or format(fileObj.get_fileSize(), "x")
+        tag = f'"{content}-{version}-{variant}"'
+        return tag if stored and fileObj.sha256 else f"W/{tag}"
+    if fileObj.sha256:
+        return f'"{fileObj.sha256}-{version}"'
+    # files uploaded before hashes were stored only get a weak validator
+    return f'W/"{format(fileObj.get_fileSize(), "x")}-{version}"'
+
+
+# Returns whether an If-Match header contains an entity tag issued for the current
+# version of the File, in any variant. Tags are compared weakly.
+def etag_matches(fileObj: models.File, header: str) -> bool:
+    current = get_etag(fileObj).removeprefix("W/").strip('"')
+    for etag in parse_etags(header):
+        if etag == "*":
+            return True
+        tag = etag.removeprefix("W/").strip('"')
+        if tag == current or tag.startswith(current + "-"):
+            return True
+    return False
+
+
+def get_last_modified(fileObj: models.File) -> int:
+    return int(fileObj.uploadDate.timestamp())
+
+
+# Parses the value of a Range header. Returns None if the header is missing,
+# malformed or requests too many ranges, in which case the whole file is sent.
+# Returns an empty list if none of the ranges can be satisfied. Overlapping and
+# adjacent ranges are coalesced.
+def parse_range_header(header: str, size: int) -> Optional[list[tuple[int, int]]]:
+    unit, _, specs = header.partition("=")
+    if unit.strip().lower() != "bytes" or not specs:
+        return None
+
+    ranges: list[tuple[int, int]] = []
+    for spec in specs.split(","):
+        match = RANGE_SPEC_PATTERN.match(spec)
+        if match is None:
+            return None
+        first, last = match.groups()
+        if first == "" and last == "":
+            return None
+        if first == "":
+            # suffix range, the last n bytes
+            length = int(last)
+            if length == 0:
+                continue
+            start, end = max(0, size - length), size - 1
+        else:
+            start = int(first)
+            end = size - 1 if last == "" else min(int(last), size - 1)
+            if last != "" and int(last) < start:
+                return None
+        if start >= size:
+            continue
+        ranges.append((start, end))
+
+    if len(ranges) > constants.DOWNLOAD_MAX_RANGES:
+        return None
+
+    ranges.sort()
+    coalesced: list[tuple[int, int]] = []
+    for start, end in ranges:
+        if coalesced and start <= coalesced[-1][1] + 1:
+            coalesced[-1] = (coalesced[-1][0], max(coalesced[-1][1], end))
+        else:
+            coalesced.append((start, end))
+    return coalesced
+
+
+def if_range_matches(request: HttpRequest, etag: str, last_modified: int) -> bool:
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if if_range is None:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"'):
+        # If-Range requires a strong comparison
+        return not etag.startswith("W/") and if_range in parse_etags(etag)
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def read_range(handle: IO[bytes], start: int, end: int) -> Iterator[bytes]:
+    handle.seek(start)
+    remaining = end - start + 1
+    while remaining > 0:
+        block = handle.read(min(constants.DOWNLOAD_BLOCK_SIZE, remaining))
+        if not block:
+            break
+        remaining -= len(block)
+        yield block
+
+
+def stream_ranges(
+    handle: IO[bytes], parts: list[tuple[bytes, int, int]], trailer: bytes
+) -> Iterator[bytes]:
+    try:
+        for header, start, end in parts:
+            if header:
+                yield header
+            yield from read_range(handle, start, end)
+        if trailer:
+            yield trailer
+    finally:
+        handle.close()
+
+
+def set_validators(response: HttpResponseBase, etag: str, last_modified: int) -> None:
+    response.headers["ETag"] = etag
+    response.headers["Last-Modified"] = http_date(last_modified)
+    response.headers["Accept-Ranges"] = "bytes"
+
+
+# Hands the download over to nginx, which serves the file (including byte ranges)
+# from its internal media location with sendfile. Raises FileNotFoundError like an
+# opened file would, so that missing files are still answered with 404.
+def accel_redirect_response(
+    content: FieldFile, filename: str, etag: str, last_modified: int
+) -> HttpResponseBase:
+    if not content.storage.exists(content.name):
+        raise FileNotFoundError(content.name)
+    response = HttpResponse(content_type="application/zip")
+    response.headers["X-Accel-Redirect"] = settings.X_ACCEL_REDIRECT_PREFIX + quote(
+        content.name
+    )
+    response.headers["Content-Disposition"] = f'inline; filename="{filename}"'
+    set_validators(response, etag, last_modified)
+    return response
+
+
+# Returns a response for downloading the given File. Stored content derived from the
+# File is identified by a variant and returned by get_blob, which is only called if
+# the content has to be sent. Raises FileNotFoundError if the file does not exist on
+# the disk.
+def file_response(
+    request: HttpRequest,
+    fileObj: models.File,
+    filename: str,
+    variant: str = "",
+    get_blob: Optional[Callable[[], models.Blob]] = None,
+) -> HttpResponseBase:
+    etag = get_etag(fileObj, variant, stored=True)
+    last_modified = get_last_modified(fileObj)
+
+    # 304 Not Modified or 412 Precondition Failed
+    conditional = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if conditional is not None:
+        set_validators(conditional, etag, last_modified)
+        return conditional
+
+    content = fileObj.file if get_blob is None else get_blob().file
+    if settings.USE_X_ACCEL_REDIRECT and "HTTP_IF_RANGE" not in request.META:
+        return accel_redirect_response(content, filename, etag, last_modified)
+
+    handle = content.open()
+    size = handle.size
+
+    range_header = request.META.get("HTTP_RANGE")
+    ranges = None
+    if (
+        range_header is not None
+        and request.method in ("GET", "HEAD")
+        and if_range_matches(request, etag, last_modified)
+    ):
+        ranges = parse_range_header(range_header, size)
+
+    response: HttpResponseBase
+    if ranges is None:
+        response = FileResponse(handle, filename=filename)
+        response.headers["Content-Length"] = size
+    elif len(ranges) == 0:
+        handle.close()
+        response = HttpResponse(status=416)
+        response.headers["Content-Range"] = f"bytes */{size}"
+    elif len(ranges) == 1:
+        start, end = ranges[0]
+        response = StreamingHttpResponse(
+            stream_ranges(handle, [(b"", start, end)], b""),
+            status=206,
+            content_type="application/zip",
+        )
+        response.headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response.headers["Content-Length"] = end - start + 1
+    else:
+        boundary = secrets.token_hex(16)
+        parts = []
+        length = 0
+        for start, end in ranges:
+            header = (
+                f"\r\n--{boundary}\r\n"
+                "Content-Type: application/zip\r\n"
+                f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+            ).encode("ascii")
+            parts.append((header, start, end))
+            length += len(header) + end - start + 1
+        trailer = f"\r\n--{boundary}--\r\n".encode("ascii")
+        length += len(trailer)
+        response = StreamingHttpResponse(
+            stream_ranges(handle, parts, trailer),
+            status=206,
+            content_type=f"multipart/byteranges; boundary={boundary}",
+        )
+        response.headers["Content-Length"] = length
+
+    if response.status_code == 206:
+        response.headers["Content-Disposition"] = f'inline; filename="{filename}"'
+    set_validators(response, etag, last_modified)
+    return response
+
+
+# Returns a response streaming generated content with the given validators.
+# Conditional requests are supported, byte ranges are not. `generate` is only called
+# if the content has to be sent.
+def stream_response(
+    request: HttpRequest,
+    etag: str,
+    last_modified: int,
+    filename: str,
+    generate: Callable[[], Iterator[bytes]],
+) -> HttpResponseBase:
+    conditional = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if conditional is None:
+        response: HttpResponseBase = StreamingHttpResponse(
+            generate(), content_type="application/zip"
+        )
+        response.headers["Content-Disposition"] = f'inline; filename="{filename}"'
+    else:
+        response = conditional
+    set_validators(response, etag, last_modified)
+    response.headers["Accept-Ranges"] = "none"
+    return response
+
+
+# Returns a response streaming content generated from the File, identified by a
+# variant.
+def generated_response(
+    request: HttpRequest,
+    fileObj: models.File,
+    filename: str,
+    variant: str,
+    generate: Callable[[], Iterator[bytes]],
+) -> HttpResponseBase:
+    return stream_response(
+        request,
+        get_etag(fileObj, variant),
+        get_last_modified(fileObj),
+        filename,
+        generate,
+    )
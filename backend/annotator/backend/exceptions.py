@@ -1,7 +1,7 @@
 from typing import Any
 
 from rest_framework.views import exception_handler
-from rest_framework import exceptions
+from rest_framework import exceptions, status
 from rest_framework.response import Response
 from rest_framework.exceptions import APIException
 
@@ -9,6 +9,24 @@ from django.http import Http404
 from django.core.exceptions import PermissionDenied
 
 
+class Conflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "The request conflicts with the current state of the resource."
+    default_code = "conflict"
+
+
+class PreconditionRequired(APIException):
+    status_code = status.HTTP_428_PRECONDITION_REQUIRED
+    default_detail = "The request has to be conditional."
+    default_code = "precondition_required"
+
+
+class PayloadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "The request body is too large."
+    default_code = "too_large"
+
+
 def code_exception_handler(
     exc: Exception | APIException, context: dict[str, Any]
 ) -> Response | None:
@@ -0,0 +1,149 @@
+import json
+import posixpath
+import tempfile
+from typing import IO, Any, Iterator, Optional
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from . import annotations
+from . import archives
+from . import models
+from .anno3d import AnnotationFileError
+
+
+# Export of all annotations of a project as a single zip archive. The archive is
+# generated while it is sent: the compressed data of every annotationFile is copied
+# from the stored archive as it is, nothing is decompressed or recompressed, and the
+# first bytes are sent before the later files are opened. The annotations are
+# exported in the anno3d format of the anno3d_format parameter, like downloads, and
+# taken from the transcoded archives of the blob store. A manifest.json at the end of
+# the archive describes the project, its labels and every ModelData, including the
+# format of every annotation.
+
+MANIFEST_NAME = "manifest.json"
+
+
+def get_annotation_path(
+    modeldata: models.ModelData, member: archives.ArchiveMember
+) -> str:
+    extension = posixpath.splitext(member.name)[1]
+    return f"annotations/{modeldata.pk}{extension}"
+
+
+def describe_file(fileObj: models.File) -> dict[str, Any]:
+    return {
+        "sha256": fileObj.sha256,
+        "uploadDate": fileObj.uploadDate,
+        "uploaded_by": fileObj.uploaded_by.username if fileObj.uploaded_by else None,
+    }
+
+
+# Opens the annotationFile archive in the given format, UTF8 1.0 with the given
+# annotation classes, and returns it with the name of its format, which is None for
+# files that are no anno3d files. They are exported as they are.
+def open_annotation(
+    fileObj: models.File, name: str, classes: Optional[list[int]] = None
+) -> tuple[IO[bytes], Optional[str]]:
+    stored = annotations.get_stored_format(fileObj)
+    if stored in (None, name):
+        return fileObj.file.open("rb"), stored
+    if fileObj.blob_id is not None:
+        blob = annotations.get_transcoded_blob(fileObj, name, classes)
+        return blob.file.open("rb"), name
+
+    # files stored before the blob store are transcoded into a temporary file
+    with fileObj.file.open("rb") as source:
+        _, labels = annotations.read_archive(source)
+    handle = tempfile.TemporaryFile()
+    for block in annotations.iter_archive(labels, name, classes=classes):
+        handle.write(block)
+    handle.seek(0)
+    return handle, name
+
+
+# Yields the annotation members of the export in the given anno3d format and finally
+# the manifest.
+def iter_members(
+    project: models.Project, name: str = annotations.DEFAULT_FORMAT
+) -> Iterator[archives.RawMember]:
+    date_time = timezone.localtime().timetuple()[:6]
+    classes = annotations.get_label_classes(project)
+    entries = []
+    queryset = project.modelData.select_related("annotationFile__uploaded_by").order_by(
+        "pk"
+    )
+    for modeldata in queryset.iterator():
+        entry: dict[str, Any] = {
+            "modelData_id": modeldata.pk,
+            "name": modeldata.name,
+            "modelType": modeldata.modelType,
+            "annotationType": modeldata.annotationType,
+            "annotationFile": None,
+        }
+        entries.append(entry)
+        fileObj = modeldata.annotationFile
+        if fileObj is None:
+            continue
+        try:
+            handle, anno3dFormat = open_annotation(fileObj, name, classes)
+        except FileNotFoundError:
+            entry["error"] = "The annotationFile was not found."
+            continue
+        except AnnotationFileError as error:
+            entry["error"] = error.message
+            continue
+        with handle:
+            try:
+                member = archives.validate_annotationfile_archive(handle, trusted=True)[
+                    0
+                ]
+            except archives.ArchiveError as error:
+                entry["error"] = error.message
+                continue
+            path = get_annotation_path(modeldata, member)
+            entry["annotationFile"] = {
+                "path": path,
+                "size": member.fileSize,
+                "format": anno3dFormat,
+                **describe_file(fileObj),
+            }
+            # the member is written completely before the file is closed
+            yield archives.copy_member(
+                handle,
+                member,
+                path,
+                timezone.localtime(fileObj.uploadDate).timetuple()[:6],
+            )
+
+    manifest = {
+        "project": {
+            "project_id": project.pk,
+            "name": project.name,
+            "description": project.description,
+        },
+        "exported": timezone.now(),
+        "anno3dFormat": name,
+        "labels": list(
+            project.labels.order_by("annotationClass").values(
+                "name", "annotationClass", "color"
+            )
+        ),
+        "modelData": entries,
+    }
+    data = json.dumps(manifest, cls=DjangoJSONEncoder, indent=2).encode("utf-8")
+    yield archives.create_stored_member(MANIFEST_NAME, data, date_time)
+
+
+def export_response(
+    project: models.Project, name: str = annotations.DEFAULT_FORMAT
+) -> StreamingHttpResponse:
+    response = StreamingHttpResponse(
+        archives.iter_raw_zip(iter_members(project, name)),
+        content_type="application/zip",
+    )
+    response.headers[
+        "Content-Disposition"
+    ] = f'attachment; filename="project-{project.pk}.zip"'
+    return response
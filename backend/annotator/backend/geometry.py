@@ -0,0 +1,779 @@
+import array
+import posixpath
+import struct
+import zipfile
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import IO, Any, Iterator, Optional, Union, cast
+
+import numpy as np
+import numpy.typing as npt
+from django.contrib.auth.models import User
+
+from . import constants
+from . import jobs
+from . import models
+
+# Reading the .obj and .ply models of baseFiles on the server, e.g. for preview
+# renders and the index of their counts and extent. Faces are triangulated like the
+# three.js loaders of the frontend do it, so the n-th triangle here is the n-th face
+# of an annotation: .obj polygons as a fan around their first vertex, .ply quads as
+# (0, 1, 3) and (1, 2, 3), while other .ply polygons are dropped. Textures, normals
+# and texture coordinates are ignored.
+
+
+class GeometryError(Exception):
+    def __init__(self, message: str, code: str) -> None:
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+
+@dataclass
+class Geometry:
+    # vertex positions, (n, 3)
+    positions: npt.NDArray[np.float32]
+    # vertex indices of the triangles, (m, 3), None for models without faces
+    triangles: Optional[npt.NDArray[np.int64]] = None
+    # vertex colors, (n, 3), None if not every vertex has a color
+    colors: Optional[npt.NDArray[np.uint8]] = None
+
+
+# numpy and struct type codes of the .ply property types
+PLY_TYPES = {
+    "char": ("i1", "b"),
+    "int8": ("i1", "b"),
+    "uchar": ("u1", "B"),
+    "uint8": ("u1", "B"),
+    "short": ("i2", "h"),
+    "int16": ("i2", "h"),
+    "ushort": ("u2", "H"),
+    "uint16": ("u2", "H"),
+    "int": ("i4", "i"),
+    "int32": ("i4", "i"),
+    "uint": ("u4", "I"),
+    "uint32": ("u4", "I"),
+    "float": ("f4", "f"),
+    "float32": ("f4", "f"),
+    "double": ("f8", "d"),
+    "float64": ("f8", "d"),
+}
+PLY_BYTE_ORDERS = {
+    "ascii": "",
+    "binary_little_endian": "<",
+    "binary_big_endian": ">",
+}
+
+
+@dataclass
+class PlyProperty:
+    name: str
+    type: str
+    # the type of the length of list properties, None for scalar properties
+    countType: Optional[str] = None
+
+
+@dataclass
+class PlyElement:
+    name: str
+    count: int
+    properties: list[PlyProperty]
+
+    def has_lists(self) -> bool:
+        return any(p.countType is not None for p in self.properties)
+
+
+@dataclass
+class PlyHeader:
+    format: str
+    elements: list[PlyElement]
+
+    def get_element(self, name: str) -> Optional[PlyElement]:
+        return next((e for e in self.elements if e.name == name), None)
+
+
+# the values of a list property, the lengths of the lists and their concatenation
+@dataclass
+class PlyList:
+    counts: npt.NDArray[np.int64]
+    values: npt.NDArray[np.int64]
+
+
+PlyColumns = dict[str, Union[npt.NDArray[np.generic], PlyList]]
+
+
+def invalid_model(message: str) -> GeometryError:
+    return GeometryError(message, "invalid_model")
+
+
+# Opens the model of the baseFile archive. Yields its extension and the opened
+# member.
+@contextmanager
+def open_model(fileObj: models.File) -> Iterator[tuple[str, IO[bytes]]]:
+    with fileObj.file.open("rb") as handle, zipfile.ZipFile(handle) as archive:
+        for info in archive.infolist():
+            extension = posixpath.splitext(info.filename)[1].lower()
+            if extension in constants.MODEL_EXTENSIONS:
+                with archive.open(info) as model:
+                    yield extension, model
+                return
+    raise GeometryError(
+        "The baseFile does not contain an .obj or .ply file.", "wrong_archive_content"
+    )
+
+
+def read_model(fileObj: models.File) -> Geometry:
+    with open_model(fileObj) as (extension, model):
+        return read_geometry(model, extension)
+
+
+def read_geometry(model: IO[bytes], extension: str) -> Geometry:
+    try:
+        geometry = read_ply(model) if extension == ".ply" else read_obj(model)
+    except (ValueError, struct.error, UnicodeDecodeError):
+        raise invalid_model("The model could not be parsed.")
+    triangles = geometry.triangles
+    if triangles is not None and len(triangles):
+        if triangles.min() < 0 or triangles.max() >= len(geometry.positions):
+            raise invalid_model("The faces of the model refer to missing vertices.")
+    return geometry
+
+
+# .obj
+
+
+def read_obj(model: IO[bytes]) -> Geometry:
+    blocks: list[npt.NDArray[np.float32]] = []
+    colorBlocks: Optional[list[npt.NDArray[np.float32]]] = []
+    vertexLines: list[bytes] = []
+    triangles = array.array("q")
+    count = 0
+
+    def add_vertices() -> None:
+        nonlocal colorBlocks
+        positions, colors = parse_obj_vertices(vertexLines)
+        blocks.append(positions)
+        if colorBlocks is not None and colors is not None:
+            colorBlocks.append(colors)
+        else:
+            colorBlocks = None
+        vertexLines.clear()
+
+    for line in model:
+        if line.startswith((b"v ", b"v\t")):
+            vertexLines.append(line)
+            count += 1
+            if len(vertexLines) == constants.GEOMETRY_BLOCK_SIZE:
+                add_vertices()
+        elif line.startswith((b"f ", b"f\t")):
+            indices = []
+            for part in line.split()[1:]:
+                index = int(part.split(b"/", 1)[0])
+                # negative indices count back from the last vertex
+                indices.append(index - 1 if index > 0 else count + index)
+            for j in range(1, len(indices) - 1):
+                triangles.extend((indices[0], indices[j], indices[j + 1]))
+    if vertexLines:
+        add_vertices()
+
+    positions = np.concatenate(blocks) if blocks else np.zeros((0, 3), np.float32)
+    colors = None
+    if colorBlocks and len(positions):
+        colors = to_color_bytes(np.concatenate(colorBlocks), scale=255)
+    return Geometry(
+        positions,
+        np.frombuffer(triangles, np.int64).reshape(-1, 3) if triangles else None,
+        colors,
+    )
+
+
+# Parses a block of "v" lines at once. Returns their positions and their colors,
+# which are None unless every line has one.
+def parse_obj_vertices(
+    lines: list[bytes],
+) -> tuple[npt.NDArray[np.float32], Optional[npt.NDArray[np.float32]]]:
+    rows = [line.split() for line in lines]
+    if any(len(row) < 4 for row in rows):
+        raise invalid_model("The model contains vertices without 3 coordinates.")
+    positions = np.array([row[1:4] for row in rows]).astype(np.float32)
+    colors = None
+    if all(len(row) >= 7 for row in rows):
+        colors = np.array([row[4:7] for row in rows]).astype(np.float32)
+    return positions, colors
+
+
+# .ply
+
+
+def read_ply_header(model: IO[bytes]) -> PlyHeader:
+    if model.readline(constants.PLY_MAX_LINE_LENGTH).strip() != b"ply":
+        raise invalid_model("The model is no .ply file.")
+    format = None
+    elements: list[PlyElement] = []
+    for _ in range(constants.PLY_MAX_HEADER_LINES):
+        line = model.readline(constants.PLY_MAX_LINE_LENGTH)
+        if not line:
+            break
+        parts = line.decode("ascii", "replace").split()
+        if not parts or parts[0] in ("comment", "obj_info"):
+            continue
+        if parts[0] == "end_header":
+            if format is None:
+                raise invalid_model("The .ply header does not declare a format.")
+            return PlyHeader(format, elements)
+        if parts[0] == "format" and len(parts) == 3 and parts[1] in PLY_BYTE_ORDERS:
+            format = parts[1]
+        elif parts[0] == "element" and len(parts) == 3 and parts[2].isdigit():
+            elements.append(PlyElement(parts[1], int(parts[2]), []))
+        elif parts[0] == "property" and elements and len(parts) == 3:
+            if parts[1] not in PLY_TYPES:
+                raise invalid_model(f"Unknown .ply property type '{parts[1]}'.")
+            elements[-1].properties.append(PlyProperty(parts[2], parts[1]))
+        elif (
+            parts[:2] == ["property", "list"]
+            and elements
+            and len(parts) == 5
+            and parts[2] in PLY_TYPES
+            and parts[3] in PLY_TYPES
+        ):
+            elements[-1].properties.append(PlyProperty(parts[4], parts[3], parts[2]))
+        else:
+            raise invalid_model("The .ply header is invalid.")
+    raise invalid_model("The .ply header is incomplete.")
+
+
+def read_ply(model: IO[bytes]) -> Geometry:
+    header = read_ply_header(model)
+    columns: dict[str, PlyColumns] = {}
+    if header.format == "ascii":
+        lines = iter(model)
+        for element in header.elements:
+            columns[element.name] = read_ascii_element(lines, element)
+    else:
+        order = PLY_BYTE_ORDERS[header.format]
+        data = model.read()
+        offset = 0
+        for element in header.elements:
+            columns[element.name], offset = read_binary_element(
+                data, offset, element, order
+            )
+
+    vertex = columns.get("vertex", {})
+    if not all(isinstance(vertex.get(axis), np.ndarray) for axis in "xyz"):
+        raise invalid_model("The .ply file has no vertex positions.")
+    positions = np.column_stack([vertex[axis] for axis in "xyz"]).astype(np.float32)
+    colors = None
+    if all(isinstance(vertex.get(c), np.ndarray) for c in ("red", "green", "blue")):
+        values = np.column_stack([vertex[c] for c in ("red", "green", "blue")])
+        # float colors are in [0, 1]
+        floating = np.issubdtype(values.dtype, np.floating)
+        colors = to_color_bytes(values, scale=255 if floating else 1)
+    triangles = None
+    face = columns.get("face", {})
+    indices = face.get("vertex_indices", face.get("vertex_index"))
+    if isinstance(indices, PlyList):
+        triangles = triangulate_ply_faces(indices)
+    return Geometry(positions, triangles, colors)
+
+
+def to_color_bytes(
+    values: npt.NDArray[np.generic], scale: int
+) -> npt.NDArray[np.uint8]:
+    return np.clip(np.rint(values.astype(np.float32) * scale), 0, 255).astype(np.uint8)
+
+
+# Triangulates the faces like the three.js PLYLoader.
+def triangulate_ply_faces(faces: PlyList) -> npt.NDArray[np.int64]:
+    counts = faces.counts
+    starts = np.cumsum(counts) - counts
+    perFace = get_ply_triangle_counts(counts)
+    face = np.repeat(np.arange(len(counts)), perFace)
+    second = np.arange(len(face)) - np.repeat(np.cumsum(perFace) - perFace, perFace)
+    start = starts[face]
+    corners = np.empty((len(face), 3), dtype=np.int64)
+    corners[:, 0] = np.where(second == 1, start + 1, start)
+    corners[:, 1] = np.where(second == 1, start + 2, start + 1)
+    corners[:, 2] = np.where(counts[face] == 4, start + 3, start + 2)
+    return faces.values[corners]
+
+
+# Returns the number of triangles of each face with the given number of vertices.
+def get_ply_triangle_counts(counts: npt.NDArray[np.generic]) -> npt.NDArray[np.int64]:
+    return np.where(counts == 3, 1, np.where(counts == 4, 2, 0)).astype(np.int64)
+
+
+def read_binary_element(
+    data: bytes, offset: int, element: PlyElement, order: str
+) -> tuple[PlyColumns, int]:
+    if not element.has_lists():
+        dtype = np.dtype(
+            [(p.name, order + PLY_TYPES[p.type][0]) for p in element.properties]
+        )
+        end = offset + element.count * dtype.itemsize
+        if end > len(data):
+            raise invalid_model("The .ply file is truncated.")
+        rows = np.frombuffer(data, dtype, element.count, offset)
+        return {name: rows[name] for name in dtype.names or ()}, end
+
+    # all faces are polygons of the same size in most files, then their rows can
+    # be read at once
+    if len(element.properties) == 1 and element.count:
+        prop = element.properties[0]
+        countType = np.dtype(order + PLY_TYPES[cast(str, prop.countType)][0])
+        first = int(np.frombuffer(data, countType, 1, offset)[0])
+        dtype = np.dtype(
+            [
+                ("count", countType),
+                ("values", order + PLY_TYPES[prop.type][0], (first,)),
+            ]
+        )
+        end = offset + element.count * dtype.itemsize
+        if end <= len(data):
+            rows = np.frombuffer(data, dtype, element.count, offset)
+            if np.all(rows["count"] == first):
+                return {
+                    prop.name: PlyList(
+                        rows["count"].astype(np.int64),
+                        rows["values"].reshape(-1).astype(np.int64),
+                    )
+                }, end
+
+    scalars, lists = create_row_buffers(element)
+    formats = {
+        name: struct.Struct(order + code) for name, (_, code) in PLY_TYPES.items()
+    }
+    for _ in range(element.count):
+        for prop in element.properties:
+            if prop.countType is None:
+                value = formats[prop.type].unpack_from(data, offset)[0]
+                offset += formats[prop.type].size
+                scalars[prop.name].append(value)
+                continue
+            count = formats[prop.countType].unpack_from(data, offset)[0]
+            offset += formats[prop.countType].size
+            code = PLY_TYPES[prop.type][1]
+            values = struct.unpack_from(f"{order}{count}{code}", data, offset)
+            offset += count * formats[prop.type].size
+            lists[prop.name][0].append(count)
+            lists[prop.name][1].extend(int(v) for v in values)
+    return build_columns(element, scalars, lists), offset
+
+
+def read_ascii_element(lines: Iterator[bytes], element: PlyElement) -> PlyColumns:
+    if not element.has_lists():
+        width = len(element.properties)
+        blocks = list(read_ascii_rows(lines, element))
+        rows = np.concatenate(blocks) if blocks else np.zeros((0, width))
+        return {
+            p.name: rows[:, i].astype(PLY_TYPES[p.type][0])
+            for i, p in enumerate(element.properties)
+        }
+
+    scalars, lists = create_row_buffers(element)
+    for _ in range(element.count):
+        line = next(lines, None)
+        if line is None:
+            raise invalid_model("The .ply file is truncated.")
+        tokens = line.split()
+        position = 0
+        for prop in element.properties:
+            if prop.countType is None:
+                scalars[prop.name].append(float(tokens[position]))
+                position += 1
+                continue
+            count = int(tokens[position])
+            values = tokens[position + 1 : position + 1 + count]
+            if len(values) != count:
+                raise invalid_model("The .ply file has rows of the wrong length.")
+            lists[prop.name][0].append(count)
+            lists[prop.name][1].extend(int(v) for v in values)
+            position += 1 + count
+    return build_columns(element, scalars, lists)
+
+
+# Reads the rows of an ascii element without lists in blocks.
+def read_ascii_rows(
+    lines: Iterator[bytes], element: PlyElement
+) -> Iterator[npt.NDArray[np.float64]]:
+    width = len(element.properties)
+    for start in range(0, element.count, constants.GEOMETRY_BLOCK_SIZE):
+        block = []
+        for _ in range(min(constants.GEOMETRY_BLOCK_SIZE, element.count - start)):
+            line = next(lines, None)
+            if line is None:
+                raise invalid_model("The .ply file is truncated.")
+            block.append(line)
+        values = np.array(b" ".join(block).split()).astype(np.float64)
+        if values.size != len(block) * width:
+            raise invalid_model("The .ply file has rows of the wrong length.")
+        yield values.reshape(-1, width)
+
+
+# Rows with lists are read one at a time into these buffers: the values of each
+# scalar property and the counts and values of each list property.
+RowBuffers = tuple[dict[str, list[float]], dict[str, tuple["array.array[int]", ...]]]
+
+
+def create_row_buffers(element: PlyElement) -> RowBuffers:
+    scalars: dict[str, list[float]] = {}
+    lists: dict[str, tuple["array.array[int]", ...]] = {}
+    for prop in element.properties:
+        if prop.countType is None:
+            scalars[prop.name] = []
+        else:
+            lists[prop.name] = (array.array("q"), array.array("q"))
+    return scalars, lists
+
+
+def build_columns(
+    element: PlyElement,
+    scalars: dict[str, list[float]],
+    lists: dict[str, tuple["array.array[int]", ...]],
+) -> PlyColumns:
+    columns: PlyColumns = {}
+    for prop in element.properties:
+        if prop.countType is None:
+            columns[prop.name] = np.array(
+                scalars[prop.name], dtype=PLY_TYPES[prop.type][0]
+            )
+        else:
+            counts, values = lists[prop.name]
+            columns[prop.name] = PlyList(
+                np.frombuffer(counts, np.int64) if counts else np.zeros(0, np.int64),
+                np.frombuffer(values, np.int64) if values else np.zeros(0, np.int64),
+            )
+    return columns
+
+
+# Indexing
+#
+# The counts, attributes and extent of a baseFile are indexed once after its upload,
+# so that clients know them before downloading the model. The model is streamed in
+# blocks of GEOMETRY_BLOCK_SIZE rows, only the extent of the vertices is kept. .ply
+# elements after the vertices and faces are not read at all.
+
+INDEX_JOB = "index_geometry"
+ATTRIBUTE_POSITION = "position"
+ATTRIBUTE_NORMAL = "normal"
+ATTRIBUTE_COLOR = "color"
+ATTRIBUTE_UV = "uv"
+# the vertex properties of the attributes, see the three.js PLYLoader
+PLY_ATTRIBUTES = (
+    (ATTRIBUTE_NORMAL, ("nx", "ny", "nz")),
+    (ATTRIBUTE_COLOR, ("red", "green", "blue")),
+    (ATTRIBUTE_UV, ("s", "t")),
+    (ATTRIBUTE_UV, ("u", "v")),
+    (ATTRIBUTE_UV, ("texture_u", "texture_v")),
+    (ATTRIBUTE_UV, ("texture_s", "texture_t")),
+)
+
+# the scalar columns of a block of rows and the lengths of its lists
+PlyBlock = dict[str, npt.NDArray[np.generic]]
+
+
+# Bounding box and centroid of the vertices added so far. Vertices with non-finite
+# coordinates are ignored.
+class Extent:
+    def __init__(self) -> None:
+        self.count = 0
+        self.min = np.full(3, np.inf)
+        self.max = np.full(3, -np.inf)
+        self.total = np.zeros(3)
+
+    def add(self, positions: npt.NDArray[np.generic]) -> None:
+        positions = positions.astype(np.float64, copy=False)
+        positions = positions[np.isfinite(positions).all(axis=1)]
+        if not len(positions):
+            return
+        self.count += len(positions)
+        self.min = np.minimum(self.min, positions.min(axis=0))
+        self.max = np.maximum(self.max, positions.max(axis=0))
+        self.total += positions.sum(axis=0)
+
+    def get_bounds(self) -> Optional[dict[str, list[float]]]:
+        if not self.count:
+            return None
+        return {"min": self.min.tolist(), "max": self.max.tolist()}
+
+    def get_centroid(self) -> Optional[list[float]]:
+        if not self.count:
+            return None
+        return (self.total / self.count).tolist()
+
+
+# faceCount is the number of triangles after triangulating the faces like the
+# frontend, i.e. the number of labels of an annotated mesh.
+@dataclass
+class GeometryIndex:
+    vertexCount: int
+    faceCount: int
+    attributes: list[str]
+    bounds: Optional[dict[str, list[float]]]
+    centroid: Optional[list[float]]
+
+
+# Starts indexing the baseFile of the ModelData.
+def start_indexing(modeldata: models.ModelData, user: Optional[User]) -> models.Job:
+    return jobs.enqueue(INDEX_JOB, user=user, modelData=modeldata)
+
+
+# Indexes the baseFile of the ModelData and stores the index on it, unless the
+# baseFile was removed meanwhile. Returns the index.
+def index_basefile(modeldata: models.ModelData) -> dict[str, Any]:
+    modeldata.refresh_from_db()
+    if modeldata.baseFile is None:
+        raise ValueError("The ModelData has no baseFile.")
+    fields = asdict(index_model(modeldata.baseFile))
+    models.ModelData.objects.filter(
+        pk=modeldata.pk, baseFile=modeldata.baseFile
+    ).update(**fields)
+    return fields
+
+
+def index_model(fileObj: models.File) -> GeometryIndex:
+    with open_model(fileObj) as (extension, model):
+        try:
+            return index_ply(model) if extension == ".ply" else index_obj(model)
+        except (ValueError, struct.error, UnicodeDecodeError):
+            raise invalid_model("The model could not be parsed.")
+
+
+# Scans the lines once, the "v" lines are parsed in blocks.
+def index_obj(model: IO[bytes]) -> GeometryIndex:
+    extent = Extent()
+    vertexLines: list[bytes] = []
+    vertexCount = 0
+    faceCount = 0
+    colored = True
+    normals = False
+    uvs = False
+
+    def add_vertices() -> None:
+        nonlocal colored
+        positions, colors = parse_obj_vertices(vertexLines)
+        extent.add(positions)
+        colored = colored and colors is not None
+        vertexLines.clear()
+
+    for line in model:
+        if line.startswith((b"v ", b"v\t")):
+            vertexLines.append(line)
+            vertexCount += 1
+            if len(vertexLines) == constants.GEOMETRY_BLOCK_SIZE:
+                add_vertices()
+        elif line.startswith((b"f ", b"f\t")):
+            # a fan of n - 2 triangles
+            faceCount += max(len(line.split()) - 3, 0)
+        elif line.startswith((b"vn ", b"vn\t")):
+            normals = True
+        elif line.startswith((b"vt ", b"vt\t")):
+            uvs = True
+    if vertexLines:
+        add_vertices()
+
+    attributes = [ATTRIBUTE_POSITION] if vertexCount else []
+    if normals:
+        attributes.append(ATTRIBUTE_NORMAL)
+    if colored and vertexCount:
+        attributes.append(ATTRIBUTE_COLOR)
+    if uvs:
+        attributes.append(ATTRIBUTE_UV)
+    return GeometryIndex(
+        vertexCount, faceCount, attributes, extent.get_bounds(), extent.get_centroid()
+    )
+
+
+def index_ply(model: IO[bytes]) -> GeometryIndex:
+    header = read_ply_header(model)
+    vertex = header.get_element("vertex")
+    if vertex is None:
+        raise invalid_model("The .ply file has no vertex positions.")
+    scalars = {p.name for p in vertex.properties if p.countType is None}
+    if not scalars.issuperset("xyz"):
+        raise invalid_model("The .ply file has no vertex positions.")
+    face = header.get_element("face")
+    lists = {p.name for p in face.properties if p.countType is not None} if face else ()
+    indices = next((n for n in ("vertex_indices", "vertex_index") if n in lists), None)
+
+    extent = Extent()
+    faceCount = 0
+    # the elements up to the vertices and faces
+    last = max(
+        i
+        for i, element in enumerate(header.elements)
+        if element is vertex or (indices and element is face)
+    )
+    if header.format == "ascii":
+        lines = iter(model)
+    else:
+        reader = BinaryReader(model)
+        order = PLY_BYTE_ORDERS[header.format]
+    for element in header.elements[: last + 1]:
+        if header.format == "ascii":
+            blocks = scan_ascii_element(lines, element)
+        else:
+            blocks = scan_binary_element(reader, element, order)
+        for block in blocks:
+            if element is vertex:
+                extent.add(np.column_stack([block[axis] for axis in "xyz"]))
+            elif element is face and indices:
+                faceCount += int(get_ply_triangle_counts(block[indices]).sum())
+
+    attributes = [ATTRIBUTE_POSITION] if vertex.count else []
+    for attribute, names in PLY_ATTRIBUTES:
+        if attribute not in attributes and scalars.issuperset(names):
+            attributes.append(attribute)
+    return GeometryIndex(
+        vertex.count, faceCount, attributes, extent.get_bounds(), extent.get_centroid()
+    )
+
+
+# Yields the rows of an ascii element in blocks.
+def scan_ascii_element(
+    lines: Iterator[bytes], element: PlyElement
+) -> Iterator[PlyBlock]:
+    if not element.has_lists():
+        for rows in read_ascii_rows(lines, element):
+            yield {p.name: rows[:, i] for i, p in enumerate(element.properties)}
+        return
+    for start in range(0, element.count, constants.GEOMETRY_BLOCK_SIZE):
+        values: dict[str, list[float]] = {p.name: [] for p in element.properties}
+        for _ in range(min(constants.GEOMETRY_BLOCK_SIZE, element.count - start)):
+            line = next(lines, None)
+            if line is None:
+                raise invalid_model("The .ply file is truncated.")
+            tokens = line.split()
+            position = 0
+            for prop in element.properties:
+                value = float(tokens[position])
+                values[prop.name].append(value)
+                position += 1
+                if prop.countType is not None:
+                    position += int(value)
+            if position > len(tokens):
+                raise invalid_model("The .ply file has rows of the wrong length.")
+        yield {name: np.array(column) for name, column in values.items()}
+
+
+# Buffers the binary body of a .ply file, so that rows can be parsed from the
+# buffered bytes while it is streamed.
+class BinaryReader:
+    def __init__(self, model: IO[bytes]) -> None:
+        self.model = model
+        self.data = b""
+        self.offset = 0
+
+    # Buffers at least the next `size` bytes unless the file ends before. Returns
+    # the number of buffered bytes.
+    def fill(self, size: int) -> int:
+        if self.offset + size > len(self.data):
+            parts = [self.data[self.offset :]]
+            missing = size - len(parts[0])
+            while missing > 0:
+                read = self.model.read(max(missing, constants.UPLOAD_STREAM_BLOCK_SIZE))
+                if not read:
+                    break
+                parts.append(read)
+                missing -= len(read)
+            self.data = b"".join(parts)
+            self.offset = 0
+        return len(self.data) - self.offset
+
+    def require(self, size: int) -> None:
+        if self.fill(size) < size:
+            raise invalid_model("The .ply file is truncated.")
+
+    # Parses the next value with the given struct.
+    def unpack(self, format: struct.Struct) -> float:
+        self.require(format.size)
+        value = format.unpack_from(self.data, self.offset)[0]
+        self.offset += format.size
+        return value
+
+
+# Yields the rows of a binary element in blocks. Rows with lists are read at once as
+# long as every list has the length of the first row's list, which holds for the
+# faces of most files, the rest of the rows is parsed one at a time.
+def scan_binary_element(
+    reader: BinaryReader, element: PlyElement, order: str
+) -> Iterator[PlyBlock]:
+    formats = {
+        name: struct.Struct(order + code) for name, (_, code) in PLY_TYPES.items()
+    }
+    if not element.properties:
+        return
+    remaining = element.count
+    while remaining:
+        dtype = get_row_dtype(reader, element, order, formats)
+        rows = min(remaining, constants.GEOMETRY_BLOCK_SIZE)
+        rows = min(rows, reader.fill(rows * dtype.itemsize) // dtype.itemsize)
+        block = np.frombuffer(reader.data, dtype, rows, reader.offset)
+        uniform = np.ones(rows, dtype=bool)
+        for prop in element.properties:
+            if prop.countType is not None:
+                length = dtype[prop.name].shape[0]
+                uniform &= block[get_count_field(prop)] == length
+        if not uniform.all():
+            rows = int(np.argmin(uniform))
+        if rows:
+            reader.offset += rows * dtype.itemsize
+            remaining -= rows
+            yield {
+                prop.name: block[
+                    prop.name if prop.countType is None else get_count_field(prop)
+                ][:rows]
+                for prop in element.properties
+            }
+        if remaining and (not rows or not uniform.all()):
+            yield from scan_binary_rows(reader, element, formats, remaining)
+            return
+
+
+# Returns the dtype of the rows, if their lists have the lengths of the next row's.
+def get_row_dtype(
+    reader: BinaryReader,
+    element: PlyElement,
+    order: str,
+    formats: dict[str, struct.Struct],
+) -> np.dtype[np.void]:
+    fields: list[tuple[Any, ...]] = []
+    size = 0
+    for prop in element.properties:
+        if prop.countType is None:
+            fields.append((prop.name, order + PLY_TYPES[prop.type][0]))
+            size += formats[prop.type].size
+            continue
+        countFormat = formats[prop.countType]
+        reader.require(size + countFormat.size)
+        length = int(countFormat.unpack_from(reader.data, reader.offset + size)[0])
+        fields.append((get_count_field(prop), order + PLY_TYPES[prop.countType][0]))
+        fields.append((prop.name, order + PLY_TYPES[prop.type][0], (length,)))
+        size += countFormat.size + length * formats[prop.type].size
+    return np.dtype(fields)
+
+
+# the field of the list lengths in the row dtype, .ply names contain no spaces
+def get_count_field(prop: PlyProperty) -> str:
+    return f"{prop.name} count"
+
+
+# Parses the given number of rows one at a time.
+def scan_binary_rows(
+    reader: BinaryReader,
+    element: PlyElement,
+    formats: dict[str, struct.Struct],
+    count: int,
+) -> Iterator[PlyBlock]:
+    for start in range(0, count, constants.GEOMETRY_BLOCK_SIZE):
+        values: dict[str, list[float]] = {p.name: [] for p in element.properties}
+        for _ in range(min(constants.GEOMETRY_BLOCK_SIZE, count - start)):
+            for prop in element.properties:
+                if prop.countType is None:
+                    values[prop.name].append(reader.unpack(formats[prop.type]))
+                    continue
+                length = int(reader.unpack(formats[prop.countType]))
+                size = length * formats[prop.type].size
+                reader.require(size)
+                reader.offset += size
+                values[prop.name].append(length)
+        yield {name: np.array(column) for name, column in values.items()}
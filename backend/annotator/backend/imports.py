@@ -0,0 +1,198 @@
+import hashlib
+import os
+import posixpath
+import shutil
+import time
+import zipfile
+from dataclasses import dataclass
+from typing import BinaryIO, Optional
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from . import archives
+from . import blobs
+from . import constants
+from . import geometry
+from . import models
+from .utils import get_modeldata_file_path
+
+
+# Bulk import of models from a directory, see the import_models command. Every .obj
+# or .ply file becomes a ModelData, together with a texture of the same name next to
+# it. The baseFile archives are built and hashed by a process pool, the ModelData and
+# File objects are created in batches by the main process. ModelData are identified
+# by their name, the path of the model relative to the imported directory, so an
+# interrupted import continues where it stopped.
+
+MODEL_TYPE_MESH = constants.MODEL_TYPE_MESH
+MODEL_TYPE_POINT_CLOUD = constants.MODEL_TYPE_POINT_CLOUD
+ANNOTATION_TYPE = "index"
+# the MIME type the frontend sends with baseFiles
+FILE_FORMAT = "application/x-zip-compressed"
+
+
+@dataclass
+class ImportItem:
+    name: str
+    modelPath: str
+    texturePath: Optional[str]
+    modelType: str
+
+    def get_size(self) -> int:
+        size = os.path.getsize(self.modelPath)
+        if self.texturePath is not None:
+            size += os.path.getsize(self.texturePath)
+        return size
+
+
+@dataclass
+class BuiltArchive:
+    path: str
+    sha256: str
+    size: int
+
+
+# A .ply file is a point cloud if its header declares no faces. .obj files are
+# always meshes.
+def get_model_type(path: str) -> str:
+    if not path.lower().endswith(".ply"):
+        return MODEL_TYPE_MESH
+    with open(path, "rb") as model:
+        for _ in range(constants.PLY_MAX_HEADER_LINES):
+            line = model.readline(constants.PLY_MAX_LINE_LENGTH).strip()
+            parts = line.split()
+            if line == b"end_header" or not line:
+                break
+            if parts[:2] == [b"element", b"face"] and parts[2:] != [b"0"]:
+                return MODEL_TYPE_MESH
+    return MODEL_TYPE_POINT_CLOUD
+
+
+# Finds the models below the directory, sorted by their name.
+def discover(directory: str, modelType: Optional[str] = None) -> list[ImportItem]:
+    items = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        names = {name.lower(): name for name in files}
+        for name in sorted(files):
+            stem, extension = os.path.splitext(name)
+            if extension.lower() not in constants.MODEL_EXTENSIONS:
+                continue
+            texture = None
+            for textureExtension in constants.TEXTURE_EXTENSIONS:
+                candidate = names.get((stem + textureExtension).lower())
+                if candidate is not None:
+                    texture = os.path.join(root, candidate)
+                    break
+            path = os.path.join(root, name)
+            relative = os.path.relpath(path, directory).replace(os.sep, posixpath.sep)
+            items.append(
+                ImportItem(relative, path, texture, modelType or get_model_type(path))
+            )
+    return items
+
+
+# zipfile writes data descriptors instead of seeking back, so the archive can be
+# hashed while it is written
+class HashingWriter:
+    def __init__(self, fileobj: BinaryIO) -> None:
+        self.fileobj = fileobj
+        self.digest = hashlib.sha256()
+        self.position = 0
+
+    def write(self, data: bytes) -> int:
+        self.digest.update(data)
+        self.fileobj.write(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self) -> None:
+        self.fileobj.flush()
+
+
+# Writes the baseFile archive of the item to the given path. Runs in the worker
+# processes, which only work on files and never use the database. Textures are
+# compressed already and stored as they are. The date of the members is taken from
+# the files, so the same files always result in the same archive. The file at the
+# path is removed if the archive cannot be built or is invalid.
+def build_archive(item: ImportItem, path: str) -> BuiltArchive:
+    try:
+        return write_archive(item, path)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+
+def write_archive(item: ImportItem, path: str) -> BuiltArchive:
+    sources = [item.modelPath] + ([item.texturePath] if item.texturePath else [])
+    with open(path, "wb") as target:
+        writer = HashingWriter(target)
+        with zipfile.ZipFile(writer, "w") as archive:  # type: ignore[arg-type]
+            for source in sources:
+                size = os.path.getsize(source)
+                date_time = time.localtime(max(os.path.getmtime(source), 315532800))
+                info = zipfile.ZipInfo(os.path.basename(source), date_time[:6])
+                isModel = source == item.modelPath
+                info.compress_type = (
+                    zipfile.ZIP_DEFLATED if isModel else zipfile.ZIP_STORED
+                )
+                force_zip64 = size >= zipfile.ZIP64_LIMIT
+                with open(source, "rb") as data, archive.open(
+                    info, "w", force_zip64=force_zip64
+                ) as member:
+                    shutil.copyfileobj(data, member, constants.UPLOAD_STREAM_BLOCK_SIZE)
+    with open(path, "rb") as built:
+        archives.validate_basefile_archive(built)
+    return BuiltArchive(path, writer.digest.hexdigest(), writer.position)
+
+
+# Returns the names of the models of the project, which already have a baseFile.
+def get_imported_names(project: models.Project) -> set[str]:
+    return set(
+        project.modelData.filter(baseFile__isnull=False).values_list("name", flat=True)
+    )
+
+
+# Stores the archives and creates their ModelData and Files in one transaction. A
+# ModelData with the same name but without a baseFile, e.g. from an interrupted
+# import, gets the baseFile instead of a new ModelData being created.
+def create_batch(
+    project: models.Project,
+    owner: User,
+    batch: list[tuple[ImportItem, BuiltArchive]],
+) -> None:
+    with transaction.atomic():
+        blobList = [
+            blobs.store_path(built.path, built.sha256, built.size) for _, built in batch
+        ]
+        existing = {
+            modeldata.name: modeldata
+            for modeldata in project.modelData.select_for_update().filter(
+                name__in=[item.name for item, _ in batch], baseFile__isnull=True
+            )
+        }
+        for (item, _), blob in zip(batch, blobList):
+            modeldata = existing.get(item.name)
+            if modeldata is None:
+                modeldata = models.ModelData.objects.create(
+                    name=item.name,
+                    modelType=item.modelType,
+                    annotationType=ANNOTATION_TYPE,
+                    project=project,
+                    owner=owner,
+                )
+            fileObj = models.File(
+                filePath=get_modeldata_file_path(modeldata, project),
+                fileFormat=FILE_FORMAT,
+                uploaded_by=owner,
+            )
+            blobs.assign_blob(fileObj, blob)
+            fileObj.save()
+            modeldata.baseFile = fileObj
+            modeldata.save()
+            geometry.start_indexing(modeldata, owner)
@@ -0,0 +1,284 @@
+import logging
+import os
+import socket
+import threading
+import traceback
+from datetime import timedelta
+from typing import Any, Callable, Optional, Protocol
+
+from django.contrib.auth.models import User
+from django.db import DatabaseError, connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import constants
+from . import models
+
+
+# Background jobs without an external broker. Jobs are rows of the Job table, which
+# `manage.py runworkers` polls from a pool of worker processes. A job is claimed
+# with a conditional UPDATE, which only one worker can win, so this works on SQLite
+# as well as on databases with row locks.
+#
+# Tasks are functions registered with @task(kind). They are called with the Job and
+# read their input from job.arguments. The return value has to be JSON serializable
+# and is stored as job.result. Tasks report their progress with report_progress(),
+# which also raises JobCancelled once the job was cancelled. Tasks that never report
+# their progress are cancelled once they return, their result is dropped. A task that
+# raises any other exception is retried with an exponential delay until maxAttempts
+# is reached. The outcome is only stored while the worker still holds the claim of
+# the job, a job that was requeued meanwhile belongs to the worker claiming it next.
+# The heartbeat of a running job is refreshed by a background thread, so tasks that
+# do not report their progress for a long time are not taken for crashed ones.
+
+logger = logging.getLogger(__name__)
+
+Task = Callable[[models.Job], Any]
+
+TASKS: dict[str, Task] = {}
+
+
+class JobCancelled(Exception):
+    pass
+
+
+# threading.Event or multiprocessing.Event
+class StopEvent(Protocol):
+    def is_set(self) -> bool:
+        ...  # pragma: no cover
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        ...  # pragma: no cover
+
+
+def task(kind: str) -> Callable[[Task], Task]:
+    def register(function: Task) -> Task:
+        TASKS[kind] = function
+        return function
+
+    return register
+
+
+def enqueue(
+    kind: str,
+    arguments: Optional[dict[str, Any]] = None,
+    priority: int = 0,
+    maxAttempts: int = constants.JOB_MAX_ATTEMPTS,
+    user: Optional[User] = None,
+    modelData: Optional[models.ModelData] = None,
+) -> models.Job:
+    if kind not in TASKS:
+        raise ValueError(f"There is no task '{kind}'.")
+    return models.Job.objects.create(
+        kind=kind,
+        arguments=arguments or {},
+        priority=priority,
+        maxAttempts=maxAttempts,
+        created_by=user,
+        modelData=modelData,
+    )
+
+
+# Returns the job of the kind for the ModelData whose arguments have the same "key",
+# which is enqueued unless there is one already. Only cancelled jobs are enqueued
+# again, failed ones are returned, so that work that cannot be done is not tried
+# again on every request.
+def enqueue_keyed(
+    kind: str,
+    arguments: dict[str, Any],
+    user: Optional[User],
+    modelData: models.ModelData,
+) -> models.Job:
+    job = (
+        models.Job.objects.filter(
+            kind=kind, modelData=modelData, arguments__key=arguments["key"]
+        )
+        .exclude(status=models.Job.CANCELLED)
+        .order_by("-created")
+        .first()
+    )
+    if job is not None:
+        return job
+    return enqueue(kind, arguments, user=user, modelData=modelData)
+
+
+def get_worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+# Claims the queued job with the highest priority, the oldest first. Returns None if
+# no job is due.
+def claim_job(worker: str) -> Optional[models.Job]:
+    while True:
+        now = timezone.now()
+        candidate = (
+            models.Job.objects.filter(status=models.Job.QUEUED, runAfter__lte=now)
+            .order_by("-priority", "created")
+            .values_list("pk", flat=True)
+            .first()
+        )
+        if candidate is None:
+            return None
+        claimed = models.Job.objects.filter(
+            pk=candidate, status=models.Job.QUEUED
+        ).update(
+            status=models.Job.RUNNING,
+            attempts=F("attempts") + 1,
+            started=now,
+            heartbeat=now,
+            worker=worker,
+        )
+        # another worker was faster, try the next job
+        if claimed:
+            return models.Job.objects.get(pk=candidate)
+
+
+# Stores the progress of a running job. Raises JobCancelled if the job was cancelled.
+def report_progress(job: models.Job, progress: float, message: str = "") -> None:
+    job.progress = min(max(progress, 0.0), 1.0)
+    job.message = message[: constants.JOB_MESSAGE_MAX_LENGTH]
+    models.Job.objects.filter(pk=job.pk).update(
+        progress=job.progress, message=job.message, heartbeat=timezone.now()
+    )
+    if models.Job.objects.filter(pk=job.pk, cancelRequested=True).exists():
+        raise JobCancelled()
+
+
+# Stores the fields of a job, which this worker is running. Drops them and returns
+# False if the job was requeued meanwhile, e.g. after its heartbeat was missed.
+def update_claimed_job(job: models.Job, **fields: Any) -> bool:
+    updated = models.Job.objects.filter(
+        pk=job.pk, status=models.Job.RUNNING, worker=job.worker
+    ).update(**fields)
+    if not updated:
+        logger.warning("Job %s was requeued, its outcome is dropped.", job.pk)
+        return False
+    for name, value in fields.items():
+        setattr(job, name, value)
+    return True
+
+
+def finish_job(job: models.Job, status: str, **fields: Any) -> bool:
+    return update_claimed_job(job, status=status, finished=timezone.now(), **fields)
+
+
+# Refreshes the heartbeat of a running job every JOB_HEARTBEAT_INTERVAL seconds from a
+# background thread while the block runs. Only the claim of this worker is refreshed,
+# a job that was requeued meanwhile is left alone.
+class Heartbeat:
+    def __init__(self, job: models.Job) -> None:
+        self.job = job
+        self.stop = threading.Event()
+        self.thread = threading.Thread(
+            target=self.run, name=f"heartbeat-{job.pk}", daemon=True
+        )
+
+    def __enter__(self) -> "Heartbeat":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.stop.set()
+        self.thread.join()
+
+    def run(self) -> None:
+        try:
+            while not self.stop.wait(constants.JOB_HEARTBEAT_INTERVAL):
+                try:
+                    models.Job.objects.filter(
+                        pk=self.job.pk,
+                        status=models.Job.RUNNING,
+                        worker=self.job.worker,
+                    ).update(heartbeat=timezone.now())
+                except DatabaseError:
+                    logger.exception("The heartbeat of job %s failed.", self.job.pk)
+        finally:
+            # the thread has its own connection
+            connection.close()
+
+
+# Runs a claimed job and stores its outcome.
+def run_job(job: models.Job) -> None:
+    function = TASKS.get(job.kind)
+    if function is None:
+        finish_job(job, models.Job.FAILED, error=f"There is no task '{job.kind}'.")
+        return
+    try:
+        with Heartbeat(job):
+            result = function(job)
+    except JobCancelled:
+        finish_job(job, models.Job.CANCELLED)
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception("Job %s (%s) failed.", job.pk, job.kind)
+        job.refresh_from_db(fields=["cancelRequested"])
+        if job.cancelRequested:
+            finish_job(job, models.Job.CANCELLED, error=error)
+        elif job.attempts < job.maxAttempts:
+            delay = constants.JOB_RETRY_DELAY * pow(2, job.attempts - 1)
+            update_claimed_job(
+                job,
+                status=models.Job.QUEUED,
+                error=error,
+                runAfter=timezone.now() + timedelta(seconds=delay),
+            )
+        else:
+            finish_job(job, models.Job.FAILED, error=error)
+    else:
+        # tasks that do not report their progress only notice a cancellation here
+        job.refresh_from_db(fields=["cancelRequested"])
+        if job.cancelRequested:
+            finish_job(job, models.Job.CANCELLED)
+        else:
+            finish_job(job, models.Job.SUCCEEDED, progress=1.0, result=result)
+
+
+# Cancels a queued job immediately, a running job once it reports its progress the
+# next time or, at the latest, once its task returns.
+def cancel_job(job: models.Job) -> None:
+    models.Job.objects.filter(pk=job.pk, status=models.Job.QUEUED).update(
+        status=models.Job.CANCELLED, finished=timezone.now()
+    )
+    models.Job.objects.filter(pk=job.pk, status=models.Job.RUNNING).update(
+        cancelRequested=True
+    )
+    job.refresh_from_db()
+
+
+# Requeues running jobs of crashed workers, or fails them if they were attempted too
+# often. Returns the number of affected jobs.
+def requeue_stale_jobs() -> int:
+    now = timezone.now()
+    stale = models.Job.objects.filter(
+        status=models.Job.RUNNING,
+        heartbeat__lt=now - timedelta(seconds=constants.JOB_STALE_TIMEOUT),
+    )
+    failed = stale.filter(
+        Q(attempts__gte=F("maxAttempts")) | Q(cancelRequested=True)
+    ).update(
+        status=models.Job.FAILED,
+        finished=now,
+        error="The worker running the job stopped responding.",
+    )
+    return failed + stale.update(status=models.Job.QUEUED, runAfter=now)
+
+
+# Runs jobs until `stop` is set. With `once` or without `stop`, returns as soon as no
+# job is due. Returns the number of jobs that were run.
+def work(
+    stop: Optional[StopEvent] = None,
+    once: bool = False,
+    worker: Optional[str] = None,
+) -> int:
+    worker = worker or get_worker_name()
+    done = 0
+    while stop is None or not stop.is_set():
+        job = claim_job(worker)
+        if job is None:
+            if once or stop is None:
+                break
+            stop.wait(constants.JOB_POLL_INTERVAL)
+            continue
+        run_job(job)
+        done += 1
+    return done
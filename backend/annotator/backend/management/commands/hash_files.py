@@ -0,0 +1,29 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from annotator.backend import blobs
+from annotator.backend import constants
+
+
+# Hashes the files uploaded before hashes were stored, see blobs.hash_legacy_files.
+# Meant to be run once after migrating, it can be interrupted and started again.
+class Command(BaseCommand):
+    help = "Stores the SHA-256 of files uploaded before hashes were stored."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=constants.HASH_FILES_BATCH_SIZE,
+            help="number of files that are looked up at once",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        files, size = 0, 0
+        for hashed, hashedSize in blobs.hash_legacy_files(options["batch_size"]):
+            files += hashed
+            size += hashedSize
+            if options["verbosity"] > 1:
+                self.stdout.write(f"Hashed {files} files ({size} bytes) so far.")
+        self.stdout.write(f"Hashed {files} files ({size} bytes).")
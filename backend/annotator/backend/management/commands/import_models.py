@@ -0,0 +1,148 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from multiprocessing import get_context
+from typing import Any
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import connections
+
+from annotator.backend import archives
+from annotator.backend import blobs
+from annotator.backend import constants
+from annotator.backend import imports
+from annotator.backend import models
+
+
+# Creates a ModelData with a baseFile for every model below a directory, see
+# imports.py. Models that were imported before are skipped, so the command can
+# simply be run again after it was interrupted.
+class Command(BaseCommand):
+    help = "Imports all .obj and .ply files (with textures) below a directory."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("project", type=int, help="id of the project")
+        parser.add_argument("directory", help="directory containing the models")
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="number of processes building the archives",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=50,
+            help="number of ModelData created per transaction",
+        )
+        parser.add_argument(
+            "--owner", help="username of the owner, by default the project owner"
+        )
+        parser.add_argument(
+            "--model-type",
+            choices=[imports.MODEL_TYPE_MESH, imports.MODEL_TYPE_POINT_CLOUD],
+            help="model type of all models, by default detected from the files",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        project = models.Project.objects.filter(pk=options["project"]).first()
+        if project is None:
+            raise CommandError(f"There is no project {options['project']}.")
+        if not os.path.isdir(options["directory"]):
+            raise CommandError(f"'{options['directory']}' is no directory.")
+        owner = project.owner
+        if options["owner"]:
+            owner = User.objects.filter(username=options["owner"]).first()
+            if owner is None:
+                raise CommandError(f"There is no user '{options['owner']}'.")
+
+        start = time.perf_counter()
+        items = imports.discover(options["directory"], options["model_type"])
+        imported = imports.get_imported_names(project)
+        pending = []
+        for item in items:
+            if len(item.name) > constants.MODELDATA_NAME_MAX_LENGTH:
+                self.stderr.write(f"Skipping '{item.name}', the name is too long.")
+            elif item.name not in imported:
+                pending.append(item)
+        self.stdout.write(
+            f"Found {len(items)} models, {len(items) - len(pending)} were imported "
+            + "before."
+        )
+
+        count, size = self.run(project, owner, pending, options)
+        seconds = time.perf_counter() - start
+        self.stdout.write(
+            f"Imported {count} models ({size / pow(2, 20):.1f} MiB) in "
+            + f"{seconds:.1f} s: {count / seconds:.1f} files/s, "
+            + f"{size / pow(2, 20) / seconds:.1f} MiB/s."
+        )
+        if count < len(pending):
+            self.stderr.write(f"Skipped {len(pending) - count} models with errors.")
+
+    # Builds the archives in the pool and stores them in batches. At most two
+    # archives per process are in progress, which bounds the temporary disk usage.
+    # Models whose archive cannot be built or is invalid are reported and skipped.
+    # Returns the number and the size of the imported models.
+    def run(
+        self,
+        project: models.Project,
+        owner: User,
+        items: list[imports.ImportItem],
+        options: dict[str, Any],
+    ) -> tuple[int, int]:
+        processes = max(1, options["processes"])
+        batchSize = max(1, options["batch_size"])
+        count = 0
+        size = 0
+        batch: list[tuple[imports.ImportItem, imports.BuiltArchive]] = []
+        remaining = iter(items)
+        running: dict[Future[imports.BuiltArchive], tuple[imports.ImportItem, str]] = {}
+        # the workers never use the database connections of this process
+        connections.close_all()
+        try:
+            with ProcessPoolExecutor(processes, mp_context=get_context("fork")) as pool:
+                try:
+                    while True:
+                        while len(running) < 2 * processes:
+                            item = next(remaining, None)
+                            if item is None:
+                                break
+                            path = blobs.get_temp_path()
+                            future = pool.submit(imports.build_archive, item, path)
+                            running[future] = (item, path)
+                        if not running:
+                            break
+                        done, _ = wait(running, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            item, _ = running.pop(future)
+                            try:
+                                built = future.result()
+                            except (archives.ArchiveError, OSError) as error:
+                                self.report_error(item, error)
+                                continue
+                            batch.append((item, built))
+                            count += 1
+                            size += item.get_size()
+                        if len(batch) >= batchSize:
+                            imports.create_batch(project, owner, batch)
+                            batch = []
+                    if batch:
+                        imports.create_batch(project, owner, batch)
+                except BaseException:
+                    for future in running:
+                        future.cancel()
+                    raise
+        except BaseException:
+            # the pool has finished the running archives, none of them is stored
+            paths = [path for _, path in running.values()]
+            for path in paths + [built.path for _, built in batch]:
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+        return count, size
+
+    def report_error(self, item: imports.ImportItem, error: Exception) -> None:
+        message = error.message if isinstance(error, archives.ArchiveError) else error
+        self.stderr.write(f"Skipping '{item.name}': {message}")
@@ -0,0 +1,56 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from annotator.backend import constants
+from annotator.backend import mediagc
+
+
+# Consistency check of MEDIA_ROOT and the database, see mediagc.py. Deletes orphaned
+# files, unreferenced Blobs and Files without ModelData, and restores missing
+# annotationFiles from the version history. Tile sets without their file are removed
+# to be built again, other missing files that cannot be restored are only reported.
+class Command(BaseCommand):
+    help = "Reports and repairs orphaned and missing media files."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="only report the problems, do not repair them",
+        )
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=constants.MEDIA_GC_THREADS,
+            help="number of threads listing directories and checking files",
+        )
+        parser.add_argument(
+            "--grace-period",
+            type=int,
+            default=constants.MEDIA_GC_GRACE_PERIOD,
+            help="files and rows younger than this number of seconds are skipped",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        log = None
+        if options["verbosity"] > 1:
+
+            def log(kind: str, name: str) -> None:
+                self.stdout.write(f"{kind}: {name}")
+
+        collector = mediagc.MediaCollector(
+            options["dry_run"], options["threads"], options["grace_period"], log
+        )
+        report = collector.run()
+        prefix = "Found" if options["dry_run"] else "Repaired"
+        self.stdout.write(
+            f"Scanned {report.scannedFiles} files and {report.scannedRows} rows.\n"
+            + f"{prefix} {report.orphanFiles} orphaned files "
+            + f"({report.orphanBytes} bytes), {report.unreferencedBlobs} "
+            + f"unreferenced blobs, {report.danglingFiles} files without ModelData "
+            + f"and {report.emptyDirectories} empty directories.\n"
+            + f"Missing: {report.missingBlobs} blobs ({report.restored} restored), "
+            + f"{report.missingChunks} annotation chunks, {report.missingFiles} "
+            + f"files, {report.missingTiles} tile sets."
+        )
@@ -0,0 +1,41 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from annotator.backend import constants
+from annotator.backend import versions
+
+
+# Retention policy job for the annotation version history, meant to be run
+# periodically, e.g. by cron. See versions.prune_versions.
+class Command(BaseCommand):
+    help = "Deletes old annotation versions and the chunks only they referenced."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--keep",
+            type=int,
+            default=constants.ANNOTATION_VERSIONS_KEEP,
+            help="number of the newest versions that are kept per ModelData",
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=constants.ANNOTATION_VERSIONS_KEEP_DAYS,
+            help="versions younger than this number of days are kept",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="only report what would be deleted",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        report = versions.prune_versions(
+            options["keep"], options["days"], options["dry_run"]
+        )
+        prefix = "Would delete" if options["dry_run"] else "Deleted"
+        self.stdout.write(
+            f"{prefix} {report['versions']} versions and {report['chunks']} chunks "
+            + f"({report['bytes']} bytes)."
+        )
@@ -0,0 +1,99 @@
+import multiprocessing
+import os
+import signal
+import time
+from multiprocessing.process import BaseProcess
+from types import FrameType
+from typing import Any, Optional
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import connections
+
+from annotator.backend import constants
+from annotator.backend import jobs
+
+
+def run_worker(stop: jobs.StopEvent, once: bool) -> None:
+    # only the supervisor handles the signals and tells the workers to stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    try:
+        jobs.work(stop, once)
+    finally:
+        connections.close_all()
+
+
+# Runs the background jobs of jobs.py in a pool of worker processes. The supervising
+# process restarts workers that died and requeues the jobs of crashed workers. On
+# SIGTERM or SIGINT, the workers finish their current job and exit.
+class Command(BaseCommand):
+    help = "Runs background jobs in a pool of worker processes."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="number of worker processes, 0 runs the jobs in this process",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="exit as soon as no job is due",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        self.stopping = False
+        handlers = [
+            (signum, signal.signal(signum, self.handle_signal))
+            for signum in (signal.SIGTERM, signal.SIGINT)
+        ]
+        try:
+            jobs.requeue_stale_jobs()
+            if options["processes"] <= 0:
+                done = jobs.work(self, options["once"])
+                self.stdout.write(f"Ran {done} jobs.")
+            else:
+                self.supervise(options["processes"], options["once"])
+        finally:
+            for signum, handler in handlers:
+                signal.signal(signum, handler)
+
+    # Events cannot be set safely from a signal handler, so it only sets a flag.
+    def handle_signal(self, signum: int, frame: Optional[FrameType]) -> None:
+        self.stopping = True
+
+    # the command itself is the StopEvent of jobs run in this process
+    def is_set(self) -> bool:
+        return self.stopping
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        time.sleep(timeout or 0)
+        return self.stopping
+
+    def supervise(self, processes: int, once: bool) -> None:
+        context = multiprocessing.get_context("fork")
+        stop = context.Event()
+
+        def start() -> BaseProcess:
+            # forked workers must open their own database connections
+            connections.close_all()
+            process = context.Process(target=run_worker, args=(stop, once))
+            process.start()
+            return process
+
+        workers = [start() for _ in range(processes)]
+        self.stdout.write(f"Started {processes} workers.")
+        while not self.stopping:
+            alive = [worker for worker in workers if worker.is_alive()]
+            if once and not alive:
+                break
+            if not once:
+                # workers only exit on their own if they crashed
+                workers = alive + [start() for _ in range(processes - len(alive))]
+            jobs.requeue_stale_jobs()
+            time.sleep(constants.JOB_POLL_INTERVAL)
+        stop.set()
+        for worker in workers:
+            worker.join()
+        self.stdout.write("All workers stopped.")
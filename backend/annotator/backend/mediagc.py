@@ -0,0 +1,336 @@
+import os
+import time
+import uuid
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Iterator, Optional
+
+from django.core.files.storage import default_storage
+from django.db.models import Count, Model, QuerySet
+from django.utils import timezone
+
+from . import annotations
+from . import blobs
+from . import constants
+from . import models
+from . import versions
+
+# Garbage collection and consistency check of MEDIA_ROOT, see the media_gc command.
+# Deleting a ModelData or replacing a file touches the database and the disk in
+# separate steps, a crash in between leaves files without rows or rows without files.
+#
+# The disk is scanned for files without rows, the tables for rows without files. In
+# both scans a thread pool lists the directories or stats the files of the rows,
+# which is what takes long on large or network volumes. The main thread runs all
+# queries, so the threads never need a database connection. Both scans work on
+# batches of MEDIA_GC_BATCH_SIZE paths, so only the directories waiting to be listed
+# are kept in memory, not every path.
+#
+# Files and rows younger than the grace period are skipped, they may belong to a
+# request that has not finished yet.
+
+Log = Callable[[str, str], None]
+
+
+@dataclass
+class DiskEntry:
+    name: str
+    size: int
+    mtime: float
+
+
+@dataclass
+class Report:
+    # files on the disk that no row references
+    orphanFiles: int = 0
+    orphanBytes: int = 0
+    # rows whose file does not exist
+    missingBlobs: int = 0
+    missingChunks: int = 0
+    missingFiles: int = 0
+    # tile sets of point clouds, which are removed to be built again
+    missingTiles: int = 0
+    # Blobs without Files and Files without ModelData
+    unreferencedBlobs: int = 0
+    danglingFiles: int = 0
+    emptyDirectories: int = 0
+    # missing annotationFiles restored from the version history
+    restored: int = 0
+    scannedFiles: int = 0
+    scannedRows: int = 0
+
+
+class MediaCollector:
+    def __init__(
+        self,
+        dryRun: bool = True,
+        threads: int = constants.MEDIA_GC_THREADS,
+        gracePeriod: int = constants.MEDIA_GC_GRACE_PERIOD,
+        log: Optional[Log] = None,
+    ) -> None:
+        self.dryRun = dryRun
+        self.threads = max(1, threads)
+        self.gracePeriod = gracePeriod
+        self.log = log
+        self.root = default_storage.path("")
+        self.cutoff = time.time() - gracePeriod
+        self.report = Report()
+        # directories that are created by the application and never removed
+        self.protected = {
+            "",
+            constants.BLOB_DIR,
+            os.path.join(constants.BLOB_DIR, "tmp"),
+            os.path.join(constants.BLOB_DIR, constants.ANNOTATION_CHUNK_DIR),
+            constants.UPLOAD_SESSION_DIR,
+            constants.TILE_DIR,
+        }
+
+    def run(self) -> Report:
+        with ThreadPoolExecutor(self.threads) as pool:
+            self.scan_disk(pool)
+            self.scan_rows(pool)
+        self.collect_unreferenced_blobs()
+        self.collect_dangling_files()
+        return self.report
+
+    # the problems are logged instead of collected, there may be millions of them
+    def add_problem(self, kind: str, name: str) -> None:
+        if self.log is not None:
+            self.log(kind, name)
+
+    # Lists the directories breadth first, at most two per thread at once.
+    def scan_disk(self, pool: ThreadPoolExecutor) -> None:
+        directories = deque([""])
+        running: set[Future[tuple[str, list[DiskEntry], list[str]]]] = set()
+        while directories or running:
+            while directories and len(running) < 2 * self.threads:
+                running.add(
+                    pool.submit(list_directory, self.root, directories.popleft())
+                )
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                directory, entries, subdirectories = future.result()
+                directories.extend(subdirectories)
+                for start in range(0, len(entries), constants.MEDIA_GC_BATCH_SIZE):
+                    self.check_files(
+                        entries[start : start + constants.MEDIA_GC_BATCH_SIZE]
+                    )
+                if not entries and not subdirectories:
+                    self.remove_empty_directory(directory)
+
+    # Reports the files of the batch, which no row references.
+    def check_files(self, entries: list[DiskEntry]) -> None:
+        self.report.scannedFiles += len(entries)
+        names = [entry.name for entry in entries]
+        referenced = set(get_referenced_names(names))
+        for entry in entries:
+            if entry.name in referenced or entry.mtime > self.cutoff:
+                continue
+            self.report.orphanFiles += 1
+            self.report.orphanBytes += entry.size
+            self.add_problem("orphan file", entry.name)
+            if not self.dryRun:
+                self.remove_file(entry)
+
+    def remove_file(self, entry: DiskEntry) -> None:
+        path = os.path.join(self.root, entry.name)
+        try:
+            # the file was replaced since it was listed
+            if os.stat(path).st_mtime > self.cutoff:
+                return
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def remove_empty_directory(self, directory: str) -> None:
+        if directory in self.protected:
+            return
+        path = os.path.join(self.root, directory)
+        try:
+            if os.stat(path).st_mtime > self.cutoff:
+                return
+            self.report.emptyDirectories += 1
+            if not self.dryRun:
+                # fails if a file was added in the meantime
+                os.rmdir(path)
+        except OSError:
+            pass
+
+    # Stats the files of the Blob, AnnotationChunk, File and TileSet rows. Files that
+    # store their content in a Blob are checked with the Blob.
+    def scan_rows(self, pool: ThreadPoolExecutor) -> None:
+        querysets: list[tuple[str, QuerySet[Model], str]] = [
+            ("missing blob", models.Blob.objects.all(), "file"),
+            ("missing chunk", models.AnnotationChunk.objects.all(), "file"),
+            (
+                "missing file",
+                models.File.objects.filter(blob__isnull=True).exclude(file=""),
+                "file",
+            ),
+            ("missing tiles", models.TileSet.objects.all(), "file"),
+        ]
+        for kind, queryset, column in querysets:
+            running: set[Future[list[tuple[int, str]]]] = set()
+            for batch in iter_batches(queryset, column):
+                self.report.scannedRows += len(batch)
+                if len(running) >= 2 * self.threads:
+                    done, running = wait(running, return_when=FIRST_COMPLETED)
+                    self.handle_missing(kind, done)
+                running.add(pool.submit(find_missing, self.root, batch))
+            self.handle_missing(kind, wait(running)[0])
+
+    def handle_missing(
+        self, kind: str, done: set[Future[list[tuple[int, str]]]]
+    ) -> None:
+        for future in done:
+            for pk, name in future.result():
+                if kind == "missing blob":
+                    self.report.missingBlobs += 1
+                    if not self.dryRun and restore_blob(pk):
+                        self.report.restored += 1
+                        continue
+                elif kind == "missing chunk":
+                    self.report.missingChunks += 1
+                elif kind == "missing tiles":
+                    self.report.missingTiles += 1
+                    if not self.dryRun:
+                        models.TileSet.objects.filter(pk=pk).delete()
+                else:
+                    self.report.missingFiles += 1
+                self.add_problem(kind, name)
+
+    # Deletes Blobs, which neither a File nor a TranscodedBlob references anymore,
+    # with their file.
+    def collect_unreferenced_blobs(self) -> None:
+        unreferenced = (
+            models.Blob.objects.filter(created__lt=self.get_cutoff_datetime())
+            .annotate(
+                references=Count("files", distinct=True)
+                + Count("transcodedFrom", distinct=True)
+            )
+            .filter(references=0)
+            .values_list("pk", "sha256")
+        )
+        for pk, sha256 in unreferenced.iterator():
+            self.report.unreferencedBlobs += 1
+            self.add_problem("unreferenced blob", sha256)
+            if not self.dryRun:
+                blobs.release_blob(pk)
+
+    # Deletes Files, which are neither the baseFile nor the annotationFile of a
+    # ModelData. Their content is released by the post_delete handler.
+    def collect_dangling_files(self) -> None:
+        dangling = (
+            models.File.objects.filter(uploadDate__lt=self.get_cutoff_datetime())
+            .exclude(
+                pk__in=models.ModelData.objects.filter(baseFile__isnull=False).values(
+                    "baseFile"
+                )
+            )
+            .exclude(
+                pk__in=models.ModelData.objects.filter(
+                    annotationFile__isnull=False
+                ).values("annotationFile")
+            )
+        )
+        for fileObj in dangling.iterator():
+            self.report.danglingFiles += 1
+            self.add_problem("dangling file", f"{fileObj.pk} {fileObj.file.name}")
+            if not self.dryRun:
+                fileObj.delete()
+
+    def get_cutoff_datetime(self) -> datetime:
+        return timezone.now() - timedelta(seconds=self.gracePeriod)
+
+
+# Lists a directory relative to the root. Returns the directory, its files and its
+# subdirectories. Symbolic links are not followed.
+def list_directory(root: str, directory: str) -> tuple[str, list[DiskEntry], list[str]]:
+    entries = []
+    subdirectories = []
+    try:
+        with os.scandir(os.path.join(root, directory)) as iterator:
+            for entry in iterator:
+                name = os.path.join(directory, entry.name)
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.append(name)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    entries.append(DiskEntry(name, stat.st_size, stat.st_mtime))
+    except FileNotFoundError:
+        # removed while it was waiting to be listed
+        pass
+    return directory, entries, sorted(subdirectories)
+
+
+# Returns the (pk, name) pairs of the batch, whose files do not exist.
+def find_missing(root: str, batch: list[tuple[int, str]]) -> list[tuple[int, str]]:
+    return [
+        (pk, name) for pk, name in batch if not os.path.isfile(os.path.join(root, name))
+    ]
+
+
+# Returns the given names, which belong to a row.
+def get_referenced_names(names: list[str]) -> Iterator[str]:
+    yield from models.Blob.objects.filter(file__in=names).values_list("file", flat=True)
+    yield from models.AnnotationChunk.objects.filter(file__in=names).values_list(
+        "file", flat=True
+    )
+    yield from models.File.objects.filter(file__in=names).values_list("file", flat=True)
+    yield from models.TileSet.objects.filter(file__in=names).values_list(
+        "file", flat=True
+    )
+    # part files of upload sessions, UPLOAD_SESSION_DIR/<session id>/upload.part
+    sessions = {}
+    for name in names:
+        parts = name.split(os.sep)
+        if len(parts) == 3 and parts[0] == constants.UPLOAD_SESSION_DIR:
+            try:
+                sessions[uuid.UUID(parts[1])] = name
+            except ValueError:
+                continue
+    for pk in models.UploadSession.objects.filter(pk__in=sessions).values_list(
+        "pk", flat=True
+    ):
+        yield sessions[pk]
+
+
+# Iterates over (pk, column) pairs of the queryset in batches, ordered by pk.
+def iter_batches(
+    queryset: QuerySet[Model], column: str
+) -> Iterator[list[tuple[int, str]]]:
+    last = None
+    while True:
+        page = queryset.order_by("pk")
+        if last is not None:
+            page = page.filter(pk__gt=last)
+        batch = list(page.values_list("pk", column)[: constants.MEDIA_GC_BATCH_SIZE])
+        if not batch:
+            return
+        yield batch
+        last = batch[-1][0]
+
+
+# Rebuilds the file of a missing Blob from the version history, which is possible
+# for canonical annotationFiles. Returns whether the Blob was restored.
+def restore_blob(pk: int) -> bool:
+    blob = models.Blob.objects.get(pk=pk)
+    version = (
+        models.AnnotationVersion.objects.filter(sha256=blob.sha256)
+        .order_by("-created")
+        .first()
+    )
+    if version is None:
+        return False
+    try:
+        labels = versions.read_labels(version)
+    except FileNotFoundError:
+        return False
+    rebuilt = annotations.store_labels(labels)
+    if rebuilt.pk != blob.pk:
+        # the annotationFile was not stored in the canonical format
+        blobs.release_blob(rebuilt.pk)
+        return False
+    return True
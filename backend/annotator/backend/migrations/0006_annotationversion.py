@@ -0,0 +1,132 @@
+# Generated by Django 4.0.6 on 2026-10-17 06:28
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("backend", "0005_blob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AnnotationChunk",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("sha256", models.CharField(max_length=64, unique=True)),
+                ("size", models.IntegerField()),
+                ("file", models.FileField(upload_to="")),
+            ],
+        ),
+        migrations.CreateModel(
+            name="AnnotationVersion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("number", models.IntegerField()),
+                ("sha256", models.CharField(blank=True, default="", max_length=64)),
+                ("count", models.BigIntegerField()),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                (
+                    "restoredFrom",
+                    models.IntegerField(blank=True, default=None, null=True),
+                ),
+            ],
+            options={
+                "ordering": ["number"],
+            },
+        ),
+        migrations.CreateModel(
+            name="AnnotationVersionChunk",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("index", models.IntegerField()),
+                (
+                    "chunk",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="versionChunks",
+                        to="backend.annotationchunk",
+                    ),
+                ),
+                (
+                    "version",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="versionChunks",
+                        to="backend.annotationversion",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["index"],
+            },
+        ),
+        migrations.AddField(
+            model_name="annotationversion",
+            name="chunks",
+            field=models.ManyToManyField(
+                related_name="versions",
+                through="backend.AnnotationVersionChunk",
+                to="backend.annotationchunk",
+            ),
+        ),
+        migrations.AddField(
+            model_name="annotationversion",
+            name="created_by",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="annotationVersions",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddField(
+            model_name="annotationversion",
+            name="modelData",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="annotationVersions",
+                to="backend.modeldata",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="annotationversionchunk",
+            constraint=models.UniqueConstraint(
+                fields=("version", "index"), name="unique_annotationversionchunk_index"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="annotationversion",
+            constraint=models.UniqueConstraint(
+                fields=("modelData", "number"), name="unique_annotationversion_number"
+            ),
+        ),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 4.0.6 on 2026-10-17 06:32
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("backend", "0006_annotationversion"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Job",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("kind", models.CharField(max_length=100)),
+                ("arguments", models.JSONField(default=dict)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "queued"),
+                            ("running", "running"),
+                            ("succeeded", "succeeded"),
+                            ("failed", "failed"),
+                            ("cancelled", "cancelled"),
+                        ],
+                        default="queued",
+                        max_length=20,
+                    ),
+                ),
+                ("priority", models.IntegerField(default=0)),
+                ("attempts", models.IntegerField(default=0)),
+                ("maxAttempts", models.IntegerField(default=3)),
+                ("progress", models.FloatField(default=0)),
+                ("message", models.CharField(blank=True, default="", max_length=255)),
+                ("cancelRequested", models.BooleanField(default=False)),
+                ("result", models.JSONField(blank=True, default=None, null=True)),
+                ("error", models.TextField(blank=True, default="")),
+                ("runAfter", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "heartbeat",
+                    models.DateTimeField(blank=True, default=None, null=True),
+                ),
+                ("worker", models.CharField(blank=True, default="", max_length=100)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                ("started", models.DateTimeField(blank=True, default=None, null=True)),
+                ("finished", models.DateTimeField(blank=True, default=None, null=True)),
+                (
+                    "created_by",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="jobs",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "modelData",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="jobs",
+                        to="backend.modeldata",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["created"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="job",
+            index=models.Index(
+                fields=["status", "-priority", "runAfter"], name="job_queue_index"
+            ),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.0.6 on 2026-10-17 06:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0007_job"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AnnotationAgreement",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("sha256", models.CharField(max_length=64)),
+                ("againstSha256", models.CharField(max_length=64)),
+                ("result", models.JSONField()),
+                ("created", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="annotationagreement",
+            constraint=models.UniqueConstraint(
+                fields=("sha256", "againstSha256"), name="unique_annotationagreement"
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.0.6 on 2026-10-17 06:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0008_annotationagreement"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="file",
+            name="archiveMembers",
+            field=models.JSONField(blank=True, default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name="file",
+            name="fileSize",
+            field=models.BigIntegerField(blank=True, default=None, null=True),
+        ),
+    ]
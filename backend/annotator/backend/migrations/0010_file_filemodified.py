@@ -0,0 +1,18 @@
+# Generated by Django 4.0.6 on 2026-10-17 06:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0009_file_filesize"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="file",
+            name="fileModified",
+            field=models.DateTimeField(blank=True, default=None, null=True),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.0.6 on 2026-10-17 06:58
+
+from django.apps.registry import Apps
+from django.core.files.storage import default_storage
+from django.db import migrations
+from django.db.backends.base.schema import BaseDatabaseSchemaEditor
+
+BATCH_SIZE = 500
+
+
+# Stores the size and the modification time of the existing files. Files in the blob
+# store take them and their SHA-256 from their Blob, older files are only stat'd.
+# Reading them would block the migration for as long as hashing all media takes,
+# `manage.py hash_files` stores their SHA-256 afterwards. Files missing on the disk
+# keep NULL columns.
+def backfill_file_metadata(apps: Apps, schema_editor: BaseDatabaseSchemaEditor) -> None:
+    File = apps.get_model("backend", "File")
+    queryset = File.objects.filter(fileSize__isnull=True).select_related("blob")
+    last = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last).order_by("pk")[:BATCH_SIZE])
+        if not batch:
+            return
+        for fileObj in batch:
+            if fileObj.blob is not None:
+                fileObj.fileSize = fileObj.blob.size
+                fileObj.fileModified = fileObj.blob.created
+                fileObj.sha256 = fileObj.blob.sha256
+                continue
+            name = fileObj.file.name
+            if not name or not default_storage.exists(name):
+                continue
+            fileObj.fileSize = default_storage.size(name)
+            fileObj.fileModified = default_storage.get_modified_time(name)
+        File.objects.bulk_update(batch, ["fileSize", "fileModified", "sha256"])
+        last = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0010_file_filemodified"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_file_metadata, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.0.6 on 2026-10-17 07:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0011_backfill_file_metadata"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PreviewRender",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("view", models.CharField(max_length=10)),
+                ("annotated", models.BooleanField(default=False)),
+                ("key", models.CharField(max_length=64)),
+                ("image", models.BinaryField()),
+                ("created", models.DateTimeField(auto_now=True)),
+                (
+                    "modelData",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="previewRenders",
+                        to="backend.modeldata",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="previewrender",
+            constraint=models.UniqueConstraint(
+                fields=("modelData", "view", "annotated"), name="unique_previewrender"
+            ),
+        ),
+    ]
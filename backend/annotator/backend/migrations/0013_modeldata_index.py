@@ -0,0 +1,38 @@
+# Generated by Django 4.0.6 on 2026-10-17 07:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0012_previewrender"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="modeldata",
+            name="attributes",
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="modeldata",
+            name="bounds",
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="modeldata",
+            name="centroid",
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="modeldata",
+            name="faceCount",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="modeldata",
+            name="vertexCount",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.0.6 on 2026-10-17 07:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0013_modeldata_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TileSet",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=64)),
+                ("file", models.FileField(upload_to="")),
+                ("pointCount", models.BigIntegerField()),
+                ("colors", models.BooleanField(default=False)),
+                ("bounds", models.JSONField()),
+                ("nodes", models.JSONField()),
+                ("created", models.DateTimeField(auto_now=True)),
+                (
+                    "modelData",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="tileSet",
+                        to="backend.modeldata",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.0.6 on 2026-10-17 08:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0014_tileset"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TranscodedBlob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("anno3dFormat", models.CharField(max_length=10)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                (
+                    "blob",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="transcodedFrom",
+                        to="backend.blob",
+                    ),
+                ),
+                (
+                    "source",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="transcodings",
+                        to="backend.blob",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="transcodedblob",
+            constraint=models.UniqueConstraint(
+                fields=("source", "anno3dFormat"), name="unique_transcodedblob"
+            ),
+        ),
+    ]
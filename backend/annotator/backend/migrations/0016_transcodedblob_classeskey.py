@@ -0,0 +1,29 @@
+# Generated by Django 4.0.6 on 2026-10-17 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("backend", "0015_transcodedblob"),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="transcodedblob",
+            name="unique_transcodedblob",
+        ),
+        migrations.AddField(
+            model_name="transcodedblob",
+            name="classesKey",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+        migrations.AddConstraint(
+            model_name="transcodedblob",
+            constraint=models.UniqueConstraint(
+                fields=("source", "anno3dFormat", "classesKey"),
+                name="unique_transcodedblob_classes",
+            ),
+        ),
+    ]
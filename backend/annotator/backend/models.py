@@ -1,7 +1,9 @@
 import os.path
+import uuid
 from typing import Protocol
 
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 from . import constants
@@ -36,6 +38,46 @@ def get_file_path(instance: FilePathObject, filename: str) -> str:
     return os.path.join(instance.filePath, filename)
 
 
+# Content-addressed file content, see blobs.py. A Blob is shared by all File objects
+# with the same content and deleted together with the last of them.
+class Blob(models.Model):
+    sha256 = models.CharField(
+        max_length=constants.FILE_CHECKSUM_MAX_LENGTH, unique=True
+    )
+    size = models.BigIntegerField()
+    file = models.FileField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:  # pragma: no cover
+        return self.sha256
+
+
+# An annotationFile Blob transcoded to another anno3d format, see annotations.py.
+# Transcoded archives are stored in the blob store as well and released together
+# with the Blob they were transcoded from.
+class TranscodedBlob(models.Model):
+    source = models.ForeignKey(
+        Blob, related_name="transcodings", on_delete=models.CASCADE
+    )
+    anno3dFormat = models.CharField(max_length=constants.ANNO3D_FORMAT_MAX_LENGTH)
+    # identifies the annotation classes of the labels, see annotations.get_classes_key
+    classesKey = models.CharField(
+        max_length=constants.FILE_CHECKSUM_MAX_LENGTH, blank=True, default=""
+    )
+    blob = models.ForeignKey(
+        Blob, related_name="transcodedFrom", on_delete=models.CASCADE
+    )
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["source", "anno3dFormat", "classesKey"],
+                name="unique_transcodedblob_classes",
+            )
+        ]
+
+
 class File(models.Model):
     # should be set on creation by 'file holder'
     filePath = models.CharField(max_length=constants.FILE_FILEPATH_MAX_LENGTH)
@@ -50,8 +92,32 @@ class File(models.Model):
     )
     fileFormat = models.CharField(max_length=constants.FILE_FILEFORMAT_MAX_LENGTH)
     file = models.FileField(upload_to=get_file_path)
+    # SHA-256 hex digest of the file, empty for files uploaded before it was stored
+    sha256 = models.CharField(
+        max_length=constants.FILE_CHECKSUM_MAX_LENGTH, blank=True, default=""
+    )
+    # the stored content, None for files uploaded before the blob store existed
+    blob = models.ForeignKey(
+        Blob,
+        blank=True,
+        null=True,
+        related_name="files",
+        # blobs are only deleted once no File references them anymore
+        on_delete=models.PROTECT,
+    )
+    # size in bytes and time the stored content was written, None for files that
+    # were missing when the columns were backfilled
+    fileSize = models.BigIntegerField(blank=True, null=True, default=None)
+    fileModified = models.DateTimeField(blank=True, null=True, default=None)
+    # the members of the zip archive as found while it was uploaded, see
+    # archives.LocalHeaderScanner, None if they are unknown
+    archiveMembers = models.JSONField(blank=True, null=True, default=None)
 
+    # only falls back to the storage for files that were missing when the size was
+    # backfilled, serializers use the column
     def get_fileSize(self) -> int:
+        if self.fileSize is not None:
+            return self.fileSize
         return self.file.size
 
 
@@ -102,6 +168,17 @@ class ModelData(models.Model):
         related_name="+",
         on_delete=models.SET_NULL,
     )
+    # indexed from the baseFile by a job after its upload, see geometry.py, None
+    # until then
+    vertexCount = models.BigIntegerField(blank=True, null=True)
+    # the number of triangles, i.e. of labels of an annotated mesh
+    faceCount = models.BigIntegerField(blank=True, null=True)
+    # e.g. ["position", "normal", "color", "uv"]
+    attributes = models.JSONField(blank=True, null=True)
+    # {"min": [x, y, z], "max": [x, y, z]}
+    bounds = models.JSONField(blank=True, null=True)
+    # the mean of the vertices, [x, y, z]
+    centroid = models.JSONField(blank=True, null=True)
 
 
 class Label(models.Model):
@@ -111,3 +188,262 @@ class Label(models.Model):
     project = models.ForeignKey(
         Project, blank=False, related_name="labels", on_delete=models.CASCADE
     )
+
+
+class UploadSession(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    modelData = models.ForeignKey(
+        ModelData,
+        blank=False,
+        related_name="uploadSessions",
+        # pending uploads are discarded with the ModelData
+        on_delete=models.CASCADE,
+    )
+    # either "baseFile" or "annotationFile"
+    fileType = models.CharField(max_length=constants.UPLOADSESSION_FILETYPE_MAX_LENGTH)
+    fileFormat = models.CharField(max_length=constants.FILE_FILEFORMAT_MAX_LENGTH)
+    fileSize = models.BigIntegerField()
+    chunkSize = models.IntegerField()
+    # optional SHA-256 hex digest announced by the client, checked on finalize
+    checksum = models.CharField(
+        max_length=constants.FILE_CHECKSUM_MAX_LENGTH, blank=True, default=""
+    )
+    created = models.DateTimeField(auto_now_add=True)
+    created_by = models.ForeignKey(
+        User,
+        blank=False,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name="uploadSessions",
+    )
+
+    class Meta:
+        ordering = ["created"]
+
+    def get_chunkCount(self) -> int:
+        return max(1, -(-self.fileSize // self.chunkSize))
+
+    def get_chunk_range(self, index: int) -> tuple[int, int]:
+        start = index * self.chunkSize
+        return start, min(start + self.chunkSize, self.fileSize)
+
+
+class UploadChunk(models.Model):
+    session = models.ForeignKey(
+        UploadSession, blank=False, related_name="chunks", on_delete=models.CASCADE
+    )
+    index = models.IntegerField()
+    size = models.IntegerField()
+
+    class Meta:
+        ordering = ["index"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["session", "index"], name="unique_uploadchunk_index"
+            )
+        ]
+
+
+# A zlib compressed block of labels, see versions.py. A chunk is shared by all
+# AnnotationVersions containing the same block and pruned with the last of them.
+class AnnotationChunk(models.Model):
+    sha256 = models.CharField(
+        max_length=constants.FILE_CHECKSUM_MAX_LENGTH, unique=True
+    )
+    # size of the compressed file
+    size = models.IntegerField()
+    file = models.FileField()
+
+
+# A former or the current state of the annotationFile of a ModelData. The labels are
+# stored as a list of AnnotationChunks.
+class AnnotationVersion(models.Model):
+    modelData = models.ForeignKey(
+        ModelData,
+        blank=False,
+        related_name="annotationVersions",
+        # the history is deleted with the ModelData, the chunks are pruned later on
+        on_delete=models.CASCADE,
+    )
+    number = models.IntegerField()
+    # SHA-256 hex digest of the annotationFile of this version
+    sha256 = models.CharField(
+        max_length=constants.FILE_CHECKSUM_MAX_LENGTH, blank=True, default=""
+    )
+    # number of labels, that is faces or points
+    count = models.BigIntegerField()
+    created = models.DateTimeField(auto_now_add=True)
+    created_by = models.ForeignKey(
+        User,
+        blank=False,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name="annotationVersions",
+    )
+    # number of the version this one was restored from
+    restoredFrom = models.IntegerField(blank=True, null=True, default=None)
+    chunks = models.ManyToManyField(
+        AnnotationChunk, through="AnnotationVersionChunk", related_name="versions"
+    )
+
+    class Meta:
+        ordering = ["number"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["modelData", "number"], name="unique_annotationversion_number"
+            )
+        ]
+
+
+class AnnotationVersionChunk(models.Model):
+    version = models.ForeignKey(
+        AnnotationVersion,
+        blank=False,
+        related_name="versionChunks",
+        on_delete=models.CASCADE,
+    )
+    chunk = models.ForeignKey(
+        AnnotationChunk,
+        blank=False,
+        related_name="versionChunks",
+        # chunks are only deleted once no version references them anymore
+        on_delete=models.PROTECT,
+    )
+    index = models.IntegerField()
+
+    class Meta:
+        ordering = ["index"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["version", "index"], name="unique_annotationversionchunk_index"
+            )
+        ]
+
+
+# A background job, see jobs.py. Jobs are run by `manage.py runworkers`.
+class Job(models.Model):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+    STATUS_CHOICES = [
+        (QUEUED, QUEUED),
+        (RUNNING, RUNNING),
+        (SUCCEEDED, SUCCEEDED),
+        (FAILED, FAILED),
+        (CANCELLED, CANCELLED),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # name of the registered task that runs the job
+    kind = models.CharField(max_length=constants.JOB_KIND_MAX_LENGTH)
+    arguments = models.JSONField(default=dict)
+    status = models.CharField(
+        max_length=constants.JOB_STATUS_MAX_LENGTH,
+        choices=STATUS_CHOICES,
+        default=QUEUED,
+    )
+    # jobs with a higher priority are run first
+    priority = models.IntegerField(default=0)
+    attempts = models.IntegerField(default=0)
+    maxAttempts = models.IntegerField(default=constants.JOB_MAX_ATTEMPTS)
+    # from 0 to 1, reported by the running task
+    progress = models.FloatField(default=0)
+    message = models.CharField(
+        max_length=constants.JOB_MESSAGE_MAX_LENGTH, blank=True, default=""
+    )
+    cancelRequested = models.BooleanField(default=False)
+    result = models.JSONField(blank=True, null=True, default=None)
+    error = models.TextField(blank=True, default="")
+    # the job is not run before this time, used to delay retries
+    runAfter = models.DateTimeField(default=timezone.now)
+    # updated by the worker while the job is running, see jobs.requeue_stale_jobs
+    heartbeat = models.DateTimeField(blank=True, null=True, default=None)
+    worker = models.CharField(
+        max_length=constants.JOB_WORKER_MAX_LENGTH, blank=True, default=""
+    )
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(blank=True, null=True, default=None)
+    finished = models.DateTimeField(blank=True, null=True, default=None)
+    created_by = models.ForeignKey(
+        User,
+        blank=False,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name="jobs",
+    )
+    # the ModelData the job works on, gives its project members access to the job
+    modelData = models.ForeignKey(
+        ModelData,
+        blank=True,
+        null=True,
+        related_name="jobs",
+        on_delete=models.CASCADE,
+    )
+
+    class Meta:
+        ordering = ["created"]
+        indexes = [
+            models.Index(
+                fields=["status", "-priority", "runAfter"], name="job_queue_index"
+            )
+        ]
+
+    def is_finished(self) -> bool:
+        return self.status in (Job.SUCCEEDED, Job.FAILED, Job.CANCELLED)
+
+
+# Cached agreement metrics of two annotationFiles, see agreement.py. The files are
+# identified by their content, so the metrics never become outdated.
+class AnnotationAgreement(models.Model):
+    sha256 = models.CharField(max_length=constants.FILE_CHECKSUM_MAX_LENGTH)
+    againstSha256 = models.CharField(max_length=constants.FILE_CHECKSUM_MAX_LENGTH)
+    result = models.JSONField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["sha256", "againstSha256"], name="unique_annotationagreement"
+            )
+        ]
+
+
+# Renders of the baseFile from one of the views of previews.py, with or without the
+# labels of the annotationFile. The key identifies everything it was drawn from.
+class PreviewRender(models.Model):
+    modelData = models.ForeignKey(
+        ModelData, related_name="previewRenders", on_delete=models.CASCADE
+    )
+    view = models.CharField(max_length=constants.PREVIEW_VIEW_MAX_LENGTH)
+    annotated = models.BooleanField(default=False)
+    key = models.CharField(max_length=constants.FILE_CHECKSUM_MAX_LENGTH)
+    # WebP image
+    image = models.BinaryField()
+    created = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["modelData", "view", "annotated"], name="unique_previewrender"
+            )
+        ]
+
+
+# The octree of tiles of a point cloud, see tiles.py. The tiles of all nodes are
+# stored one after another in one file.
+class TileSet(models.Model):
+    modelData = models.OneToOneField(
+        ModelData, related_name="tileSet", on_delete=models.CASCADE
+    )
+    key = models.CharField(max_length=constants.FILE_CHECKSUM_MAX_LENGTH)
+    file = models.FileField()
+    pointCount = models.BigIntegerField()
+    # whether the tiles contain the colors of the points
+    colors = models.BooleanField(default=False)
+    # {"min": [x, y, z], "max": [x, y, z]} of the root node
+    bounds = models.JSONField()
+    # {"<node id>": {"count", "bounds", "offset", "size"}} in the order of the file
+    nodes = models.JSONField()
+    created = models.DateTimeField(auto_now=True)
@@ -1,4 +1,5 @@
-from typing import Union
+import time
+from typing import Optional, Union
 
 from django.contrib.auth.models import User, AnonymousUser
 from django.db.models import Model
@@ -7,9 +8,77 @@ from rest_framework.permissions import BasePermission
 from rest_framework.request import Request
 from rest_framework.views import APIView
 
+from . import constants
 from . import models
 
 
+# Answers of membership checks of this worker process, by user and project, with the
+# time they expire. Only used if PROJECT_MEMBERSHIP_CACHE_TTL is set.
+class MembershipCache:
+    def __init__(self) -> None:
+        self.entries: dict[tuple[int, int], tuple[float, bool]] = {}
+
+    def get(self, key: tuple[int, int]) -> Optional[bool]:
+        entry = self.entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    def set(self, key: tuple[int, int], member: bool) -> None:
+        ttl = constants.PROJECT_MEMBERSHIP_CACHE_TTL
+        if ttl <= 0:
+            return
+        if len(self.entries) >= constants.PROJECT_MEMBERSHIP_CACHE_SIZE:
+            self.entries.clear()
+        self.entries[key] = (time.monotonic() + ttl, member)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+
+membershipCache = MembershipCache()
+
+
+# Returns the memoized membership checks of the request, by user and project. Without
+# a request, nothing is memoized.
+def get_request_memo(request: Optional[Request]) -> dict[tuple[int, int], bool]:
+    if request is None:
+        return {}
+    memo = getattr(request, "_projectMemberships", None)
+    if memo is None:
+        memo = {}
+        setattr(request, "_projectMemberships", memo)
+    return memo
+
+
+# Returns whether the user owns the project or is one of its members. Members are
+# looked up with an EXISTS query on the (project, user) index instead of loading all
+# of them. One request checks the same membership several times, so the answer is
+# memoized on the request and, for PROJECT_MEMBERSHIP_CACHE_TTL seconds, by the
+# worker process.
+def is_project_member(
+    user: Union[User, AnonymousUser],
+    project: models.Project,
+    request: Optional[Request] = None,
+) -> bool:
+    if user.pk is None:
+        return False
+    if user.pk == project.owner_id:
+        return True
+    key = (user.pk, project.pk)
+    memo = get_request_memo(request)
+    if key in memo:
+        return memo[key]
+    member = membershipCache.get(key)
+    if member is None:
+        member = models.Project.users.through.objects.filter(
+            project_id=project.pk, user_id=user.pk
+        ).exists()
+        membershipCache.set(key, member)
+    memo[key] = member
+    return member
+
+
 class IsPartOfProject(BasePermission):
     message = "You need to be a part of the project/s to use this."
     code = "missing_permission"
@@ -23,9 +92,7 @@ class IsPartOfProject(BasePermission):
         elif isinstance(temp_obj, models.Label):
             temp_obj = temp_obj.project
         if isinstance(temp_obj, models.Project):
-            return (
-                request.user in temp_obj.users.all() or request.user == temp_obj.owner
-            )
+            return is_project_member(request.user, temp_obj, request)
         raise Exception("Cannot use permission IsPartOfProject on the object!")
 
 
@@ -42,7 +109,7 @@ class IsProjectOwner(BasePermission):
         elif isinstance(temp_obj, models.Label):
             temp_obj = temp_obj.project
         if isinstance(temp_obj, models.Project):
-            return request.user == temp_obj.owner
+            return request.user.pk is not None and request.user.pk == temp_obj.owner_id
         raise Exception("Cannot use permission IsProjectOwner on the object!")
 
 
@@ -54,3 +121,19 @@ class DetailedUserPermission(BasePermission):
         self, request: Request, view: APIView, obj: Union[User, AnonymousUser]
     ) -> bool:
         return request.user == obj
+
+
+# Jobs are accessible to the user who created them and, if they work on a ModelData,
+# to the members of its project.
+class CanAccessJob(BasePermission):
+    message = "You need to have created the job or be a part of its project."
+    code = "missing_permission"
+
+    def has_object_permission(
+        self, request: Request, view: APIView, obj: models.Job
+    ) -> bool:
+        if obj.created_by_id is not None and request.user.pk == obj.created_by_id:
+            return True
+        return obj.modelData is not None and IsPartOfProject().has_object_permission(
+            request, view, obj.modelData
+        )
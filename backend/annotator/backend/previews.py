@@ -0,0 +1,398 @@
+import hashlib
+import io
+import math
+from typing import Any, Callable, Optional
+
+import numpy as np
+import numpy.typing as npt
+from django.contrib.auth.models import User
+from django.http import HttpRequest, HttpResponse
+from django.http.response import HttpResponseBase
+from django.utils.cache import get_conditional_response, patch_cache_control
+from PIL import Image
+
+from . import annotations
+from . import constants
+from . import downloads
+from . import geometry
+from . import jobs
+from . import models
+from .anno3d import Labels
+from .geometry import Geometry
+
+# Preview renders of baseFiles for the project overview, drawn by the background
+# workers without a GPU. The model is drawn from the six perspectives of the Views
+# menu of the annotator with an orthographic camera, point clouds as points and
+# meshes as flat shaded triangles. Annotated renders color the faces or points with
+# the labels of the annotationFile.
+#
+# Every set of renders has a key, the hash of everything it was drawn from. Renders
+# are only drawn again once their key changes, and browsers may cache them forever
+# under their key.
+#
+# Triangles are rasterized by sampling them densely enough to hit every pixel they
+# cover, so most of the work is done on whole blocks of triangles by numpy. The
+# renders are drawn PREVIEW_SUPERSAMPLING times larger and scaled down to smooth
+# the edges.
+
+# the direction from the model to the camera and the up direction of the image, see
+# setCameraPerspective in frontend/src/annotator/scene/controls
+VIEWS = {
+    "top": ((0, 0, 1), (0, 1, 0)),
+    "bottom": ((0, 0, -1), (0, 1, 0)),
+    "left": ((1, 0, 0), (0, 0, 1)),
+    "right": ((-1, 0, 0), (0, 0, 1)),
+    "front": ((0, 1, 0), (0, 0, 1)),
+    "back": ((0, -1, 0), (0, 0, 1)),
+}
+
+RENDER_JOB = "render_previews"
+# the material color of the annotator
+DEFAULT_COLOR = (0xCC, 0xCC, 0xCC)
+# share of the image left empty around the model
+MARGIN = 0.04
+# brightness of surfaces facing away from the camera and of the farthest points
+MIN_BRIGHTNESS = 0.35
+# precision of the depth buffer
+DEPTH_BITS = 24
+DEPTH_MAX = pow(2, DEPTH_BITS) - 1
+
+
+Progress = Callable[[int], None]
+
+
+# Identifies the content of a File, the hash if it is known.
+def get_content_id(fileObj: models.File) -> str:
+    return fileObj.sha256 or downloads.get_etag(fileObj)
+
+
+def get_render_key(modeldata: models.ModelData, annotated: bool) -> str:
+    if modeldata.baseFile is None:
+        raise ValueError("The ModelData has no baseFile.")
+    parts = [
+        f"size:{constants.PREVIEW_SIZE}",
+        f"modelType:{modeldata.modelType}",
+        f"base:{get_content_id(modeldata.baseFile)}",
+    ]
+    if annotated:
+        annotationFile = modeldata.annotationFile
+        content = get_content_id(annotationFile) if annotationFile else ""
+        labels = modeldata.project.labels.order_by("annotationClass", "pk")
+        colors = ",".join(
+            f"{annotationClass}={color}"
+            for annotationClass, color in labels.values_list("annotationClass", "color")
+        )
+        parts += [f"annotation:{content}", f"labels:{colors}"]
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+# Returns the views, whose render with the given key exists.
+def get_rendered_views(
+    modeldata: models.ModelData, annotated: bool, key: str
+) -> set[str]:
+    return set(
+        models.PreviewRender.objects.filter(
+            modelData=modeldata, annotated=annotated, key=key
+        ).values_list("view", flat=True)
+    )
+
+
+# Returns the job rendering the previews with the given key, which is started unless
+# there is one already, see jobs.enqueue_keyed.
+def start_rendering(
+    modeldata: models.ModelData, annotated: bool, key: str, user: Optional[User]
+) -> models.Job:
+    return jobs.enqueue_keyed(
+        RENDER_JOB, {"annotated": annotated, "key": key}, user, modeldata
+    )
+
+
+# Draws and stores the six renders of the ModelData. Returns the key and the sizes
+# of the images.
+def render_previews(
+    modeldata: models.ModelData, annotated: bool, progress: Progress
+) -> dict[str, Any]:
+    modeldata.refresh_from_db()
+    key = get_render_key(modeldata, annotated)
+    model = geometry.read_model(modeldata.baseFile)  # type: ignore[arg-type]
+    pointCloud = (
+        modeldata.modelType == constants.MODEL_TYPE_POINT_CLOUD
+        or model.triangles is None
+    )
+    labels = None
+    if annotated and modeldata.annotationFile is not None:
+        with modeldata.annotationFile.file.open("rb") as handle:
+            labels = annotations.read_archive(handle)[1]
+    colors = get_colors(model, pointCloud, labels, get_label_colors(modeldata))
+
+    sizes = {}
+    for done, view in enumerate(VIEWS, 1):
+        if pointCloud:
+            pixels = draw_points(model.positions, colors, view)
+        else:
+            pixels = draw_triangles(model, colors, view)
+        image = encode_webp(pixels)
+        models.PreviewRender.objects.update_or_create(
+            modelData=modeldata,
+            view=view,
+            annotated=annotated,
+            defaults={"key": key, "image": image},
+        )
+        sizes[view] = len(image)
+        progress(done)
+    return {"key": key, "sizes": sizes}
+
+
+# Returns the RGB colors of the annotation classes, known classes are marked by an
+# alpha of 255.
+def get_label_colors(modeldata: models.ModelData) -> npt.NDArray[np.uint8]:
+    lookup = np.zeros((constants.ANNO3D_NEUTRAL_CLASS + 1, 4), dtype=np.uint8)
+    for annotationClass, color in modeldata.project.labels.values_list(
+        "annotationClass", "color"
+    ):
+        if 0 <= annotationClass < constants.ANNO3D_NEUTRAL_CLASS:
+            lookup[annotationClass] = (
+                (color >> 16) & 0xFF,
+                (color >> 8) & 0xFF,
+                color & 0xFF,
+                0xFF,
+            )
+    return lookup
+
+
+# Returns the colors of the points or triangles. Triangles take the mean color of
+# their vertices. Labels of annotation classes without a Label are not shown.
+def get_colors(
+    model: Geometry,
+    pointCloud: bool,
+    labels: Optional[Labels],
+    labelColors: npt.NDArray[np.uint8],
+) -> npt.NDArray[np.uint8]:
+    if pointCloud:
+        count = len(model.positions)
+        colors = model.colors
+    else:
+        triangles = model.triangles
+        assert triangles is not None
+        count = len(triangles)
+        colors = None
+        if model.colors is not None:
+            colors = np.empty((count, 3), dtype=np.uint8)
+            for start in range(0, count, constants.PREVIEW_BLOCK_SIZE):
+                corners = model.colors[
+                    triangles[start : start + constants.PREVIEW_BLOCK_SIZE]
+                ]
+                colors[start : start + len(corners)] = corners.mean(axis=1)
+    if colors is None:
+        colors = np.tile(np.array(DEFAULT_COLOR, dtype=np.uint8), (count, 1))
+    else:
+        colors = colors.copy()
+    if labels is not None:
+        if len(labels) != count:
+            raise ValueError("The annotationFile does not match the baseFile.")
+        labelled = labelColors[labels]
+        known = labelled[:, 3] == 0xFF
+        colors[known] = labelled[known, :3]
+    return colors
+
+
+# Returns the rows right, up and towards the camera of the view.
+def get_view_axes(view: str) -> npt.NDArray[np.float64]:
+    towards, up = (np.array(v, dtype=np.float64) for v in VIEWS[view])
+    return np.stack([np.cross(up, towards), up, towards])
+
+
+class Canvas:
+    def __init__(self, positions: npt.NDArray[np.float32], view: str) -> None:
+        self.size = constants.PREVIEW_SIZE * constants.PREVIEW_SUPERSAMPLING
+        self.axes = get_view_axes(view)
+        # quantized depth of the drawn pixels, -1 where nothing was drawn
+        self.depth = np.full(self.size * self.size, -1, dtype=np.int64)
+        self.color = np.zeros((self.size * self.size, 3), dtype=np.uint8)
+        # fits the bounding box of the model into the image
+        low, high = np.zeros(3), np.ones(3)
+        if len(positions):
+            low = positions.min(axis=0).astype(np.float64)
+            high = positions.max(axis=0).astype(np.float64)
+        corners = np.array(
+            [
+                [(low, high)[(i >> axis) & 1][axis] for axis in range(3)]
+                for i in range(8)
+            ]
+        )
+        projected = corners @ self.axes.T
+        self.low, self.high = projected.min(axis=0), projected.max(axis=0)
+        extent = max(self.high[0] - self.low[0], self.high[1] - self.low[1], 1e-12)
+        self.scale = self.size * (1 - 2 * MARGIN) / extent
+        self.center = (self.low + self.high) / 2
+
+    # Returns x and y in pixels and the depth, which grows towards the camera.
+    def project(self, positions: npt.NDArray[Any]) -> npt.NDArray[np.float64]:
+        projected = positions.astype(np.float64) @ self.axes.T
+        projected[:, :2] -= self.center[:2]
+        projected[:, :2] *= self.scale
+        projected[:, 0] += self.size / 2
+        projected[:, 1] = self.size / 2 - projected[:, 1]
+        return projected
+
+    # Brightness by depth, the nearest points are the brightest.
+    def get_depth_brightness(
+        self, depth: npt.NDArray[np.float64]
+    ) -> npt.NDArray[np.float64]:
+        extent = max(self.high[2] - self.low[2], 1e-12)
+        relative = np.clip((depth - self.low[2]) / extent, 0.0, 1.0)
+        return MIN_BRIGHTNESS + (1 - MIN_BRIGHTNESS) * relative
+
+    # Draws the samples (x, y, depth) in the given colors, where they are nearer
+    # than what was drawn before.
+    def draw(self, samples: npt.NDArray[np.float64], colors: npt.NDArray[Any]) -> None:
+        x = np.floor(samples[:, 0]).astype(np.int64)
+        y = np.floor(samples[:, 1]).astype(np.int64)
+        inside = (x >= 0) & (x < self.size) & (y >= 0) & (y < self.size)
+        pixel = (y * self.size + x)[inside]
+        extent = max(self.high[2] - self.low[2], 1e-12)
+        relative = np.clip((samples[inside, 2] - self.low[2]) / extent, 0.0, 1.0)
+        depth = (relative * DEPTH_MAX).astype(np.int64)
+        # the nearest sample of each pixel, sorting by pixel and depth in one key is
+        # much faster than lexsort
+        order = np.argsort((pixel << DEPTH_BITS) | (DEPTH_MAX - depth))
+        pixel, depth = pixel[order], depth[order]
+        first = np.ones(len(pixel), dtype=bool)
+        first[1:] = pixel[1:] != pixel[:-1]
+        pixel, depth = pixel[first], depth[first]
+        colors = colors[inside][order[first]]
+        nearer = depth > self.depth[pixel]
+        self.depth[pixel[nearer]] = depth[nearer]
+        self.color[pixel[nearer]] = colors[nearer]
+
+    # Returns the image scaled down to PREVIEW_SIZE as RGBA pixels.
+    def get_pixels(self) -> npt.NDArray[np.uint8]:
+        factor = constants.PREVIEW_SUPERSAMPLING
+        size = constants.PREVIEW_SIZE
+        alpha = (self.depth >= 0).astype(np.float32)
+        rgba = np.empty((self.size * self.size, 4), dtype=np.float32)
+        # premultiplied, so that the empty background does not darken the edges
+        rgba[:, :3] = self.color * alpha[:, None]
+        rgba[:, 3] = alpha
+        rgba = rgba.reshape(size, factor, size, factor, 4).mean(axis=(1, 3))
+        covered = rgba[:, :, 3:] > 0
+        rgba[:, :, :3] = np.where(
+            covered, rgba[:, :, :3] / np.maximum(rgba[:, :, 3:], 1e-6), 0
+        )
+        rgba[:, :, 3] *= 255
+        return np.clip(np.rint(rgba), 0, 255).astype(np.uint8)
+
+
+def draw_points(
+    positions: npt.NDArray[np.float32], colors: npt.NDArray[np.uint8], view: str
+) -> npt.NDArray[np.uint8]:
+    # large point clouds are thinned out, they cover the image anyway
+    step = max(1, math.ceil(len(positions) / constants.PREVIEW_MAX_POINTS))
+    positions, colors = positions[::step], colors[::step]
+    canvas = Canvas(positions, view)
+    # points of sparse clouds are drawn larger, up to the mean spacing of the points
+    spacing = canvas.size / math.sqrt(max(len(positions), 1))
+    factor = constants.PREVIEW_SUPERSAMPLING
+    pointSize = int(min(max(spacing / 2, factor), 4 * factor))
+    offsets = np.array(
+        [(dx, dy) for dx in range(pointSize) for dy in range(pointSize)],
+        dtype=np.float64,
+    )
+    block = max(1, constants.PREVIEW_BLOCK_SIZE // len(offsets))
+    for start in range(0, len(positions), block):
+        projected = canvas.project(positions[start : start + block])
+        shaded = (
+            colors[start : start + block]
+            * canvas.get_depth_brightness(projected[:, 2])[:, None]
+        )
+        samples = np.repeat(projected, len(offsets), axis=0)
+        samples[:, :2] += np.tile(offsets - pointSize // 2, (len(projected), 1))
+        canvas.draw(samples, np.repeat(shaded.astype(np.uint8), len(offsets), axis=0))
+    return canvas.get_pixels()
+
+
+# Returns the barycentric weights of a triangular grid with `level` steps per edge.
+# Level 0 is the centroid.
+def get_barycentric_grid(level: int) -> npt.NDArray[np.float64]:
+    if level == 0:
+        return np.full((1, 3), 1 / 3)
+    i, j = np.divmod(np.arange((level + 1) * (level + 1)), level + 1)
+    inside = i + j <= level
+    i, j = i[inside] / level, j[inside] / level
+    return np.stack([1 - i - j, i, j], axis=1)
+
+
+def draw_triangles(
+    model: Geometry, colors: npt.NDArray[np.uint8], view: str
+) -> npt.NDArray[np.uint8]:
+    triangles = model.triangles
+    assert triangles is not None
+    canvas = Canvas(model.positions, view)
+    towards = canvas.axes[2]
+    for start in range(0, len(triangles), constants.PREVIEW_BLOCK_SIZE):
+        block = triangles[start : start + constants.PREVIEW_BLOCK_SIZE]
+        vertices = model.positions[block].astype(np.float64)
+        # flat shading, lit from the camera
+        normals = np.cross(
+            vertices[:, 1] - vertices[:, 0], vertices[:, 2] - vertices[:, 0]
+        )
+        lengths = np.linalg.norm(normals, axis=1)
+        facing = np.abs(normals @ towards) / np.maximum(lengths, 1e-30)
+        brightness = MIN_BRIGHTNESS + (1 - MIN_BRIGHTNESS) * facing
+        shaded = (colors[start : start + len(block)] * brightness[:, None]).astype(
+            np.uint8
+        )
+        corners = canvas.project(vertices.reshape(-1, 3)).reshape(-1, 3, 3)
+        # samples at most a pixel apart leave no gaps, triangles smaller than a pixel
+        # are drawn at their centroid
+        edges = corners[:, :, :2] - np.roll(corners[:, :, :2], 1, axis=1)
+        longest = np.sqrt((edges**2).sum(axis=2)).max(axis=1)
+        levels = np.where(longest < 1, 0, np.minimum(np.ceil(longest), canvas.size))
+        # meshes of many large triangles are sampled more sparsely
+        budget = constants.PREVIEW_MAX_SAMPLES * len(block) / len(triangles)
+        samples = ((levels + 1) * (levels + 2) / 2).sum()
+        if samples > budget:
+            levels = np.floor(levels * math.sqrt(budget / samples))
+        levels = levels.astype(np.int64)
+        for level in np.unique(levels):
+            selected = np.flatnonzero(levels == level)
+            weights = get_barycentric_grid(int(level))
+            step = max(1, constants.PREVIEW_BLOCK_SIZE // len(weights))
+            for first in range(0, len(selected), step):
+                chosen = selected[first : first + step]
+                samples = np.einsum("kv,tvc->tkc", weights, corners[chosen])
+                canvas.draw(
+                    samples.reshape(-1, 3),
+                    np.repeat(shaded[chosen], len(weights), axis=0),
+                )
+    return canvas.get_pixels()
+
+
+def encode_webp(pixels: npt.NDArray[np.uint8]) -> bytes:
+    buffer = io.BytesIO()
+    Image.fromarray(pixels, "RGBA").save(
+        buffer, "WEBP", quality=constants.PREVIEW_WEBP_QUALITY
+    )
+    return buffer.getvalue()
+
+
+# Answers with the render. Requests with the key of the render in their `key`
+# parameter may be cached forever, other ones are revalidated.
+def image_response(
+    request: HttpRequest, render: models.PreviewRender
+) -> HttpResponseBase:
+    etag = f'"{render.key}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(bytes(render.image), content_type="image/webp")
+    response.headers["ETag"] = etag
+    if request.GET.get("key") == render.key:
+        patch_cache_control(
+            response,
+            private=True,
+            max_age=constants.PREVIEW_CACHE_MAX_AGE,
+            immutable=True,
+        )
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -1,14 +1,23 @@
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
 from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
 
-from typing import Any, Union
+from typing import Any, Optional, Union
 
+import numpy as np
+import numpy.typing as npt
 from django.db.models import QuerySet
 from rest_framework import serializers, validators
 
 from . import models
 from . import constants
+from . import annotations
+from . import archives
+from . import blobs
+from . import consensus
+from . import uploads
+from .anno3d import AnnotationFileError, Labels
 
 
 # Readonly serializer for the User model. It only returns a reduced representation.
@@ -64,11 +73,12 @@ class UserSerializer(ReducedUserSerializer):
         return user
 
 
-# Readonly serializer for the File model.
+# Readonly serializer for the File model. Only reads the stored columns, never the
+# storage.
 class FileSerializer(serializers.Serializer[models.File]):
     fileFormat = serializers.CharField(read_only=True)
     uploadDate = serializers.DateTimeField(read_only=True)
-    fileSize = serializers.IntegerField(read_only=True, source="get_fileSize")
+    fileSize = serializers.IntegerField(read_only=True)
     uploaded_by = ReducedUserSerializer(read_only=True)
 
 
@@ -77,27 +87,47 @@ class FileSerializer(serializers.Serializer[models.File]):
 class FileUploadSerializer(FileSerializer):
     file = serializers.FileField(write_only=True)
     fileFormat = serializers.CharField(max_length=constants.FILE_FILEFORMAT_MAX_LENGTH)
+    # the members of the validated archive, None if the stored content differs
+    archiveMembers: Optional[list[archives.ArchiveMember]] = None
 
+    # the content is stored and referenced in one transaction, see blobs
+    @transaction.atomic
     def create(self, validated_data: dict[str, Any]) -> models.File:
+        content = validated_data.pop("file")
         fileObj = models.File(**validated_data)
+        blob = self.store_content(content)
+        blobs.assign_blob(fileObj, blob, self.archiveMembers)
         fileObj.save()
         return fileObj
 
-    # annotationFile can be lost when interrupting between deletion of old file and
-    # saving of new file
+    # the new content is stored before the File is switched to it, see
+    # blobs.replace_content
+    @transaction.atomic
     def update(
         self, instance: models.File, validated_data: dict[str, Any]
     ) -> models.File:
         instance.uploaded_by = validated_data["uploaded_by"]
-        oldFile = instance.file
-        oldFile.delete()
-        instance.file = validated_data["file"]
-        instance.save()
+        blob = self.store_content(validated_data["file"])
+        blobs.replace_content(instance, blob, self.archiveMembers)
         return instance
 
+    def store_content(self, content: UploadedFile) -> models.Blob:
+        return blobs.store_file(content)
+
+    # Remembers the members of the archive. Files streamed through the
+    # HashingFileUploadHandler were scanned while they were uploaded, their local
+    # headers have to match the central directory.
+    def set_archive_members(
+        self, value: UploadedFile, members: list[archives.ArchiveMember]
+    ) -> None:
+        scanned = getattr(value, "archiveMembers", None)
+        if scanned is not None:
+            archives.check_scanned_members(scanned, members)
+        self.archiveMembers = members if scanned is None else scanned
+
 
-# A more specific FileUploadSerializer for BaseFiles. Checks for a maximum filesize
-# and the filename. Does not support updates.
+# A more specific FileUploadSerializer for BaseFiles. Checks for a maximum filesize,
+# the filename and the content of the zip archive. Does not support updates.
 class BaseFileUploadSerializer(FileUploadSerializer):
     def update(
         self, instance: models.File, validated_data: dict[str, Any]
@@ -115,12 +145,26 @@ class BaseFileUploadSerializer(FileUploadSerializer):
             raise serializers.ValidationError(
                 "BaseFile has to be named 'baseFile.zip'.", code="wrong_name"
             )
+        try:
+            self.set_archive_members(value, archives.validate_basefile_archive(value))
+        except archives.ArchiveError as error:
+            raise serializers.ValidationError(error.message, code=error.code)
         return value
 
 
 # A more specific FileUploadSerializer for AnnotationFiles. Checks for a maximum
-# filesize and the filename.
+# filesize, the filename and the content of the zip archive, which has to be a
+# parsable anno3d file. Annotations are stored in the canonical anno3d format.
 class AnnotationFileUploadSerializer(FileUploadSerializer):
+    annotationFormat: str
+    labels: Labels
+
+    def store_content(self, content: UploadedFile) -> models.Blob:
+        if self.annotationFormat == annotations.CANONICAL_FORMAT:
+            return blobs.store_file(content)
+        self.archiveMembers = None
+        return annotations.store_labels(self.labels)
+
     def validate_file(self, value: UploadedFile) -> UploadedFile:
         if value.size is None:
             raise Exception("File error. File size should not be none!")
@@ -133,6 +177,133 @@ class AnnotationFileUploadSerializer(FileUploadSerializer):
                 "AnnotationFile has to be named 'annotationFile.zip'.",
                 code="wrong_name",
             )
+        try:
+            members = archives.validate_annotationfile_archive(value)
+            self.set_archive_members(value, members)
+            self.annotationFormat, self.labels = annotations.read_archive(value)
+        except (archives.ArchiveError, AnnotationFileError) as error:
+            raise serializers.ValidationError(error.message, code=error.code)
+        return value
+
+
+# Field for the changes of an annotation patch, a list of [start, end, annotation
+# class] lists. The list is converted to a NumPy array in one go instead of
+# validating every number on its own.
+class AnnotationChangesField(serializers.Field):
+    default_error_messages = {
+        "invalid": "Expected a list of [start, end, annotationClass] lists.",
+        "empty": "The list of changes may not be empty.",
+        "too_many": "The list of changes may contain at most {max_length} entries.",
+        "out_of_range": (
+            "Indices have to be non-negative and classes at most {max_class}."
+        ),
+    }
+
+    def to_internal_value(self, data: Any) -> npt.NDArray[np.int64]:
+        if not isinstance(data, list):
+            self.fail("invalid")
+        if len(data) == 0:
+            self.fail("empty")
+        if len(data) > constants.ANNO3D_MAX_PATCH_CHANGES:
+            self.fail("too_many", max_length=constants.ANNO3D_MAX_PATCH_CHANGES)
+        try:
+            changes = np.array(data)
+        except ValueError:
+            self.fail("invalid")
+        # floats, strings and nested lists of the wrong shape are rejected as well
+        if changes.dtype.kind != "i" or changes.ndim != 2 or changes.shape[1] != 3:
+            self.fail("invalid")
+        if (changes < 0).any() or (
+            changes[:, 2] > constants.ANNO3D_NEUTRAL_CLASS
+        ).any():
+            self.fail("out_of_range", max_class=constants.ANNO3D_NEUTRAL_CLASS)
+        return changes.astype(np.int64)
+
+    def to_representation(self, value: npt.NDArray[np.int64]) -> list[list[int]]:
+        return value.tolist()  # pragma: no cover
+
+
+# Serializer for patches of annotationFiles. The ranges of the changes exclude their
+# end, an annotation class of ANNO3D_NEUTRAL_CLASS removes the labels.
+class AnnotationPatchSerializer(serializers.Serializer[models.File]):
+    changes = AnnotationChangesField()
+
+
+# Serializer for consensus merges. The sources are the ids of the ModelData whose
+# annotations are merged, see consensus.py.
+class ConsensusMergeSerializer(serializers.Serializer[models.ModelData]):
+    sources = serializers.ListField(
+        child=serializers.IntegerField(),
+        min_length=2,
+        max_length=constants.CONSENSUS_MAX_SOURCES,
+    )
+    tieBreak = serializers.ChoiceField(
+        choices=consensus.TIE_BREAKS, default=consensus.TIE_BREAK_NEUTRAL
+    )
+    minAgreement = serializers.FloatField(min_value=0.0, max_value=1.0, default=0.0)
+
+
+# Readonly serializer for the AnnotationVersion model.
+class AnnotationVersionSerializer(serializers.Serializer[models.AnnotationVersion]):
+    number = serializers.IntegerField(read_only=True)
+    created = serializers.DateTimeField(read_only=True)
+    created_by = ReducedUserSerializer(read_only=True)
+    count = serializers.IntegerField(read_only=True)
+    sha256 = serializers.CharField(read_only=True)
+    restoredFrom = serializers.IntegerField(read_only=True)
+
+
+# Readonly serializer for the Job model.
+class JobSerializer(serializers.Serializer[models.Job]):
+    job_id = serializers.UUIDField(read_only=True, source="pk")
+    kind = serializers.CharField(read_only=True)
+    status = serializers.CharField(read_only=True)
+    priority = serializers.IntegerField(read_only=True)
+    progress = serializers.FloatField(read_only=True)
+    message = serializers.CharField(read_only=True)
+    attempts = serializers.IntegerField(read_only=True)
+    maxAttempts = serializers.IntegerField(read_only=True)
+    cancelRequested = serializers.BooleanField(read_only=True)
+    result = serializers.JSONField(read_only=True)
+    error = serializers.CharField(read_only=True)
+    created = serializers.DateTimeField(read_only=True)
+    started = serializers.DateTimeField(read_only=True)
+    finished = serializers.DateTimeField(read_only=True)
+    modelData_id = serializers.IntegerField(read_only=True)
+
+
+# Serializer for resumable UploadSessions. Can create sessions and returns their
+# progress. For creation, the modelData, fileType and created_by arguments have to be
+# included when calling .save().
+class UploadSessionSerializer(serializers.Serializer[models.UploadSession]):
+    session_id = serializers.UUIDField(read_only=True, source="pk")
+    fileType = serializers.CharField(read_only=True)
+    fileFormat = serializers.CharField(max_length=constants.FILE_FILEFORMAT_MAX_LENGTH)
+    fileSize = serializers.IntegerField(min_value=1)
+    chunkSize = serializers.IntegerField(
+        min_value=constants.UPLOAD_MIN_CHUNK_SIZE,
+        max_value=constants.UPLOAD_MAX_CHUNK_SIZE,
+        default=constants.UPLOAD_DEFAULT_CHUNK_SIZE,
+    )
+    checksum = serializers.RegexField(
+        r"^[0-9a-f]{64}$", required=False, allow_blank=True
+    )
+    chunkCount = serializers.IntegerField(read_only=True, source="get_chunkCount")
+    receivedRanges = serializers.SerializerMethodField()
+    created = serializers.DateTimeField(read_only=True)
+
+    def create(self, validated_data: dict[str, Any]) -> models.UploadSession:
+        session = models.UploadSession(**validated_data)
+        session.save()
+        uploads.create_part_file(session)
+        return session
+
+    def get_receivedRanges(self, obj: models.UploadSession) -> list[list[int]]:
+        return uploads.get_received_ranges(obj)
+
+    def validate_fileSize(self, value: int) -> int:
+        if value >= constants.FILE_MAX_FILESIZE:
+            raise serializers.ValidationError("File is too large.", code="too_large")
         return value
 
 
@@ -204,6 +375,14 @@ class ModelDataSerializer(
     baseFile = FileSerializer(read_only=True)
     annotationFile = FileSerializer(read_only=True)
     locked = ReducedUserSerializer(read_only=True)
+    # the index of the baseFile, null until it is indexed
+    vertexCount = serializers.IntegerField(read_only=True)
+    faceCount = serializers.IntegerField(read_only=True)
+    attributes = serializers.ListField(child=serializers.CharField(), read_only=True)
+    bounds = serializers.DictField(
+        child=serializers.ListField(child=serializers.FloatField()), read_only=True
+    )
+    centroid = serializers.ListField(child=serializers.FloatField(), read_only=True)
     project_id = serializers.PrimaryKeyRelatedField(
         queryset=models.Project.objects.all(), write_only=False, source="project"
     )
@@ -2,14 +2,18 @@ from django.core.files.storage import default_storage, Storage
 
 from typing import Union, Type, Any
 
+from django.db import transaction
 from django.db.models import Model
-from django.db.models.signals import post_delete
+from django.db.models.signals import m2m_changed, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.signals import user_logged_out
 from django.contrib.auth.models import User
 from rest_framework.request import Request
 
+from . import blobs
 from . import models
+from . import permissions
+from . import uploads
 from annotator.backend.utils import unlock_modeldata_from_user
 
 
@@ -24,25 +28,59 @@ def post_delete_modeldata_handler(
         instance.annotationFile.delete()
     if instance.baseFile is not None:
         path = instance.baseFile.filePath
-        storage: Storage = default_storage
         instance.baseFile.delete()
-        # delete modelData directory
-        storage.delete(path)
-        path = path.rstrip("/")
-        index = path.rfind("/")
-        project_path = path[:index]
-        files = storage.listdir(project_path)
-        # if the project directory is empty, delete it
-        if len(files[0]) == 0 and len(files[1]) == 0:
-            storage.delete(project_path)
-
-
-# deletes the file of the File model from the disk
+        # the files of the File are removed once the deletion is committed
+        transaction.on_commit(lambda: delete_modeldata_directory(path))
+
+
+def delete_modeldata_directory(path: str) -> None:
+    storage: Storage = default_storage
+    # delete modelData directory, files stored in the blob store never created it
+    if not storage.exists(path):
+        return
+    storage.delete(path)
+    path = path.rstrip("/")
+    index = path.rfind("/")
+    project_path = path[:index]
+    files = storage.listdir(project_path)
+    # if the project directory is empty, delete it
+    if len(files[0]) == 0 and len(files[1]) == 0:
+        storage.delete(project_path)
+
+
+# deletes the file of the File model from the disk, once it is not shared anymore and
+# the deletion is committed
 @receiver(post_delete, sender=models.File)
 def post_delete_file_handler(
     sender: Union[Type[Model], str], instance: models.File, **kwargs: dict[str, Any]
 ) -> None:
-    instance.file.delete()
+    blobs.release_content(instance.blob_id, instance.file.name)
+
+
+# removes the part file of finished or aborted upload sessions
+@receiver(post_delete, sender=models.UploadSession)
+def post_delete_uploadsession_handler(
+    sender: Union[Type[Model], str],
+    instance: models.UploadSession,
+    **kwargs: dict[str, Any]
+) -> None:
+    uploads.delete_session_files(instance)
+
+
+# removes the file of the tiles of a point cloud
+@receiver(post_delete, sender=models.TileSet)
+def post_delete_tileset_handler(
+    sender: Union[Type[Model], str], instance: models.TileSet, **kwargs: dict[str, Any]
+) -> None:
+    default_storage.delete(instance.file.name)
+
+
+# members that were removed lose their access at once, at least in this worker process
+@receiver(m2m_changed, sender=models.Project.users.through)
+def project_users_changed_handler(
+    sender: Union[Type[Model], str], **kwargs: dict[str, Any]
+) -> None:
+    permissions.membershipCache.clear()
 
 
 @receiver(user_logged_out)
@@ -0,0 +1,89 @@
+from typing import Any
+
+from . import consensus
+from . import constants
+from . import geometry
+from . import jobs
+from . import models
+from . import previews
+from . import tiles
+from . import versions
+
+
+# Tasks run by the background workers, see jobs.py. This module is imported when the
+# app is ready, so every process knows all tasks.
+
+
+@jobs.task("prune_annotation_versions")
+def prune_annotation_versions(job: models.Job) -> Any:
+    return versions.prune_versions(**job.arguments)
+
+
+# Merges the annotations of the ModelData `sources` into the annotationFile of the
+# ModelData of the job.
+@jobs.task("merge_annotations")
+def merge_annotations(job: models.Job) -> Any:
+    if job.modelData is None:
+        raise ValueError("The job has no ModelData.")
+    sourceIds = job.arguments["sources"]
+    byId = models.ModelData.objects.select_related("annotationFile").in_bulk(sourceIds)
+    missing = [pk for pk in sourceIds if pk not in byId]
+    if missing:
+        raise ValueError(f"The ModelData {missing} do not exist anymore.")
+
+    def progress(done: int) -> None:
+        jobs.report_progress(
+            job, done / (len(sourceIds) + 1), f"Read {done} of {len(sourceIds)}."
+        )
+
+    return consensus.merge_annotations(
+        job.modelData,
+        [byId[pk] for pk in sourceIds],
+        job.created_by,
+        job.arguments.get("tieBreak", consensus.TIE_BREAK_NEUTRAL),
+        job.arguments.get("minAgreement", 0.0),
+        progress,
+    )
+
+
+# Draws the preview renders of the ModelData of the job, see previews.py.
+@jobs.task(previews.RENDER_JOB)
+def render_previews(job: models.Job) -> Any:
+    if job.modelData is None:
+        raise ValueError("The job has no ModelData.")
+
+    def progress(done: int) -> None:
+        jobs.report_progress(
+            job,
+            done / len(previews.VIEWS),
+            f"Rendered {done} of {len(previews.VIEWS)} views.",
+        )
+
+    return previews.render_previews(
+        job.modelData, job.arguments.get("annotated", False), progress
+    )
+
+
+# Indexes the baseFile of the ModelData of the job, see geometry.py. Point clouds are
+# tiled afterwards.
+@jobs.task(geometry.INDEX_JOB)
+def index_geometry(job: models.Job) -> Any:
+    if job.modelData is None:
+        raise ValueError("The job has no ModelData.")
+    result = geometry.index_basefile(job.modelData)
+    if job.modelData.modelType == constants.MODEL_TYPE_POINT_CLOUD:
+        key = tiles.get_tiles_key(job.modelData)
+        tiles.start_tiling(job.modelData, key, job.created_by)
+    return result
+
+
+# Builds the octree tiles of the point cloud of the job, see tiles.py.
+@jobs.task(tiles.TILE_JOB)
+def build_tiles(job: models.Job) -> Any:
+    if job.modelData is None:
+        raise ValueError("The job has no ModelData.")
+
+    def progress(done: int, total: int) -> None:
+        jobs.report_progress(job, done / total, f"Tiled {done} of {total} points.")
+
+    return tiles.build_tiles(job.modelData, progress)
@@ -0,0 +1,260 @@
+import hashlib
+import os
+from collections import deque
+from typing import Any, Callable, Optional
+
+import numpy as np
+import numpy.typing as npt
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.http import HttpRequest, HttpResponse
+from django.http.response import HttpResponseBase
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+from . import blobs
+from . import constants
+from . import geometry
+from . import jobs
+from . import models
+from . import previews
+
+# Octree tiles of point clouds, so that the annotator can show a coarse model within
+# seconds and load the details of the parts it shows later, instead of downloading
+# and parsing the whole baseFile first.
+#
+# The root node "r" covers the bounding cube of the points, the children of a node
+# append the digit of their octant, x * 4 + y * 2 + z with 1 for the upper half of
+# an axis, e.g. "r07". Every node keeps a subsample of the points it covers, at most
+# one point of each cell of a TILE_GRID_SIZE^3 grid and at most TILE_MAX_POINTS, and
+# passes the rest on to its children. Every point is kept by exactly one node, so
+# the levels of the octree refine each other. The points are shuffled first, so the
+# subsample of a cell is random. Points with non-finite coordinates are left out.
+#
+# All tiles are stored one after another in one file, in breadth first order. A tile
+# of n points is little endian binary:
+#   uint32[n]     the indices of the points in the baseFile, which labels refer to
+#   uint16[n][3]  the positions, quantized to the bounding cube of the node
+#   uint8[n][3]   the colors, only if the model has colors
+
+TILE_JOB = "build_tiles"
+# changes whenever the tiles would be built differently
+TILE_FORMAT = 1
+QUANTIZATION_MAX = pow(2, 16) - 1
+# the children of a node by octant, as multiples of the half size of the node
+OCTANTS = np.array([(x, y, z) for x in (0, 1) for y in (0, 1) for z in (0, 1)])
+
+
+Progress = Callable[[int, int], None]
+
+
+def get_tiles_key(modeldata: models.ModelData) -> str:
+    if modeldata.baseFile is None:
+        raise ValueError("The ModelData has no baseFile.")
+    parts = [
+        f"format:{TILE_FORMAT}",
+        f"maxPoints:{constants.TILE_MAX_POINTS}",
+        f"gridSize:{constants.TILE_GRID_SIZE}",
+        f"maxDepth:{constants.TILE_MAX_DEPTH}",
+        f"base:{previews.get_content_id(modeldata.baseFile)}",
+    ]
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+def get_tile_set(modeldata: models.ModelData, key: str) -> Optional[models.TileSet]:
+    return models.TileSet.objects.filter(modelData=modeldata, key=key).first()
+
+
+# Returns the job building the tiles with the given key, which is started unless
+# there is one already, see jobs.enqueue_keyed.
+def start_tiling(
+    modeldata: models.ModelData, key: str, user: Optional[User]
+) -> models.Job:
+    return jobs.enqueue_keyed(TILE_JOB, {"key": key}, user, modeldata)
+
+
+# Builds and stores the tiles of the ModelData, replacing former ones. Returns the
+# key and the number of nodes.
+def build_tiles(modeldata: models.ModelData, progress: Progress) -> dict[str, Any]:
+    modeldata.refresh_from_db()
+    key = get_tiles_key(modeldata)
+    model = geometry.read_model(modeldata.baseFile)  # type: ignore[arg-type]
+    positions = model.positions
+    finite = np.flatnonzero(np.isfinite(positions).all(axis=1))
+    if not len(finite):
+        raise ValueError("The model has no points.")
+    low = positions[finite].min(axis=0).astype(np.float64)
+    size = float((positions[finite].max(axis=0) - low).max()) or 1.0
+
+    name = os.path.join(constants.TILE_DIR, str(modeldata.pk), f"{key}.bin")
+    temp = blobs.get_temp_path()
+    try:
+        with open(temp, "wb") as out:
+            nodes = write_tiles(out, model, finite, low, size, progress)
+        target = default_storage.path(name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(temp, target)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+
+    former = models.TileSet.objects.filter(modelData=modeldata).first()
+    models.TileSet.objects.update_or_create(
+        modelData=modeldata,
+        defaults={
+            "key": key,
+            "file": name,
+            "pointCount": len(positions),
+            "colors": model.colors is not None,
+            "bounds": get_bounds(low, size),
+            "nodes": nodes,
+        },
+    )
+    if former is not None and former.file.name != name:
+        default_storage.delete(former.file.name)
+    return {"key": key, "nodes": len(nodes)}
+
+
+# Distributes the points with the given indices over the octree, writes the tiles
+# and returns the nodes.
+def write_tiles(
+    out: Any,
+    model: geometry.Geometry,
+    indices: npt.NDArray[np.int64],
+    low: npt.NDArray[np.float64],
+    size: float,
+    progress: Progress,
+) -> dict[str, dict[str, Any]]:
+    rng = np.random.default_rng(0)
+    queue = deque([("r", low, size, rng.permutation(indices).astype(np.uint32))])
+    nodes: dict[str, dict[str, Any]] = {}
+    offset = 0
+    done = 0
+    depth = 0
+    while queue:
+        node, origin, nodeSize, members = queue.popleft()
+        # the progress is reported once per level
+        if len(node) - 1 > depth:
+            depth = len(node) - 1
+            progress(done, len(indices))
+        if (
+            len(members) <= constants.TILE_MAX_POINTS
+            or depth >= constants.TILE_MAX_DEPTH
+        ):
+            kept, rest, cells = members, members[:0], None
+        else:
+            cells = get_cells(model.positions, members, origin, nodeSize)
+            keep = subsample(cells)
+            kept, rest, cells = members[keep], members[~keep], cells[~keep]
+        tile = encode_tile(model, kept, origin, nodeSize)
+        out.write(tile)
+        nodes[node] = {
+            "count": len(kept),
+            "bounds": get_bounds(origin, nodeSize),
+            "offset": offset,
+            "size": len(tile),
+        }
+        offset += len(tile)
+        done += len(kept)
+        if cells is None or not len(rest):
+            continue
+        octants = get_octants(cells)
+        # a radix sort for small integers
+        order = np.argsort(octants, kind="stable")
+        ends = np.cumsum(np.bincount(octants, minlength=len(OCTANTS)))
+        half = nodeSize / 2
+        for octant, part in enumerate(np.split(rest[order], ends[:-1])):
+            if len(part):
+                child = origin + OCTANTS[octant] * half
+                queue.append((f"{node}{octant}", child, half, part))
+    progress(done, len(indices))
+    return nodes
+
+
+# Returns the cells of the members in the grid of the cube of their node.
+def get_cells(
+    positions: npt.NDArray[np.float32],
+    members: npt.NDArray[np.uint32],
+    origin: npt.NDArray[np.float64],
+    size: float,
+) -> npt.NDArray[np.int64]:
+    grid = constants.TILE_GRID_SIZE
+    cells = np.empty(len(members), dtype=np.int64)
+    for start in range(0, len(members), constants.PREVIEW_BLOCK_SIZE):
+        block = members[start : start + constants.PREVIEW_BLOCK_SIZE]
+        coordinates = np.floor((positions[block] - origin) / size * grid)
+        coordinates = np.clip(coordinates, 0, grid - 1).astype(np.int64)
+        cells[start : start + len(block)] = (
+            coordinates[:, 0] * grid + coordinates[:, 1]
+        ) * grid + coordinates[:, 2]
+    return cells
+
+
+# Returns which members a node keeps, one of each cell and at most TILE_MAX_POINTS.
+# The members are in random order, so any member of a cell will do.
+def subsample(cells: npt.NDArray[np.int64]) -> npt.NDArray[np.bool_]:
+    chosen = np.full(pow(constants.TILE_GRID_SIZE, 3), -1, dtype=np.int64)
+    chosen[cells] = np.arange(len(cells))
+    chosen = np.sort(chosen[chosen >= 0])[: constants.TILE_MAX_POINTS]
+    keep = np.zeros(len(cells), dtype=bool)
+    keep[chosen] = True
+    return keep
+
+
+# Returns the octants of the cells, the upper halves of the grid are the upper halves
+# of the node.
+def get_octants(cells: npt.NDArray[np.int64]) -> npt.NDArray[np.uint8]:
+    grid = constants.TILE_GRID_SIZE
+    half = grid // 2
+    upper = (
+        (cells // (grid * grid) >= half) * 4
+        + (cells // grid % grid >= half) * 2
+        + (cells % grid >= half)
+    )
+    return upper.astype(np.uint8)
+
+
+def encode_tile(
+    model: geometry.Geometry,
+    kept: npt.NDArray[np.uint32],
+    origin: npt.NDArray[np.float64],
+    size: float,
+) -> bytes:
+    quantized = (model.positions[kept] - origin) / size * QUANTIZATION_MAX
+    parts = [
+        kept.astype("<u4").tobytes(),
+        np.clip(np.rint(quantized), 0, QUANTIZATION_MAX).astype("<u2").tobytes(),
+    ]
+    if model.colors is not None:
+        parts.append(model.colors[kept].tobytes())
+    return b"".join(parts)
+
+
+def get_bounds(origin: npt.NDArray[np.float64], size: float) -> dict[str, list[float]]:
+    return {"min": origin.tolist(), "max": (origin + size).tolist()}
+
+
+# Answers with the tile of the node. Like preview renders, requests with the key of
+# the tiles in their `key` parameter may be cached forever.
+def tile_response(
+    request: HttpRequest, tileSet: models.TileSet, node: str
+) -> HttpResponseBase:
+    etag = f'"{tileSet.key}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        info = tileSet.nodes[node]
+        with tileSet.file.open("rb") as handle:
+            handle.seek(info["offset"])
+            tile = handle.read(info["size"])
+        response = HttpResponse(tile, content_type="application/octet-stream")
+        response.headers["X-Point-Count"] = str(info["count"])
+    response.headers["ETag"] = etag
+    if request.GET.get("key") == tileSet.key:
+        patch_cache_control(
+            response,
+            private=True,
+            max_age=constants.PREVIEW_CACHE_MAX_AGE,
+            immutable=True,
+        )
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,124 @@
+import hashlib
+import zlib
+from typing import Any, BinaryIO, Optional
+
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.http import HttpRequest
+
+from rest_framework import exceptions
+
+from . import archives
+from . import constants
+from .exceptions import PayloadTooLarge
+
+# Content type of uploads whose body is the zip archive itself instead of a multipart
+# form, see receive_raw_body.
+RAW_CONTENT_TYPE = "application/zip"
+
+
+# Streams uploaded files to a temporary file like Django's TemporaryFileUploadHandler
+# and computes everything that is stored about them in the same pass: the SHA-256,
+# the size and the members of the zip archive from its local headers. They are
+# available as the sha256, size and archiveMembers attributes of the resulting
+# TemporaryUploadedFile, so the file never has to be read again before it is moved
+# into the blob store. archiveMembers is None if the local headers could not be
+# followed, see archives.LocalHeaderScanner.
+#
+# Files of maxSize bytes or more are rejected with 413 as soon as that many bytes
+# were received, the temporary file is removed and the rest of the body is not read.
+class HashingFileUploadHandler(TemporaryFileUploadHandler):
+    def __init__(
+        self, request: Optional[HttpRequest] = None, maxSize: Optional[int] = None
+    ) -> None:
+        super().__init__(request)
+        self.maxSize = maxSize
+
+    def new_file(self, *args: Any, **kwargs: Any) -> None:
+        super().new_file(*args, **kwargs)
+        self.digest = hashlib.sha256()
+        self.scanner = archives.LocalHeaderScanner()
+
+    def receive_data_chunk(self, raw_data: bytes, start: int) -> Optional[bytes]:
+        if self.maxSize is not None and start + len(raw_data) >= self.maxSize:
+            # the temporary file is deleted once it is closed
+            self.file.close()
+            raise PayloadTooLarge(
+                f"The file has to be smaller than {self.maxSize} bytes."
+            )
+        self.digest.update(raw_data)
+        self.scanner.feed(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size: int) -> Optional[UploadedFile]:
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.sha256 = self.digest.hexdigest()
+            file.archiveMembers = self.scanner.get_members()
+        return file
+
+
+# Rejects the request with 413 if its Content-Length exceeds the limit, before any
+# of the body is read.
+def check_content_length(request: HttpRequest, limit: int) -> None:
+    try:
+        length = int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        return
+    if length > limit:
+        raise PayloadTooLarge(
+            f"The request body must not be larger than {limit} bytes."
+        )
+
+
+# Streams the body of a raw upload through the handler in blocks of
+# UPLOAD_STREAM_BLOCK_SIZE and returns the resulting file, named like the file field
+# of a multipart upload. Unlike multipart bodies, raw bodies are never parsed into
+# memory and have no form overhead.
+#
+# Bodies with Content-Encoding gzip are decompressed on the fly if allowed. The
+# handler limits the size of the decompressed file, so that a small body cannot
+# expand beyond it, and no block is inflated to more than UPLOAD_STREAM_BLOCK_SIZE.
+def receive_raw_body(
+    stream: Optional[BinaryIO],
+    handler: HashingFileUploadHandler,
+    name: str,
+    encoding: str = "",
+    allowGzip: bool = False,
+) -> UploadedFile:
+    decompressor = None
+    if encoding == "gzip" and allowGzip:
+        decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+    elif encoding not in ("", "identity"):
+        raise exceptions.UnsupportedMediaType(
+            RAW_CONTENT_TYPE, f"Content-Encoding '{encoding}' is not supported."
+        )
+
+    handler.new_file("file", name, RAW_CONTENT_TYPE, None)
+    size = 0
+    try:
+        while stream is not None:
+            block = stream.read(constants.UPLOAD_STREAM_BLOCK_SIZE)
+            if not block:
+                break
+            if decompressor is None:
+                handler.receive_data_chunk(block, size)
+                size += len(block)
+                continue
+            while block:
+                data = decompressor.decompress(
+                    block, constants.UPLOAD_STREAM_BLOCK_SIZE
+                )
+                handler.receive_data_chunk(data, size)
+                size += len(data)
+                block = decompressor.unconsumed_tail
+        if decompressor is not None and not decompressor.eof:
+            raise zlib.error("incomplete stream")
+    except zlib.error:
+        handler.file.close()
+        raise exceptions.ValidationError(
+            "The body is not valid gzip.", code="invalid_encoding"
+        )
+    file = handler.file_complete(size)
+    assert file is not None
+    return file
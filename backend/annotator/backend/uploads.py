@@ -0,0 +1,159 @@
+import dataclasses
+import hashlib
+import os
+import shutil
+from typing import IO, BinaryIO, Optional, cast
+
+from django.core.files.storage import default_storage
+
+from . import annotations
+from . import archives
+from . import blobs
+from . import constants
+from . import models
+from .anno3d import AnnotationFileError, Labels
+
+
+# Helpers for resumable upload sessions. Every session owns a directory below
+# MEDIA_ROOT/UPLOAD_SESSION_DIR with a single preallocated part file. Chunks are
+# written directly to their offset in that file, so they can arrive in any order
+# and in parallel without being assembled afterwards.
+
+
+def get_session_dir(session: models.UploadSession) -> str:
+    return os.path.join(constants.UPLOAD_SESSION_DIR, str(session.pk))
+
+
+def get_part_path(session: models.UploadSession) -> str:
+    return default_storage.path(os.path.join(get_session_dir(session), "upload.part"))
+
+
+def create_part_file(session: models.UploadSession) -> None:
+    path = get_part_path(session)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as part:
+        # sparse on most file systems, the chunks fill it later on
+        part.truncate(session.fileSize)
+
+
+def delete_session_files(session: models.UploadSession) -> None:
+    shutil.rmtree(default_storage.path(get_session_dir(session)), ignore_errors=True)
+
+
+# Streams the body of a chunk request to its offset in the part file and returns the
+# number of bytes the body contained. Bytes exceeding the chunk are counted, but
+# never written, so that a faulty request cannot overwrite a neighbouring chunk.
+def write_chunk(session: models.UploadSession, index: int, stream: BinaryIO) -> int:
+    start, end = session.get_chunk_range(index)
+    received = 0
+    fd = os.open(get_part_path(session), os.O_WRONLY)
+    try:
+        while True:
+            block = stream.read(constants.UPLOAD_STREAM_BLOCK_SIZE)
+            if not block:
+                break
+            writable = max(0, min(len(block), end - start - received))
+            if writable > 0:
+                os.pwrite(fd, block[:writable], start + received)
+            received += len(block)
+            if received > end - start:
+                break
+    finally:
+        os.close(fd)
+    return received
+
+
+# Returns the received bytes of a session as a list of merged [start, end) ranges.
+def get_received_ranges(session: models.UploadSession) -> list[list[int]]:
+    ranges: list[list[int]] = []
+    for index in session.chunks.values_list("index", flat=True).order_by("index"):
+        start, end = session.get_chunk_range(index)
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = end
+        else:
+            ranges.append([start, end])
+    return ranges
+
+
+def is_complete(session: models.UploadSession) -> bool:
+    return session.chunks.count() == session.get_chunkCount()
+
+
+# A file that computes the SHA-256 of the bytes read from it in order. Reads that
+# skip ahead, like those of the central directory of a zip archive, are not hashed,
+# finish hashes whatever was not read in order. Parsing an archive through it reads
+# the member data once for both, only the headers are read twice.
+class HashingReader:
+    def __init__(self, file: BinaryIO) -> None:
+        self.file = file
+        self.digest = hashlib.sha256()
+        self.hashed = 0
+
+    def read(self, size: int = -1) -> bytes:
+        position = self.file.tell()
+        data = self.file.read(size)
+        if position == self.hashed:
+            self.digest.update(data)
+            self.hashed += len(data)
+        return data
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        return self.file.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self.file.tell()
+
+    def seekable(self) -> bool:
+        return True
+
+    def finish(self) -> str:
+        self.file.seek(self.hashed)
+        while block := self.file.read(constants.UPLOAD_STREAM_BLOCK_SIZE * 16):
+            self.digest.update(block)
+        return self.digest.hexdigest()
+
+
+# The content of a complete session. The labels of annotationFiles are parsed while
+# the file is hashed, a file that cannot be parsed keeps the error, so that a
+# checksum mismatch can be reported first.
+@dataclasses.dataclass
+class PartFile:
+    sha256: str
+    annotationFormat: Optional[str] = None
+    labels: Optional[Labels] = None
+    error: Optional[AnnotationFileError] = None
+
+
+# Reads the assembled part file once, hashes it and parses the labels of
+# annotationFiles.
+def read_part_file(session: models.UploadSession) -> PartFile:
+    with open(get_part_path(session), "rb") as part:
+        reader = HashingReader(part)
+        if session.fileType != "annotationFile":
+            return PartFile(reader.finish())
+        try:
+            annotationFormat, labels = annotations.read_archive(cast(IO[bytes], reader))
+        except AnnotationFileError as error:
+            return PartFile(reader.finish(), error=error)
+        return PartFile(reader.finish(), annotationFormat, labels)
+
+
+# Validates the zip archive of a complete session without extracting it and returns
+# its members.
+def validate_part_file(session: models.UploadSession) -> list[archives.ArchiveMember]:
+    with open(get_part_path(session), "rb") as part:
+        if session.fileType == "baseFile":
+            return archives.validate_basefile_archive(part)
+        return archives.validate_annotationfile_archive(part)
+
+
+# Moves the part file of a complete, validated session into the blob store and
+# returns its Blob. AnnotationFiles are stored in the canonical anno3d format.
+def store_part_file(session: models.UploadSession, part: PartFile) -> models.Blob:
+    if part.error is not None:
+        raise part.error
+    if part.labels is not None and (
+        part.annotationFormat != annotations.CANONICAL_FORMAT
+    ):
+        return annotations.store_labels(part.labels)
+    return blobs.store_path(get_part_path(session), part.sha256, session.fileSize)
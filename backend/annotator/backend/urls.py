@@ -13,6 +13,16 @@ advancedRouter.register(r"users", views.ProjectUserViewSet, basename="projectuse
 
 urlpatterns = [
     path("v1/", include(baseRouter.urls)),
+    path(
+        "v1/jobs/<uuid:pk>",
+        views.JobViewSet.as_view({"get": "retrieve"}),
+        name="job",
+    ),
+    path(
+        "v1/jobs/<uuid:pk>/cancel",
+        views.JobViewSet.as_view({"post": "cancel"}),
+        name="job-cancel",
+    ),
     path("v1/login/", views.LoginView.as_view(), name="login"),
     path("v1/logout/", views.LogoutView.as_view(), name="logout"),
     path("v1/register/", views.RegisterView.as_view(), name="register"),
@@ -27,10 +37,81 @@ urlpatterns = [
     path(
         "v1/modelData/<int:pk>/annotationFile",
         views.FileViewSet.as_view(
-            {"put": "upload_annotationfile", "get": "download_annotationfile"}
+            {
+                "put": "upload_annotationfile",
+                "get": "download_annotationfile",
+                "patch": "patch_annotationfile",
+            }
         ),
         name="annotationfile",
     ),
+    path(
+        "v1/modelData/<int:pk>/annotationFile/versions",
+        views.AnnotationVersionViewSet.as_view({"get": "list"}),
+        name="annotationfile-versions",
+    ),
+    path(
+        "v1/modelData/<int:pk>/annotationFile/versions/<int:number>",
+        views.AnnotationVersionViewSet.as_view({"get": "retrieve"}),
+        name="annotationfile-version",
+    ),
+    path(
+        "v1/modelData/<int:pk>/annotationFile/versions/<int:number>/restore",
+        views.AnnotationVersionViewSet.as_view({"post": "restore"}),
+        name="annotationfile-version-restore",
+    ),
+    path(
+        "v1/modelData/<int:pk>/baseFile/uploads",
+        views.UploadSessionViewSet.as_view({"post": "create"}, fileType="baseFile"),
+        name="basefile-uploads",
+    ),
+    path(
+        "v1/modelData/<int:pk>/baseFile/uploads/<uuid:session_id>",
+        views.UploadSessionViewSet.as_view(
+            {"get": "retrieve", "delete": "destroy"}, fileType="baseFile"
+        ),
+        name="basefile-upload",
+    ),
+    path(
+        "v1/modelData/<int:pk>/baseFile/uploads/<uuid:session_id>/<int:index>",
+        views.UploadSessionViewSet.as_view(
+            {"put": "upload_chunk"}, fileType="baseFile"
+        ),
+        name="basefile-upload-chunk",
+    ),
+    path(
+        "v1/modelData/<int:pk>/baseFile/uploads/<uuid:session_id>/finalize",
+        views.UploadSessionViewSet.as_view({"post": "finalize"}, fileType="baseFile"),
+        name="basefile-upload-finalize",
+    ),
+    path(
+        "v1/modelData/<int:pk>/annotationFile/uploads",
+        views.UploadSessionViewSet.as_view(
+            {"post": "create"}, fileType="annotationFile"
+        ),
+        name="annotationfile-uploads",
+    ),
+    path(
+        "v1/modelData/<int:pk>/annotationFile/uploads/<uuid:session_id>",
+        views.UploadSessionViewSet.as_view(
+            {"get": "retrieve", "delete": "destroy"}, fileType="annotationFile"
+        ),
+        name="annotationfile-upload",
+    ),
+    path(
+        "v1/modelData/<int:pk>/annotationFile/uploads/<uuid:session_id>/<int:index>",
+        views.UploadSessionViewSet.as_view(
+            {"put": "upload_chunk"}, fileType="annotationFile"
+        ),
+        name="annotationfile-upload-chunk",
+    ),
+    path(
+        "v1/modelData/<int:pk>/annotationFile/uploads/<uuid:session_id>/finalize",
+        views.UploadSessionViewSet.as_view(
+            {"post": "finalize"}, fileType="annotationFile"
+        ),
+        name="annotationfile-upload-finalize",
+    ),
     re_path(
         "v1/^projects/(?P<user_id>=[1-9]+)/$",
         views.ProjectViewSet.as_view({"get": "list"}),
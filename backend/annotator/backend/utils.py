@@ -1,5 +1,7 @@
+import hashlib
 from typing import Optional, Union
 
+from django.core.files import File as DjangoFile
 from django.db.models import Model
 
 from rest_framework.views import APIView
@@ -68,3 +70,10 @@ def check_project_owner_or_himself(
 
 def get_modeldata_file_path(modeldata: ModelData, project: Project) -> str:
     return f"projects/{project.pk}/{modeldata.pk}/"
+
+
+def hash_file(file: DjangoFile) -> str:
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
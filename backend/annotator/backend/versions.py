@@ -0,0 +1,285 @@
+import hashlib
+import os
+import zlib
+from datetime import timedelta
+from typing import Iterator, Optional
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.http import HttpRequest
+from django.http.response import HttpResponseBase
+from django.utils import timezone
+
+from . import annotations
+from . import blobs
+from . import constants
+from . import downloads
+from . import models
+from .anno3d import AnnotationFileError, Labels
+
+
+# Version history of annotationFiles. Every state of an annotationFile is recorded as
+# an AnnotationVersion. The labels of a version are split into chunks of
+# ANNOTATION_CHUNK_SIZE labels, which are stored zlib compressed and named by the
+# SHA-256 of their labels, so a chunk is stored once no matter how many versions
+# contain it. The number of labels never changes for a ModelData and a new version
+# only differs in the chunks that were edited, so the history of an annotation costs
+# little more than its current state. Unlabeled or uniformly labeled chunks are
+# shared across all ModelData.
+
+CHUNK_DTYPE = np.dtype("<u2")
+# number of chunks that are hashed and looked up at once
+CHUNK_BATCH_SIZE = 512
+
+
+def get_chunk_name(sha256: str) -> str:
+    return os.path.join(
+        constants.BLOB_DIR, constants.ANNOTATION_CHUNK_DIR, sha256[:2], sha256
+    )
+
+
+def write_chunk(name: str, data: bytes) -> int:
+    path = default_storage.path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    compressed = zlib.compress(data)
+    temp_path = blobs.get_temp_path()
+    with open(temp_path, "wb") as temp:
+        temp.write(compressed)
+    os.chmod(temp_path, settings.FILE_UPLOAD_PERMISSIONS or 0o644)
+    # readers never see a partial chunk
+    os.replace(temp_path, path)
+    return len(compressed)
+
+
+# Stores the chunks of the labels, which are not stored yet, and returns the ids of
+# the AnnotationChunks in order. The rows of the chunks are locked, so they have to
+# be referenced in the same transaction; otherwise prune_chunks() could delete a
+# chunk that was found stored before the version containing it exists.
+def store_chunks(labels: Labels) -> list[int]:
+    ids: list[int] = []
+    size = constants.ANNOTATION_CHUNK_SIZE
+    for first in range(0, len(labels), size * CHUNK_BATCH_SIZE):
+        batch: dict[str, bytes] = {}
+        hashes = []
+        for start in range(
+            first, min(first + size * CHUNK_BATCH_SIZE, len(labels)), size
+        ):
+            data = (
+                labels[start : start + size].astype(CHUNK_DTYPE, copy=False).tobytes()
+            )
+            sha256 = hashlib.sha256(data).hexdigest()
+            batch[sha256] = data
+            hashes.append(sha256)
+
+        existing = dict(
+            models.AnnotationChunk.objects.select_for_update()
+            .filter(sha256__in=batch)
+            .values_list("sha256", "pk")
+        )
+        created = []
+        for sha256, data in batch.items():
+            name = get_chunk_name(sha256)
+            if sha256 in existing and default_storage.exists(name):
+                continue
+            chunkSize = write_chunk(name, data)
+            if sha256 not in existing:
+                created.append(
+                    models.AnnotationChunk(sha256=sha256, size=chunkSize, file=name)
+                )
+        # chunks stored concurrently by another request are simply looked up again
+        models.AnnotationChunk.objects.bulk_create(created, ignore_conflicts=True)
+        if created:
+            existing = dict(
+                models.AnnotationChunk.objects.select_for_update()
+                .filter(sha256__in=batch)
+                .values_list("sha256", "pk")
+            )
+        ids.extend(existing[sha256] for sha256 in hashes)
+    return ids
+
+
+# Records the current annotationFile of the ModelData as new version, unless it
+# equals the latest one. The labels are read from the file, if they are not given.
+# Files that are no anno3d files are not recorded. Callers record the version in the
+# transaction that changed the annotationFile, while they hold the row lock of the
+# ModelData, so that the versions are numbered in the order of the changes.
+def record_version(
+    modeldata: models.ModelData,
+    user: Optional[User],
+    labels: Optional[Labels] = None,
+    restoredFrom: Optional[int] = None,
+) -> Optional[models.AnnotationVersion]:
+    fileObj = modeldata.annotationFile
+    if fileObj is None:
+        return None
+    with transaction.atomic():
+        models.ModelData.objects.select_for_update().filter(pk=modeldata.pk).first()
+        latest = modeldata.annotationVersions.order_by("-number").first()
+        if latest is not None and fileObj.sha256 and latest.sha256 == fileObj.sha256:
+            return None
+        if labels is None:
+            try:
+                with fileObj.file.open("rb") as handle:
+                    _, labels = annotations.read_archive(handle)
+            except AnnotationFileError:
+                return None
+
+        chunkIds = store_chunks(labels)
+        version = models.AnnotationVersion.objects.create(
+            modelData=modeldata,
+            number=1 if latest is None else latest.number + 1,
+            sha256=fileObj.sha256,
+            count=len(labels),
+            created_by=user,
+            restoredFrom=restoredFrom,
+        )
+        models.AnnotationVersionChunk.objects.bulk_create(
+            models.AnnotationVersionChunk(version=version, chunk_id=chunkId, index=i)
+            for i, chunkId in enumerate(chunkIds)
+        )
+    return version
+
+
+# Reassembles the labels of a version. Raises FileNotFoundError if a chunk does not
+# exist on the disk.
+def read_labels(version: models.AnnotationVersion) -> Labels:
+    labels = np.empty(version.count, dtype=np.uint16)
+    size = constants.ANNOTATION_CHUNK_SIZE
+    position = 0
+    for index, name in version.versionChunks.order_by("index").values_list(
+        "index", "chunk__file"
+    ):
+        if index * size != position:
+            raise FileNotFoundError(f"Chunk {index} of the version is missing.")
+        with default_storage.open(name, "rb") as chunk:
+            data = np.frombuffer(zlib.decompress(chunk.read()), dtype=CHUNK_DTYPE)
+        labels[position : position + len(data)] = data
+        position += len(data)
+    if position != len(labels):
+        raise FileNotFoundError("The chunks of the version are incomplete.")
+    return labels
+
+
+# Returns a response for downloading the version in the given anno3d format, UTF8
+# 1.0 with the given annotation classes. Versions never change, so the response is
+# validated by the version and the format alone.
+def download_response(
+    request: HttpRequest,
+    version: models.AnnotationVersion,
+    name: str,
+    classes: Optional[list[int]] = None,
+) -> HttpResponseBase:
+    variant = annotations.get_variant(name, classes)
+    etag = f'W/"{version.sha256 or version.pk}-{version.number}-{variant}"'
+
+    def generate() -> Iterator[bytes]:
+        return annotations.iter_archive(read_labels(version), name, classes=classes)
+
+    return downloads.stream_response(
+        request,
+        etag,
+        int(version.created.timestamp()),
+        f"annotationFile.v{version.number}.zip",
+        generate,
+    )
+
+
+# Deletes those of the chunks, which no version references, and returns the sizes and
+# names of the deleted chunks. The references are counted again once the chunks are
+# locked, since store_chunks() may have found one of them stored meanwhile.
+def delete_unreferenced_chunks(pks: list[int]) -> list[tuple[int, str]]:
+    with transaction.atomic():
+        locked = {
+            pk: (size, name)
+            for pk, size, name in models.AnnotationChunk.objects.select_for_update()
+            .filter(pk__in=pks)
+            .values_list("pk", "size", "file")
+        }
+        referenced = models.AnnotationVersionChunk.objects.filter(chunk_id__in=locked)
+        for pk in set(referenced.values_list("chunk_id", flat=True)):
+            del locked[pk]
+        models.AnnotationChunk.objects.filter(pk__in=locked).delete()
+    chunks = list(locked.values())
+    # a chunk stored again after it was deleted has the same name
+    stored = set(
+        models.AnnotationChunk.objects.filter(
+            file__in=[name for _, name in chunks]
+        ).values_list("file", flat=True)
+    )
+    for _, name in chunks:
+        if name not in stored:
+            default_storage.delete(name)
+    return chunks
+
+
+# Deletes the chunks no version references anymore, including those of deleted
+# ModelData. Returns the number of deleted chunks and bytes.
+def prune_chunks() -> tuple[int, int]:
+    candidates = list(
+        models.AnnotationChunk.objects.annotate(references=Count("versionChunks"))
+        .filter(references=0)
+        .values_list("pk", flat=True)
+    )
+    count, size = 0, 0
+    for first in range(0, len(candidates), CHUNK_BATCH_SIZE):
+        chunks = delete_unreferenced_chunks(
+            candidates[first : first + CHUNK_BATCH_SIZE]
+        )
+        count += len(chunks)
+        size += sum(chunkSize for chunkSize, _ in chunks)
+    return count, size
+
+
+# Retention policy: deletes all versions of a ModelData but the `keep` newest ones
+# and those younger than `days` days, then prunes the chunks that are not used
+# anymore. The current version is always kept. Returns a report of the deleted
+# versions, chunks and bytes.
+def prune_versions(
+    keep: int = constants.ANNOTATION_VERSIONS_KEEP,
+    days: int = constants.ANNOTATION_VERSIONS_KEEP_DAYS,
+    dryRun: bool = False,
+) -> dict[str, int]:
+    keep = max(1, keep)
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted = 0
+    expiredIds: list[int] = []
+    candidates = (
+        models.AnnotationVersion.objects.values("modelData")
+        .annotate(versions=Count("pk"))
+        .filter(versions__gt=keep)
+        .values_list("modelData", flat=True)
+    )
+    for modeldata_id in candidates:
+        versions = models.AnnotationVersion.objects.filter(modelData_id=modeldata_id)
+        oldestKept = versions.order_by("-number").values_list("number", flat=True)[
+            keep - 1
+        ]
+        expired = versions.filter(number__lt=oldestKept, created__lt=cutoff)
+        if dryRun:
+            expiredIds.extend(expired.values_list("pk", flat=True))
+        else:
+            deleted += expired.delete()[1].get("backend.AnnotationVersion", 0)
+
+    if dryRun:
+        # chunks that are unreferenced or only referenced by expired versions
+        report = (
+            models.AnnotationChunk.objects.annotate(
+                references=Count("versionChunks"),
+                expiredReferences=Count(
+                    "versionChunks", filter=Q(versionChunks__version__in=expiredIds)
+                ),
+            )
+            .filter(references=F("expiredReferences"))
+            .aggregate(count=Count("pk"), bytes=Sum("size"))
+        )
+        return {
+            "versions": len(expiredIds),
+            "chunks": report["count"] or 0,
+            "bytes": report["bytes"] or 0,
+        }
+    chunkCount, chunkBytes = prune_chunks()
+    return {"versions": deleted, "chunks": chunkCount, "bytes": chunkBytes}
@@ -1,15 +1,17 @@
 from typing import Optional, Type, List, Any, cast, Protocol
 
 from django.contrib.auth.models import User
-from django.db.models import QuerySet
-from django.http import FileResponse
+from django.db import transaction
+from django.db.models import Prefetch, QuerySet
+from django.http.response import HttpResponseBase
+from django.urls import reverse
 
 from rest_framework.generics import GenericAPIView, get_object_or_404
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.viewsets import GenericViewSet
 from rest_framework.decorators import action
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import BaseParser, JSONParser, MultiPartParser, FormParser
 from rest_framework import status
 from rest_framework.request import Request
 from rest_framework import exceptions
@@ -23,6 +25,19 @@ from django.utils import timezone
 from . import models
 from . import serializers
 from . import permissions
+from . import agreement
+from . import annotations
+from . import archives
+from . import blobs
+from . import constants
+from . import downloads
+from . import exports
+from . import geometry
+from . import jobs
+from . import previews
+from . import tiles
+from . import uploads
+from . import versions
 
 from annotator.backend.utils import (
     check_modeldata_lock,
@@ -33,7 +48,39 @@ from annotator.backend.utils import (
 
 from rest_framework.permissions import IsAuthenticated, BasePermission
 
+from annotator.backend.anno3d import AnnotationFileError, Labels, generic
 from annotator.backend.auth import BasicAuthentication, TokenAuthentication
+from annotator.backend.exceptions import Conflict, PreconditionRequired
+from annotator.backend.upload_handlers import (
+    RAW_CONTENT_TYPE,
+    HashingFileUploadHandler,
+    check_content_length,
+    receive_raw_body,
+)
+
+
+# The relations nested by the ModelDataSerializer, selected with the ModelData so that
+# serializing many of them does not query every relation of every row.
+MODELDATA_RELATIONS = [
+    "owner",
+    "locked",
+    "baseFile__uploaded_by",
+    "annotationFile__uploaded_by",
+]
+
+
+# Returns the anno3d format requested with the anno3d_format parameter. Clients that
+# do not request a format get the one they always got.
+def get_anno3d_format(request: Request) -> str:
+    name = request.query_params.get(
+        annotations.FORMAT_PARAMETER, annotations.DEFAULT_FORMAT
+    )
+    if name not in generic.FORMATS:
+        raise exceptions.ValidationError(
+            f"The anno3d format '{name}' is not supported.",
+            code="unsupported_format",
+        )
+    return name
 
 
 # only for typing
@@ -53,6 +100,7 @@ class ProjectViewSet(GenericViewSet):
         "retrieve": [IsAuthenticated, permissions.IsPartOfProject],
         "update": [IsAuthenticated, permissions.IsPartOfProject],
         "destroy": [IsAuthenticated, permissions.IsProjectOwner],
+        "export": [IsAuthenticated, permissions.IsPartOfProject],
     }
 
     def list(self, request: Request) -> Response:
@@ -69,15 +117,8 @@ class ProjectViewSet(GenericViewSet):
 
     def retrieve(self, request: Request, pk: Optional[str] = None) -> Response:
         instance = self.get_object()
-        # 5 tries, before server sends an error
-        for i in range(5):
-            try:
-                serializer = self.get_serializer(instance)
-                return Response(serializer.data)
-            except FileNotFoundError:  # pragma: no cover
-                print("file not found! retry...")
-                instance.refresh_from_db()
-        return Response("try again later", status=425)  # pragma: no cover
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
 
     def update(self, request: Request, pk: Optional[str] = None) -> Response:
         instance = self.get_object()
@@ -91,6 +132,13 @@ class ProjectViewSet(GenericViewSet):
         instance.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    # Streams all annotationFiles of the project in the anno3d format given with the
+    # anno3d_format parameter and a manifest as one zip archive.
+    @action(detail=True, methods=["get"])
+    def export(self, request: Request, pk: Optional[str] = None) -> HttpResponseBase:
+        project = self.get_object()
+        return exports.export_response(project, get_anno3d_format(request))
+
     def get_serializer_class(self) -> Type[serializers.ReducedProjectSerializer]:
         if self.action == "list":
             return serializers.ReducedProjectSerializer
@@ -98,7 +146,19 @@ class ProjectViewSet(GenericViewSet):
 
     def get_queryset(self) -> QuerySet[models.Project]:
         user_id = self.get_parameters("user_id")
-        queryset = models.Project.objects.all()
+        queryset = models.Project.objects.select_related("owner")
+        if self.action in ("retrieve", "update"):
+            # the relations nested by the ProjectSerializer, one query each
+            queryset = queryset.prefetch_related(
+                "users",
+                Prefetch(
+                    "modelData",
+                    queryset=models.ModelData.objects.select_related(
+                        *MODELDATA_RELATIONS
+                    ),
+                ),
+                "labels",
+            )
         if user_id is not None:
             queryset = queryset.filter(users=user_id) | queryset.filter(owner=user_id)
         return queryset
@@ -146,20 +206,19 @@ class ModelDataViewSet(GenericViewSet):
         "update": [IsAuthenticated, permissions.IsPartOfProject],
         "destroy": [IsAuthenticated, permissions.IsPartOfProject],
         "lock": [IsAuthenticated, permissions.IsPartOfProject],
+        "merge": [IsAuthenticated, permissions.IsPartOfProject],
+        "agreement": [IsAuthenticated, permissions.IsPartOfProject],
+        "previews": [IsAuthenticated, permissions.IsPartOfProject],
+        "preview": [IsAuthenticated, permissions.IsPartOfProject],
+        "tiles": [IsAuthenticated, permissions.IsPartOfProject],
+        "tile": [IsAuthenticated, permissions.IsPartOfProject],
     }
 
     def list(self, request: Request) -> Response:
         self.validate_parameter()
         queryset = self.get_queryset()
-        # 5 tries, before server sends an error
-        for i in range(5):
-            try:
-                serializer = self.serializer_class(queryset, many=True)
-                return Response(serializer.data)
-            except FileNotFoundError:  # pragma: no cover
-                print("file not found! retry...")
-                queryset = self.get_queryset()
-        return Response("try again later", status=425)  # pragma: no cover
+        serializer = self.serializer_class(queryset, many=True)
+        return Response(serializer.data)
 
     def create(self, request: Request) -> Response:
         serializer = self.serializer_class(data=request.data)
@@ -170,15 +229,8 @@ class ModelDataViewSet(GenericViewSet):
 
     def retrieve(self, request: Request, pk: Optional[str] = None) -> Response:
         instance = self.get_object()
-        # 5 tries, before server sends an error
-        for i in range(5):
-            try:
-                serializer = self.get_serializer(instance)
-                return Response(serializer.data)
-            except FileNotFoundError:  # pragma: no cover
-                print("file not found! retry...")
-                instance.refresh_from_db()
-        return Response("try again later", status=425)  # pragma: no cover
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
 
     def update(self, request: Request, pk: Optional[str] = None) -> Response:
         instance = self.get_object()
@@ -211,10 +263,7 @@ class ModelDataViewSet(GenericViewSet):
 
             if data.get("user"):
                 user = data["user"]
-                if (
-                    user not in modelData.project.users.all()
-                    and not user == modelData.project.owner
-                ):
+                if not permissions.is_project_member(user, modelData.project, request):
                     self.permission_denied(
                         self.request,
                         message="The given user has to be part of the project.",
@@ -232,11 +281,220 @@ class ModelDataViewSet(GenericViewSet):
         modelData.save()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    # Starts a job, which replaces the annotationFile of this ModelData with the
+    # consensus of the annotations of the given ModelData, see consensus.py. The
+    # sources have to be part of the same project and share the baseFile.
+    @action(detail=True, methods=["post"])
+    def merge(self, request: Request, pk: Optional[str] = None) -> Response:
+        target: models.ModelData = self.get_object()
+        check_modeldata_lock(self, target, request.user)
+        serializer = serializers.ConsensusMergeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data: dict[str, Any] = serializer.validated_data
+        self.get_annotated_modeldata(target, data["sources"])
+
+        job = jobs.enqueue(
+            "merge_annotations",
+            data,
+            user=cast(User, request.user),
+            modelData=target,
+        )
+        jobSerializer = serializers.JobSerializer(job)
+        return Response(jobSerializer.data, status=status.HTTP_202_ACCEPTED)
+
+    # Returns the agreement metrics of the annotationFile of this ModelData and those
+    # of the ModelData given with the `against` parameter, which can be repeated.
+    @action(detail=True, methods=["get"])
+    def agreement(self, request: Request, pk: Optional[str] = None) -> Response:
+        modeldata: models.ModelData = self.get_object()
+        against = request.query_params.getlist("against")
+        if not against or not all(value.isdigit() for value in against):
+            raise exceptions.ValidationError(
+                "The ids of the ModelData to compare with have to be given with "
+                + "'against'.",
+                code="invalid_parameter",
+            )
+        if len(against) > constants.CONSENSUS_MAX_SOURCES:
+            raise exceptions.ValidationError(
+                f"At most {constants.CONSENSUS_MAX_SOURCES} ModelData can be "
+                + "compared at once.",
+                code="invalid_parameter",
+            )
+        if modeldata.annotationFile is None:
+            raise exceptions.NotFound("AnnotationFile was not found.")
+        others = self.get_annotated_modeldata(modeldata, [int(v) for v in against])
+
+        def read_labels(fileObj: models.File) -> Labels:
+            with fileObj.file.open("rb") as handle:
+                return annotations.read_archive(handle)[1]
+
+        results = []
+        for other in others:
+            try:
+                metrics = agreement.get_metrics(
+                    modeldata.annotationFile,
+                    cast(models.File, other.annotationFile),
+                    read_labels,
+                )
+            except FileNotFoundError:
+                raise exceptions.NotFound("AnnotationFile was not found.")
+            except AnnotationFileError as error:
+                raise exceptions.ValidationError(error.message, code=error.code)
+            except ValueError as error:
+                raise exceptions.ValidationError(str(error), code="different_count")
+            results.append({"against": other.pk, **metrics})
+        return Response(results)
+
+    # Returns the URLs of the six preview renders of the baseFile, colored by the
+    # annotationFile with `annotated=true`. Renders that are missing or out of date
+    # are drawn by a job, which is returned with 202 instead.
+    @action(detail=True, methods=["get"])
+    def previews(self, request: Request, pk: Optional[str] = None) -> Response:
+        modeldata: models.ModelData = self.get_object()
+        if modeldata.baseFile is None:
+            raise exceptions.NotFound("BaseFile was not found.")
+        annotated = self.get_annotated_parameter()
+        key = previews.get_render_key(modeldata, annotated)
+        if previews.get_rendered_views(modeldata, annotated, key) != set(
+            previews.VIEWS
+        ):
+            job = previews.start_rendering(
+                modeldata, annotated, key, cast(User, request.user)
+            )
+            jobSerializer = serializers.JobSerializer(job)
+            return Response(jobSerializer.data, status=status.HTTP_202_ACCEPTED)
+        query = f"?annotated={str(annotated).lower()}&key={key}"
+        views = {
+            view: reverse(
+                "modeldata-preview", kwargs={"pk": modeldata.pk, "view": view}
+            )
+            + query
+            for view in previews.VIEWS
+        }
+        return Response({"key": key, "annotated": annotated, "views": views})
+
+    # Returns the latest preview render of the view as WebP image.
+    @action(
+        detail=True,
+        methods=["get"],
+        url_path=r"previews/(?P<view>[a-z]+)",
+    )
+    def preview(
+        self, request: Request, pk: Optional[str] = None, view: str = ""
+    ) -> HttpResponseBase:
+        modeldata: models.ModelData = self.get_object()
+        render = models.PreviewRender.objects.filter(
+            modelData=modeldata, view=view, annotated=self.get_annotated_parameter()
+        ).first()
+        if render is None:
+            raise exceptions.NotFound("The preview was not rendered yet.")
+        return previews.image_response(request, render)
+
+    # Returns the nodes of the octree tiles of a point cloud, see tiles.py. Missing or
+    # out of date tiles are built by a job, which is returned with 202 instead.
+    @action(detail=True, methods=["get"])
+    def tiles(self, request: Request, pk: Optional[str] = None) -> Response:
+        modeldata: models.ModelData = self.get_object()
+        if modeldata.baseFile is None:
+            raise exceptions.NotFound("BaseFile was not found.")
+        if modeldata.modelType != constants.MODEL_TYPE_POINT_CLOUD:
+            raise exceptions.ValidationError(
+                "Only point clouds are tiled.", code="no_point_cloud"
+            )
+        key = tiles.get_tiles_key(modeldata)
+        tileSet = tiles.get_tile_set(modeldata, key)
+        if tileSet is None:
+            job = tiles.start_tiling(modeldata, key, cast(User, request.user))
+            jobSerializer = serializers.JobSerializer(job)
+            return Response(jobSerializer.data, status=status.HTTP_202_ACCEPTED)
+        prefix = reverse("modeldata-tiles", kwargs={"pk": modeldata.pk})
+        nodes = [
+            {
+                "id": node,
+                "count": info["count"],
+                "bounds": info["bounds"],
+                "url": f"{prefix}{node}/?key={key}",
+            }
+            for node, info in tileSet.nodes.items()
+        ]
+        return Response(
+            {
+                "key": key,
+                "pointCount": tileSet.pointCount,
+                "colors": tileSet.colors,
+                "bounds": tileSet.bounds,
+                "nodes": nodes,
+            }
+        )
+
+    # Returns the tile of the node as binary, see tiles.py for its layout.
+    @action(
+        detail=True,
+        methods=["get"],
+        url_path=r"tiles/(?P<node>r[0-7]*)",
+    )
+    def tile(
+        self, request: Request, pk: Optional[str] = None, node: str = ""
+    ) -> HttpResponseBase:
+        modeldata: models.ModelData = self.get_object()
+        tileSet = models.TileSet.objects.filter(modelData=modeldata).first()
+        if tileSet is None or node not in tileSet.nodes:
+            raise exceptions.NotFound("The tile does not exist.")
+        try:
+            return tiles.tile_response(request, tileSet, node)
+        except FileNotFoundError:
+            raise exceptions.NotFound("The tile does not exist.")
+
+    def get_annotated_parameter(self) -> bool:
+        value = self.request.query_params.get("annotated", "false")
+        if value not in ("true", "false"):
+            raise exceptions.ValidationError(
+                "'annotated' has to be 'true' or 'false'.", code="invalid_parameter"
+            )
+        return value == "true"
+
+    # Returns the ModelData with the given ids, which have to be part of the project
+    # of the given ModelData, share its baseFile and have an annotationFile.
+    def get_annotated_modeldata(
+        self, modeldata: models.ModelData, ids: List[int]
+    ) -> List[models.ModelData]:
+        if len(set(ids)) != len(ids):
+            raise exceptions.ValidationError(
+                "The ModelData contain duplicates.", code="duplicate_sources"
+            )
+        byId = models.ModelData.objects.select_related(
+            "baseFile", "annotationFile"
+        ).in_bulk(ids)
+        baseFile = modeldata.baseFile
+        for modeldata_id in ids:
+            other = byId.get(modeldata_id)
+            if other is None or other.project_id != modeldata.project_id:
+                raise exceptions.ValidationError(
+                    f"ModelData {modeldata_id} is not part of the project.",
+                    code="invalid_source",
+                )
+            if other.annotationFile is None:
+                raise exceptions.ValidationError(
+                    f"ModelData {modeldata_id} has no annotationFile.",
+                    code="missing_annotationfile",
+                )
+            if (
+                baseFile is None
+                or other.baseFile is None
+                or not baseFile.sha256
+                or other.baseFile.sha256 != baseFile.sha256
+            ):
+                raise exceptions.ValidationError(
+                    f"ModelData {modeldata_id} does not share the baseFile.",
+                    code="different_basefile",
+                )
+        return [byId[modeldata_id] for modeldata_id in ids]
+
     def get_queryset(self) -> QuerySet[models.ModelData]:
         user_id = self.get_parameter("user_id")
         project_id = self.get_parameter("project_id")
         projects = self.get_projects_of_user()
-        queryset = models.ModelData.objects.all()
+        queryset = models.ModelData.objects.select_related(*MODELDATA_RELATIONS)
 
         if user_id is not None:
             queryset = queryset.filter(
@@ -474,38 +732,138 @@ class FileViewSet(GenericViewSet):
     serializer_class = serializers.FileUploadSerializer
     parser_classes = [MultiPartParser, FormParser]
     permission_classes = [IsAuthenticated, permissions.IsPartOfProject]
+    # the maximum size of the uploaded file by action
+    upload_limits = {
+        "upload_basefile": constants.FILE_MAX_FILESIZE,
+        "upload_annotationfile": constants.FILE_MAX_FILESIZE,
+    }
+
+    def get_parsers(self) -> list[BaseParser]:
+        # annotation patches are JSON, the uploads are multipart or raw, raw bodies
+        # are streamed by get_upload_data and never parsed
+        if self.request.method == "PATCH":
+            return [JSONParser()]
+        return super().get_parsers()
+
+    def initial(self, request: Request, *args: Any, **kwargs: Any) -> None:
+        # hash uploads while they are streamed to disk, before the body is parsed
+        maxSize = self.upload_limits.get(self.action or "")
+        if not hasattr(request._request, "_files"):
+            handler = HashingFileUploadHandler(request._request, maxSize)
+            request._request.upload_handlers = [handler]
+        super().initial(request, *args, **kwargs)
+        if maxSize is not None:
+            check_content_length(
+                request._request, maxSize + constants.FILE_MAX_FORM_OVERHEAD
+            )
+
+    # Returns the data for the upload serializers. Uploads with the content type
+    # application/zip have the archive as body and the fileFormat as query parameter,
+    # the body is streamed to a temporary file. AnnotationFiles may be gzip encoded.
+    def get_upload_data(self, request: Request, name: str) -> Any:
+        if request.content_type != RAW_CONTENT_TYPE:
+            return request.data
+        handler = HashingFileUploadHandler(
+            request._request, self.upload_limits[self.action]
+        )
+        data = {
+            "file": receive_raw_body(
+                request.stream,
+                handler,
+                name,
+                request.headers.get("Content-Encoding", "").strip().lower(),
+                allowGzip=self.action == "upload_annotationfile",
+            )
+        }
+        if "fileFormat" in request.query_params:
+            data["fileFormat"] = request.query_params["fileFormat"]
+        return data
+
+    # Closes the temporary file of a raw upload, which removes it unless it was moved
+    # into the blob store. Multipart files are closed by Django with the request.
+    def close_upload_data(self, request: Request, data: Any) -> None:
+        if request.content_type == RAW_CONTENT_TYPE:
+            data["file"].close()
 
     @action(detail=False, methods=["get"])
     def download_basefile(
         self, request: Request, pk: Optional[str] = None
-    ) -> FileResponse:
+    ) -> HttpResponseBase:
         modeldata: models.ModelData = self.get_object()
         if modeldata.baseFile is None:
             raise exceptions.NotFound("BaseFile was not found.")
         try:
-            file_handler = modeldata.baseFile.file.open()
-            response = FileResponse(file_handler, filename="baseFile.zip")
-            response.headers["Content-Length"] = file_handler.size
-            return response
+            return downloads.file_response(
+                request._request, modeldata.baseFile, "baseFile.zip"
+            )
         except FileNotFoundError:
             raise exceptions.NotFound("BaseFile was not found.")
 
     @action(detail=False, methods=["get"])
     def download_annotationfile(
         self, request: Request, pk: Optional[str] = None
-    ) -> FileResponse:
+    ) -> HttpResponseBase:
         modeldata: models.ModelData = self.get_object()
         if modeldata.annotationFile is None:
             raise exceptions.NotFound("AnnotationFile was not found.")
 
+        name = get_anno3d_format(request)
         try:
-            file_handler = modeldata.annotationFile.file.open()
-            response = FileResponse(file_handler, filename="annotationFile.zip")
-            response.headers["Content-Length"] = file_handler.size
-            return response
+            return annotations.download_response(
+                request._request,
+                modeldata.annotationFile,
+                name,
+                annotations.get_label_classes(modeldata.project),
+            )
         except FileNotFoundError:
             raise exceptions.NotFound("AnnotationFile was not found.")
 
+    # Applies a list of changes to the stored annotationFile instead of uploading all
+    # of it. The changes are made against the version given with If-Match, which
+    # has to be the current one.
+    @action(detail=False, methods=["patch"])
+    def patch_annotationfile(
+        self, request: Request, pk: Optional[str] = None
+    ) -> Response:
+        base = request.headers.get("If-Match")
+        if base is None:
+            raise PreconditionRequired(
+                "The base version has to be given with If-Match.", code="missing_base"
+            )
+        serializer = serializers.AnnotationPatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        modeldata: models.ModelData = self.get_object()
+        with transaction.atomic():
+            modeldata = models.ModelData.objects.select_for_update().get(
+                pk=modeldata.pk
+            )
+            check_modeldata_lock(self, modeldata, request.user)
+            fileObj = modeldata.annotationFile
+            if fileObj is None:
+                raise exceptions.NotFound("AnnotationFile was not found.")
+            if not downloads.etag_matches(fileObj, base):
+                raise Conflict(
+                    "The annotationFile was changed after the base version.",
+                    code="stale_base",
+                )
+            try:
+                with fileObj.file.open("rb") as handle:
+                    _, labels = annotations.read_archive(handle)
+                annotations.apply_changes(labels, serializer.validated_data["changes"])
+            except FileNotFoundError:
+                raise exceptions.NotFound("AnnotationFile was not found.")
+            except AnnotationFileError as error:
+                raise exceptions.ValidationError(error.message, code=error.code)
+
+            fileObj.uploaded_by = cast(User, request.user)
+            blobs.replace_content(fileObj, annotations.store_labels(labels))
+            versions.record_version(modeldata, fileObj.uploaded_by, labels)
+
+        response = Response(serializers.FileSerializer(fileObj).data)
+        response.headers["ETag"] = downloads.get_etag(fileObj)
+        return response
+
     @action(detail=False, methods=["put"])
     def upload_basefile(self, request: Request, pk: Optional[str] = None) -> Response:
         modeldata = self.get_object()
@@ -518,16 +876,21 @@ class FileViewSet(GenericViewSet):
                 code="basefile_already_exists",
             )
 
-        serializer = serializers.BaseFileUploadSerializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
+        data = self.get_upload_data(request, "baseFile.zip")
+        try:
+            serializer = serializers.BaseFileUploadSerializer(data=data)
+            serializer.is_valid(raise_exception=True)
 
-        project = modeldata.project
-        file = serializer.save(
-            filePath=get_modeldata_file_path(modeldata, project),
-            uploaded_by=request.user,
-        )
+            project = modeldata.project
+            file = serializer.save(
+                filePath=get_modeldata_file_path(modeldata, project),
+                uploaded_by=request.user,
+            )
+        finally:
+            self.close_upload_data(request, data)
         modeldata.baseFile = file
         modeldata.save()
+        geometry.start_indexing(modeldata, cast(User, request.user))
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @action(detail=False, methods=["put"])
@@ -538,26 +901,263 @@ class FileViewSet(GenericViewSet):
         serializer = None
 
         check_modeldata_lock(self, modeldata, request.user)
-        # check if it is not the first upload
-        if modeldata.annotationFile is not None:
+        data = self.get_upload_data(request, "annotationFile.zip")
+        try:
+            # the file is swapped and its version recorded under the row lock, so
+            # that concurrent uploads are numbered in the order they were stored
+            with transaction.atomic():
+                modeldata = models.ModelData.objects.select_for_update().get(
+                    pk=modeldata.pk
+                )
+                # check if it is not the first upload
+                if modeldata.annotationFile is not None:
+                    serializer = serializers.AnnotationFileUploadSerializer(
+                        modeldata.annotationFile, data=data
+                    )
+                    serializer.is_valid(raise_exception=True)
+                    serializer.save(uploaded_by=request.user)
+                else:
+                    # no annotation was uploaded yet
+                    serializer = serializers.AnnotationFileUploadSerializer(data=data)
+                    serializer.is_valid(raise_exception=True)
+                    project = modeldata.project
+                    file = serializer.save(
+                        filePath=get_modeldata_file_path(modeldata, project)
+                    )
+                    # because File objects have no reference to ModelData,
+                    # the reference is set here
+                    modeldata.annotationFile = file
+                    modeldata.save()
+                versions.record_version(
+                    modeldata, cast(User, request.user), serializer.labels
+                )
+        finally:
+            self.close_upload_data(request, data)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-            serializer = serializers.AnnotationFileUploadSerializer(
-                modeldata.annotationFile, data=request.data
+
+class AnnotationVersionViewSet(GenericViewSet):
+    queryset = models.ModelData.objects.all()
+    serializer_class = serializers.AnnotationVersionSerializer
+    permission_classes = [IsAuthenticated, permissions.IsPartOfProject]
+
+    def list(self, request: Request, pk: Optional[str] = None) -> Response:
+        modeldata: models.ModelData = self.get_object()
+        queryset = modeldata.annotationVersions.select_related("created_by")
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
+    # Downloads a version in the anno3d format given with the anno3d_format
+    # parameter, like the current annotationFile.
+    def retrieve(
+        self, request: Request, pk: Optional[str] = None, number: int = 0
+    ) -> HttpResponseBase:
+        version = self.get_version(number)
+        name = get_anno3d_format(request)
+        try:
+            return versions.download_response(
+                request._request,
+                version,
+                name,
+                annotations.get_label_classes(version.modelData.project),
             )
-            serializer.is_valid(raise_exception=True)
-            serializer.save(uploaded_by=request.user)
-        else:
-            # no annotation was uploaded yet
-            serializer = serializers.AnnotationFileUploadSerializer(data=request.data)
-            serializer.is_valid(raise_exception=True)
-            project = modeldata.project
-            file = serializer.save(filePath=get_modeldata_file_path(modeldata, project))
-            # because File objects have no reference to ModelData,
-            # the reference is set here
-            modeldata.annotationFile = file
+        except FileNotFoundError:
+            raise exceptions.NotFound("The annotation version was not found.")
+
+    # Makes a former version the current annotationFile. The restored state is
+    # recorded as a new version, so restoring can be undone as well.
+    @action(detail=True, methods=["post"])
+    def restore(
+        self, request: Request, pk: Optional[str] = None, number: int = 0
+    ) -> Response:
+        version = self.get_version(number)
+        with transaction.atomic():
+            modeldata = models.ModelData.objects.select_for_update().get(
+                pk=version.modelData_id
+            )
+            check_modeldata_lock(self, modeldata, request.user)
+            try:
+                labels = versions.read_labels(version)
+            except FileNotFoundError:
+                raise exceptions.NotFound("The annotation version was not found.")
+
+            fileObj = annotations.save_labels(
+                modeldata, labels, cast(User, request.user)
+            )
+            versions.record_version(
+                modeldata, fileObj.uploaded_by, labels, restoredFrom=version.number
+            )
+
+        response = Response(serializers.FileSerializer(fileObj).data)
+        response.headers["ETag"] = downloads.get_etag(fileObj)
+        return response
+
+    def get_version(self, number: int) -> models.AnnotationVersion:
+        modeldata: models.ModelData = self.get_object()
+        return get_object_or_404(modeldata.annotationVersions, number=number)
+
+
+class UploadSessionViewSet(GenericViewSet):
+    queryset = models.ModelData.objects.all()
+    serializer_class = serializers.UploadSessionSerializer
+    permission_classes = [IsAuthenticated, permissions.IsPartOfProject]
+    # set by the url configuration, either "baseFile" or "annotationFile"
+    fileType = ""
+
+    def initial(self, request: Request, *args: Any, **kwargs: Any) -> None:
+        super().initial(request, *args, **kwargs)
+        # chunks larger than any session allows are rejected before they are read
+        if self.action == "upload_chunk":
+            check_content_length(request._request, constants.UPLOAD_MAX_CHUNK_SIZE)
+
+    def create(self, request: Request, pk: Optional[str] = None) -> Response:
+        modeldata: models.ModelData = self.get_object()
+        self.check_upload_allowed(modeldata)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(
+            modelData=modeldata, fileType=self.fileType, created_by=request.user
+        )
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def retrieve(
+        self, request: Request, pk: Optional[str] = None, session_id: str = ""
+    ) -> Response:
+        session = self.get_session(session_id)
+        serializer = self.get_serializer(session)
+        return Response(serializer.data)
+
+    def destroy(
+        self, request: Request, pk: Optional[str] = None, session_id: str = ""
+    ) -> Response:
+        session = self.get_session(session_id)
+        session.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=["put"])
+    def upload_chunk(
+        self,
+        request: Request,
+        pk: Optional[str] = None,
+        session_id: str = "",
+        index: int = 0,
+    ) -> Response:
+        session = self.get_session(session_id)
+        if index >= session.get_chunkCount():
+            raise exceptions.NotFound("Chunk index is out of range.")
+
+        start, end = session.get_chunk_range(index)
+        received = uploads.write_chunk(session, index, request.stream)
+        if received != end - start:
+            raise exceptions.ValidationError(
+                f"Chunk {index} has to contain exactly {end - start} bytes.",
+                code="wrong_chunk_size",
+            )
+        # uploading a chunk twice is allowed and simply overwrites it
+        models.UploadChunk.objects.update_or_create(
+            session=session, index=index, defaults={"size": received}
+        )
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=["post"])
+    def finalize(
+        self, request: Request, pk: Optional[str] = None, session_id: str = ""
+    ) -> Response:
+        with transaction.atomic():
+            session = self.get_session(session_id, for_update=True)
+            modeldata = models.ModelData.objects.select_for_update().get(
+                pk=session.modelData_id
+            )
+            self.check_upload_allowed(modeldata)
+            if not uploads.is_complete(session):
+                raise Conflict(
+                    "Not all chunks of the upload have been received.",
+                    code="upload_incomplete",
+                )
+            part = uploads.read_part_file(session)
+            # the session is kept, so that corrupted chunks can be uploaded again
+            if session.checksum and part.sha256 != session.checksum:
+                raise exceptions.ValidationError(
+                    "The checksum of the upload does not match.",
+                    code="checksum_mismatch",
+                )
+            try:
+                members = uploads.validate_part_file(session)
+                blob = uploads.store_part_file(session, part)
+            except (archives.ArchiveError, AnnotationFileError) as error:
+                raise exceptions.ValidationError(error.message, code=error.code)
+            replaced = self.fileType == "annotationFile" and modeldata.annotationFile
+            if replaced:
+                fileObj = modeldata.annotationFile
+            else:
+                fileObj = models.File(
+                    filePath=get_modeldata_file_path(modeldata, modeldata.project)
+                )
+            fileObj.fileFormat = session.fileFormat
+            fileObj.uploaded_by = cast(User, request.user)
+            # transcoded annotationFiles are no longer the uploaded archive
+            if blob.sha256 != part.sha256:
+                members = None
+            if replaced:
+                blobs.replace_content(fileObj, blob, members)
+            else:
+                blobs.assign_blob(fileObj, blob, members)
+                fileObj.save()
+            setattr(modeldata, self.fileType, fileObj)
             modeldata.save()
+            session.delete()
+            if self.fileType == "annotationFile":
+                versions.record_version(modeldata, fileObj.uploaded_by, part.labels)
+        if self.fileType == "baseFile":
+            geometry.start_indexing(modeldata, fileObj.uploaded_by)
+
+        serializer = serializers.FileSerializer(fileObj)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    def check_upload_allowed(self, modeldata: models.ModelData) -> None:
+        if self.fileType == "baseFile":
+            # the baseFile is not allowed to be switched
+            if modeldata.baseFile is not None:
+                self.permission_denied(
+                    self.request,
+                    message="The baseFile is not allowed to be updated.",
+                    code="basefile_already_exists",
+                )
+        else:
+            check_modeldata_lock(self, modeldata, self.request.user)
+
+    def get_session(
+        self, session_id: str, for_update: bool = False
+    ) -> models.UploadSession:
+        modeldata: models.ModelData = self.get_object()
+        sessions = modeldata.uploadSessions.filter(
+            fileType=self.fileType, created_by=self.request.user
+        )
+        if for_update:
+            sessions = sessions.select_for_update()
+        return get_object_or_404(sessions, pk=session_id)
+
+
+class JobViewSet(GenericViewSet):
+    queryset = models.Job.objects.select_related("modelData__project")
+    serializer_class = serializers.JobSerializer
+    permission_classes = [IsAuthenticated, permissions.CanAccessJob]
+
+    def retrieve(self, request: Request, pk: Optional[str] = None) -> Response:
+        job = self.get_object()
+        serializer = self.get_serializer(job)
+        return Response(serializer.data)
+
+    # Cancels a queued or running job, finished jobs stay as they are.
+    @action(detail=True, methods=["post"])
+    def cancel(self, request: Request, pk: Optional[str] = None) -> Response:
+        job: models.Job = self.get_object()
+        if job.is_finished():
+            raise Conflict("The job is already finished.", code="job_finished")
+        jobs.cancel_job(job)
+        serializer = self.get_serializer(job)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
 
 class LoginView(KnoxLoginView):
     authentication_classes = [BasicAuthentication]
@@ -167,6 +167,14 @@ REST_KNOX = {
 
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Opt-in: let nginx send file downloads with an internal redirect (X-Accel-Redirect)
+# after Django checked the permissions. The prefix has to match the internal
+# location of the media directory in the nginx configuration.
+USE_X_ACCEL_REDIRECT = os.environ.get("DJANGO_USE_X_ACCEL_REDIRECT", "") == "true"
+X_ACCEL_REDIRECT_PREFIX = os.environ.get(
+    "DJANGO_X_ACCEL_REDIRECT_PREFIX", "/api/protected-media/"
+)
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost",
     "http://127.0.0.1",
@@ -14,6 +14,7 @@ from annotator.tests.factories import (
     ModelDataFactory,
     FileFactory,
 )
+from annotator.tests.query_budget import QueryBudget
 
 
 fake = faker.Faker("de_DE")
@@ -35,3 +36,8 @@ def api_client() -> Type[APIClient]:
 @pytest.fixture
 def api_factory() -> Type[APIRequestFactory]:
     return APIRequestFactory
+
+
+@pytest.fixture
+def query_budget() -> QueryBudget:
+    return QueryBudget()
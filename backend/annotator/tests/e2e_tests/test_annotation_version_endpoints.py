@@ -0,0 +1,178 @@
+import io
+import zipfile
+from typing import Any
+
+import numpy as np
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+
+from annotator.backend import annotations, versions
+from annotator.backend.anno3d import generic
+from annotator.backend.models import AnnotationVersion, ModelData
+from annotator.tests import factories
+from annotator.tests.conftest import api_client as api_client_function
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def client(model_data: ModelData, api_client: api_client_function) -> Any:
+    client = api_client()
+    client.force_authenticate(model_data.owner)
+    return client
+
+
+def upload(client: Any, model_data: ModelData, labels: Any) -> None:
+    upload_file = SimpleUploadedFile(
+        "annotationFile.zip", factories.create_annotation_file_zip(labels)
+    )
+    response = client.put(
+        reverse("annotationfile", kwargs={"pk": model_data.id}),
+        {"file": upload_file, "fileFormat": "application/zip"},
+    )
+    assert response.status_code == 201
+
+
+def read_response(response: Any) -> Any:
+    content = b"".join(response.streaming_content)
+    return annotations.read_archive(io.BytesIO(content))
+
+
+class TestAnnotationVersions:
+    def test_list(self, model_data: ModelData, client: Any):
+        first = factories.create_labels()
+        second = first.copy()
+        second[:10] = 1
+        upload(client, model_data, first)
+        upload(client, model_data, second)
+        # uploading the same content again is no new version
+        upload(client, model_data, second)
+
+        response = client.get(
+            reverse("annotationfile-versions", kwargs={"pk": model_data.id})
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert [version["number"] for version in data] == [1, 2]
+        assert data[0]["count"] == len(first)
+        assert data[1]["created_by"]["user_id"] == model_data.owner.id
+        assert data[1]["restoredFrom"] is None
+
+    def test_recorded_with_the_upload(
+        self, model_data: ModelData, client: Any, monkeypatch: pytest.MonkeyPatch
+    ):
+        upload(client, model_data, factories.create_labels())
+        model_data.refresh_from_db()
+        sha256 = model_data.annotationFile.sha256
+
+        def fail(*args: Any) -> None:
+            raise OSError("disk full")
+
+        monkeypatch.setattr(versions, "store_chunks", fail)
+        with pytest.raises(OSError):
+            upload(client, model_data, factories.create_labels(classes=2))
+
+        # the version is recorded in the transaction that replaces the file
+        model_data.refresh_from_db()
+        assert model_data.annotationFile.sha256 == sha256
+        assert model_data.annotationVersions.count() == 1
+
+    def test_download(self, model_data: ModelData, client: Any):
+        first = factories.create_labels()
+        upload(client, model_data, first)
+        upload(client, model_data, factories.create_labels())
+        endpoint = reverse(
+            "annotationfile-version", kwargs={"pk": model_data.id, "number": 1}
+        )
+
+        response = client.get(endpoint)
+
+        assert response.status_code == 200
+        name, labels = read_response(response)
+        assert name == generic.FORMAT_UTF8V1
+        assert np.array_equal(labels, first)
+
+        response = client.get(endpoint, {"anno3d_format": generic.FORMAT_BINARYV2})
+        name, labels = read_response(response)
+        assert name == generic.FORMAT_BINARYV2
+        assert np.array_equal(labels, first)
+
+        response = client.get(
+            endpoint,
+            {"anno3d_format": generic.FORMAT_BINARYV2},
+            HTTP_IF_NONE_MATCH=response.headers["ETag"],
+        )
+        assert response.status_code == 304
+
+    def test_download_unknown_version(self, model_data: ModelData, client: Any):
+        upload(client, model_data, factories.create_labels())
+        endpoint = reverse(
+            "annotationfile-version", kwargs={"pk": model_data.id, "number": 2}
+        )
+
+        response = client.get(endpoint)
+
+        assert response.status_code == 404
+
+    def test_restore(self, model_data: ModelData, client: Any):
+        first = factories.create_labels()
+        upload(client, model_data, first)
+        upload(client, model_data, factories.create_labels())
+
+        response = client.post(
+            reverse(
+                "annotationfile-version-restore",
+                kwargs={"pk": model_data.id, "number": 1},
+            )
+        )
+
+        assert response.status_code == 200
+        response = client.get(
+            reverse("annotationfile", kwargs={"pk": model_data.id}),
+            {"anno3d_format": generic.FORMAT_BINARYV2},
+        )
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+        with archive.open(archive.namelist()[0]) as member:
+            _, labels = generic.parse(member)
+        assert np.array_equal(labels, first)
+        latest = AnnotationVersion.objects.filter(modelData=model_data).last()
+        assert latest is not None
+        assert latest.number == 3
+        assert latest.restoredFrom == 1
+
+    def test_restore_locked(
+        self,
+        model_data: ModelData,
+        client: Any,
+        user_factory: factories.UserFactory,
+    ):
+        upload(client, model_data, factories.create_labels())
+        model_data.locked = user_factory.create()
+        model_data.save()
+
+        response = client.post(
+            reverse(
+                "annotationfile-version-restore",
+                kwargs={"pk": model_data.id, "number": 1},
+            )
+        )
+
+        assert response.status_code == 403
+        assert response.json()["code"] == "modeldata_locked"
+
+    def test_no_project_member(
+        self,
+        model_data: ModelData,
+        api_client: api_client_function,
+        user_factory: factories.UserFactory,
+    ):
+        client = api_client()
+        client.force_authenticate(user_factory.create())
+
+        response = client.get(
+            reverse("annotationfile-versions", kwargs={"pk": model_data.id})
+        )
+
+        assert response.status_code == 403
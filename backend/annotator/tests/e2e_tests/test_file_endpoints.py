@@ -1,15 +1,25 @@
+import gzip
+import io
 import json
+import os
+import tracemalloc
+import zipfile
+from pathlib import Path
 from typing import Any
 
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.http import FileResponse
 
 from rest_framework.request import Request
 
-from annotator.backend import utils
-from annotator.backend.models import ModelData, File
+from annotator.backend import annotations, constants, utils
+from annotator.backend.models import Blob, ModelData, File, TranscodedBlob
+from annotator.backend.anno3d import generic, utf8v1
+from annotator.backend.serializers import AnnotationFileUploadSerializer
 from annotator.backend.views import FileViewSet
 
+import numpy as np
 import pytest
 
 from django.urls import reverse
@@ -20,7 +30,6 @@ from rest_framework.test import force_authenticate
 from annotator.tests.conftest import (
     api_client as api_client_function,
     test_dir_path,
-    fake,
     api_factory as api_factory_function,
 )
 from annotator.tests import factories
@@ -69,7 +78,7 @@ class TestFileEndpoints:
         api_factory: api_factory_function,
     ):
         endpoint = reverse("basefile", kwargs={"pk": model_data.id})
-        file_data = fake.zip()
+        file_data = factories.create_base_file_zip()
         upload_file = SimpleUploadedFile(
             "baseFile.zip", file_data, content_type="multipart/form-data"
         )
@@ -89,6 +98,11 @@ class TestFileEndpoints:
 
         assert model_data.baseFile.file.size == data["file"].size
         assert model_data.baseFile.fileFormat == data["fileFormat"]
+        # measured while the file was uploaded
+        assert model_data.baseFile.fileSize == len(file_data)
+        members = model_data.baseFile.archiveMembers
+        assert [member["name"] for member in members] == ["model.ply"]
+        assert members[0]["fileSize"] == 4096
 
         response: Response = FileViewSet.as_view({"put": "upload_basefile"})(
             request, pk=model_data.id
@@ -105,7 +119,8 @@ class TestFileEndpoints:
         api_factory: api_factory_function,
     ):
         endpoint = reverse("annotationfile", kwargs={"pk": model_data.id})
-        file_data = fake.zip()
+        labels = factories.create_labels()
+        file_data = factories.create_annotation_file_zip(labels)
         upload_file = SimpleUploadedFile(
             "annotationFile.zip", file_data, content_type="multipart/form-data"
         )
@@ -124,8 +139,12 @@ class TestFileEndpoints:
         model_data.refresh_from_db()
 
         assert response.status_code == 201
-        assert model_data.annotationFile.file.size == data["file"].size
         assert model_data.annotationFile.fileFormat == data["fileFormat"]
+        # UTF8v1 uploads are stored in the canonical format
+        with model_data.annotationFile.file.open() as stored:
+            name, stored_labels = annotations.read_archive(stored)
+        assert name == annotations.CANONICAL_FORMAT
+        assert np.array_equal(stored_labels, labels)
 
         response: Response = FileViewSet.as_view({"put": "upload_annotationfile"})(
             request, pk=model_data.id
@@ -133,9 +152,26 @@ class TestFileEndpoints:
         model_data.refresh_from_db()
 
         assert response.status_code == 201
-        assert model_data.annotationFile.file.size == data["file"].size
         assert model_data.annotationFile.fileFormat == data["fileFormat"]
 
+    def test_upload_invalid_annotationfile(
+        self,
+        model_data: ModelData,
+        api_client: api_client_function,
+    ):
+        endpoint = reverse("annotationfile", kwargs={"pk": model_data.id})
+        file_data = factories.create_zip({"annotation.anno3d": b"format UTF8\n"})
+        upload_file = SimpleUploadedFile("annotationFile.zip", file_data)
+
+        client = api_client()
+        client.force_authenticate(model_data.owner)
+        response: Response = client.put(
+            endpoint, {"file": upload_file, "fileFormat": "application/zip"}
+        )
+
+        assert response.status_code == 400
+        assert response.json()["errors"]["file"][0]["code"] == "parsing_error"
+
     @pytest.mark.parametrize(
         "filename",
         [
@@ -160,3 +196,607 @@ class TestFileEndpoints:
 
         assert response.status_code == 404
         assert content_dict["code"] == "not_found"
+
+
+class TestFileDownloadRanges:
+    @pytest.fixture
+    def stored_file(
+        self, model_data: ModelData, file_factory: factories.FileFactory
+    ) -> File:
+        file_path = test_dir_path + utils.get_modeldata_file_path(
+            model_data, model_data.project
+        )
+        file: File = file_factory.build(
+            filePath=file_path, uploaded_by=model_data.owner
+        )
+        file.file.name = "baseFile.zip"
+        file.sha256 = utils.hash_file(file.file)
+        file.save()
+        model_data.baseFile = file
+        model_data.save()
+        return file
+
+    def get(self, model_data: ModelData, api_client: Any, **headers: str) -> Any:
+        endpoint = reverse("basefile", kwargs={"pk": model_data.id})
+        client = api_client()
+        client.force_authenticate(model_data.owner)
+        return client.get(endpoint, **headers)
+
+    def test_validators(
+        self, model_data: ModelData, stored_file: File, api_client: api_client_function
+    ):
+        response = self.get(model_data, api_client)
+
+        assert response.status_code == 200
+        assert response.headers["Accept-Ranges"] == "bytes"
+        assert stored_file.sha256 in response.headers["ETag"]
+
+        etag = response.headers["ETag"]
+        response = self.get(model_data, api_client, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+
+        last_modified = response.headers["Last-Modified"]
+        response = self.get(
+            model_data, api_client, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        assert response.status_code == 304
+
+        response = self.get(model_data, api_client, HTTP_IF_NONE_MATCH='"outdated"')
+        assert response.status_code == 200
+
+    def test_single_range(
+        self, model_data: ModelData, stored_file: File, api_client: api_client_function
+    ):
+        content = stored_file.file.open().read()
+        size = len(content)
+
+        response = self.get(model_data, api_client, HTTP_RANGE="bytes=10-19")
+        assert response.status_code == 206
+        assert response.headers["Content-Range"] == f"bytes 10-19/{size}"
+        assert b"".join(response.streaming_content) == content[10:20]
+
+        response = self.get(model_data, api_client, HTTP_RANGE="bytes=-5")
+        assert response.status_code == 206
+        assert b"".join(response.streaming_content) == content[-5:]
+
+        response = self.get(model_data, api_client, HTTP_RANGE=f"bytes={size}-")
+        assert response.status_code == 416
+        assert response.headers["Content-Range"] == f"bytes */{size}"
+
+    def test_multi_range(
+        self, model_data: ModelData, stored_file: File, api_client: api_client_function
+    ):
+        content = stored_file.file.open().read()
+
+        response = self.get(model_data, api_client, HTTP_RANGE="bytes=0-4,20-29")
+        body = b"".join(response.streaming_content)
+
+        assert response.status_code == 206
+        assert response.headers["Content-Type"].startswith("multipart/byteranges")
+        assert int(response.headers["Content-Length"]) == len(body)
+        assert content[0:5] in body
+        assert content[20:30] in body
+
+    def test_if_range(
+        self, model_data: ModelData, stored_file: File, api_client: api_client_function
+    ):
+        etag = self.get(model_data, api_client).headers["ETag"]
+
+        response = self.get(
+            model_data, api_client, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE=etag
+        )
+        assert response.status_code == 206
+
+        response = self.get(
+            model_data, api_client, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"outdated"'
+        )
+        assert response.status_code == 200
+
+    def test_x_accel_redirect(
+        self,
+        model_data: ModelData,
+        stored_file: File,
+        api_client: api_client_function,
+        settings,
+    ):
+        settings.USE_X_ACCEL_REDIRECT = True
+
+        response = self.get(model_data, api_client)
+        assert response.status_code == 200
+        assert response.headers["X-Accel-Redirect"] == (
+            "/api/protected-media/" + stored_file.file.name
+        )
+        assert response.content == b""
+
+        etag = response.headers["ETag"]
+        response = self.get(model_data, api_client, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+
+        # If-Range is evaluated by Django, nginx does not know the ETag
+        response = self.get(
+            model_data, api_client, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE=etag
+        )
+        assert response.status_code == 206
+        assert "X-Accel-Redirect" not in response.headers
+
+
+class TestAnnotationFileFormats:
+    @pytest.fixture
+    def labels(self, model_data: ModelData, api_client: api_client_function):
+        labels = factories.create_labels()
+        endpoint = reverse("annotationfile", kwargs={"pk": model_data.id})
+        client = api_client()
+        client.force_authenticate(model_data.owner)
+        upload_file = SimpleUploadedFile(
+            "annotationFile.zip", factories.create_annotation_file_zip(labels)
+        )
+        response = client.put(
+            endpoint, {"file": upload_file, "fileFormat": "application/zip"}
+        )
+        assert response.status_code == 201
+        return labels
+
+    def get(self, model_data: ModelData, api_client: Any, query: str = "", **headers):
+        endpoint = reverse("annotationfile", kwargs={"pk": model_data.id})
+        client = api_client()
+        client.force_authenticate(model_data.owner)
+        return client.get(endpoint + query, **headers)
+
+    def read_response(self, response: Any) -> tuple[str, Any]:
+        content = b"".join(response.streaming_content)
+        return annotations.read_archive(io.BytesIO(content))
+
+    def test_default_format(
+        self, model_data: ModelData, labels, api_client: api_client_function
+    ):
+        response = self.get(model_data, api_client)
+
+        assert response.status_code == 200
+        assert response.headers["Accept-Ranges"] == "bytes"
+        assert response.headers["ETag"].startswith('"')
+        content = b"".join(response.streaming_content)
+        name, downloaded = annotations.read_archive(io.BytesIO(content))
+        assert name == generic.FORMAT_UTF8V1
+        assert np.array_equal(downloaded, labels)
+
+        etag = response.headers["ETag"]
+        response = self.get(model_data, api_client, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+
+        # the transcoded archive is stored, so ranges of it can be resumed
+        response = self.get(
+            model_data, api_client, HTTP_RANGE="bytes=10-", HTTP_IF_RANGE=etag
+        )
+        assert response.status_code == 206
+        assert b"".join(response.streaming_content) == content[10:]
+        assert TranscodedBlob.objects.count() == 1
+
+    def test_written_like_the_frontend(
+        self, model_data: ModelData, api_client: api_client_function
+    ):
+        # the frontend writes every label of the project, in the order of the labels
+        classes = [3, 5, 0, 1, 2]
+        for annotationClass in classes:
+            factories.LabelFactory(
+                project=model_data.project, annotationClass=annotationClass
+            )
+        labels = factories.create_labels()
+        data = utf8v1.serialize_bytes(labels, classes)
+        endpoint = reverse("annotationfile", kwargs={"pk": model_data.id})
+        client = api_client()
+        client.force_authenticate(model_data.owner)
+        upload_file = SimpleUploadedFile(
+            "annotationFile.zip", factories.create_zip({"annotation.anno3d": data})
+        )
+        response = client.put(
+            endpoint, {"file": upload_file, "fileFormat": "application/zip"}
+        )
+        assert response.status_code == 201
+
+        response = self.get(model_data, api_client)
+        assert response.status_code == 200
+        content = b"".join(response.streaming_content)
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            assert archive.read(annotations.MEMBER_NAME) == data
+
+        # labels added later on change the download
+        etag = response.headers["ETag"]
+        factories.LabelFactory(project=model_data.project, annotationClass=4)
+        response = self.get(model_data, api_client, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        content = b"".join(response.streaming_content)
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            member = archive.read(annotations.MEMBER_NAME)
+        assert member == utf8v1.serialize_bytes(labels, classes + [4])
+        assert TranscodedBlob.objects.count() == 2
+
+    def test_transcoded_blob_released(
+        self,
+        model_data: ModelData,
+        labels,
+        api_client: api_client_function,
+        django_capture_on_commit_callbacks,
+    ):
+        assert self.get(model_data, api_client).status_code == 200
+        transcoded = TranscodedBlob.objects.select_related("blob").get()
+        name = transcoded.blob.file.name
+
+        model_data.refresh_from_db()
+        with django_capture_on_commit_callbacks(execute=True):
+            model_data.annotationFile.delete()
+
+        assert not TranscodedBlob.objects.exists()
+        assert not Blob.objects.filter(
+            pk__in=[transcoded.source_id, transcoded.blob_id]
+        ).exists()
+        assert not default_storage.exists(name)
+
+    def test_canonical_format(
+        self, model_data: ModelData, labels, api_client: api_client_function
+    ):
+        response = self.get(model_data, api_client, "?anno3d_format=binv2")
+
+        assert response.status_code == 200
+        assert response.headers["Accept-Ranges"] == "bytes"
+        name, downloaded = self.read_response(response)
+        assert name == generic.FORMAT_BINARYV2
+        assert np.array_equal(downloaded, labels)
+
+    def test_unsupported_format(
+        self, model_data: ModelData, labels, api_client: api_client_function
+    ):
+        response = self.get(model_data, api_client, "?anno3d_format=utf16")
+
+        assert response.status_code == 400
+        assert response.json()["errors"][0]["code"] == "unsupported_format"
+
+    def test_equal_annotations_share_blob(
+        self, model_data: ModelData, labels, api_client: api_client_function
+    ):
+        model_data.refresh_from_db()
+        first = model_data.annotationFile
+        serializer = AnnotationFileUploadSerializer(
+            data={
+                "file": SimpleUploadedFile(
+                    "annotationFile.zip", factories.create_annotation_file_zip(labels)
+                ),
+                "fileFormat": "application/zip",
+            }
+        )
+        serializer.is_valid(raise_exception=True)
+        second = serializer.save(filePath="test/", uploaded_by=model_data.owner)
+
+        assert second.blob_id == first.blob_id
+
+
+class TestAnnotationFilePatch:
+    @pytest.fixture
+    def client(self, model_data: ModelData, api_client: api_client_function):
+        client = api_client()
+        client.force_authenticate(model_data.owner)
+        return client
+
+    @pytest.fixture
+    def labels(self, model_data: ModelData, client: Any):
+        labels = factories.create_labels()
+        upload_file = SimpleUploadedFile(
+            "annotationFile.zip", factories.create_annotation_file_zip(labels)
+        )
+        response = client.put(
+            reverse("annotationfile", kwargs={"pk": model_data.id}),
+            {"file": upload_file, "fileFormat": "application/zip"},
+        )
+        assert response.status_code == 201
+        return labels
+
+    def patch(self, model_data: ModelData, client: Any, changes: Any, **headers):
+        return client.patch(
+            reverse("annotationfile", kwargs={"pk": model_data.id}),
+            {"changes": changes},
+            format="json",
+            **headers,
+        )
+
+    def get_etag(self, model_data: ModelData, client: Any) -> str:
+        endpoint = reverse("annotationfile", kwargs={"pk": model_data.id})
+        return client.get(endpoint).headers["ETag"]
+
+    def test_patch(self, model_data: ModelData, labels, client: Any):
+        etag = self.get_etag(model_data, client)
+
+        response = self.patch(
+            model_data, client, [[0, 10, 1], [5, 20, 65535]], HTTP_IF_MATCH=etag
+        )
+
+        assert response.status_code == 200
+        labels[0:10] = 1
+        labels[5:20] = 65535
+        model_data.refresh_from_db()
+        with model_data.annotationFile.file.open() as stored:
+            _, stored_labels = annotations.read_archive(stored)
+        assert np.array_equal(stored_labels, labels)
+
+        # the new ETag is the base of the next patch, the old one is stale
+        response = self.patch(
+            model_data, client, [[0, 1, 2]], HTTP_IF_MATCH=response.headers["ETag"]
+        )
+        assert response.status_code == 200
+        response = self.patch(model_data, client, [[0, 1, 2]], HTTP_IF_MATCH=etag)
+        assert response.status_code == 409
+        assert response.json()["code"] == "stale_base"
+
+    def test_missing_base(self, model_data: ModelData, labels, client: Any):
+        response = self.patch(model_data, client, [[0, 1, 2]])
+
+        assert response.status_code == 428
+        assert response.json()["code"] == "missing_base"
+
+    @pytest.mark.parametrize(
+        "changes,code",
+        [
+            ([[0, 1001, 1]], "index_out_of_range"),
+            ([[5, 5, 1]], "index_out_of_range"),
+            ([[0, 1]], "invalid"),
+            ([[0, 1.5, 1]], "invalid"),
+            ([[0, 1, 70000]], "out_of_range"),
+            ([], "empty"),
+        ],
+    )
+    def test_invalid_changes(
+        self, model_data: ModelData, labels, client: Any, changes: Any, code: str
+    ):
+        etag = self.get_etag(model_data, client)
+
+        response = self.patch(model_data, client, changes, HTTP_IF_MATCH=etag)
+
+        assert response.status_code == 400
+        errors = response.json()["errors"]
+        assert (errors[0] if isinstance(errors, list) else errors["changes"][0])[
+            "code"
+        ] == code
+
+    def test_locked(
+        self,
+        model_data: ModelData,
+        labels,
+        client: Any,
+        user_factory: factories.UserFactory,
+    ):
+        etag = self.get_etag(model_data, client)
+        model_data.locked = user_factory.create()
+        model_data.save()
+
+        response = self.patch(model_data, client, [[0, 1, 2]], HTTP_IF_MATCH=etag)
+
+        assert response.status_code == 403
+        assert response.json()["code"] == "modeldata_locked"
+
+
+# A multipart body with a file of zeros, generated while it is read. Remembers how
+# much of it was read and the most disk space the temporary files took meanwhile.
+class GeneratedUpload:
+    def __init__(self, fileSize: int, tempDir: Path) -> None:
+        self.head = (
+            b"--boundary\r\n"
+            b'Content-Disposition: form-data; name="file"; filename="baseFile.zip"'
+            b"\r\nContent-Type: application/zip\r\n\r\n"
+        )
+        self.tail = b"\r\n--boundary--\r\n"
+        self.length = len(self.head) + fileSize + len(self.tail)
+        self.position = 0
+        self.tempDir = tempDir
+        self.peakDisk = 0
+
+    def read(self, size: int = -1) -> bytes:
+        disk = sum(entry.stat().st_size for entry in os.scandir(self.tempDir))
+        self.peakDisk = max(self.peakDisk, disk)
+        end = self.length if size < 0 else min(self.length, self.position + size)
+        body = bytearray(end - self.position)
+        for offset, part in ((0, self.head), (self.length - len(self.tail), self.tail)):
+            low, high = max(offset, self.position), min(offset + len(part), end)
+            if low < high:
+                body[low - self.position : high - self.position] = part[
+                    low - offset : high - offset
+                ]
+        self.position = end
+        return bytes(body)
+
+
+class TestUploadLimits:
+    @pytest.fixture
+    def temp_dir(self, settings, tmp_path: Path) -> Path:
+        settings.MEDIA_ROOT = str(tmp_path / "media")
+        settings.FILE_UPLOAD_TEMP_DIR = str(tmp_path / "temp")
+        os.makedirs(settings.FILE_UPLOAD_TEMP_DIR)
+        return tmp_path / "temp"
+
+    def put(self, client: Any, model_data: ModelData, body: GeneratedUpload) -> Any:
+        return client.put(
+            reverse("basefile", kwargs={"pk": model_data.pk}),
+            content_type="multipart/form-data; boundary=boundary",
+            CONTENT_LENGTH=str(body.length),
+            **{"wsgi.input": body},
+        )
+
+    def test_content_length(
+        self, model_data: ModelData, api_client: api_client_function, temp_dir: Path
+    ):
+        client = api_client()
+        client.force_authenticate(model_data.owner)
+        body = GeneratedUpload(5 * pow(2, 30), temp_dir)
+
+        response = self.put(client, model_data, body)
+
+        assert response.status_code == 413
+        assert response.json()["code"] == "too_large"
+        # rejected before any of the body was read
+        assert body.position == 0
+        model_data.refresh_from_db()
+        assert model_data.baseFile is None
+
+    def test_bounded_while_streaming(
+        self,
+        model_data: ModelData,
+        api_client: api_client_function,
+        temp_dir: Path,
+        monkeypatch: pytest.MonkeyPatch,
+    ):
+        limit = 4 * pow(2, 20)
+        monkeypatch.setattr(FileViewSet, "upload_limits", {"upload_basefile": limit})
+        # a Content-Length that passes, e.g. of a misbehaving proxy
+        monkeypatch.setattr(constants, "FILE_MAX_FORM_OVERHEAD", pow(2, 30))
+        client = api_client()
+        client.force_authenticate(model_data.owner)
+        body = GeneratedUpload(64 * pow(2, 20), temp_dir)
+
+        tracemalloc.start()
+        try:
+            response = self.put(client, model_data, body)
+            peakMemory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        assert response.status_code == 413
+        assert response.json()["code"] == "too_large"
+        # the rest of the body is not read
+        assert body.position <= limit + 2 * constants.UPLOAD_STREAM_BLOCK_SIZE
+        assert body.peakDisk < limit
+        assert peakMemory < limit
+        assert list(temp_dir.iterdir()) == []
+
+
+class TestRawUploads:
+    @pytest.fixture
+    def temp_dir(self, settings, tmp_path: Path) -> Path:
+        settings.MEDIA_ROOT = str(tmp_path / "media")
+        settings.FILE_UPLOAD_TEMP_DIR = str(tmp_path / "temp")
+        os.makedirs(settings.FILE_UPLOAD_TEMP_DIR)
+        return tmp_path / "temp"
+
+    def put(
+        self,
+        model_data: ModelData,
+        api_client: Any,
+        name: str,
+        body: bytes,
+        query: str = "?fileFormat=application/zip",
+        **headers,
+    ) -> Any:
+        client = api_client()
+        client.force_authenticate(model_data.owner)
+        endpoint = reverse(name, kwargs={"pk": model_data.pk}) + query
+        return client.put(endpoint, body, content_type="application/zip", **headers)
+
+    def test_basefile(
+        self, model_data: ModelData, api_client: api_client_function, temp_dir: Path
+    ):
+        file_data = factories.create_base_file_zip()
+
+        response = self.put(
+            model_data, api_client, "basefile", file_data, "?fileFormat=obj"
+        )
+
+        assert response.status_code == 201
+        model_data.refresh_from_db()
+        assert model_data.baseFile.fileFormat == "obj"
+        assert model_data.baseFile.fileSize == len(file_data)
+        members = model_data.baseFile.archiveMembers
+        assert [member["name"] for member in members] == ["model.ply"]
+        assert list(temp_dir.iterdir()) == []
+
+    def test_annotationfile_gzip(
+        self, model_data: ModelData, api_client: api_client_function, temp_dir: Path
+    ):
+        labels = factories.create_labels()
+        body = gzip.compress(factories.create_annotation_file_zip(labels))
+
+        response = self.put(
+            model_data,
+            api_client,
+            "annotationfile",
+            body,
+            HTTP_CONTENT_ENCODING="gzip",
+        )
+
+        assert response.status_code == 201
+        model_data.refresh_from_db()
+        with model_data.annotationFile.file.open() as stored:
+            name, stored_labels = annotations.read_archive(stored)
+        assert name == annotations.CANONICAL_FORMAT
+        assert np.array_equal(stored_labels, labels)
+        assert model_data.annotationVersions.count() == 1
+        assert list(temp_dir.iterdir()) == []
+
+    def test_basefile_gzip(
+        self, model_data: ModelData, api_client: api_client_function, temp_dir: Path
+    ):
+        body = gzip.compress(factories.create_base_file_zip())
+
+        response = self.put(
+            model_data, api_client, "basefile", body, HTTP_CONTENT_ENCODING="gzip"
+        )
+
+        assert response.status_code == 415
+        model_data.refresh_from_db()
+        assert model_data.baseFile is None
+
+    def test_invalid_gzip(
+        self, model_data: ModelData, api_client: api_client_function, temp_dir: Path
+    ):
+        body = gzip.compress(factories.create_annotation_file_zip())
+
+        response = self.put(
+            model_data,
+            api_client,
+            "annotationfile",
+            body[:-10],
+            HTTP_CONTENT_ENCODING="gzip",
+        )
+
+        assert response.status_code == 400
+        assert response.json()["errors"][0]["code"] == "invalid_encoding"
+        assert list(temp_dir.iterdir()) == []
+
+    def test_gzip_is_limited(
+        self,
+        model_data: ModelData,
+        api_client: api_client_function,
+        temp_dir: Path,
+        monkeypatch: pytest.MonkeyPatch,
+    ):
+        limit = pow(2, 20)
+        monkeypatch.setattr(
+            FileViewSet, "upload_limits", {"upload_annotationfile": limit}
+        )
+        # a small body that expands far beyond the limit
+        body = gzip.compress(bytes(64 * pow(2, 20)))
+
+        tracemalloc.start()
+        try:
+            response = self.put(
+                model_data,
+                api_client,
+                "annotationfile",
+                body,
+                HTTP_CONTENT_ENCODING="gzip",
+            )
+            peakMemory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        assert response.status_code == 413
+        assert response.json()["code"] == "too_large"
+        assert peakMemory < limit + len(body)
+        assert list(temp_dir.iterdir()) == []
+
+    def test_missing_file_format(
+        self, model_data: ModelData, api_client: api_client_function, temp_dir: Path
+    ):
+        body = factories.create_base_file_zip()
+
+        response = self.put(model_data, api_client, "basefile", body, "")
+
+        assert response.status_code == 400
+        assert response.json()["errors"]["fileFormat"][0]["code"] == "required"
+        assert list(temp_dir.iterdir()) == []
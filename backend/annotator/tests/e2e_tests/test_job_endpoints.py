@@ -0,0 +1,77 @@
+import pytest
+from django.urls import reverse
+
+from annotator.backend import jobs
+from annotator.backend.models import Job, ModelData
+from annotator.tests import factories
+from annotator.tests.conftest import api_client as api_client_function
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def job(model_data: ModelData) -> Job:
+    return jobs.enqueue(
+        "prune_annotation_versions", user=model_data.owner, modelData=model_data
+    )
+
+
+class TestJobEndpoints:
+    def test_retrieve(self, job: Job, api_client: api_client_function):
+        client = api_client()
+        client.force_authenticate(job.created_by)
+
+        response = client.get(reverse("job", kwargs={"pk": job.pk}))
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["job_id"] == str(job.pk)
+        assert data["status"] == Job.QUEUED
+        assert data["progress"] == 0
+
+        jobs.work(once=True)
+        data = client.get(reverse("job", kwargs={"pk": job.pk})).json()
+        assert data["status"] == Job.SUCCEEDED
+        assert data["result"]["versions"] == 0
+
+    def test_project_member(
+        self,
+        job: Job,
+        api_client: api_client_function,
+        user_factory: factories.UserFactory,
+    ):
+        member = user_factory.create()
+        job.modelData.project.users.add(member)
+        client = api_client()
+        client.force_authenticate(member)
+
+        response = client.get(reverse("job", kwargs={"pk": job.pk}))
+
+        assert response.status_code == 200
+
+    def test_no_access(
+        self,
+        job: Job,
+        api_client: api_client_function,
+        user_factory: factories.UserFactory,
+    ):
+        client = api_client()
+        client.force_authenticate(user_factory.create())
+
+        response = client.get(reverse("job", kwargs={"pk": job.pk}))
+
+        assert response.status_code == 403
+        assert response.json()["code"] == "missing_permission"
+
+    def test_cancel(self, job: Job, api_client: api_client_function):
+        client = api_client()
+        client.force_authenticate(job.created_by)
+
+        response = client.post(reverse("job-cancel", kwargs={"pk": job.pk}))
+
+        assert response.status_code == 202
+        assert response.json()["status"] == Job.CANCELLED
+
+        response = client.post(reverse("job-cancel", kwargs={"pk": job.pk}))
+        assert response.status_code == 409
+        assert response.json()["code"] == "job_finished"
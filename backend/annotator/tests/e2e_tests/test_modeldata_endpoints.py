@@ -1,9 +1,13 @@
 from typing import Any
 
-from annotator.backend.models import Project, ModelData
+import numpy as np
+
+from annotator.backend import annotations, blobs, geometry, jobs, tiles
+from annotator.backend.models import AnnotationAgreement, Job, Project, ModelData
 
 import pytest
 
+from django.core.files.base import ContentFile
 from django.urls import reverse
 from requests import Response
 
@@ -95,6 +99,21 @@ class TestModelDataEndpoint:
         assert content_dict["annotationFile"] == model_data.annotationFile
         assert content_dict["baseFile"] == model_data.baseFile
 
+    def test_retrieve_does_not_read_storage(
+        self, model_data: ModelData, api_client: api_client_function, mocker
+    ):
+        model_data.baseFile = factories.FileFactory.create(fileSize=1234)
+        model_data.save()
+        storage = mocker.patch("django.core.files.storage.FileSystemStorage.size")
+        client = api_client()
+        client.force_authenticate(model_data.owner)
+
+        response = client.get(reverse("modeldata-detail", kwargs={"pk": model_data.pk}))
+
+        assert response.status_code == 200
+        assert response.json()["baseFile"]["fileSize"] == 1234
+        storage.assert_not_called()
+
     def test_update(
         self,
         project: Project,
@@ -255,3 +274,391 @@ class TestModelDataEndpoint:
 
         assert response.status_code == 403
         assert content_dict["code"] == "missing_permission"
+
+
+@pytest.fixture
+def sources(
+    model_data: ModelData, model_data_factory: factories.ModelDataFactory
+) -> list[ModelData]:
+    sha256 = "ab" * 32
+    model_data.baseFile = factories.FileFactory.create(sha256=sha256)
+    model_data.save()
+    sources = []
+    for labels in ([1, 2, 2], [1, 2, 3], [4, 4, 3]):
+        source = model_data_factory.create(
+            project=model_data.project,
+            baseFile=factories.FileFactory.create(sha256=sha256),
+            annotationFile=factories.FileFactory.create(filePath="test/"),
+        )
+        blobs.assign_blob(
+            source.annotationFile,
+            annotations.store_labels(np.array(labels, dtype=np.uint16)),
+        )
+        source.annotationFile.save()
+        sources.append(source)
+    return sources
+
+
+class TestModelDataMerge:
+    def test_merge(
+        self,
+        model_data: ModelData,
+        sources: list[ModelData],
+        api_client: api_client_function,
+    ):
+        client = api_client()
+        client.force_authenticate(model_data.owner)
+
+        response = client.post(
+            reverse("modeldata-merge", kwargs={"pk": model_data.pk}),
+            {"sources": [source.pk for source in sources], "tieBreak": "lowest"},
+            format="json",
+        )
+
+        assert response.status_code == 202
+        assert response.json()["kind"] == "merge_annotations"
+        jobs.work(once=True)
+        assert Job.objects.get().status == Job.SUCCEEDED
+        model_data.refresh_from_db()
+        with model_data.annotationFile.file.open("rb") as handle:
+            assert annotations.read_archive(handle)[1].tolist() == [1, 2, 3]
+
+    @pytest.mark.parametrize(
+        "change, code",
+        [
+            ("baseFile", "different_basefile"),
+            ("annotationFile", "missing_annotationfile"),
+            ("project", "invalid_source"),
+            ("duplicate", "duplicate_sources"),
+        ],
+    )
+    def test_invalid_sources(
+        self,
+        model_data: ModelData,
+        sources: list[ModelData],
+        api_client: api_client_function,
+        project_factory: factories.ProjectFactory,
+        change: str,
+        code: str,
+    ):
+        ids = [source.pk for source in sources]
+        if change == "baseFile":
+            sources[0].baseFile = factories.FileFactory.create(sha256="cd" * 32)
+        elif change == "annotationFile":
+            sources[0].annotationFile = None
+        elif change == "project":
+            sources[0].project = project_factory.create()
+        else:
+            ids.append(ids[0])
+        sources[0].save()
+        client = api_client()
+        client.force_authenticate(model_data.owner)
+
+        response = client.post(
+            reverse("modeldata-merge", kwargs={"pk": model_data.pk}),
+            {"sources": ids},
+            format="json",
+        )
+
+        assert response.status_code == 400
+        assert response.json()["errors"][0]["code"] == code
+        assert not Job.objects.exists()
+
+
+class TestModelDataAgreement:
+    def test_agreement(
+        self,
+        model_data: ModelData,
+        sources: list[ModelData],
+        api_client: api_client_function,
+    ):
+        client = api_client()
+        client.force_authenticate(model_data.owner)
+        url = reverse("modeldata-agreement", kwargs={"pk": sources[0].pk})
+
+        response = client.get(f"{url}?against={sources[1].pk}&against={sources[2].pk}")
+
+        assert response.status_code == 200
+        first, second = response.json()
+        assert first["against"] == sources[1].pk
+        assert first["classes"] == [1, 2, 3]
+        assert first["confusion"] == [[1, 0, 0], [0, 1, 1], [0, 0, 0]]
+        assert first["iou"] == [1.0, 0.5, 0.0]
+        assert second["observedAgreement"] == 0.0
+        assert AnnotationAgreement.objects.count() == 2
+
+        # cached results are returned, until the annotationFile changes
+        AnnotationAgreement.objects.update(result={"cached": True})
+        response = client.get(f"{url}?against={sources[1].pk}")
+        assert response.json() == [{"against": sources[1].pk, "cached": True}]
+        blobs.assign_blob(
+            sources[1].annotationFile,
+            annotations.store_labels(np.array([1, 2, 2], dtype=np.uint16)),
+        )
+        sources[1].annotationFile.save()
+        response = client.get(f"{url}?against={sources[1].pk}")
+        assert response.json()[0]["kappa"] == 1.0
+
+    @pytest.mark.parametrize("against", ["", "?against=x", "?against=1&against=-1"])
+    def test_invalid_parameter(
+        self,
+        sources: list[ModelData],
+        api_client: api_client_function,
+        against: str,
+    ):
+        client = api_client()
+        client.force_authenticate(sources[0].project.owner)
+        url = reverse("modeldata-agreement", kwargs={"pk": sources[0].pk})
+
+        response = client.get(url + against)
+
+        assert response.status_code == 400
+        assert response.json()["errors"][0]["code"] == "invalid_parameter"
+
+    def test_different_count(
+        self,
+        sources: list[ModelData],
+        api_client: api_client_function,
+    ):
+        blobs.assign_blob(
+            sources[1].annotationFile,
+            annotations.store_labels(np.array([1, 2], dtype=np.uint16)),
+        )
+        sources[1].annotationFile.save()
+        client = api_client()
+        client.force_authenticate(sources[0].project.owner)
+        url = reverse("modeldata-agreement", kwargs={"pk": sources[0].pk})
+
+        response = client.get(f"{url}?against={sources[1].pk}")
+
+        assert response.status_code == 400
+        assert response.json()["errors"][0]["code"] == "different_count"
+
+    def test_no_access(
+        self,
+        sources: list[ModelData],
+        api_client: api_client_function,
+        user_factory: factories.UserFactory,
+    ):
+        client = api_client()
+        client.force_authenticate(user_factory.create())
+        url = reverse("modeldata-agreement", kwargs={"pk": sources[0].pk})
+
+        response = client.get(f"{url}?against={sources[1].pk}")
+
+        assert response.status_code == 403
+
+
+class TestModelDataPreviews:
+    @pytest.fixture
+    def model_data(self, model_data: ModelData, settings, tmp_path) -> ModelData:
+        settings.MEDIA_ROOT = str(tmp_path)
+        model_data.baseFile = factories.FileFactory.create(
+            file__data=factories.create_model_zip()
+        )
+        model_data.save()
+        return model_data
+
+    def test_previews(self, model_data: ModelData, api_client: api_client_function):
+        client = api_client()
+        client.force_authenticate(model_data.owner)
+        url = reverse("modeldata-previews", kwargs={"pk": model_data.pk})
+
+        response = client.get(url)
+        assert response.status_code == 202
+        job = response.json()
+        # the running job is returned instead of starting another one
+        assert client.get(url).json()["job_id"] == job["job_id"]
+        assert Job.objects.count() == 1
+
+        jobs.work(once=True)
+        response = client.get(url)
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["annotated"] is False
+        assert set(data["views"]) == {"top", "bottom", "left", "right", "front", "back"}
+
+        response = client.get(data["views"]["front"])
+        assert response.status_code == 200
+        assert response["Content-Type"] == "image/webp"
+        assert response.content[8:12] == b"WEBP"
+        assert "immutable" in response["Cache-Control"]
+        assert response["ETag"] == f'"{data["key"]}"'
+
+        # without the key the render is revalidated
+        response = client.get(
+            reverse("modeldata-preview", kwargs={"pk": model_data.pk, "view": "top"}),
+            HTTP_IF_NONE_MATCH=f'"{data["key"]}"',
+        )
+        assert response.status_code == 304
+        assert "no-cache" in response["Cache-Control"]
+
+    def test_annotated(self, model_data: ModelData, api_client: api_client_function):
+        client = api_client()
+        client.force_authenticate(model_data.owner)
+        url = reverse("modeldata-previews", kwargs={"pk": model_data.pk})
+        client.get(url + "?annotated=true")
+        jobs.work(once=True)
+        key = client.get(url + "?annotated=true").json()["key"]
+
+        # a new annotation is rendered again, the old render is kept meanwhile
+        model_data.annotationFile = factories.FileFactory.create()
+        blobs.assign_blob(
+            model_data.annotationFile,
+            annotations.store_labels(np.full(12, 1, dtype=np.uint16)),
+        )
+        model_data.annotationFile.save()
+        model_data.save()
+        response = client.get(url + "?annotated=true")
+        assert response.status_code == 202
+        preview = reverse(
+            "modeldata-preview", kwargs={"pk": model_data.pk, "view": "top"}
+        )
+        response = client.get(f"{preview}?annotated=true&key={key}")
+        assert response.status_code == 200
+        assert response["ETag"] == f'"{key}"'
+        # the renders without the annotation were never drawn
+        assert client.get(preview).status_code == 404
+
+        jobs.work(once=True)
+        data = client.get(url + "?annotated=true").json()
+        assert data["key"] != key
+        assert Job.objects.filter(status=Job.SUCCEEDED).count() == 2
+
+    def test_failed(self, model_data: ModelData, api_client: api_client_function):
+        model_data.baseFile.file.save("baseFile.zip", ContentFile(b"no zip"))
+        client = api_client()
+        client.force_authenticate(model_data.owner)
+        url = reverse("modeldata-previews", kwargs={"pk": model_data.pk})
+        job = client.get(url).json()
+        Job.objects.filter(pk=job["job_id"]).update(maxAttempts=1)
+
+        jobs.work(once=True)
+        response = client.get(url)
+
+        # failed jobs are not started again
+        assert response.status_code == 202
+        assert response.json()["status"] == Job.FAILED
+        assert Job.objects.count() == 1
+
+    def test_invalid(
+        self,
+        model_data: ModelData,
+        api_client: api_client_function,
+        user_factory: factories.UserFactory,
+    ):
+        client = api_client()
+        client.force_authenticate(model_data.owner)
+        url = reverse("modeldata-previews", kwargs={"pk": model_data.pk})
+
+        response = client.get(url + "?annotated=yes")
+        assert response.status_code == 400
+        assert response.json()["errors"][0]["code"] == "invalid_parameter"
+
+        client.force_authenticate(user_factory.create())
+        assert client.get(url).status_code == 403
+
+        model_data.baseFile = None
+        model_data.save()
+        client.force_authenticate(model_data.owner)
+        assert client.get(url).status_code == 404
+
+
+class TestModelDataIndex:
+    def test_upload_is_indexed(
+        self,
+        model_data: ModelData,
+        api_client: api_client_function,
+        settings,
+        tmp_path,
+    ):
+        settings.MEDIA_ROOT = str(tmp_path)
+        client = api_client()
+        client.force_authenticate(model_data.owner)
+        upload = ContentFile(factories.create_model_zip(), name="baseFile.zip")
+        url = reverse("modeldata-detail", kwargs={"pk": model_data.pk})
+
+        response = client.put(
+            reverse("basefile", kwargs={"pk": model_data.pk}),
+            {"file": upload, "fileFormat": "obj"},
+            format="multipart",
+        )
+        assert response.status_code == 201
+        assert client.get(url).json()["vertexCount"] is None
+
+        jobs.work(once=True)
+        data = client.get(url).json()
+
+        assert data["vertexCount"] == 8
+        assert data["faceCount"] == 12
+        assert data["attributes"] == ["position"]
+        assert data["bounds"] == {"min": [0, 0, 0], "max": [1, 1, 1]}
+        assert data["centroid"] == [0.5, 0.5, 0.5]
+
+
+class TestModelDataTiles:
+    @pytest.fixture
+    def model_data(self, model_data: ModelData, settings, tmp_path) -> ModelData:
+        settings.MEDIA_ROOT = str(tmp_path)
+        model = b"".join(f"v {i} 0 0 1 0.5 0\n".encode() for i in range(10))
+        model_data.modelType = "point_cloud"
+        model_data.baseFile = factories.FileFactory.create(
+            file__data=factories.create_model_zip(model)
+        )
+        model_data.save()
+        return model_data
+
+    def test_tiles(self, model_data: ModelData, api_client: api_client_function):
+        client = api_client()
+        client.force_authenticate(model_data.owner)
+        url = reverse("modeldata-tiles", kwargs={"pk": model_data.pk})
+
+        response = client.get(url)
+        assert response.status_code == 202
+        assert client.get(url).json()["job_id"] == response.json()["job_id"]
+
+        jobs.work(once=True)
+        response = client.get(url)
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["pointCount"] == 10
+        assert data["colors"] is True
+        assert [node["id"] for node in data["nodes"]] == ["r"]
+        assert data["nodes"][0]["count"] == 10
+
+        response = client.get(data["nodes"][0]["url"])
+        assert response.status_code == 200
+        assert response["Content-Type"] == "application/octet-stream"
+        assert response["X-Point-Count"] == "10"
+        assert "immutable" in response["Cache-Control"]
+        tile = response.content
+        assert len(tile) == 10 * (4 + 6 + 3)
+        assert sorted(np.frombuffer(tile, "<u4", 10)) == list(range(10))
+        assert tile[-3:] == bytes([255, 128, 0])
+
+        response = client.get(
+            reverse("modeldata-tile", kwargs={"pk": model_data.pk, "node": "r0"})
+        )
+        assert response.status_code == 404
+
+    def test_mesh(self, model_data: ModelData, api_client: api_client_function):
+        model_data.modelType = "mesh"
+        model_data.save()
+        client = api_client()
+        client.force_authenticate(model_data.owner)
+
+        response = client.get(reverse("modeldata-tiles", kwargs={"pk": model_data.pk}))
+
+        assert response.status_code == 400
+        assert response.json()["errors"][0]["code"] == "no_point_cloud"
+
+    def test_tiled_after_indexing(self, model_data: ModelData):
+        geometry.start_indexing(model_data, model_data.owner)
+
+        jobs.work(once=True)
+
+        job = Job.objects.get(kind=tiles.TILE_JOB)
+        assert job.modelData == model_data
+        assert job.arguments["key"] == tiles.get_tiles_key(model_data)
@@ -1,8 +1,14 @@
+import io
+import zipfile
 from typing import Any
 
-from annotator.backend.models import Project
+from annotator.backend import annotations
+from annotator.backend.anno3d import generic
+from annotator.backend.models import ModelData, Project
 
+import numpy as np
 import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth.models import User
 from django.urls import reverse
 from requests import Response
@@ -128,3 +134,104 @@ class TestProjectEndpoints:
 
         assert response.status_code == 403
         assert content_dict["code"] == "missing_permission"
+
+
+class TestProjectExport:
+    def test_export(
+        self,
+        model_data_factory: factories.ModelDataFactory,
+        label_factory: factories.LabelFactory,
+        project: Project,
+        api_client: api_client_function,
+    ):
+        annotated, empty = model_data_factory.create_batch(
+            2, project=project, owner=project.owner
+        )
+        label_factory.create(project=project, annotationClass=1)
+        labels = factories.create_labels()
+        client = api_client()
+        client.force_authenticate(project.owner)
+        upload_file = SimpleUploadedFile(
+            "annotationFile.zip", factories.create_annotation_file_zip(labels)
+        )
+        client.put(
+            reverse("annotationfile", kwargs={"pk": annotated.pk}),
+            {"file": upload_file, "fileFormat": "application/zip"},
+        )
+
+        response = client.get(reverse("project-export", kwargs={"pk": project.pk}))
+
+        assert response.status_code == 200
+        assert response.streaming
+        data = b"".join(response.streaming_content)
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            assert archive.testzip() is None
+            manifest = json.loads(archive.read("manifest.json"))
+            path = f"annotations/{annotated.pk}.anno3d"
+            name, exported = generic.parse(io.BytesIO(archive.read(path)))
+        # exported like downloads without the anno3d_format parameter
+        assert name == generic.FORMAT_UTF8V1
+        assert np.array_equal(exported, labels)
+        assert manifest["anno3dFormat"] == generic.FORMAT_UTF8V1
+        assert manifest["project"]["name"] == project.name
+        assert manifest["labels"][0]["annotationClass"] == 1
+        entries = {entry["modelData_id"]: entry for entry in manifest["modelData"]}
+        assert entries[annotated.pk]["annotationFile"]["path"] == path
+        assert entries[annotated.pk]["annotationFile"]["format"] == name
+        assert entries[annotated.pk]["name"] == annotated.name
+        assert entries[empty.pk]["annotationFile"] is None
+
+    @pytest.mark.parametrize("anno3dFormat", generic.FORMATS)
+    def test_export_format(
+        self,
+        anno3dFormat: str,
+        model_data: ModelData,
+        api_client: api_client_function,
+    ):
+        labels = factories.create_labels()
+        annotations.save_labels(model_data, labels, model_data.owner)
+        client = api_client()
+        client.force_authenticate(model_data.owner)
+
+        response = client.get(
+            reverse("project-export", kwargs={"pk": model_data.project.pk}),
+            {"anno3d_format": anno3dFormat},
+        )
+
+        assert response.status_code == 200
+        data = b"".join(response.streaming_content)
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            manifest = json.loads(archive.read("manifest.json"))
+            entry = manifest["modelData"][0]["annotationFile"]
+            name, exported = generic.parse(io.BytesIO(archive.read(entry["path"])))
+        assert name == anno3dFormat
+        assert entry["format"] == anno3dFormat
+        assert manifest["anno3dFormat"] == anno3dFormat
+        assert np.array_equal(exported, labels)
+
+    def test_unsupported_format(
+        self, project: Project, api_client: api_client_function
+    ):
+        client = api_client()
+        client.force_authenticate(project.owner)
+
+        response = client.get(
+            reverse("project-export", kwargs={"pk": project.pk}),
+            {"anno3d_format": "utf16"},
+        )
+
+        assert response.status_code == 400
+        assert response.json()["errors"][0]["code"] == "unsupported_format"
+
+    def test_no_project_member(
+        self,
+        project: Project,
+        api_client: api_client_function,
+        user_factory: factories.UserFactory,
+    ):
+        client = api_client()
+        client.force_authenticate(user_factory.create())
+
+        response = client.get(reverse("project-export", kwargs={"pk": project.pk}))
+
+        assert response.status_code == 403
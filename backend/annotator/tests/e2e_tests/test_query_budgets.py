@@ -0,0 +1,142 @@
+from typing import Any
+
+import pytest
+from django.contrib.auth.models import User
+from django.urls import reverse
+
+from annotator.backend.models import Project
+from annotator.tests import factories
+from annotator.tests.conftest import api_client as api_client_function
+from annotator.tests.query_budget import QueryBudget
+
+pytestmark = pytest.mark.django_db
+
+
+# Adds members, labels and ModelData with both files, their uploaders and locks to
+# the project, every row with its own users.
+def grow(project: Project, count: int = 3) -> None:
+    project.users.add(*factories.UserFactory.create_batch(count))
+    factories.LabelFactory.create_batch(count, project=project)
+    for _ in range(count):
+        factories.ModelDataFactory.create(
+            project=project,
+            owner=factories.UserFactory.create(),
+            locked=factories.UserFactory.create(),
+            baseFile=factories.FileFactory.create(),
+            annotationFile=factories.FileFactory.create(),
+        )
+
+
+class TestQueryBudgets:
+    @pytest.fixture
+    def project(self, project: Project, settings, tmp_path) -> Project:
+        settings.MEDIA_ROOT = str(tmp_path)
+        grow(project, 1)
+        return project
+
+    def get(self, user: User, api_client: Any, url: str) -> Any:
+        client = api_client()
+        client.force_authenticate(user)
+
+        def call() -> None:
+            assert client.get(url).status_code == 200
+
+        return call
+
+    def test_project_retrieve(
+        self,
+        project: Project,
+        api_client: api_client_function,
+        query_budget: QueryBudget,
+    ):
+        url = reverse("project-detail", kwargs={"pk": project.pk})
+        call = self.get(project.owner, api_client, url)
+
+        query_budget.assert_constant(call, lambda: grow(project), maximum=4)
+
+    def test_project_retrieve_as_member(
+        self,
+        project: Project,
+        api_client: api_client_function,
+        query_budget: QueryBudget,
+    ):
+        url = reverse("project-detail", kwargs={"pk": project.pk})
+        call = self.get(project.users.first(), api_client, url)
+
+        # the membership is one EXISTS query, however many members there are
+        query_budget.assert_constant(call, lambda: grow(project), maximum=5)
+
+    def test_project_list(
+        self,
+        project: Project,
+        api_client: api_client_function,
+        query_budget: QueryBudget,
+    ):
+        user = project.owner
+        url = reverse("project-list") + f"?user_id={user.pk}"
+        call = self.get(user, api_client, url)
+
+        def grow_projects() -> None:
+            factories.ProjectFactory.create_batch(3)
+            for other in factories.ProjectFactory.create_batch(3):
+                other.users.add(user)
+
+        query_budget.assert_constant(call, grow_projects, maximum=1)
+
+    @pytest.mark.parametrize("parameter", ["project_id", "user_id"])
+    def test_modeldata_list(
+        self,
+        parameter: str,
+        project: Project,
+        api_client: api_client_function,
+        query_budget: QueryBudget,
+    ):
+        user = project.owner
+        value = project.pk if parameter == "project_id" else user.pk
+        url = reverse("modeldata-list") + f"?{parameter}={value}"
+        call = self.get(user, api_client, url)
+
+        query_budget.assert_constant(call, lambda: grow(project), maximum=2)
+
+    def test_modeldata_retrieve(
+        self,
+        project: Project,
+        api_client: api_client_function,
+        query_budget: QueryBudget,
+    ):
+        modelData = project.modelData.get()
+        url = reverse("modeldata-detail", kwargs={"pk": modelData.pk})
+        call = self.get(project.owner, api_client, url)
+
+        query_budget.assert_constant(call, lambda: grow(project), maximum=2)
+
+    def test_label_list(
+        self,
+        project: Project,
+        api_client: api_client_function,
+        query_budget: QueryBudget,
+    ):
+        url = reverse("label-list") + f"?project_id={project.pk}"
+        call = self.get(project.owner, api_client, url)
+
+        query_budget.assert_constant(call, lambda: grow(project), maximum=2)
+
+
+class TestQueryBudget:
+    def test_exceeded(self, project: Project, query_budget: QueryBudget):
+        with query_budget(1):
+            Project.objects.count()
+        with pytest.raises(AssertionError, match="2 queries exceed the budget of 1"):
+            with query_budget(1):
+                Project.objects.count()
+                Project.objects.count()
+
+    def test_growing(self, project: Project, query_budget: QueryBudget):
+        def call() -> None:
+            for other in Project.objects.all():
+                other.owner.username
+
+        with pytest.raises(AssertionError, match="grew from 2 to 5"):
+            query_budget.assert_constant(
+                call, lambda: factories.ProjectFactory.create_batch(3)
+            )
@@ -0,0 +1,305 @@
+import hashlib
+import json
+import os
+import zipfile
+from typing import Any
+
+from django.urls import reverse
+from requests import Response
+
+from annotator.backend import annotations, constants, uploads, utils
+from annotator.backend.anno3d import generic
+from annotator.backend.models import ModelData, UploadSession
+from annotator.tests.conftest import api_client as api_client_function
+from annotator.tests import factories
+
+import numpy as np
+import pytest
+
+pytestmark = pytest.mark.django_db
+
+chunk_size = constants.UPLOAD_MIN_CHUNK_SIZE
+
+
+def create_session(
+    client: Any, model_data: ModelData, filename: str, file_data: bytes, **kwargs: Any
+) -> dict[str, Any]:
+    endpoint = reverse(filename.lower() + "-uploads", kwargs={"pk": model_data.pk})
+    data = {
+        "fileFormat": "ply",
+        "fileSize": len(file_data),
+        "chunkSize": chunk_size,
+        **kwargs,
+    }
+    response: Response = client.post(endpoint, data=data)
+    assert response.status_code == 201
+    return json.loads(response.content)
+
+
+def upload_chunk(
+    client: Any,
+    model_data: ModelData,
+    filename: str,
+    session_id: str,
+    index: int,
+    data: bytes,
+) -> Response:
+    endpoint = reverse(
+        filename.lower() + "-upload-chunk",
+        kwargs={"pk": model_data.pk, "session_id": session_id, "index": index},
+    )
+    return client.put(endpoint, data=data, content_type="application/octet-stream")
+
+
+def finalize(
+    client: Any, model_data: ModelData, filename: str, session_id: str
+) -> Response:
+    endpoint = reverse(
+        filename.lower() + "-upload-finalize",
+        kwargs={"pk": model_data.pk, "session_id": session_id},
+    )
+    return client.post(endpoint)
+
+
+class TestUploadSessionEndpoints:
+    @pytest.mark.parametrize("filename", ["annotationFile", "baseFile"])
+    def test_upload_out_of_order(
+        self, filename: str, model_data: ModelData, api_client: api_client_function
+    ):
+        if filename == "baseFile":
+            file_data = factories.create_zip(
+                {"model.ply": os.urandom(chunk_size * 3)},
+                compression=zipfile.ZIP_STORED,
+            )
+        else:
+            # canonical annotations are stored as they are
+            file_data = factories.create_annotation_file_zip(
+                factories.create_labels(count=chunk_size * 3 // 2),
+                name=generic.FORMAT_BINARYV2,
+                compression=zipfile.ZIP_STORED,
+            )
+        chunks = [
+            file_data[i : i + chunk_size] for i in range(0, len(file_data), chunk_size)
+        ]
+        client = api_client()
+        client.force_authenticate(model_data.owner)
+
+        session = create_session(
+            client,
+            model_data,
+            filename,
+            file_data,
+            checksum=hashlib.sha256(file_data).hexdigest(),
+        )
+        assert session["chunkCount"] == 4
+        assert session["receivedRanges"] == []
+
+        for index in [3, 1, 0]:
+            response = upload_chunk(
+                client,
+                model_data,
+                filename,
+                session["session_id"],
+                index,
+                chunks[index],
+            )
+            assert response.status_code == 204
+
+        endpoint = reverse(
+            filename.lower() + "-upload",
+            kwargs={"pk": model_data.pk, "session_id": session["session_id"]},
+        )
+        content_dict = json.loads(client.get(endpoint).content)
+        assert content_dict["receivedRanges"] == [
+            [0, 2 * chunk_size],
+            [3 * chunk_size, len(file_data)],
+        ]
+
+        response = finalize(client, model_data, filename, session["session_id"])
+        assert response.status_code == 409
+        assert json.loads(response.content)["code"] == "upload_incomplete"
+
+        upload_chunk(client, model_data, filename, session["session_id"], 2, chunks[2])
+        response = finalize(client, model_data, filename, session["session_id"])
+        model_data.refresh_from_db()
+        file = getattr(model_data, filename)
+
+        assert response.status_code == 201
+        assert json.loads(response.content)["fileSize"] == len(file_data)
+        assert file.filePath == utils.get_modeldata_file_path(
+            model_data, model_data.project
+        )
+        assert file.blob.sha256 == hashlib.sha256(file_data).hexdigest()
+        with file.file.open() as stored:
+            assert stored.read() == file_data
+        assert not UploadSession.objects.exists()
+
+    def test_wrong_chunk_size(
+        self, model_data: ModelData, api_client: api_client_function
+    ):
+        file_data = b"x" * (chunk_size + 10)
+        client = api_client()
+        client.force_authenticate(model_data.owner)
+        session = create_session(client, model_data, "baseFile", file_data)
+
+        response = upload_chunk(
+            client, model_data, "baseFile", session["session_id"], 1, b"x" * 11
+        )
+        content_dict: dict[str, Any] = json.loads(response.content)
+
+        assert response.status_code == 400
+        assert content_dict["errors"][0]["code"] == "wrong_chunk_size"
+
+        response = upload_chunk(
+            client, model_data, "baseFile", session["session_id"], 2, b"x"
+        )
+        assert response.status_code == 404
+
+    def test_chunk_too_large(
+        self, model_data: ModelData, api_client: api_client_function
+    ):
+        client = api_client()
+        client.force_authenticate(model_data.owner)
+        session = create_session(client, model_data, "baseFile", b"x" * chunk_size)
+        endpoint = reverse(
+            "basefile-upload-chunk",
+            kwargs={
+                "pk": model_data.pk,
+                "session_id": session["session_id"],
+                "index": 0,
+            },
+        )
+
+        # the test client fails if more than the one byte is read
+        response: Response = client.put(
+            endpoint,
+            data=b"x",
+            content_type="application/octet-stream",
+            CONTENT_LENGTH=str(constants.UPLOAD_MAX_CHUNK_SIZE + 1),
+        )
+
+        assert response.status_code == 413
+        assert not UploadSession.objects.get(pk=session["session_id"]).chunks.exists()
+
+    def test_checksum_mismatch(
+        self, model_data: ModelData, api_client: api_client_function
+    ):
+        file_data = factories.create_base_file_zip()
+        client = api_client()
+        client.force_authenticate(model_data.owner)
+        session = create_session(
+            client, model_data, "baseFile", file_data, checksum="0" * 64
+        )
+        upload_chunk(
+            client, model_data, "baseFile", session["session_id"], 0, file_data
+        )
+
+        response = finalize(client, model_data, "baseFile", session["session_id"])
+        content_dict: dict[str, Any] = json.loads(response.content)
+        model_data.refresh_from_db()
+
+        assert response.status_code == 400
+        assert content_dict["errors"][0]["code"] == "checksum_mismatch"
+        assert model_data.baseFile is None
+
+    def test_replace_annotationfile(
+        self, model_data: ModelData, api_client: api_client_function
+    ):
+        client = api_client()
+        client.force_authenticate(model_data.owner)
+        labels = [factories.create_labels(), factories.create_labels()]
+        for file_data in map(factories.create_annotation_file_zip, labels):
+            session = create_session(client, model_data, "annotationFile", file_data)
+            upload_chunk(
+                client,
+                model_data,
+                "annotationFile",
+                session["session_id"],
+                0,
+                file_data,
+            )
+            response = finalize(
+                client, model_data, "annotationFile", session["session_id"]
+            )
+            assert response.status_code == 201
+
+        model_data.refresh_from_db()
+        with model_data.annotationFile.file.open() as stored:
+            name, stored_labels = annotations.read_archive(stored)
+        assert name == annotations.CANONICAL_FORMAT
+        assert np.array_equal(stored_labels, labels[1])
+
+    def test_annotationfile_read_once(
+        self,
+        model_data: ModelData,
+        api_client: api_client_function,
+        monkeypatch: pytest.MonkeyPatch,
+    ):
+        labels = factories.create_labels(200_000)
+        file_data = factories.create_annotation_file_zip(
+            labels, compression=zipfile.ZIP_STORED
+        )
+        client = api_client()
+        client.force_authenticate(model_data.owner)
+        session = create_session(
+            client,
+            model_data,
+            "annotationFile",
+            file_data,
+            checksum=hashlib.sha256(file_data).hexdigest(),
+        )
+        for index, start in enumerate(range(0, len(file_data), chunk_size)):
+            upload_chunk(
+                client,
+                model_data,
+                "annotationFile",
+                session["session_id"],
+                index,
+                file_data[start : start + chunk_size],
+            )
+        read = []
+
+        class CountingFile:
+            def __init__(self, file: Any) -> None:
+                self.file = file
+
+            def read(self, size: int = -1) -> bytes:
+                data = self.file.read(size)
+                read.append(len(data))
+                return data
+
+            def __getattr__(self, name: str) -> Any:
+                return getattr(self.file, name)
+
+            def __enter__(self) -> "CountingFile":
+                return self
+
+            def __exit__(self, *args: Any) -> None:
+                self.file.close()
+
+        monkeypatch.setattr(
+            uploads, "open", lambda *args: CountingFile(open(*args)), raising=False
+        )
+        response = finalize(client, model_data, "annotationFile", session["session_id"])
+
+        assert response.status_code == 201
+        # hashed and parsed in one pass, only the headers and the end of the
+        # archive, which is searched for the end record, are read again
+        assert sum(read) < len(file_data) + pow(2, 17)
+        version = model_data.annotationVersions.get()
+        assert version.count == len(labels)
+
+    def test_not_part_of_project(
+        self,
+        model_data: ModelData,
+        user_factory: factories.UserFactory,
+        api_client: api_client_function,
+    ):
+        endpoint = reverse("basefile-uploads", kwargs={"pk": model_data.pk})
+        client = api_client()
+        client.force_authenticate(user_factory.create())
+        response: Response = client.post(
+            endpoint, data={"fileFormat": "ply", "fileSize": 10}
+        )
+
+        assert response.status_code == 403
@@ -1,12 +1,74 @@
+import io
+import zipfile
 from typing import Optional
 
 import factory
+import numpy as np
 from faker import Faker
 from django.contrib.auth.models import User
 
 from annotator.backend import models, constants
-
-Faker("de_DE")
+from annotator.backend.anno3d import Labels, generic
+
+fake = Faker("de_DE")
+
+
+def create_zip(
+    members: dict[str, bytes], compression: int = zipfile.ZIP_DEFLATED
+) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=compression) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+# returns a zip archive with the layout required for baseFiles
+def create_base_file_zip(size: int = 4096) -> bytes:
+    return create_zip({"model.ply": fake.binary(length=size)})
+
+
+# a unit cube of six quads, 12 triangles
+CUBE_OBJ = b"""v 0 0 0
+v 1 0 0
+v 1 1 0
+v 0 1 0
+v 0 0 1
+v 1 0 1
+v 1 1 1
+v 0 1 1
+f 1 2 3 4
+f 5 6 7 8
+f 1 2 6 5
+f 2 3 7 6
+f 3 4 8 7
+f 4 1 5 8
+"""
+
+
+# returns a baseFile archive of a model that can be read
+def create_model_zip(model: bytes = CUBE_OBJ, name: str = "model.obj") -> bytes:
+    return create_zip({name: model})
+
+
+def create_labels(count: int = 1000, classes: int = 4) -> Labels:
+    rng = np.random.default_rng(fake.random_int())
+    labels = rng.integers(0, classes, size=count, endpoint=True, dtype=np.uint16)
+    # the largest value stands for unlabeled indices
+    labels[labels == classes] = constants.ANNO3D_NEUTRAL_CLASS
+    return labels
+
+
+# returns a zip archive with the layout required for annotationFiles
+def create_annotation_file_zip(
+    labels: Optional[Labels] = None,
+    name: str = generic.FORMAT_UTF8V1,
+    compression: int = zipfile.ZIP_DEFLATED,
+) -> bytes:
+    if labels is None:
+        labels = create_labels()
+    data = b"".join(generic.iter_serialize(labels, name))
+    return create_zip({"annotation.anno3d": data}, compression=compression)
 
 
 class UserFactory(factory.django.DjangoModelFactory):
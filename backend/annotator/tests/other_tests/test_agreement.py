@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from annotator.backend import agreement, constants
+
+N = constants.ANNO3D_NEUTRAL_CLASS
+
+
+def compare(labels: list[int], against: list[int]) -> agreement.Metrics:
+    return agreement.compare_labels(
+        np.array(labels, dtype=np.uint16), np.array(against, dtype=np.uint16)
+    )
+
+
+class TestCompareLabels:
+    def test_metrics(self):
+        metrics = compare([0, 0, 1, 1, N, N], [0, 1, 1, 1, N, 0])
+
+        assert metrics["count"] == 6
+        assert metrics["classes"] == [0, 1, N]
+        assert metrics["confusion"] == [[1, 1, 0], [0, 2, 0], [1, 0, 1]]
+        assert metrics["iou"] == [pytest.approx(1 / 3), pytest.approx(2 / 3), None]
+        assert metrics["meanIou"] == pytest.approx(0.5)
+        assert metrics["observedAgreement"] == pytest.approx(4 / 6)
+        # expected agreement (2*2 + 2*3 + 2*1) / 36
+        expected = 12 / 36
+        assert metrics["kappa"] == pytest.approx((4 / 6 - expected) / (1 - expected))
+
+    def test_identical(self):
+        assert compare([2, 2, 2], [2, 2, 2])["kappa"] == 1.0
+        assert compare([1, 2, N], [1, 2, N])["kappa"] == 1.0
+
+    def test_empty(self):
+        metrics = compare([], [])
+        assert metrics["classes"] == []
+        assert metrics["kappa"] is None
+
+    def test_blocks(self, monkeypatch: pytest.MonkeyPatch):
+        rng = np.random.default_rng(0)
+        labels = rng.integers(0, 5, 1000, dtype=np.uint16)
+        against = rng.integers(0, 5, 1000, dtype=np.uint16)
+        expected = agreement.compare_labels(labels, against)
+        monkeypatch.setattr(constants, "ANNO3D_BLOCK_SIZE", 64)
+        assert agreement.compare_labels(labels, against) == expected
+        assert sum(map(sum, expected["confusion"])) == 1000
+
+    def test_different_counts(self):
+        with pytest.raises(ValueError):
+            compare([1, 2], [1])
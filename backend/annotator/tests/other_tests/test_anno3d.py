@@ -0,0 +1,164 @@
+import io
+
+import numpy as np
+import pytest
+
+from annotator.backend.anno3d import AnnotationFileError, binaryv2, generic, utf8v1
+
+# the example of frontend/src/annotator/__test__/anno3d/UTF8v1
+EXAMPLE_LABELS = np.array(
+    [65535, 1, 0, 1, 0, 65535, 0, 65535, 0, 65535], dtype=np.uint16
+)
+EXAMPLE_FILE = (
+    b"format UTF8\nversion 1.0\ncount 10\nlabel 0 4\n2\n4\n6\n8\n"
+    + b"label 1 2\n1\n3\nlabel 2 0\n"
+)
+
+
+class TestUTF8v1:
+    @pytest.mark.unit
+    def test_serialize(self):
+        assert utf8v1.serialize_bytes(EXAMPLE_LABELS, [0, 1, 2]) == EXAMPLE_FILE
+
+    @pytest.mark.unit
+    def test_serialize_unknown_label(self):
+        with pytest.raises(AnnotationFileError) as error:
+            utf8v1.serialize_bytes(EXAMPLE_LABELS, [0])
+
+        assert error.value.code == "unknown_label"
+
+    @pytest.mark.unit
+    def test_parse(self):
+        labels = utf8v1.parse_bytes(EXAMPLE_FILE, classes=[0, 1, 2])
+
+        assert labels.dtype == np.uint16
+        assert np.array_equal(labels, EXAMPLE_LABELS)
+
+    @pytest.mark.unit
+    def test_parse_split_lines(self):
+        parser = utf8v1.ParserUTF8v1()
+        for i in range(len(EXAMPLE_FILE)):
+            parser.feed(EXAMPLE_FILE[i : i + 1])
+
+        assert np.array_equal(parser.close(), EXAMPLE_LABELS)
+
+    @pytest.mark.unit
+    def test_round_trip(self, mocker):
+        # small blocks to cover indices spanning several blocks
+        mocker.patch("annotator.backend.constants.ANNO3D_BLOCK_SIZE", 4096)
+        rng = np.random.default_rng(0)
+        labels = rng.integers(0, 5, size=123_457, dtype=np.uint16)
+        labels[rng.random(len(labels)) < 0.3] = 65535
+
+        file = io.BytesIO()
+        utf8v1.serialize(labels, file)
+        file.seek(0)
+
+        assert np.array_equal(utf8v1.parse(file), labels)
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize(
+        "data,code,lineNumber",
+        [
+            (b"format UTF16\nversion 1.0\ncount 1\n", "unsupported_format", 1),
+            (b"format UTF8\nversion 2.0\ncount 1\n", "unsupported_format", 2),
+            (b"format UTF8\nversion 1.0\n", "parsing_error", 2),
+            (b"format UTF8\nversion 1.0\ncount 3\n1\n", "parsing_error", 4),
+            (
+                b"format UTF8\nversion 1.0\ncount 3\nlabel 0 2\n1\n-2\n",
+                "parsing_error",
+                6,
+            ),
+            (
+                b"format UTF8\nversion 1.0\ncount 3\nlabel 0 2\n1\n\n",
+                "parsing_error",
+                6,
+            ),
+            (b"format UTF8\nversion 1.0\ncount 3\nlabel 0 2\n1\n", "parsing_error", 5),
+            (
+                b"format UTF8\nversion 1.0\ncount 3\nlabel 0 1\n3\n",
+                "index_out_of_range",
+                5,
+            ),
+            (b"format UTF8\nversion 1.0\ncount 3\nlabel 9 0\n", "unknown_label", 4),
+            (
+                b"format UTF8\nversion 1.0\ncount 3\nlabel 0 0\nlabel 0 0\n",
+                "duplicate_label",
+                5,
+            ),
+            (b"format UTF8\nversion 1.0\ncount 999999999999\n", "count_too_large", 3),
+        ],
+    )
+    def test_parse_errors(self, data: bytes, code: str, lineNumber: int):
+        with pytest.raises(AnnotationFileError) as error:
+            utf8v1.parse_bytes(data, classes=[0, 1, 2])
+
+        assert error.value.code == code
+        assert error.value.lineNumber == lineNumber
+
+    @pytest.mark.unit
+    def test_parse_long_line(self):
+        parser = utf8v1.ParserUTF8v1()
+
+        with pytest.raises(AnnotationFileError):
+            parser.feed(b"format UTF8\n" + b"1" * 1000)
+
+
+class TestBinaryV2:
+    @pytest.mark.unit
+    @pytest.mark.parametrize(
+        "labels,encoding",
+        [
+            (EXAMPLE_LABELS, b"encoding dense\n"),
+            (np.full(10_000, 65535, dtype=np.uint16), b"encoding rle\nruns 1\n"),
+            (np.zeros(0, dtype=np.uint16), b"encoding dense\n"),
+        ],
+    )
+    def test_round_trip(self, labels, encoding: bytes):
+        data = binaryv2.serialize_bytes(labels)
+
+        assert encoding in data
+        assert np.array_equal(binaryv2.parse_bytes(data), labels)
+
+    @pytest.mark.unit
+    def test_runs_across_blocks(self, mocker):
+        mocker.patch("annotator.backend.constants.ANNO3D_BLOCK_SIZE", 64)
+        labels = np.repeat(np.array([1, 65535, 2, 1], dtype=np.uint16), 100)
+
+        data = binaryv2.serialize_bytes(labels)
+
+        assert b"runs 4\n" in data
+        assert len(data) == data.index(b"runs 4\n") + 7 + 4 * 6
+        assert np.array_equal(binaryv2.parse_bytes(data), labels)
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize(
+        "data",
+        [
+            b"format BIN\nversion 2.0\ncount 2\nencoding dense\n\x00\x00",
+            b"format BIN\nversion 2.0\ncount 1\nencoding dense\n\x00\x00\x00",
+            b"format BIN\nversion 2.0\ncount 2\nencoding rle\nruns 1\n"
+            + b"\x00\x00\x01\x00\x00\x00",
+            b"format BIN\nversion 2.0\ncount 2\nencoding zstd\n",
+        ],
+    )
+    def test_parse_errors(self, data: bytes):
+        with pytest.raises(AnnotationFileError):
+            binaryv2.parse_bytes(data)
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("name", generic.FORMATS)
+    def test_generic_parse(self, name: str):
+        data = b"".join(generic.iter_serialize(EXAMPLE_LABELS, name))
+
+        parsed_name, labels = generic.parse(io.BytesIO(data))
+
+        assert parsed_name == name
+        assert np.array_equal(labels, EXAMPLE_LABELS)
+
+    @pytest.mark.unit
+    def test_generic_unsupported(self):
+        with pytest.raises(AnnotationFileError) as error:
+            generic.parse(io.BytesIO(b"ply\nformat ascii 1.0\n"))
+
+        assert error.value.code == "unsupported_format"
@@ -0,0 +1,202 @@
+import io
+import zipfile
+
+import pytest
+
+from annotator.backend import archives
+from annotator.tests.factories import create_zip
+
+
+def validate_basefile(data: bytes) -> list[archives.ArchiveMember]:
+    return archives.validate_basefile_archive(io.BytesIO(data))
+
+
+class TestBaseFileArchive:
+    @pytest.mark.unit
+    @pytest.mark.parametrize(
+        "names",
+        [
+            ["model.ply"],
+            ["model.OBJ", "texture.png"],
+            ["folder/", "folder/model.obj", "folder/texture.jpg"],
+        ],
+    )
+    def test_valid(self, names: list[str]):
+        members = validate_basefile(create_zip({name: b"data" for name in names}))
+
+        assert [m.name for m in members] == [n for n in names if not n.endswith("/")]
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize(
+        "names",
+        [
+            ["texture.png"],
+            ["model.ply", "model.obj"],
+            ["model.ply", "a.png", "b.png"],
+            ["model.ply", "notes.txt"],
+        ],
+    )
+    def test_wrong_content(self, names: list[str]):
+        with pytest.raises(archives.ArchiveError) as error:
+            validate_basefile(create_zip({name: b"data" for name in names}))
+
+        assert error.value.code == "wrong_archive_content"
+
+    @pytest.mark.unit
+    def test_compression_ratio(self):
+        data = create_zip({"model.ply": bytes(10 * pow(2, 20))})
+
+        with pytest.raises(archives.ArchiveError) as error:
+            validate_basefile(data)
+
+        assert error.value.code == "compression_ratio_too_high"
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("data", [b"", b"no zip archive", b"PK\x05\x06"])
+    def test_invalid_archive(self, data: bytes):
+        with pytest.raises(archives.ArchiveError) as error:
+            validate_basefile(data)
+
+        assert error.value.code == "invalid_archive"
+
+    @pytest.mark.unit
+    def test_truncated(self):
+        data = create_zip({"model.ply": b"data" * 100}, compression=zipfile.ZIP_STORED)
+        # cut off the beginning of the archive, the central directory remains
+        truncated = b"\x00" * 50 + data[50:]
+
+        with pytest.raises(archives.ArchiveError) as error:
+            validate_basefile(truncated)
+
+        assert error.value.code == "invalid_archive"
+
+    @pytest.mark.unit
+    def test_unsafe_path(self):
+        with pytest.raises(archives.ArchiveError) as error:
+            validate_basefile(create_zip({"../model.ply": b"data"}))
+
+        assert error.value.code == "unsafe_path"
+
+    @pytest.mark.unit
+    def test_zip64(self):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            with archive.open("model.ply", "w", force_zip64=True) as member:
+                member.write(b"data")
+
+        members = validate_basefile(buffer.getvalue())
+
+        assert members[0].fileSize == 4
+
+
+class TestAnnotationFileArchive:
+    @pytest.mark.unit
+    def test_single_file(self):
+        data = create_zip({"annotation.anno3d": b"format UTF8\n"})
+
+        members = archives.validate_annotationfile_archive(io.BytesIO(data))
+
+        assert len(members) == 1
+
+    @pytest.mark.unit
+    def test_multiple_files(self):
+        data = create_zip({"a.anno3d": b"a", "b.anno3d": b"b"})
+
+        with pytest.raises(archives.ArchiveError):
+            archives.validate_annotationfile_archive(io.BytesIO(data))
+
+
+class TestRawZip:
+    @pytest.mark.unit
+    def test_copy_members(self):
+        date_time = (2022, 10, 1, 12, 30, 0)
+        sources = [
+            create_zip({"a.anno3d": b"a" * 1000}),
+            create_zip({"b.anno3d": b"b" * 10}, compression=zipfile.ZIP_STORED),
+        ]
+        handles = [io.BytesIO(source) for source in sources]
+        members = [
+            archives.copy_member(
+                handle,
+                archives.validate_annotationfile_archive(handle)[0],
+                f"annotations/{i}.anno3d",
+                date_time,
+            )
+            for i, handle in enumerate(handles)
+        ]
+        members.append(archives.create_stored_member("ä.json", b"{}", date_time))
+
+        data = b"".join(archives.iter_raw_zip(members))
+
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            assert archive.testzip() is None
+            assert archive.namelist() == [
+                "annotations/0.anno3d",
+                "annotations/1.anno3d",
+                "ä.json",
+            ]
+            assert archive.read("annotations/0.anno3d") == b"a" * 1000
+            assert archive.read("annotations/1.anno3d") == b"b" * 10
+            assert archive.getinfo("ä.json").date_time == date_time
+            # the compressed data is copied as it is
+            assert archive.getinfo("annotations/0.anno3d").compress_type == 8
+
+    @pytest.mark.unit
+    def test_size_mismatch(self):
+        member = archives.create_stored_member("a", b"abc", (2022, 1, 1, 0, 0, 0))
+        member.content = [b"ab"]
+
+        with pytest.raises(archives.ArchiveError):
+            b"".join(archives.iter_raw_zip([member]))
+
+
+def scan(data: bytes, blockSize: int) -> archives.LocalHeaderScanner:
+    scanner = archives.LocalHeaderScanner()
+    for start in range(0, len(data), blockSize):
+        scanner.feed(data[start : start + blockSize])
+    return scanner
+
+
+class TestLocalHeaderScanner:
+    @pytest.mark.unit
+    @pytest.mark.parametrize("blockSize", [1, 7, 64, 1 << 20])
+    def test_matches_central_directory(self, blockSize: int):
+        data = create_zip(
+            {"folder/": b"", "folder/model.obj": bytes(range(256)) * 8, "t.png": b"png"}
+        )
+        expected = validate_basefile(data)
+
+        scanned = scan(data, blockSize).get_members()
+
+        assert scanned is not None
+        assert [m.name for m in scanned] == ["folder/model.obj", "t.png"]
+        archives.check_scanned_members(scanned, expected)
+        assert [m.dataOffset for m in scanned] == [m.dataOffset for m in expected]
+
+    @pytest.mark.unit
+    def test_data_descriptor(self):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            archive.writestr("model.obj", b"data")
+        # an unseekable output makes zipfile write data descriptors
+        data = b"".join(archives.iter_zip([("model.obj", [b"data"], 4)]))
+
+        assert scan(buffer.getvalue(), 16).get_members() is not None
+        assert scan(data, 16).get_members() is None
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("data", [b"", b"no zip archive", b"PK\x03\x04short"])
+    def test_incomplete(self, data: bytes):
+        assert scan(data, 4).get_members() is None
+
+    @pytest.mark.unit
+    def test_mismatching_local_header(self):
+        data = create_zip({"model.obj": b"data", "texture.png": b"png"})
+        members = validate_basefile(data)
+        scanned = scan(data, 16).get_members()
+        assert scanned is not None
+        scanned[1].fileSize += 1
+
+        with pytest.raises(archives.ArchiveError) as error:
+            archives.check_scanned_members(scanned, members)
+        assert error.value.code == "invalid_archive"
@@ -0,0 +1,134 @@
+import pytest
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+
+import numpy as np
+
+from annotator.backend import annotations, blobs
+from annotator.backend.anno3d import generic
+from annotator.backend.models import Blob, File, ModelData
+from annotator.backend.serializers import AnnotationFileUploadSerializer
+from annotator.tests import factories
+
+pytestmark = pytest.mark.django_db
+
+
+# canonical annotations are stored as they are
+def create_content() -> bytes:
+    return factories.create_annotation_file_zip(name=generic.FORMAT_BINARYV2)
+
+
+def upload(content: bytes, model_data: ModelData) -> File:
+    upload_file = SimpleUploadedFile("annotationFile.zip", content)
+    serializer = AnnotationFileUploadSerializer(
+        data={"file": upload_file, "fileFormat": "obj"}
+    )
+    serializer.is_valid(raise_exception=True)
+    return serializer.save(filePath="test/", uploaded_by=model_data.owner)
+
+
+class TestBlobStore:
+    def test_deduplication(self, model_data: ModelData):
+        content = create_content()
+        first = upload(content, model_data)
+        second = upload(content, model_data)
+
+        assert first.blob_id == second.blob_id
+        assert first.file.name == second.file.name
+        assert Blob.objects.count() == 1
+
+        report = blobs.get_deduplication_report()
+        assert report["blobs"] == 1
+        assert report["references"] == 2
+        assert report["savedBytes"] == len(content)
+
+    def test_release_last_reference(
+        self, model_data: ModelData, django_capture_on_commit_callbacks
+    ):
+        content = create_content()
+        first = upload(content, model_data)
+        second = upload(content, model_data)
+        name = first.file.name
+
+        with django_capture_on_commit_callbacks(execute=True):
+            first.delete()
+        assert default_storage.exists(name)
+        assert Blob.objects.count() == 1
+
+        with django_capture_on_commit_callbacks(execute=True):
+            second.delete()
+            # removed from the disk once the deletion is committed
+            assert default_storage.exists(name)
+            assert Blob.objects.count() == 0
+        assert not default_storage.exists(name)
+
+    def test_stored_again_before_commit(
+        self, model_data: ModelData, django_capture_on_commit_callbacks
+    ):
+        content = create_content()
+        fileObj = upload(content, model_data)
+        name = fileObj.file.name
+
+        with django_capture_on_commit_callbacks(execute=True):
+            fileObj.delete()
+            again = upload(content, model_data)
+
+        assert again.file.name == name
+        assert default_storage.exists(name)
+        assert Blob.objects.count() == 1
+
+    def test_update_releases_old_blob(
+        self, model_data: ModelData, django_capture_on_commit_callbacks
+    ):
+        fileObj = upload(create_content(), model_data)
+        old_name = fileObj.file.name
+
+        serializer = AnnotationFileUploadSerializer(
+            fileObj,
+            data={
+                "file": SimpleUploadedFile("annotationFile.zip", create_content()),
+                "fileFormat": "obj",
+            },
+        )
+        serializer.is_valid(raise_exception=True)
+        with django_capture_on_commit_callbacks(execute=True):
+            serializer.save(uploaded_by=model_data.owner)
+            # released once the new content is committed
+            assert default_storage.exists(old_name)
+
+        assert fileObj.file.name != old_name
+        assert not default_storage.exists(old_name)
+        assert Blob.objects.count() == 1
+
+    def test_replace_with_stale_instance(
+        self, model_data: ModelData, django_capture_on_commit_callbacks
+    ):
+        fileObj = upload(create_content(), model_data)
+        first = fileObj.file.name
+        stale = File.objects.get(pk=fileObj.pk)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            blobs.replace_content(fileObj, annotations.store_labels(np.zeros(4, "u2")))
+        second = fileObj.file.name
+        with django_capture_on_commit_callbacks(execute=True):
+            blobs.replace_content(stale, annotations.store_labels(np.ones(4, "u2")))
+
+        # the content the row referenced is released, not the one of the instance
+        assert not default_storage.exists(first)
+        assert not default_storage.exists(second)
+        assert default_storage.exists(stale.file.name)
+        assert Blob.objects.count() == 1
+
+    def test_admin_report(
+        self, model_data: ModelData, user_factory: factories.UserFactory, client
+    ):
+        content = create_content()
+        upload(content, model_data)
+        upload(content, model_data)
+        client.force_login(user_factory.create(is_staff=True, is_superuser=True))
+
+        response = client.get(reverse("admin:backend_blob_changelist"))
+
+        assert response.status_code == 200
+        assert response.context["deduplication"]["savedBytes"] == len(content)
@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+
+from annotator.backend import annotations, blobs, constants, consensus, jobs
+from annotator.backend.models import Job, ModelData
+from annotator.tests import factories
+
+pytestmark = pytest.mark.django_db
+
+N = constants.ANNO3D_NEUTRAL_CLASS
+
+
+def merge(rows: list[list[int]], **kwargs) -> list[int]:
+    labelList = [np.array(row, dtype=np.uint16) for row in rows]
+    return consensus.merge_labels(labelList, **kwargs)[0].tolist()
+
+
+def annotate(model_data: ModelData, labels: np.ndarray) -> ModelData:
+    fileObj = factories.FileFactory.create(filePath="test/")
+    blobs.assign_blob(fileObj, annotations.store_labels(labels))
+    fileObj.save()
+    model_data.annotationFile = fileObj
+    model_data.save()
+    return model_data
+
+
+class TestMergeLabels:
+    def test_majority(self):
+        assert merge([[1, 2, 3, N], [1, 2, 4, N], [2, 5, 4, N]]) == [1, 2, 4, N]
+
+    def test_unlabeled_is_no_vote(self):
+        assert merge([[N, N, 3], [N, 2, N], [1, 2, N]]) == [1, 2, 3]
+
+    def test_tie_breaks(self):
+        rows = [[3, 1, 5], [1, 3, 5], [N, N, 6]]
+        assert merge(rows) == [N, N, 5]
+        assert merge(rows, tieBreak=consensus.TIE_BREAK_NEUTRAL) == [N, N, 5]
+        assert merge(rows, tieBreak=consensus.TIE_BREAK_LOWEST) == [1, 1, 5]
+        assert merge(rows, tieBreak=consensus.TIE_BREAK_FIRST) == [3, 1, 5]
+
+    def test_min_agreement(self):
+        rows = [[1, 1, 1, 1], [1, 1, 2, N], [1, 2, 3, N], [1, 2, 4, N], [1, N, N, N]]
+        assert merge(rows, minAgreement=0.6) == [1, N, N, N]
+        assert merge(rows, minAgreement=0.4) == [1, N, N, N]
+        assert merge(rows, minAgreement=0.4, tieBreak="first") == [1, 1, N, N]
+        assert merge(rows, minAgreement=0.2, tieBreak="first") == [1, 1, 1, 1]
+        assert merge(rows, minAgreement=1.0) == [1, N, N, N]
+
+    def test_stats(self):
+        labelList = [np.array(row, dtype=np.uint16) for row in [[1, 1, 2], [2, 1, 3]]]
+        _, stats = consensus.merge_labels(labelList, minAgreement=1.0)
+        assert stats == {"ties": 0, "belowAgreement": 2}
+        _, stats = consensus.merge_labels(labelList)
+        assert stats == {"ties": 2, "belowAgreement": 0}
+
+    def test_blocks(self, monkeypatch: pytest.MonkeyPatch):
+        labelList = [factories.create_labels(count=1000) for _ in range(5)]
+        expected, _ = consensus.merge_labels(labelList, consensus.TIE_BREAK_LOWEST)
+        monkeypatch.setattr(constants, "ANNO3D_BLOCK_SIZE", 64)
+        merged, _ = consensus.merge_labels(labelList, consensus.TIE_BREAK_LOWEST)
+        assert np.array_equal(merged, expected)
+
+    def test_matches_counting(self):
+        labelList = [factories.create_labels(count=500, classes=3) for _ in range(4)]
+        merged, _ = consensus.merge_labels(labelList, consensus.TIE_BREAK_LOWEST)
+        stacked = np.stack(labelList)
+        for index in range(500):
+            values, counts = np.unique(stacked[:, index], return_counts=True)
+            counts[values == N] = 0
+            if counts.max() == 0:
+                assert merged[index] == N
+            else:
+                assert merged[index] == values[counts == counts.max()].min()
+
+    def test_different_counts(self):
+        with pytest.raises(ValueError):
+            merge([[1, 2], [1]])
+
+
+class TestMergeJob:
+    def test_merge(self, model_data_factory: factories.ModelDataFactory):
+        target = model_data_factory.create()
+        sources = [
+            annotate(model_data_factory.create(project=target.project), labels)
+            for labels in (
+                np.array([1, 2, N, 4], dtype=np.uint16),
+                np.array([1, 3, N, 4], dtype=np.uint16),
+                np.array([1, 3, 5, 6], dtype=np.uint16),
+            )
+        ]
+        job = jobs.enqueue(
+            "merge_annotations",
+            {"sources": [source.pk for source in sources], "minAgreement": 0.5},
+            user=target.owner,
+            modelData=target,
+        )
+
+        jobs.work(once=True)
+
+        job.refresh_from_db()
+        assert job.status == Job.SUCCEEDED
+        assert job.result["count"] == 4
+        assert job.result["belowAgreement"] == 1
+        target.refresh_from_db()
+        with target.annotationFile.file.open("rb") as handle:
+            _, labels = annotations.read_archive(handle)
+        assert labels.tolist() == [1, 3, N, 4]
+        assert target.annotationVersions.count() == 1
@@ -0,0 +1,222 @@
+import io
+import struct
+
+import pytest
+
+from annotator.backend import geometry
+from annotator.tests import factories
+
+
+def read(data: bytes, extension: str) -> geometry.Geometry:
+    return geometry.read_geometry(io.BytesIO(data), extension)
+
+
+def create_ply(format: str, body: bytes, faceList: str = "uchar int") -> bytes:
+    header = (
+        f"ply\nformat {format} 1.0\ncomment test\n"
+        "element vertex 5\nproperty float x\nproperty float y\nproperty float z\n"
+        "property uchar red\nproperty uchar green\nproperty uchar blue\n"
+        f"element face 3\nproperty list {faceList} vertex_indices\nend_header\n"
+    )
+    return header.encode() + body
+
+
+VERTICES = [(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0), (0, 0, 1)]
+# a triangle, a quad and a pentagon, which three.js drops
+FACES = [[0, 1, 4], [0, 1, 2, 3], [0, 1, 2, 3, 4]]
+TRIANGLES = [[0, 1, 4], [0, 1, 3], [1, 2, 3]]
+
+
+class TestObj:
+    def test_cube(self):
+        model = read(factories.CUBE_OBJ, ".obj")
+
+        assert model.positions.shape == (8, 3)
+        assert model.triangles is not None
+        # the quads are split into fans around their first vertex
+        assert model.triangles[:2].tolist() == [[0, 1, 2], [0, 2, 3]]
+        assert len(model.triangles) == 12
+        assert model.colors is None
+
+    def test_indices_and_colors(self):
+        data = (
+            b"# comment\nv 0 0 0 1 0 0\nv 1 0 0 0 1 0\nvt 0 0\n"
+            b"v 0 1 0 0 0 1\nf 1/1/1 2/1/1 3/1/1\nf -3 -2 -1\n"
+        )
+        model = read(data, ".obj")
+
+        assert model.triangles.tolist() == [[0, 1, 2], [0, 1, 2]]
+        assert model.colors.tolist() == [[255, 0, 0], [0, 255, 0], [0, 0, 255]]
+
+    def test_points(self, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setattr(geometry.constants, "GEOMETRY_BLOCK_SIZE", 2)
+        model = read(b"v 0 0 0\nv 1 2 3\nv 4 5 6 0.5 0.5 0.5\n", ".obj")
+
+        assert model.positions.tolist() == [[0, 0, 0], [1, 2, 3], [4, 5, 6]]
+        assert model.triangles is None
+        # not every vertex has a color
+        assert model.colors is None
+
+    @pytest.mark.parametrize(
+        "data", [b"v 0 0\n", b"v 0 0 x\n", b"v 0 0 0\nf 1 2 3\n", b"v 0 0 0\nf a\n"]
+    )
+    def test_invalid(self, data: bytes):
+        with pytest.raises(geometry.GeometryError) as error:
+            read(data, ".obj")
+        assert error.value.code == "invalid_model"
+
+
+class TestPly:
+    def test_ascii(self):
+        vertices = "".join(
+            f"{x} {y} {z} 255 0 {i}\n" for i, (x, y, z) in enumerate(VERTICES)
+        )
+        faces = "".join(f"{len(f)} {' '.join(map(str, f))}\n" for f in FACES)
+        model = read(create_ply("ascii", (vertices + faces).encode()), ".ply")
+
+        assert model.positions.tolist() == [list(v) for v in VERTICES]
+        assert model.triangles.tolist() == TRIANGLES
+        assert model.colors[:, 2].tolist() == [0, 1, 2, 3, 4]
+
+    @pytest.mark.parametrize("order", ["<", ">"])
+    def test_binary(self, order: str):
+        vertices = b"".join(struct.pack(order + "3f3B", *v, 1, 2, 3) for v in VERTICES)
+        faces = b"".join(struct.pack(f"{order}B{len(f)}i", len(f), *f) for f in FACES)
+        format = "binary_little_endian" if order == "<" else "binary_big_endian"
+        model = read(create_ply(format, vertices + faces), ".ply")
+
+        assert model.positions.tolist() == [list(v) for v in VERTICES]
+        assert model.triangles.tolist() == TRIANGLES
+        assert model.colors.tolist() == [[1, 2, 3]] * 5
+
+    def test_binary_triangles(self):
+        # faces of the same size are read at once
+        vertices = b"".join(struct.pack("<3f3B", *v, 0, 0, 0) for v in VERTICES)
+        faces = b"".join(struct.pack("<H3I", 3, *f) for f in TRIANGLES)
+        model = read(
+            create_ply("binary_little_endian", vertices + faces, "ushort uint"), ".ply"
+        )
+
+        assert model.triangles.tolist() == TRIANGLES
+
+    @pytest.mark.parametrize(
+        "data",
+        [
+            b"obj\n",
+            b"ply\nelement vertex 1\nend_header\n",
+            b"ply\nformat ascii 1.0\nproperty float x\nend_header\n",
+            b"ply\nformat ascii 1.0\nelement vertex 1\nproperty int128 x\n",
+            b"ply\nformat ascii 1.0\nelement vertex 1\nproperty float x\n",
+            b"ply\nformat ascii 1.0\nelement vertex 2\nproperty float x\n"
+            b"property float y\nproperty float z\nend_header\n0 0 0\n",
+            b"ply\nformat binary_little_endian 1.0\nelement vertex 2\n"
+            b"property float x\nproperty float y\nproperty float z\nend_header\n",
+        ],
+    )
+    def test_invalid(self, data: bytes):
+        with pytest.raises(geometry.GeometryError) as error:
+            read(data, ".ply")
+        assert error.value.code == "invalid_model"
+
+    def test_missing_vertices(self):
+        faces = "3 0 1 5\n" * 3
+        vertices = "".join(f"{x} {y} {z} 0 0 0\n" for x, y, z in VERTICES)
+        with pytest.raises(geometry.GeometryError):
+            read(create_ply("ascii", (vertices + faces).encode()), ".ply")
+
+
+@pytest.mark.django_db
+def test_read_model(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    fileObj = factories.FileFactory.create(
+        file__data=factories.create_model_zip(), file__filename="baseFile.zip"
+    )
+    assert len(geometry.read_model(fileObj).triangles) == 12
+
+    fileObj = factories.FileFactory.create(
+        file__data=factories.create_zip({"texture.png": b""})
+    )
+    with pytest.raises(geometry.GeometryError) as error:
+        geometry.read_model(fileObj)
+    assert error.value.code == "wrong_archive_content"
+
+
+class TestIndex:
+    def test_obj(self):
+        index = geometry.index_obj(io.BytesIO(factories.CUBE_OBJ))
+
+        assert index.vertexCount == 8
+        assert index.faceCount == 12
+        assert index.attributes == ["position"]
+        assert index.bounds == {"min": [0, 0, 0], "max": [1, 1, 1]}
+        assert index.centroid == [0.5, 0.5, 0.5]
+
+    def test_obj_attributes(self, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setattr(geometry.constants, "GEOMETRY_BLOCK_SIZE", 2)
+        data = (
+            b"v 0 0 0 1 0 0\nv 2 0 0 0 1 0\nvt 0 0\nvn 0 0 1\n"
+            b"v 0 4 0 0 0 1\nf 1/1/1 2/1/1 3/1/1\n"
+        )
+        index = geometry.index_obj(io.BytesIO(data))
+
+        assert index.faceCount == 1
+        assert index.attributes == ["position", "normal", "color", "uv"]
+        assert index.bounds == {"min": [0, 0, 0], "max": [2, 4, 0]}
+
+    @pytest.mark.parametrize("format", ["ascii", "binary_little_endian"])
+    def test_ply(self, format: str, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setattr(geometry.constants, "GEOMETRY_BLOCK_SIZE", 2)
+        if format == "ascii":
+            vertices = "".join(f"{x} {y} {z} 0 0 0\n" for x, y, z in VERTICES)
+            faces = "".join(f"{len(f)} {' '.join(map(str, f))}\n" for f in FACES)
+            body = (vertices + faces).encode()
+        else:
+            body = b"".join(struct.pack("<3f3B", *v, 0, 0, 0) for v in VERTICES)
+            # faces of different sizes are parsed one at a time
+            body += b"".join(struct.pack(f"<B{len(f)}i", len(f), *f) for f in FACES)
+        index = geometry.index_ply(io.BytesIO(create_ply(format, body)))
+
+        assert index.vertexCount == 5
+        # as many as the triangulation has
+        assert index.faceCount == len(TRIANGLES)
+        assert index.attributes == ["position", "color"]
+        assert index.bounds == {"min": [0, 0, 0], "max": [1, 1, 1]}
+        assert index.centroid == pytest.approx([0.4, 0.4, 0.2])
+
+    def test_ply_uniform_faces(self):
+        faces = struct.pack(">B4i", 4, 0, 1, 2, 3) * 3
+        header = (
+            b"ply\nformat binary_big_endian 1.0\nelement vertex 5\n"
+            b"property double x\nproperty double y\nproperty double z\n"
+            b"property double nx\nproperty double ny\nproperty double nz\n"
+            b"element face 3\nproperty list uchar int vertex_indices\n"
+            b"element edge 1\nproperty int vertex1\nend_header\n"
+        )
+        normals = b"".join(struct.pack(">3d3d", *v, 0, 0, 1) for v in VERTICES)
+        # the edges after the faces are not read
+        index = geometry.index_ply(io.BytesIO(header + normals + faces))
+
+        assert index.faceCount == 6
+        assert index.attributes == ["position", "normal"]
+        assert index.bounds == {"min": [0, 0, 0], "max": [1, 1, 1]}
+
+    def test_ply_truncated(self):
+        body = b"".join(struct.pack("<3f3B", *v, 0, 0, 0) for v in VERTICES)
+        with pytest.raises(geometry.GeometryError) as error:
+            geometry.index_ply(io.BytesIO(create_ply("binary_little_endian", body)))
+        assert error.value.code == "invalid_model"
+
+    @pytest.mark.django_db
+    def test_index_basefile(self, model_data, settings, tmp_path):
+        settings.MEDIA_ROOT = str(tmp_path)
+        model_data.baseFile = factories.FileFactory.create(
+            file__data=factories.create_model_zip()
+        )
+        model_data.save()
+
+        index = geometry.index_basefile(model_data)
+
+        model_data.refresh_from_db()
+        assert index["vertexCount"] == model_data.vertexCount == 8
+        assert model_data.faceCount == 12
+        assert model_data.centroid == [0.5, 0.5, 0.5]
@@ -0,0 +1,153 @@
+import io
+import os
+import zipfile
+from pathlib import Path
+
+import pytest
+from django.core.management import CommandError, call_command
+
+from annotator.backend import blobs, imports
+from annotator.backend.models import ModelData, Project
+
+pytestmark = pytest.mark.django_db
+
+OBJ = b"v 0 0 0\nv 1 0 0\nv 0 1 0\nf 1 2 3\n"
+PLY_HEADER = (
+    "ply\nformat ascii 1.0\nelement vertex 3\nproperty float x\nproperty float y\n"
+    + "property float z\n"
+)
+MESH_PLY = PLY_HEADER + "element face 1\nproperty list uchar int vertex_indices\n"
+POINT_CLOUD_PLY = PLY_HEADER + "end_header\n0 0 0\n1 0 0\n0 1 0\n"
+
+
+@pytest.fixture
+def models_dir(tmp_path: Path) -> Path:
+    (tmp_path / "scans").mkdir()
+    (tmp_path / "chair.obj").write_bytes(OBJ)
+    (tmp_path / "chair.PNG").write_bytes(b"\x89PNG texture")
+    (tmp_path / "scans" / "room.ply").write_text(POINT_CLOUD_PLY)
+    (tmp_path / "scans" / "table.ply").write_text(
+        MESH_PLY + "end_header\n0 0 0\n1 0 0\n0 1 0\n3 0 1 2\n"
+    )
+    (tmp_path / "notes.txt").write_text("no model")
+    return tmp_path
+
+
+def import_models(project: Project, directory: Path, **options) -> None:
+    call_command(
+        "import_models", project.pk, str(directory), "--processes", "1", **options
+    )
+
+
+@pytest.fixture
+def media_root(settings, tmp_path_factory) -> Path:
+    settings.MEDIA_ROOT = tmp_path_factory.mktemp("media")
+    return settings.MEDIA_ROOT
+
+
+def get_temp_files() -> list[str]:
+    return os.listdir(os.path.dirname(blobs.get_temp_path()))
+
+
+class TestDiscover:
+    def test_discover(self, models_dir: Path):
+        items = imports.discover(str(models_dir))
+        assert [item.name for item in items] == [
+            "chair.obj",
+            "scans/room.ply",
+            "scans/table.ply",
+        ]
+        assert items[0].texturePath == str(models_dir / "chair.PNG")
+        assert items[1].texturePath is None
+        assert [item.modelType for item in items] == [
+            imports.MODEL_TYPE_MESH,
+            imports.MODEL_TYPE_POINT_CLOUD,
+            imports.MODEL_TYPE_MESH,
+        ]
+
+    def test_model_type_option(self, models_dir: Path):
+        items = imports.discover(str(models_dir), imports.MODEL_TYPE_POINT_CLOUD)
+        assert {item.modelType for item in items} == {imports.MODEL_TYPE_POINT_CLOUD}
+
+
+class TestImportModels:
+    def test_import(self, project: Project, models_dir: Path):
+        import_models(project, models_dir)
+
+        modelDataList = {
+            modeldata.name: modeldata for modeldata in ModelData.objects.all()
+        }
+        assert sorted(modelDataList) == [
+            "chair.obj",
+            "scans/room.ply",
+            "scans/table.ply",
+        ]
+        chair = modelDataList["chair.obj"]
+        assert chair.project == project
+        assert chair.owner == project.owner
+        assert chair.modelType == imports.MODEL_TYPE_MESH
+        assert modelDataList["scans/room.ply"].modelType == (
+            imports.MODEL_TYPE_POINT_CLOUD
+        )
+        assert chair.baseFile is not None
+        with chair.baseFile.file.open("rb") as handle:
+            with zipfile.ZipFile(handle) as archive:
+                assert archive.namelist() == ["chair.obj", "chair.PNG"]
+                assert archive.read("chair.obj") == OBJ
+
+    def test_import_is_idempotent(self, project: Project, models_dir: Path):
+        import_models(project, models_dir)
+        baseFiles = set(ModelData.objects.values_list("baseFile", flat=True))
+        (models_dir / "lamp.obj").write_bytes(OBJ)
+
+        import_models(project, models_dir)
+
+        assert ModelData.objects.count() == 4
+        assert baseFiles < set(ModelData.objects.values_list("baseFile", flat=True))
+
+    def test_resume_interrupted_import(
+        self, project: Project, models_dir: Path, model_data_factory
+    ):
+        interrupted = model_data_factory.create(
+            name="chair.obj", project=project, baseFile=None
+        )
+
+        import_models(project, models_dir)
+
+        interrupted.refresh_from_db()
+        assert interrupted.baseFile is not None
+        assert ModelData.objects.filter(name="chair.obj").count() == 1
+
+    def test_failed_models_are_skipped(
+        self, project: Project, models_dir: Path, media_root: Path
+    ):
+        (models_dir / "lamp.obj").write_bytes(OBJ)
+        (models_dir / "lamp.png").symlink_to(models_dir / "missing.png")
+        stderr = io.StringIO()
+
+        import_models(project, models_dir, stderr=stderr)
+
+        assert "Skipping 'lamp.obj'" in stderr.getvalue()
+        assert "Skipped 1 models with errors." in stderr.getvalue()
+        assert sorted(ModelData.objects.values_list("name", flat=True)) == [
+            "chair.obj",
+            "scans/room.ply",
+            "scans/table.ply",
+        ]
+        assert get_temp_files() == []
+
+    def test_interrupted_import_removes_archives(
+        self, project: Project, models_dir: Path, media_root: Path, monkeypatch
+    ):
+        def create_batch(*args):
+            raise RuntimeError("interrupted")
+
+        monkeypatch.setattr(imports, "create_batch", create_batch)
+
+        with pytest.raises(RuntimeError):
+            import_models(project, models_dir)
+        assert get_temp_files() == []
+
+    def test_unknown_project(self, models_dir: Path):
+        with pytest.raises(CommandError):
+            call_command("import_models", 0, str(models_dir))
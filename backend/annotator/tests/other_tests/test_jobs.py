@@ -0,0 +1,204 @@
+import time
+from datetime import timedelta
+from typing import Any
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+
+from annotator.backend import constants, jobs
+from annotator.backend.models import Job, ModelData
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def tasks():
+    calls: list[Any] = []
+
+    def succeed(job: Job) -> Any:
+        calls.append(job.arguments)
+        jobs.report_progress(job, 0.5, "halfway")
+        return {"value": job.arguments.get("value")}
+
+    def fail(job: Job) -> Any:
+        calls.append(job.arguments)
+        raise ValueError("failed")
+
+    def cancel(job: Job) -> Any:
+        Job.objects.filter(pk=job.pk).update(cancelRequested=True)
+        jobs.report_progress(job, 0.1)
+
+    registered = {"succeed": succeed, "fail": fail, "cancel": cancel}
+    jobs.TASKS.update(registered)
+    yield calls
+    for kind in registered:
+        del jobs.TASKS[kind]
+
+
+class TestJobs:
+    def test_run(self, tasks: list[Any]):
+        job = jobs.enqueue("succeed", {"value": 1})
+
+        assert jobs.work(once=True) == 1
+
+        job.refresh_from_db()
+        assert job.status == Job.SUCCEEDED
+        assert job.result == {"value": 1}
+        assert job.progress == 1
+        assert job.message == "halfway"
+        assert job.attempts == 1
+        assert job.finished is not None
+
+    def test_unknown_task(self):
+        with pytest.raises(ValueError):
+            jobs.enqueue("unknown")
+
+    def test_priority(self, tasks: list[Any]):
+        jobs.enqueue("succeed", {"value": 1})
+        jobs.enqueue("succeed", {"value": 2}, priority=10)
+        jobs.enqueue("succeed", {"value": 3})
+
+        jobs.work(once=True)
+
+        assert [call["value"] for call in tasks] == [2, 1, 3]
+
+    def test_retry(self, tasks: list[Any]):
+        job = jobs.enqueue("fail", maxAttempts=2)
+
+        jobs.work(once=True)
+        job.refresh_from_db()
+        assert job.status == Job.QUEUED
+        assert job.attempts == 1
+        assert "ValueError" in job.error
+        assert job.runAfter > timezone.now()
+        # the retry is delayed
+        assert jobs.work(once=True) == 0
+
+        Job.objects.update(runAfter=timezone.now())
+        jobs.work(once=True)
+        job.refresh_from_db()
+        assert job.status == Job.FAILED
+        assert job.attempts == 2
+        assert len(tasks) == 2
+
+    def test_cancel_queued(self, tasks: list[Any]):
+        job = jobs.enqueue("succeed")
+
+        jobs.cancel_job(job)
+
+        assert job.status == Job.CANCELLED
+        assert jobs.work(once=True) == 0
+        assert tasks == []
+
+    def test_cancel_running(self, tasks: list[Any]):
+        job = jobs.enqueue("cancel")
+
+        jobs.work(once=True)
+
+        job.refresh_from_db()
+        assert job.status == Job.CANCELLED
+
+    def test_cancel_without_progress(self, monkeypatch: pytest.MonkeyPatch):
+        def quiet(job: Job) -> Any:
+            Job.objects.filter(pk=job.pk).update(cancelRequested=True)
+            return "done"
+
+        monkeypatch.setitem(jobs.TASKS, "quiet", quiet)
+        job = jobs.enqueue("quiet")
+
+        jobs.work(once=True)
+
+        job.refresh_from_db()
+        assert job.status == Job.CANCELLED
+        assert job.result is None
+
+    @pytest.mark.parametrize("kind", ["succeed", "fail"])
+    def test_requeued_while_running(self, kind: str, tasks: list[Any]):
+        job = jobs.enqueue(kind, maxAttempts=2)
+        claimed = jobs.claim_job("first")
+        assert claimed is not None
+        # the heartbeat was missed, the job is requeued and claimed by another worker
+        Job.objects.filter(pk=job.pk).update(status=Job.QUEUED)
+        assert jobs.claim_job("second") is not None
+
+        jobs.run_job(claimed)
+
+        job.refresh_from_db()
+        assert job.status == Job.RUNNING
+        assert job.worker == "second"
+        assert job.result is None
+        assert job.error == ""
+
+    def test_claim(self, tasks: list[Any]):
+        job = jobs.enqueue("succeed")
+
+        claimed = jobs.claim_job("first")
+
+        assert claimed is not None and claimed.pk == job.pk
+        assert claimed.status == Job.RUNNING
+        assert claimed.worker == "first"
+        assert jobs.claim_job("second") is None
+
+    def test_enqueue_keyed(self, tasks: list[Any], model_data: ModelData):
+        job = jobs.enqueue_keyed("fail", {"key": "a"}, None, model_data)
+        other = jobs.enqueue_keyed("fail", {"key": "b"}, None, model_data)
+        assert other.pk != job.pk
+        assert jobs.enqueue_keyed("fail", {"key": "a"}, None, model_data) == job
+
+        # failed jobs are kept, cancelled ones are replaced
+        Job.objects.filter(pk=job.pk).update(status=Job.FAILED)
+        assert jobs.enqueue_keyed("fail", {"key": "a"}, None, model_data) == job
+        jobs.cancel_job(other)
+        again = jobs.enqueue_keyed("fail", {"key": "b"}, None, model_data)
+        assert again.pk not in (job.pk, other.pk)
+        assert again.status == Job.QUEUED
+
+    def test_requeue_stale_jobs(self, tasks: list[Any]):
+        stale = jobs.enqueue("succeed")
+        exhausted = jobs.enqueue("succeed", maxAttempts=1)
+        running = jobs.enqueue("succeed")
+        jobs.claim_job("crashed")
+        jobs.claim_job("crashed")
+        jobs.claim_job("alive")
+        Job.objects.filter(pk__in=[stale.pk, exhausted.pk]).update(
+            heartbeat=timezone.now()
+            - timedelta(seconds=constants.JOB_STALE_TIMEOUT + 1)
+        )
+
+        assert jobs.requeue_stale_jobs() == 2
+
+        stale.refresh_from_db()
+        exhausted.refresh_from_db()
+        running.refresh_from_db()
+        assert stale.status == Job.QUEUED
+        assert exhausted.status == Job.FAILED
+        assert running.status == Job.RUNNING
+
+    @pytest.mark.django_db(transaction=True)
+    def test_heartbeat_without_progress(self, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setattr(constants, "JOB_STALE_TIMEOUT", 0.5)
+        monkeypatch.setattr(constants, "JOB_HEARTBEAT_INTERVAL", 0.05)
+
+        # runs longer than the stale timeout without reporting its progress
+        def slow(job: Job) -> Any:
+            time.sleep(1)
+            return jobs.requeue_stale_jobs()
+
+        monkeypatch.setitem(jobs.TASKS, "slow", slow)
+        job = jobs.enqueue("slow")
+
+        assert jobs.work(once=True) == 1
+
+        job.refresh_from_db()
+        assert job.status == Job.SUCCEEDED
+        assert job.result == 0
+        assert job.attempts == 1
+
+    def test_runworkers(self, tasks: list[Any]):
+        job = jobs.enqueue("succeed")
+
+        call_command("runworkers", "--processes", "0", "--once")
+
+        job.refresh_from_db()
+        assert job.status == Job.SUCCEEDED
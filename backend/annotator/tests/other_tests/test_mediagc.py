@@ -0,0 +1,213 @@
+import os
+import time
+from datetime import timedelta
+from pathlib import Path
+
+import numpy as np
+import pytest
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.utils import timezone
+
+from annotator.backend import annotations, blobs, mediagc, uploads, versions
+from annotator.backend.anno3d import generic
+from annotator.backend.models import Blob, File, ModelData, TileSet, UploadSession
+from annotator.tests import factories
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def media_root(settings, tmp_path: Path) -> Path:
+    settings.MEDIA_ROOT = str(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def upload_session_path(model_data: ModelData) -> Path:
+    session = UploadSession.objects.create(
+        modelData=model_data,
+        fileType="baseFile",
+        fileFormat="application/zip",
+        fileSize=1,
+        chunkSize=1,
+    )
+    uploads.create_part_file(session)
+    path = Path(uploads.get_part_path(session))
+    os.utime(path, (0, 0))
+    return path
+
+
+def write(root: Path, name: str, age: int = 2 * 24 * 60 * 60) -> Path:
+    path = root / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"content")
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def collect(dryRun: bool) -> tuple[mediagc.Report, list[tuple[str, str]]]:
+    problems: list[tuple[str, str]] = []
+    collector = mediagc.MediaCollector(
+        dryRun, threads=2, log=lambda kind, name: problems.append((kind, name))
+    )
+    return collector.run(), problems
+
+
+def annotate(model_data: ModelData) -> File:
+    labels = np.array([1, 2, 3], dtype=np.uint16)
+    fileObj = factories.FileFactory.create(filePath="test/")
+    blobs.assign_blob(fileObj, annotations.store_labels(labels))
+    fileObj.save()
+    model_data.annotationFile = fileObj
+    model_data.save()
+    versions.record_version(model_data, model_data.owner, labels)
+    return fileObj
+
+
+class TestMediaCollector:
+    def test_orphan_files(self, media_root: Path):
+        orphans = [
+            write(media_root, "blobs/ab/cd/abcd"),
+            write(media_root, "projects/1/2/baseFile.zip"),
+            write(media_root, "uploads/3f2504e0-4f89-11d3-9a0c-0305e82c3301/x.part"),
+        ]
+        young = write(media_root, "blobs/tmp/upload", age=0)
+
+        report, problems = collect(dryRun=True)
+
+        assert report.orphanFiles == 3
+        assert report.orphanBytes == 3 * len(b"content")
+        assert sorted(name for _, name in problems) == sorted(
+            str(path.relative_to(media_root)) for path in orphans
+        )
+        assert all(path.exists() for path in orphans)
+
+        report, _ = collect(dryRun=False)
+
+        assert report.orphanFiles == 3
+        assert not any(path.exists() for path in orphans)
+        assert young.exists()
+        # empty directories are removed once they are older than the grace period
+        directory = media_root / "projects/1/2"
+        assert collect(dryRun=False)[0].emptyDirectories == 0
+        os.utime(directory, (0, 0))
+        assert collect(dryRun=False)[0].emptyDirectories == 1
+        assert not directory.exists()
+
+    def test_referenced_files_are_kept(
+        self, media_root: Path, model_data: ModelData, upload_session_path
+    ):
+        fileObj = annotate(model_data)
+        path = Path(default_storage.path(fileObj.file.name))
+        os.utime(path, (0, 0))
+
+        report, problems = collect(dryRun=False)
+
+        assert report.orphanFiles == 0, problems
+        assert report.missingBlobs == 0
+        assert path.exists()
+        assert upload_session_path.exists()
+
+    def test_restore_missing_annotationfile(
+        self, media_root: Path, model_data: ModelData
+    ):
+        fileObj = annotate(model_data)
+        path = Path(default_storage.path(fileObj.file.name))
+        content = path.read_bytes()
+        path.unlink()
+
+        report, problems = collect(dryRun=True)
+        assert report.missingBlobs == 1
+        assert problems == [("missing blob", fileObj.file.name)]
+        assert not path.exists()
+
+        report, problems = collect(dryRun=False)
+        assert report.restored == 1
+        assert problems == []
+        assert path.read_bytes() == content
+
+    def test_missing_files(self, media_root: Path, model_data: ModelData):
+        model_data.baseFile = factories.FileFactory.create(file="projects/1/a.zip")
+        model_data.save()
+        blob = Blob.objects.create(sha256="ab" * 32, size=1, file="blobs/ab/ab/x")
+        fileObj = factories.FileFactory.create(blob=blob, file=blob.file.name)
+        model_data.annotationFile = fileObj
+        model_data.save()
+
+        report, _ = collect(dryRun=False)
+
+        assert report.missingFiles == 1
+        assert report.missingBlobs == 1
+        assert report.restored == 0
+        assert Blob.objects.filter(pk=blob.pk).exists()
+
+    def test_tiles(self, media_root: Path, model_data: ModelData):
+        path = write(media_root, "tiles/1/key.bin")
+        tileSet = TileSet.objects.create(
+            modelData=model_data,
+            key="key",
+            file="tiles/1/key.bin",
+            pointCount=1,
+            bounds={},
+            nodes={},
+        )
+
+        report, _ = collect(dryRun=False)
+        assert report.orphanFiles == 0
+        assert report.missingTiles == 0
+
+        path.unlink()
+        report, _ = collect(dryRun=True)
+        assert report.missingTiles == 1
+        assert TileSet.objects.filter(pk=tileSet.pk).exists()
+
+        report, _ = collect(dryRun=False)
+        # built again on the next request
+        assert not TileSet.objects.filter(pk=tileSet.pk).exists()
+
+    def test_unreferenced_rows(
+        self,
+        media_root: Path,
+        model_data: ModelData,
+        django_capture_on_commit_callbacks,
+    ):
+        fileObj = annotate(model_data)
+        model_data.annotationFile = None
+        model_data.save()
+        File.objects.update(uploadDate=timezone.now() - timedelta(days=2))
+        Blob.objects.update(created=timezone.now() - timedelta(days=2))
+        path = Path(default_storage.path(fileObj.file.name))
+
+        report, _ = collect(dryRun=True)
+        assert report.danglingFiles == 1
+        assert path.exists()
+
+        with django_capture_on_commit_callbacks(execute=True):
+            report, _ = collect(dryRun=False)
+        assert report.danglingFiles == 1
+        assert not File.objects.filter(pk=fileObj.pk).exists()
+        assert not Blob.objects.exists()
+        assert not path.exists()
+
+    def test_transcoded_blobs_are_kept(self, media_root: Path, model_data: ModelData):
+        fileObj = annotate(model_data)
+        transcoded = annotations.get_transcoded_blob(fileObj, generic.FORMAT_UTF8V1)
+        Blob.objects.update(created=timezone.now() - timedelta(days=2))
+
+        report, _ = collect(dryRun=False)
+
+        assert report.unreferencedBlobs == 0
+        assert default_storage.exists(transcoded.file.name)
+
+
+def test_command(media_root: Path, capsys):
+    write(media_root, "projects/1/2/baseFile.zip")
+
+    call_command("media_gc", "--dry-run", "-v", "2")
+
+    output = capsys.readouterr().out
+    assert "orphan file: projects/1/2/baseFile.zip" in output
+    assert "Found 1 orphaned files" in output
+    assert (media_root / "projects/1/2/baseFile.zip").exists()
@@ -0,0 +1,77 @@
+import importlib
+from typing import Any
+
+import pytest
+from django.apps import apps
+from django.core.management import call_command
+
+from annotator.backend import annotations, blobs, utils
+from annotator.backend.models import File
+from annotator.tests import factories
+
+pytestmark = pytest.mark.django_db
+
+backfill = importlib.import_module(
+    "annotator.backend.migrations.0011_backfill_file_metadata"
+)
+
+
+class TestBackfillFileMetadata:
+    def test_backfill(self):
+        legacy = factories.FileFactory.create()
+        missing = factories.FileFactory.create(file="projects/missing.zip")
+        stored = factories.FileFactory.create()
+        blobs.assign_blob(stored, annotations.store_labels(factories.create_labels()))
+        stored.save()
+        File.objects.update(fileSize=None, fileModified=None, sha256="")
+
+        backfill.backfill_file_metadata(apps, None)
+
+        legacy.refresh_from_db()
+        assert legacy.fileSize == legacy.file.size
+        assert legacy.fileModified is not None
+        # hashed by the hash_files command instead
+        assert legacy.sha256 == ""
+        stored.refresh_from_db()
+        assert stored.fileSize == stored.blob.size
+        assert stored.fileModified == stored.blob.created
+        assert stored.sha256 == stored.blob.sha256
+        missing.refresh_from_db()
+        assert missing.fileSize is None
+
+
+class TestHashFiles:
+    def test_hash_files(self, capsys):
+        legacy = factories.FileFactory.create()
+        missing = factories.FileFactory.create(file="projects/missing.zip")
+        stored = factories.FileFactory.create()
+        blobs.assign_blob(stored, annotations.store_labels(factories.create_labels()))
+        stored.save()
+        File.objects.filter(blob__isnull=True).update(sha256="")
+
+        call_command("hash_files", "--batch-size", "1")
+
+        assert (
+            capsys.readouterr().out == f"Hashed 1 files ({legacy.file.size} bytes).\n"
+        )
+        legacy.refresh_from_db()
+        assert legacy.sha256 == utils.hash_file(legacy.file)
+        missing.refresh_from_db()
+        assert missing.sha256 == ""
+        # nothing is left, so a second run continues without hashing anything again
+        call_command("hash_files")
+        assert capsys.readouterr().out == "Hashed 0 files (0 bytes).\n"
+
+    def test_replaced_meanwhile(self, monkeypatch):
+        legacy = factories.FileFactory.create(sha256="")
+        replaced = "0" * 64
+
+        # the File is replaced while its former content is hashed
+        def hash_file(file: Any) -> str:
+            File.objects.filter(pk=legacy.pk).update(sha256=replaced)
+            return utils.hash_file(file)
+
+        monkeypatch.setattr(blobs, "hash_file", hash_file)
+        assert list(blobs.hash_legacy_files()) == [(0, 0)]
+        legacy.refresh_from_db()
+        assert legacy.sha256 == replaced
@@ -0,0 +1,74 @@
+import pytest
+from django.contrib.auth.models import AnonymousUser, User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from annotator.backend import constants, permissions
+from annotator.backend.models import Project
+from annotator.tests import factories
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def member(project: Project) -> User:
+    user = factories.UserFactory.create()
+    project.users.add(*factories.UserFactory.create_batch(3), user)
+    return user
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    permissions.membershipCache.clear()
+    yield
+    permissions.membershipCache.clear()
+
+
+def create_request() -> Request:
+    return Request(APIRequestFactory().get("/"))
+
+
+def count_queries(user, project: Project, request=None) -> tuple[bool, int]:
+    with CaptureQueriesContext(connection) as context:
+        member = permissions.is_project_member(user, project, request)
+    return member, len(context)
+
+
+class TestIsProjectMember:
+    def test_members(self, project: Project, member: User):
+        assert count_queries(project.owner, project) == (True, 0)
+        assert count_queries(member, project) == (True, 1)
+        assert count_queries(factories.UserFactory.create(), project) == (False, 1)
+        assert count_queries(AnonymousUser(), project) == (False, 0)
+
+    def test_memoized_per_request(self, project: Project, member: User):
+        request = create_request()
+        assert count_queries(member, project, request) == (True, 1)
+        assert count_queries(member, project, request) == (True, 0)
+        assert count_queries(member, project, create_request()) == (True, 1)
+
+    def test_worker_cache(
+        self, project: Project, member: User, monkeypatch: pytest.MonkeyPatch
+    ):
+        monkeypatch.setattr(constants, "PROJECT_MEMBERSHIP_CACHE_TTL", 60)
+        assert count_queries(member, project, create_request()) == (True, 1)
+        assert count_queries(member, project, create_request()) == (True, 0)
+
+        # removing a member clears the cache of the worker
+        project.users.remove(member)
+        assert count_queries(member, project, create_request()) == (False, 1)
+
+    def test_worker_cache_expires(
+        self, project: Project, member: User, monkeypatch: pytest.MonkeyPatch
+    ):
+        monkeypatch.setattr(constants, "PROJECT_MEMBERSHIP_CACHE_TTL", 60)
+        now = 1000.0
+        monkeypatch.setattr(permissions.time, "monotonic", lambda: now)
+        count_queries(member, project)
+
+        now += 59
+        assert count_queries(member, project) == (True, 0)
+        now += 1
+        assert count_queries(member, project) == (True, 1)
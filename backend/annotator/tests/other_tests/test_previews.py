@@ -0,0 +1,128 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from annotator.backend import annotations, blobs, constants, geometry, previews
+from annotator.backend.models import ModelData, PreviewRender
+from annotator.tests import factories
+
+N = constants.ANNO3D_NEUTRAL_CLASS
+RED = 0xFF0000
+
+
+@pytest.fixture
+def cube() -> geometry.Geometry:
+    return geometry.read_geometry(io.BytesIO(factories.CUBE_OBJ), ".obj")
+
+
+def get_label_colors() -> np.ndarray:
+    colors = np.zeros((N + 1, 4), dtype=np.uint8)
+    colors[1] = (255, 0, 0, 255)
+    return colors
+
+
+class TestDraw:
+    def test_colors(self, cube: geometry.Geometry):
+        # the two triangles of the bottom quad, class 2 has no Label
+        labels = np.array([1, 1, 2] + [N] * 9, dtype=np.uint16)
+        colors = previews.get_colors(cube, False, labels, get_label_colors())
+
+        assert colors[:3].tolist() == [[255, 0, 0], [255, 0, 0], [0xCC] * 3]
+        with pytest.raises(ValueError):
+            previews.get_colors(cube, False, labels[:5], get_label_colors())
+
+    def test_triangles(self, cube: geometry.Geometry):
+        labels = np.array([1, 1] + [N] * 10, dtype=np.uint16)
+        colors = previews.get_colors(cube, False, labels, get_label_colors())
+        size = constants.PREVIEW_SIZE
+
+        bottom = previews.draw_triangles(cube, colors, "bottom")
+        top = previews.draw_triangles(cube, colors, "top")
+
+        assert bottom.shape == (size, size, 4)
+        center = size // 2
+        # the labeled bottom quad faces the camera, the top quad is hidden behind it
+        assert bottom[center, center].tolist() == [255, 0, 0, 255]
+        assert top[center, center].tolist() == [0xCC, 0xCC, 0xCC, 255]
+        # the margin stays transparent
+        assert bottom[0, 0, 3] == 0
+
+    def test_sample_budget(
+        self, cube: geometry.Geometry, monkeypatch: pytest.MonkeyPatch
+    ):
+        colors = previews.get_colors(cube, False, None, get_label_colors())
+        monkeypatch.setattr(previews.constants, "PREVIEW_MAX_SAMPLES", 12)
+        # the quads are drawn with their centroids only
+        pixels = previews.draw_triangles(cube, colors, "top")
+        assert 0 < np.count_nonzero(pixels[:, :, 3]) <= 12
+
+    def test_points(self):
+        positions = np.array([[0, 0, 0], [1, 1, 0], [1, 1, 1]], dtype=np.float32)
+        colors = np.full((3, 3), 200, dtype=np.uint8)
+
+        pixels = previews.draw_points(positions, colors, "top")
+        hidden = previews.draw_points(positions[1:], colors[1:], "top")
+
+        drawn = pixels[:, :, 3] > 0
+        # the farther points are darker
+        assert set(pixels[drawn, 0].tolist()) == {70, 200}
+        # the point below the nearest one is hidden
+        assert set(hidden[hidden[:, :, 3] > 0, 0].tolist()) == {200}
+
+    def test_encode(self):
+        pixels = np.zeros((4, 4, 4), dtype=np.uint8)
+        image = Image.open(io.BytesIO(previews.encode_webp(pixels)))
+        assert image.format == "WEBP"
+
+
+@pytest.mark.django_db
+class TestRenderPreviews:
+    def test_render(self, model_data: ModelData, settings, tmp_path):
+        settings.MEDIA_ROOT = str(tmp_path)
+        model_data.baseFile = factories.FileFactory.create(
+            file__data=factories.create_model_zip()
+        )
+        model_data.annotationFile = factories.FileFactory.create()
+        blobs.assign_blob(
+            model_data.annotationFile,
+            annotations.store_labels(np.full(12, 1, dtype=np.uint16)),
+        )
+        model_data.annotationFile.save()
+        model_data.save()
+        factories.LabelFactory.create(
+            project=model_data.project, annotationClass=1, color=RED
+        )
+        done = []
+
+        result = previews.render_previews(model_data, True, done.append)
+
+        assert done == [1, 2, 3, 4, 5, 6]
+        assert result["key"] == previews.get_render_key(model_data, True)
+        assert result["key"] != previews.get_render_key(model_data, False)
+        render = PreviewRender.objects.get(modelData=model_data, view="top")
+        image = Image.open(io.BytesIO(render.image)).convert("RGBA")
+        center = constants.PREVIEW_SIZE // 2
+        red, green, _, alpha = image.getpixel((center, center))
+        assert red > 200 and green < 50 and alpha == 255
+
+        # rendering again replaces the renders
+        previews.render_previews(model_data, True, done.append)
+        assert PreviewRender.objects.count() == 6
+
+    def test_key(self, model_data: ModelData, settings, tmp_path):
+        settings.MEDIA_ROOT = str(tmp_path)
+        model_data.baseFile = factories.FileFactory.create(sha256="a" * 64)
+        model_data.save()
+        plain = previews.get_render_key(model_data, False)
+        annotated = previews.get_render_key(model_data, True)
+
+        label = factories.LabelFactory.create(project=model_data.project)
+        assert previews.get_render_key(model_data, False) == plain
+        assert previews.get_render_key(model_data, True) != annotated
+        annotated = previews.get_render_key(model_data, True)
+
+        label.color += 1
+        label.save()
+        assert previews.get_render_key(model_data, True) != annotated
@@ -0,0 +1,122 @@
+import io
+import os
+
+import numpy as np
+import pytest
+from django.core.files.storage import default_storage
+
+from annotator.backend import geometry, tiles
+from annotator.backend.models import ModelData, TileSet
+from annotator.tests import factories
+
+
+def decode(data: bytes, info: dict, colors: bool) -> tuple[np.ndarray, ...]:
+    count = info["count"]
+    tile = data[info["offset"] : info["offset"] + info["size"]]
+    indices = np.frombuffer(tile, "<u4", count)
+    quantized = np.frombuffer(tile, "<u2", 3 * count, 4 * count).reshape(-1, 3)
+    low = np.array(info["bounds"]["min"])
+    high = np.array(info["bounds"]["max"])
+    positions = low + quantized / tiles.QUANTIZATION_MAX * (high - low)
+    rest = tile[10 * count :]
+    assert len(rest) == (3 * count if colors else 0)
+    return indices, positions, np.frombuffer(rest, np.uint8).reshape(-1, 3)
+
+
+def write(model: geometry.Geometry) -> tuple[dict, bytes]:
+    positions = model.positions
+    low = positions.min(axis=0).astype(np.float64)
+    size = float((positions.max(axis=0) - low).max()) or 1.0
+    out = io.BytesIO()
+    indices = np.arange(len(positions))
+    nodes = tiles.write_tiles(out, model, indices, low, size, lambda *_: None)
+    return nodes, out.getvalue()
+
+
+class TestWriteTiles:
+    @pytest.fixture(autouse=True)
+    def small_nodes(self, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setattr(tiles.constants, "TILE_MAX_POINTS", 50)
+        monkeypatch.setattr(tiles.constants, "TILE_GRID_SIZE", 4)
+
+    def test_points_are_distributed(self):
+        rng = np.random.default_rng(0)
+        positions = rng.normal(size=(2000, 3)).astype(np.float32)
+        colors = rng.integers(0, 255, size=(2000, 3), dtype=np.uint8)
+        nodes, data = write(geometry.Geometry(positions, None, colors))
+
+        assert list(nodes)[:2] == ["r", "r0"]
+        # breadth first
+        assert [len(node) for node in nodes] == sorted(len(node) for node in nodes)
+        seen = np.zeros(len(positions), dtype=int)
+        for node, info in nodes.items():
+            assert node == "r" or node[:-1] in nodes
+            assert info["count"] <= 50
+            indices, decoded, tileColors = decode(data, info, colors=True)
+            seen[indices] += 1
+            step = np.subtract(info["bounds"]["max"], info["bounds"]["min"])[0]
+            assert np.abs(decoded - positions[indices]).max() <= step / 65535
+            assert (tileColors == colors[indices]).all()
+        # every point is in exactly one tile
+        assert (seen == 1).all()
+        # the root keeps at most one point per cell
+        assert nodes["r"]["count"] <= pow(4, 3)
+
+    def test_duplicates_stop_at_max_depth(self, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setattr(tiles.constants, "TILE_MAX_DEPTH", 3)
+        positions = np.zeros((300, 3), dtype=np.float32)
+        positions[0] = 1
+        nodes, data = write(geometry.Geometry(positions))
+
+        assert max(len(node) for node in nodes) == 4
+        assert sum(info["count"] for info in nodes.values()) == 300
+        assert len(data) == 300 * 10
+
+
+@pytest.mark.django_db
+class TestBuildTiles:
+    @pytest.fixture
+    def model_data(self, model_data: ModelData, settings, tmp_path) -> ModelData:
+        settings.MEDIA_ROOT = str(tmp_path)
+        model = b"".join(f"v {i} {i % 7} 0\n".encode() for i in range(100))
+        model_data.modelType = "point_cloud"
+        model_data.baseFile = factories.FileFactory.create(
+            file__data=factories.create_model_zip(model)
+        )
+        model_data.save()
+        return model_data
+
+    def test_build(self, model_data: ModelData):
+        progress = []
+
+        result = tiles.build_tiles(
+            model_data, lambda done, total: progress.append((done, total))
+        )
+
+        tileSet = TileSet.objects.get(modelData=model_data)
+        assert result == {"key": tiles.get_tiles_key(model_data), "nodes": 1}
+        assert tileSet.key == result["key"]
+        assert tileSet.pointCount == 100
+        assert tileSet.colors is False
+        assert tileSet.bounds == {"min": [0, 0, 0], "max": [99, 99, 99]}
+        assert progress[-1] == (100, 100)
+        with tileSet.file.open("rb") as handle:
+            indices, _, _ = decode(handle.read(), tileSet.nodes["r"], colors=False)
+        assert sorted(indices) == list(range(100))
+
+    def test_rebuild_replaces_file(
+        self, model_data: ModelData, django_capture_on_commit_callbacks
+    ):
+        tiles.build_tiles(model_data, lambda *_: None)
+        former = TileSet.objects.get(modelData=model_data).file.name
+        model_data.baseFile.sha256 = "ab" * 32
+        model_data.baseFile.save()
+
+        tiles.build_tiles(model_data, lambda *_: None)
+
+        assert TileSet.objects.count() == 1
+        assert not default_storage.exists(former)
+        path = default_storage.path(TileSet.objects.get().file.name)
+        with django_capture_on_commit_callbacks(execute=True):
+            model_data.delete()
+        assert not os.path.exists(path)
@@ -0,0 +1,126 @@
+from datetime import timedelta
+
+import numpy as np
+import pytest
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.utils import timezone
+
+from annotator.backend import annotations, blobs, constants, versions
+from annotator.backend.models import AnnotationChunk, AnnotationVersion, ModelData
+from annotator.tests import factories
+
+pytestmark = pytest.mark.django_db
+
+
+def record(model_data: ModelData, labels: np.ndarray) -> AnnotationVersion:
+    fileObj = model_data.annotationFile
+    if fileObj is None:
+        fileObj = factories.FileFactory.create(filePath="test/")
+        model_data.annotationFile = fileObj
+        model_data.save()
+    blobs.assign_blob(fileObj, annotations.store_labels(labels))
+    fileObj.save()
+    version = versions.record_version(model_data, model_data.owner, labels)
+    assert version is not None
+    return version
+
+
+@pytest.fixture
+def chunk_size(settings):
+    # small chunks, so that a few labels span several of them
+    constants.ANNOTATION_CHUNK_SIZE, previous = 64, constants.ANNOTATION_CHUNK_SIZE
+    yield constants.ANNOTATION_CHUNK_SIZE
+    constants.ANNOTATION_CHUNK_SIZE = previous
+
+
+class TestVersionStore:
+    def test_chunks_are_shared(self, model_data: ModelData, chunk_size: int):
+        labels = factories.create_labels(count=chunk_size * 10)
+        first = record(model_data, labels)
+        labels = labels.copy()
+        edited = chunk_size * 3 + 5
+        labels[edited] = 2 if labels[edited] == 1 else 1
+        second = record(model_data, labels)
+
+        assert first.chunks.count() == second.chunks.count() == 10
+        # only the edited chunk is stored again
+        assert AnnotationChunk.objects.count() == 11
+        assert np.array_equal(versions.read_labels(second), labels)
+        assert not np.array_equal(versions.read_labels(first), labels)
+
+    def test_uniform_chunks_are_stored_once(
+        self, model_data: ModelData, chunk_size: int
+    ):
+        labels = np.full(chunk_size * 10 + 1, 65535, dtype=np.uint16)
+        version = record(model_data, labels)
+
+        assert version.versionChunks.count() == 11
+        assert AnnotationChunk.objects.count() == 2
+        assert np.array_equal(versions.read_labels(version), labels)
+
+    def test_missing_chunk(self, model_data: ModelData, chunk_size: int):
+        version = record(model_data, factories.create_labels(count=chunk_size * 2))
+        default_storage.delete(version.chunks.first().file.name)
+
+        with pytest.raises(FileNotFoundError):
+            versions.read_labels(version)
+
+
+class TestRetention:
+    def create_versions(self, model_data: ModelData, count: int, age: int):
+        labels = factories.create_labels()
+        for i in range(count):
+            labels = labels.copy()
+            labels[i] = 65535 - labels[i] % 2
+            record(model_data, labels)
+        AnnotationVersion.objects.update(created=timezone.now() - timedelta(days=age))
+
+    def test_prune(self, model_data: ModelData):
+        self.create_versions(model_data, 5, 40)
+
+        report = versions.prune_versions(keep=2, days=30)
+
+        numbers = list(model_data.annotationVersions.values_list("number", flat=True))
+        assert numbers == [4, 5]
+        assert report["versions"] == 3
+        assert report["chunks"] == 3
+        for chunk in AnnotationChunk.objects.all():
+            assert default_storage.exists(chunk.file.name)
+        for version in model_data.annotationVersions.all():
+            versions.read_labels(version)
+
+    def test_young_versions_are_kept(self, model_data: ModelData):
+        self.create_versions(model_data, 5, 10)
+
+        report = versions.prune_versions(keep=2, days=30)
+
+        assert report["versions"] == 0
+        assert model_data.annotationVersions.count() == 5
+
+    def test_dry_run(self, model_data: ModelData):
+        self.create_versions(model_data, 5, 40)
+
+        dry = versions.prune_versions(keep=2, days=30, dryRun=True)
+
+        assert model_data.annotationVersions.count() == 5
+        assert dry == versions.prune_versions(keep=2, days=30)
+
+    def test_chunks_referenced_meanwhile_are_kept(self, model_data: ModelData):
+        # e.g. found by store_chunks() after prune_chunks() collected its candidates
+        version = record(model_data, factories.create_labels())
+        pks = list(AnnotationChunk.objects.values_list("pk", flat=True))
+
+        assert versions.delete_unreferenced_chunks(pks) == []
+        assert AnnotationChunk.objects.count() == len(pks)
+        versions.read_labels(version)
+
+    def test_deleted_modeldata(self, model_data: ModelData):
+        self.create_versions(model_data, 2, 0)
+        names = [chunk.file.name for chunk in AnnotationChunk.objects.all()]
+        model_data.delete()
+
+        call_command("prune_annotation_versions")
+
+        assert AnnotationChunk.objects.count() == 0
+        assert not any(default_storage.exists(name) for name in names)
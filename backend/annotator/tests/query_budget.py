@@ -0,0 +1,66 @@
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+# Assertions on the number of database queries of endpoints. Serializers that nest
+# related objects issue a query per row unless the querysets select or prefetch the
+# relations, which only shows with more than a handful of rows.
+
+
+def describe_queries(context: CaptureQueriesContext) -> str:
+    return "\n".join(
+        f"{number}. {query['sql']}"
+        for number, query in enumerate(context.captured_queries, start=1)
+    )
+
+
+# Fails if the block issues more than maximum queries, listing the queries.
+@contextmanager
+def query_budget(maximum: int) -> Iterator[CaptureQueriesContext]:
+    with CaptureQueriesContext(connection) as context:
+        yield context
+    if len(context) > maximum:
+        raise AssertionError(
+            f"{len(context)} queries exceed the budget of {maximum}:\n"
+            + describe_queries(context)
+        )
+
+
+# The query_budget fixture. Can be used as the context manager and checks that the
+# number of queries of a call does not grow with the number of rows.
+class QueryBudget:
+    def __call__(self, maximum: int) -> Any:
+        return query_budget(maximum)
+
+    def capture(self, call: Callable[[], Any]) -> CaptureQueriesContext:
+        with CaptureQueriesContext(connection) as context:
+            call()
+        return context
+
+    # Counts the queries of the call, lets grow add rows and counts again. The call
+    # is made once beforehand, so that caches filled by the first call do not count.
+    # Returns the number of queries.
+    def assert_constant(
+        self,
+        call: Callable[[], Any],
+        grow: Callable[[], Any],
+        maximum: Optional[int] = None,
+    ) -> int:
+        call()
+        before = self.capture(call)
+        grow()
+        after = self.capture(call)
+        if len(after) > len(before):
+            raise AssertionError(
+                f"The queries grew from {len(before)} to {len(after)} with the rows:\n"
+                + describe_queries(after)
+            )
+        if maximum is not None and len(after) > maximum:
+            raise AssertionError(
+                f"{len(after)} queries exceed the budget of {maximum}:\n"
+                + describe_queries(after)
+            )
+        return len(after)
@@ -39,10 +39,11 @@ class TestFileSerializer:
         file: File = file_factory.build(filePath=file_path, uploaded_by=user)
         file.file.name = filename_with_ending
         file.uploadDate = datetime.datetime.now()
+        file.fileSize = file.file.size
 
         expected_serialized_data = {
             "fileFormat": file.fileFormat,
-            "fileSize": file.file.size,
+            "fileSize": file.fileSize,
             "uploadDate": DateTimeField().to_representation(file.uploadDate),
         }
         serializer = FileSerializer(file)
@@ -90,7 +91,9 @@ class TestBaseFileUploadSerializer:
     ):
         file_path = test_dir_path + "test_files/"
         filename_with_ending = filename + ".zip"
-        file: File = file_factory.build(filePath=file_path)
+        file: File = file_factory.build(
+            filePath=file_path, file__data=factories.create_base_file_zip()
+        )
         file.file.name = filename_with_ending
 
         valid_serialized_data = {
@@ -107,7 +110,9 @@ class TestBaseFileUploadSerializer:
     def test_update(self, file_factory: factories.FileFactory):
         file_path = test_dir_path + "test_files/"
         filename_with_ending = "baseFile.zip"
-        file: File = file_factory.build(filePath=file_path)
+        file: File = file_factory.build(
+            filePath=file_path, file__data=factories.create_base_file_zip()
+        )
         file.file.name = filename_with_ending
 
         valid_serialized_data = {
@@ -131,7 +136,9 @@ class TestAnnotationFileUploadSerializer:
     ):
         file_path = test_dir_path + "test_files/"
         filename_with_ending = filename + ".zip"
-        file: File = file_factory.build(filePath=file_path)
+        file: File = file_factory.build(
+            filePath=file_path, file__data=factories.create_annotation_file_zip()
+        )
         file.file.name = filename_with_ending
 
         valid_serialized_data = {
@@ -26,6 +26,11 @@ class TestModelDataSerializer:
             "annotationFile": None,
             "baseFile": None,
             "locked": None,
+            "vertexCount": None,
+            "faceCount": None,
+            "attributes": None,
+            "bounds": None,
+            "centroid": None,
             "project_id": project.id,
         }
 
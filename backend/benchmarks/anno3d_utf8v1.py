@@ -0,0 +1,97 @@
+# Throughput benchmark of the anno3d UTF8v1 parser and serializer.
+#
+# Run from the backend directory:
+#   python -m benchmarks.anno3d_utf8v1 --count 10000000 --classes 8
+
+import argparse
+import io
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from annotator.backend.anno3d import binaryv2, utf8v1
+
+
+def create_labels(count: int, classes: int, neutral: float) -> utf8v1.Labels:
+    rng = np.random.default_rng(0)
+    labels = rng.integers(0, classes, size=count, dtype=np.uint16)
+    labels[rng.random(count) < neutral] = 0xFFFF
+    return labels
+
+
+def report(name: str, seconds: float, size: int, count: int) -> None:
+    print(
+        f"{name:<24} {seconds:8.3f} s {size / seconds / pow(2, 20):10.1f} MiB/s "
+        + f"{count / seconds / 1e6:8.1f} M indices/s"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=10_000_000)
+    parser.add_argument("--classes", type=int, default=8)
+    parser.add_argument("--neutral", type=float, default=0.25)
+    args = parser.parse_args()
+
+    labels = create_labels(args.count, args.classes, args.neutral)
+    print(f"{args.count} indices, {args.classes} classes")
+
+    start = time.perf_counter()
+    data = utf8v1.serialize_bytes(labels)
+    report("serialize", time.perf_counter() - start, len(data), args.count)
+
+    start = time.perf_counter()
+    parsed = utf8v1.parse_bytes(data)
+    report("parse (in memory)", time.perf_counter() - start, len(data), args.count)
+    assert np.array_equal(parsed, labels)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "annotation.anno3d")
+        with open(path, "wb") as file:
+            file.write(data)
+        del data, parsed
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        with open(path, "rb") as file:
+            parsed = utf8v1.parse(file)
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        report("parse (streaming)", seconds, os.path.getsize(path), args.count)
+        print(f"{'':<24} {os.path.getsize(path) / pow(2, 20):.1f} MiB")
+        assert np.array_equal(parsed, labels)
+        print(
+            f"{'':<24} peak memory {peak / pow(2, 20):.1f} MiB, labels "
+            + f"{labels.nbytes / pow(2, 20):.1f} MiB"
+        )
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        with open(path, "wb") as file:
+            utf8v1.serialize(labels, file)
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        report("serialize (streaming)", seconds, os.path.getsize(path), args.count)
+        print(f"{'':<24} peak memory {peak / pow(2, 20):.1f} MiB")
+
+    start = time.perf_counter()
+    binary = binaryv2.serialize_bytes(labels)
+    report("serialize BIN 2.0", time.perf_counter() - start, len(binary), args.count)
+    start = time.perf_counter()
+    assert np.array_equal(binaryv2.parse_bytes(binary), labels)
+    report("parse BIN 2.0", time.perf_counter() - start, len(binary), args.count)
+    print(f"{'':<24} {len(binary) / pow(2, 20):.1f} MiB")
+
+    # the streaming parser also accepts arbitrarily small pieces
+    assert np.array_equal(
+        utf8v1.parse(io.BytesIO(utf8v1.serialize_bytes(labels[:1000]))), labels[:1000]
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# Benchmark of project membership checks on a project with many members: loading
+# all members as IsPartOfProject did before, the EXISTS lookup, and the lookup
+# memoized per request and cached per worker process. Runs on a temporary test
+# database, the configured one is not touched.
+#
+# Run from the backend directory:
+#   python -m benchmarks.permissions --members 10000 --checks 4
+
+import argparse
+import os
+import time
+from typing import Callable
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "annotator.settings")
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from rest_framework.request import Request  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+
+from annotator.backend import constants, permissions  # noqa: E402
+from annotator.backend.models import Project  # noqa: E402
+
+
+def create_project(members: int) -> tuple[Project, User]:
+    User.objects.bulk_create(
+        User(username=f"user{number}") for number in range(members + 1)
+    )
+    users = list(User.objects.order_by("pk"))
+    project = Project.objects.create(name="benchmark", owner=users[0])
+    Project.users.through.objects.bulk_create(
+        Project.users.through(project=project, user=user) for user in users[1:]
+    )
+    # the last member is found last when the members are loaded
+    return project, users[-1]
+
+
+def report(name: str, requests: int, checks: int, check: Callable[[], None]) -> None:
+    with CaptureQueriesContext(connection) as context:
+        start = time.perf_counter()
+        for _ in range(requests):
+            check()
+        seconds = time.perf_counter() - start
+    print(
+        f"{name:<28} {seconds / requests * 1e6:10.1f} µs per request "
+        + f"{len(context) / requests:6.1f} queries per request "
+        + f"({checks} checks)"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--members", type=int, default=10_000)
+    parser.add_argument("--checks", type=int, default=4, help="checks per request")
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    database = connection.creation.create_test_db(verbosity=0)
+    try:
+        project, user = create_project(args.members)
+        print(f"{args.members} members, database {database}")
+        factory = APIRequestFactory()
+
+        def load_members() -> None:
+            for _ in range(args.checks):
+                assert user in project.users.all() or user == project.owner
+
+        def exists() -> None:
+            for _ in range(args.checks):
+                assert permissions.is_project_member(user, project)
+
+        def memoized() -> None:
+            request = Request(factory.get("/"))
+            for _ in range(args.checks):
+                assert permissions.is_project_member(user, project, request)
+
+        report("load all members", args.requests, args.checks, load_members)
+        report("EXISTS", args.requests, args.checks, exists)
+        report("EXISTS, per request", args.requests, args.checks, memoized)
+        constants.PROJECT_MEMBERSHIP_CACHE_TTL = 5
+        report("EXISTS, per worker (5 s)", args.requests, args.checks, memoized)
+    finally:
+        connection.creation.destroy_test_db(database, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+# Throughput and memory benchmark of the upload paths: multipart bodies parsed by
+# Django with the HashingFileUploadHandler, and raw application/zip bodies streamed
+# by receive_raw_body, plain and gzip encoded. The bodies are generated while they
+# are read, every path runs in its own process so that its peak RSS is its own.
+#
+# Run from the backend directory:
+#   python -m benchmarks.uploads --size 1024
+
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+import zlib
+from typing import Any, Callable
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "annotator.settings")
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.http.multipartparser import MultiPartParser  # noqa: E402
+
+from annotator.backend import constants  # noqa: E402
+from annotator.backend.upload_handlers import (  # noqa: E402
+    RAW_CONTENT_TYPE,
+    HashingFileUploadHandler,
+    receive_raw_body,
+)
+
+BOUNDARY = "boundary"
+# the size of the pieces a WSGI server hands to Django
+READ_SIZE = pow(2, 20)
+
+
+# A body of a head, size zeros and a tail, generated while it is read.
+class GeneratedBody:
+    def __init__(self, size: int, head: bytes = b"", tail: bytes = b"") -> None:
+        self.head = head
+        self.tail = tail
+        self.length = len(head) + size + len(tail)
+        self.position = 0
+        self.zeros = bytes(READ_SIZE)
+
+    # returns at most size bytes, never parts of both the zeros and the head or tail
+    def read(self, size: int = -1) -> bytes:
+        size = READ_SIZE if size < 0 else size
+        start = self.position
+        end = self.length - len(self.tail)
+        if start < len(self.head):
+            data = self.head[start : start + size]
+        elif start >= end:
+            data = self.tail[start - end : start - end + size]
+        else:
+            data = self.zeros[: min(size, end - start)]
+        self.position += len(data)
+        return data
+
+
+# A fixed body, e.g. a gzip encoded one, read in pieces.
+class BytesBody:
+    def __init__(self, data: bytes) -> None:
+        self.data = memoryview(data)
+        self.length = len(data)
+        self.position = 0
+
+    def read(self, size: int = -1) -> bytes:
+        size = min(READ_SIZE if size < 0 else size, self.length - self.position)
+        start, self.position = self.position, self.position + size
+        return bytes(self.data[start : self.position])
+
+
+def get_handler(size: int) -> HashingFileUploadHandler:
+    return HashingFileUploadHandler(None, size + 1)
+
+
+def upload_multipart(size: int) -> Any:
+    head = (
+        f"--{BOUNDARY}\r\n"
+        + 'Content-Disposition: form-data; name="file"; filename="baseFile.zip"\r\n'
+        + "Content-Type: application/zip\r\n\r\n"
+    ).encode()
+    body = GeneratedBody(size, head, f"\r\n--{BOUNDARY}--\r\n".encode())
+    meta = {
+        "CONTENT_TYPE": f"multipart/form-data; boundary={BOUNDARY}",
+        "CONTENT_LENGTH": str(body.length),
+    }
+    parser = MultiPartParser(meta, body, [get_handler(size)], "utf-8")
+    return parser.parse()[1]["file"]
+
+
+def upload_raw(size: int) -> Any:
+    return receive_raw_body(GeneratedBody(size), get_handler(size), "baseFile.zip")
+
+
+def compress(size: int) -> bytes:
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    zeros = bytes(READ_SIZE)
+    parts = []
+    for start in range(0, size, READ_SIZE):
+        parts.append(compressor.compress(zeros[: min(READ_SIZE, size - start)]))
+    parts.append(compressor.flush())
+    return b"".join(parts)
+
+
+def run(upload: Callable[..., Any], args: tuple, size: int, results: Any) -> None:
+    start = time.perf_counter()
+    file = upload(*args)
+    seconds = time.perf_counter() - start
+    assert file.size == size, file.size
+    file.close()
+    # KiB on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    results.put((seconds, peak))
+
+
+def report(name: str, seconds: float, size: int, peak: int) -> None:
+    print(
+        f"{name:<24} {seconds:8.3f} s {size / seconds / pow(2, 20):10.1f} MiB/s "
+        + f"peak RSS {peak / pow(2, 20):8.1f} MiB"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=1024, help="MiB per upload")
+    args = parser.parse_args()
+    size = args.size * pow(2, 20)
+
+    gzipped = compress(size)
+    print(
+        f"{args.size} MiB uploads, gzip body {len(gzipped) / pow(2, 20):.1f} MiB, "
+        + f"{constants.UPLOAD_STREAM_BLOCK_SIZE // 1024} KiB blocks"
+    )
+
+    def upload_gzip(data: bytes) -> Any:
+        return receive_raw_body(
+            BytesBody(data), get_handler(size), "annotationFile.zip", "gzip", True
+        )
+
+    context = multiprocessing.get_context("fork")
+    with tempfile.TemporaryDirectory() as directory:
+        settings.FILE_UPLOAD_TEMP_DIR = directory
+        for name, upload, uploadArgs in [
+            ("multipart/form-data", upload_multipart, (size,)),
+            (RAW_CONTENT_TYPE, upload_raw, (size,)),
+            (f"{RAW_CONTENT_TYPE}, gzip", upload_gzip, (gzipped,)),
+        ]:
+            results = context.Queue()
+            process = context.Process(
+                target=run, args=(upload, uploadArgs, size, results)
+            )
+            process.start()
+            seconds, peak = results.get()
+            process.join()
+            report(name, seconds, size, peak)
+
+
+if __name__ == "__main__":
+    main()